@@ -0,0 +1,283 @@
+"""
+Control de admisión por tenant y descarte de carga
+
+Cada endpoint tiene un costo (`@request_cost(n)`, 1 por omisión; 0 lo
+exenta): el dashboard, las predicciones o el portafolio cuestan más que
+una página de CFDIs y /health no cuesta nada. Un request se admite si cabe
+en dos límites de costo en curso:
+  - Por tenant: el usuario del token (o la IP sin token) y, si la ruta trae
+    `company_id`, la empresa; cada llave tiene ADMISSION_TENANT_CAPACITY.
+    Un despacho que refresca 200 empresas a la vez o que martillea el CFO
+    Virtual espera su turno sin quitarle conexiones a los demás.
+  - Global del proceso (ADMISSION_GLOBAL_CAPACITY), para no pasar de lo que
+    aguantan el threadpool y el pool de conexiones.
+Si no cabe, el request espera en una cola FIFO hasta
+ADMISSION_QUEUE_TIMEOUT_SECONDS; si se acaba el tiempo (o la cola de su
+llave está llena) se responde 429 (límite del tenant) o 503 (proceso
+saturado) con `Retry-After`, en lugar de dejar que la latencia crezca para
+todos.
+
+Los límites son por proceso: con WEB_CONCURRENCY workers el máximo real de
+un tenant es WEB_CONCURRENCY veces ADMISSION_TENANT_CAPACITY.
+"""
+from collections import deque
+from typing import Callable, Optional
+import asyncio
+import time
+
+from starlette.routing import Match
+
+from app.auth import InvalidToken, token_user_id
+from app.config import settings
+from app.observability.metrics import REGISTRY
+from app.responses import ORJSONResponse
+
+DEFAULT_COST = 1
+
+
+def request_cost(cost: int) -> Callable:
+    """Declara el costo de un endpoint para el control de admisión (0 = exento)."""
+    def decorator(func: Callable) -> Callable:
+        func.__request_cost__ = cost
+        return func
+    return decorator
+
+
+class CostLimiter:
+    """Semáforo con pesos y cola FIFO; vive en el event loop (sin locks)."""
+
+    def __init__(self, capacity: int, max_queue: Optional[int] = None):
+        self.capacity = capacity
+        self.max_queue = max_queue
+        self.in_use = 0
+        self._waiters: deque[tuple[int, asyncio.Future]] = deque()
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    @property
+    def idle(self) -> bool:
+        return self.in_use == 0 and not self._waiters
+
+    def _fits(self, cost: int) -> bool:
+        # Un request más caro que la capacidad entra solo cuando la llave está libre
+        return self.in_use + cost <= self.capacity or self.in_use == 0
+
+    def try_acquire(self, cost: int) -> bool:
+        if not self._waiters and self._fits(cost):
+            self.in_use += cost
+            return True
+        return False
+
+    async def acquire(self, cost: int, timeout: float) -> bool:
+        """True si se obtuvo el costo antes de `timeout` segundos."""
+        if self.try_acquire(cost):
+            return True
+        if timeout <= 0 or (self.max_queue is not None and len(self._waiters) >= self.max_queue):
+            return False
+        future = asyncio.get_running_loop().create_future()
+        entry = (cost, future)
+        self._waiters.append(entry)
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout)
+            return True
+        except asyncio.TimeoutError:
+            if future.done():
+                # Se le asignó justo al vencer el plazo
+                return True
+            self._waiters.remove(entry)
+            self._wake()
+            return False
+        except asyncio.CancelledError:
+            if future.done():
+                self.release(cost)
+            else:
+                self._waiters.remove(entry)
+                self._wake()
+            raise
+
+    def release(self, cost: int) -> None:
+        self.in_use -= cost
+        self._wake()
+
+    def _wake(self) -> None:
+        while self._waiters and self._fits(self._waiters[0][0]):
+            cost, future = self._waiters.popleft()
+            self.in_use += cost
+            future.set_result(None)
+
+
+class AdmissionController:
+    """Límite global más un `CostLimiter` por llave de tenant, creado al vuelo."""
+
+    def __init__(self, tenant_capacity: int, global_capacity: int, queue_timeout: float, max_queue: int):
+        self.tenant_capacity = tenant_capacity
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.global_limiter = CostLimiter(global_capacity)
+        self.tenants: dict[str, CostLimiter] = {}
+
+    def _tenant(self, key: str) -> CostLimiter:
+        limiter = self.tenants.get(key)
+        if limiter is None:
+            limiter = self.tenants[key] = CostLimiter(self.tenant_capacity, self.max_queue)
+        return limiter
+
+    def _release_tenants(self, keys: list[str], cost: int) -> None:
+        for key in keys:
+            limiter = self.tenants[key]
+            limiter.release(cost)
+            if limiter.idle:
+                del self.tenants[key]
+
+    async def admit(self, keys: list[str], cost: int) -> Optional[str]:
+        """Reserva `cost` en cada llave y en el global. None si se admitió; si no, "tenant" u "overload"."""
+        deadline = time.monotonic() + self.queue_timeout
+        acquired: list[str] = []
+        try:
+            for key in keys:
+                if not await self._tenant(key).acquire(cost, deadline - time.monotonic()):
+                    self._release_tenants(acquired, cost)
+                    if self.tenants[key].idle:
+                        del self.tenants[key]
+                    return "tenant"
+                acquired.append(key)
+            if not await self.global_limiter.acquire(cost, deadline - time.monotonic()):
+                self._release_tenants(acquired, cost)
+                return "overload"
+        except asyncio.CancelledError:
+            # El cliente se desconectó mientras esperaba
+            self._release_tenants(acquired, cost)
+            for key in keys:
+                if key in self.tenants and self.tenants[key].idle:
+                    del self.tenants[key]
+            raise
+        return None
+
+    def release(self, keys: list[str], cost: int) -> None:
+        self.global_limiter.release(cost)
+        self._release_tenants(keys, cost)
+
+    def snapshot(self) -> dict:
+        return {
+            "global_in_use": self.global_limiter.in_use,
+            "global_queued": self.global_limiter.queued,
+            "tenants_active": len(self.tenants),
+            "tenant_queued": sum(limiter.queued for limiter in list(self.tenants.values())),
+            "tenant_in_use_max": max((limiter.in_use for limiter in list(self.tenants.values())), default=0),
+        }
+
+
+REJECTED = REGISTRY.counter(
+    "poa_admission_rejected_total", "Requests rechazados por el control de admisión", ("route", "reason"),
+)
+WAIT_SECONDS = REGISTRY.histogram(
+    "poa_admission_wait_seconds", "Espera en cola de los requests admitidos", ("route",),
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+
+admission = AdmissionController(
+    tenant_capacity=settings.ADMISSION_TENANT_CAPACITY,
+    global_capacity=settings.ADMISSION_GLOBAL_CAPACITY,
+    queue_timeout=settings.ADMISSION_QUEUE_TIMEOUT_SECONDS,
+    max_queue=settings.ADMISSION_MAX_QUEUE,
+)
+
+
+def _gauge(field: str) -> Callable[[], dict[tuple, float]]:
+    return lambda: {(): admission.snapshot()[field]}
+
+
+REGISTRY.gauge("poa_admission_global_in_use", "Costo en curso en el proceso", callback=_gauge("global_in_use"))
+REGISTRY.gauge("poa_admission_global_queued", "Requests esperando el límite global", callback=_gauge("global_queued"))
+REGISTRY.gauge("poa_admission_tenants_active", "Llaves de tenant con requests en curso o en cola",
+               callback=_gauge("tenants_active"))
+REGISTRY.gauge("poa_admission_tenant_queued", "Requests esperando el límite de su tenant",
+               callback=_gauge("tenant_queued"))
+REGISTRY.gauge("poa_admission_tenant_in_use_max", "Mayor costo en curso de un solo tenant",
+               callback=_gauge("tenant_in_use_max"))
+
+
+def _bearer(scope) -> Optional[str]:
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            return token if scheme.lower() == "bearer" and token else None
+    return None
+
+
+def _query_company_id(scope) -> Optional[str]:
+    for part in scope.get("query_string", b"").split(b"&"):
+        name, _, value = part.partition(b"=")
+        if name == b"company_id" and value.isdigit():
+            return value.decode()
+    return None
+
+
+def tenant_keys(scope, path_params: dict) -> list[str]:
+    """Llaves de tenant del request: usuario (o IP) y empresa, si la hay."""
+    user_id = None
+    token = _bearer(scope)
+    if token:
+        try:
+            user_id = token_user_id(token)
+        except InvalidToken:
+            pass
+    if user_id is not None:
+        keys = [f"user:{user_id}"]
+    else:
+        client = scope.get("client")
+        keys = [f"ip:{client[0] if client else 'desconocida'}"]
+    company_id = path_params.get("company_id") or _query_company_id(scope)
+    if company_id is not None:
+        keys.append(f"company:{company_id}")
+    return keys
+
+
+class AdmissionMiddleware:
+    """Middleware ASGI: resuelve la ruta, admite según su costo o rechaza con Retry-After."""
+
+    def __init__(self, app, routes: list, controller: AdmissionController = admission, retry_after: int = 1):
+        self.app = app
+        self.routes = routes
+        self.controller = controller
+        self.retry_after = retry_after
+
+    def _match(self, scope):
+        for route in self.routes:
+            match, child_scope = route.matches(scope)
+            if match == Match.FULL:
+                return route, child_scope.get("path_params", {})
+        return None, {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        route, path_params = self._match(scope)
+        cost = getattr(getattr(route, "endpoint", None), "__request_cost__", DEFAULT_COST)
+        if route is None or cost <= 0:
+            await self.app(scope, receive, send)
+            return
+
+        # Para que las métricas etiqueten por plantilla también los rechazados
+        scope["route"] = route
+        keys = tenant_keys(scope, path_params)
+        started = time.monotonic()
+        rejected = await self.controller.admit(keys, cost)
+        if rejected is not None:
+            REJECTED.inc(1, route.path, rejected)
+            status, detail = (429, "Demasiadas solicitudes en curso; intenta de nuevo en un momento") \
+                if rejected == "tenant" else (503, "Servidor saturado; intenta de nuevo en un momento")
+            response = ORJSONResponse({"detail": detail}, status_code=status,
+                                      headers={"Retry-After": str(self.retry_after)})
+            await response(scope, receive, send)
+            return
+
+        WAIT_SECONDS.observe(time.monotonic() - started, route.path)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release(keys, cost)
@@ -0,0 +1,361 @@
+"""
+Archivo frío de CFDIs en Parquet
+
+El SAT obliga a conservar 5 años de comprobantes, pero el dashboard mira 8
+meses y las predicciones 6. Los meses anteriores a `ARCHIVE_HORIZON_MONTHS`
+salen de `cfdis` a un archivo Parquet por empresa y mes (columnar,
+comprimido con zstd). En la base quedan solo sus acumulados en
+`cfdi_rollups`, así la tabla caliente y sus índices no crecen con la historia.
+Sus conceptos (`cfdi_conceptos`) también se borran; el XML archivado los conserva.
+Igual sus saldos por cobrar y sus verificaciones de estado ante el SAT.
+
+Estructura en disco:
+    {ARCHIVE_DIR}/company_id=7/2023-04.parquet
+
+Cada archivo va ordenado por UUID: la búsqueda por UUID usa las estadísticas
+min/max de cada row group y solo lee el que puede contenerlo. Si a un mes ya
+archivado le llegan CFDIs tardíos o cancelaciones, la siguiente corrida lo
+vuelve a archivar. Las filas de la tabla reemplazan a las del archivo con el
+mismo UUID y los acumulados del mes se recalculan desde el archivo final.
+
+Requiere pyarrow. Mientras no haya archivos en disco no se importa.
+
+Uso:
+    python -m app.archive status
+    python -m app.archive run --horizon-months 24
+    python -m app.archive run --company 7
+"""
+from dataclasses import dataclass, field, asdict
+from datetime import date, datetime
+from decimal import Decimal
+from pathlib import Path
+from typing import Iterable, Iterator, Optional
+import argparse
+import logging
+import os
+
+from sqlalchemy import select, func, delete, insert, Integer, Numeric, DateTime
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models import CFDI, CFDIRollup, CFDIConcepto, CFDIStatusCheck, ReceivableBalance
+from app.models.cfdi import TipoCFDI, EstadoCFDI
+from app.partitioning import add_months, month_start
+
+logger = logging.getLogger("poa.archive")
+
+# El dashboard mira el mes actual y los 7 anteriores: nunca archivar dentro de esa ventana
+MIN_HORIZON_MONTHS = 9
+
+ARCHIVE_KEYS = tuple(c.key for c in CFDI.__table__.columns)
+ROLLUP_KEYS = ("tipo_comprobante", "estado", "emisor_rfc", "emisor_nombre", "receptor_rfc", "receptor_nombre")
+_ENUMS = {"tipo_comprobante": TipoCFDI, "estado": EstadoCFDI}
+_DATETIMES = tuple(c.key for c in CFDI.__table__.columns if isinstance(c.type, DateTime))
+_DELETE_BATCH = 1000
+
+
+class ArchiveError(RuntimeError):
+    """Archivo no disponible (falta pyarrow) u operación inválida."""
+
+
+def require_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.compute  # noqa: F401
+        import pyarrow.dataset  # noqa: F401
+        import pyarrow.parquet  # noqa: F401
+    except ImportError as exc:
+        raise ArchiveError("El archivo de CFDIs requiere pyarrow (pip install pyarrow)") from exc
+    return pyarrow
+
+
+def arrow_schema(pa):
+    """Esquema Parquet con las columnas de `cfdis`; los enums se guardan por nombre, como en la base."""
+    fields = []
+    for column in CFDI.__table__.columns:
+        if isinstance(column.type, Integer):
+            type_ = pa.int64()
+        elif isinstance(column.type, Numeric):
+            type_ = pa.decimal128(column.type.precision, column.type.scale)
+        elif isinstance(column.type, DateTime):
+            type_ = pa.timestamp("us")
+        else:
+            type_ = pa.string()
+        fields.append(pa.field(column.key, type_))
+    return pa.schema(fields)
+
+
+def _to_archive(key: str, value):
+    if value is None:
+        return None
+    if key in _ENUMS:
+        return value.name
+    if key in _DATETIMES and value.tzinfo is not None:
+        # Las fechas de la app son hora local sin zona; PostgreSQL las regresa con zona
+        return value.astimezone().replace(tzinfo=None)
+    return value
+
+
+def from_archive(row: dict) -> dict:
+    """Fila leída del Parquet con los tipos que regresaría la base."""
+    for key, enum_type in _ENUMS.items():
+        if row.get(key) is not None:
+            row[key] = enum_type[row[key]]
+    return row
+
+
+def _month_bounds(month: date) -> tuple[datetime, datetime]:
+    end = add_months(month, 1)
+    return datetime(month.year, month.month, 1), datetime(end.year, end.month, 1)
+
+
+class ArchiveStore:
+    """Archivos Parquet por empresa y mes bajo `directory`."""
+
+    def __init__(self, directory: Optional[str] = None, compression: Optional[str] = None):
+        self.root = Path(directory or settings.ARCHIVE_DIR)
+        self.compression = compression or settings.ARCHIVE_COMPRESSION
+
+    def company_dir(self, company_id: int) -> Path:
+        return self.root / f"company_id={company_id}"
+
+    def path(self, company_id: int, month: date) -> Path:
+        return self.company_dir(company_id) / f"{month:%Y-%m}.parquet"
+
+    def months(self, company_id: int) -> list[date]:
+        directory = self.company_dir(company_id)
+        if not directory.is_dir():
+            return []
+        return sorted(datetime.strptime(p.stem, "%Y-%m").date() for p in directory.glob("*.parquet"))
+
+    def read_month(self, company_id: int, month: date, columns: Optional[list[str]] = None):
+        path = self.path(company_id, month)
+        if not path.exists():
+            return None
+        return require_pyarrow().parquet.read_table(path, columns=columns)
+
+    def write_month(self, company_id: int, month: date, table) -> Path:
+        """Escribe a un temporal y lo renombra: un lector nunca ve un archivo a medias."""
+        pa = require_pyarrow()
+        path = self.path(company_id, month)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".parquet.tmp")
+        pa.parquet.write_table(
+            table, tmp,
+            compression=self.compression,
+            row_group_size=settings.ARCHIVE_ROW_GROUP_SIZE,
+            write_statistics=True,
+        )
+        os.replace(tmp, path)
+        return path
+
+    def find(self, company_id: int, uuid: str) -> Optional[dict]:
+        """CFDI archivado por UUID, o None."""
+        months = self.months(company_id)
+        if not months:
+            return None
+        pa = require_pyarrow()
+        dataset = pa.dataset.dataset(
+            [str(self.path(company_id, m)) for m in months], schema=arrow_schema(pa), format="parquet",
+        )
+        table = dataset.to_table(filter=pa.dataset.field("uuid") == uuid)
+        if not table.num_rows:
+            return None
+        return from_archive(table.slice(0, 1).to_pylist()[0])
+
+    def iter_rows(
+        self,
+        company_id: int,
+        columns: Iterable[str],
+        desde: Optional[datetime] = None,
+        hasta: Optional[datetime] = None,
+    ) -> Iterator[dict]:
+        """
+        Filas archivadas con `desde <= fecha_emision < hasta`, en orden de
+        fecha. Se lee un mes a la vez y solo las columnas pedidas.
+        """
+        columns = list(columns)
+        read = columns if "fecha_emision" in columns else [*columns, "fecha_emision"]
+        for month in self.months(company_id):
+            start, end = _month_bounds(month)
+            if (desde and end <= desde) or (hasta and start >= hasta):
+                continue
+            table = self.read_month(company_id, month, read).sort_by("fecha_emision")
+            for row in table.to_pylist():
+                fecha = row["fecha_emision"]
+                if (desde and fecha < desde) or (hasta and fecha >= hasta):
+                    continue
+                if len(read) > len(columns):
+                    del row["fecha_emision"]
+                yield from_archive(row)
+
+
+@dataclass
+class ArchiveReport:
+    cutoff: date
+    companies: int = 0
+    months: int = 0
+    rows: int = 0
+    archived: list[str] = field(default_factory=list)
+
+    def as_dict(self) -> dict:
+        return {**asdict(self), "cutoff": self.cutoff.isoformat()}
+
+
+def _rollups(pa, table) -> list[dict]:
+    grouped = table.group_by(list(ROLLUP_KEYS), use_threads=False).aggregate([
+        ("uuid", "count"), ("subtotal", "sum"), ("iva", "sum"), ("total", "sum"),
+    ])
+    return [
+        {
+            **{k: r[k] for k in ROLLUP_KEYS},
+            "tipo_comprobante": TipoCFDI[r["tipo_comprobante"]],
+            "estado": EstadoCFDI[r["estado"]] if r["estado"] else None,
+            "num_cfdis": r["uuid_count"],
+            "subtotal": r["subtotal_sum"] or Decimal(0),
+            "iva": r["iva_sum"] or Decimal(0),
+            "total": r["total_sum"] or Decimal(0),
+        }
+        for r in grouped.to_pylist()
+    ]
+
+
+def archive_month(db: Session, store: ArchiveStore, company_id: int, month: date) -> int:
+    """
+    Mueve los CFDIs de la empresa en `month` al Parquet del mes y reemplaza
+    sus acumulados. Hace commit; regresa cuántas filas salieron de `cfdis`.
+    """
+    start, end = _month_bounds(month)
+    in_month = (CFDI.company_id == company_id, CFDI.fecha_emision >= start, CFDI.fecha_emision < end)
+    rows = db.execute(select(*CFDI.__table__.columns).where(*in_month)).all()
+    if not rows:
+        return 0
+
+    pa = require_pyarrow()
+    schema = arrow_schema(pa)
+    fresh = pa.table(
+        [pa.array([_to_archive(key, row[i]) for row in rows], type=schema.field(key).type)
+         for i, key in enumerate(ARCHIVE_KEYS)],
+        schema=schema,
+    )
+    existing = store.read_month(company_id, month)
+    if existing is not None:
+        # Lo que está en la tabla es más nuevo que lo archivado con el mismo UUID
+        stale = pa.compute.is_in(existing.column("uuid"), value_set=fresh.column("uuid"))
+        fresh = pa.concat_tables([existing.filter(pa.compute.invert(stale)), fresh])
+    table = fresh.sort_by("uuid")
+    # El archivo se escribe antes de borrar: si algo falla después, la
+    # siguiente corrida lo fusiona de nuevo sin perder filas
+    store.write_month(company_id, month, table)
+
+    # Borrados masivos sin sincronizar entidades que la sesión tuviera cargadas
+    unsynced = {"synchronize_session": False}
+    db.execute(
+        delete(CFDIRollup).where(CFDIRollup.company_id == company_id, CFDIRollup.periodo == start),
+        execution_options=unsynced,
+    )
+    db.execute(insert(CFDIRollup), [
+        {"company_id": company_id, "periodo": start, **r} for r in _rollups(pa, table)
+    ])
+    db.execute(
+        delete(CFDIConcepto).where(
+            CFDIConcepto.company_id == company_id,
+            CFDIConcepto.fecha_emision >= start,
+            CFDIConcepto.fecha_emision < end,
+        ),
+        execution_options=unsynced,
+    )
+    db.execute(
+        delete(ReceivableBalance).where(
+            ReceivableBalance.company_id == company_id,
+            ReceivableBalance.fecha_emision >= start,
+            ReceivableBalance.fecha_emision < end,
+        ),
+        execution_options=unsynced,
+    )
+    ids = [row.id for row in rows]
+    uuids = [row.uuid for row in rows]
+    for i in range(0, len(ids), _DELETE_BATCH):
+        db.execute(
+            delete(CFDIStatusCheck).where(
+                CFDIStatusCheck.company_id == company_id, CFDIStatusCheck.cfdi_uuid.in_(uuids[i:i + _DELETE_BATCH]),
+            ),
+            execution_options=unsynced,
+        )
+        db.execute(
+            delete(CFDI).where(*in_month, CFDI.id.in_(ids[i:i + _DELETE_BATCH])),
+            execution_options=unsynced,
+        )
+    db.commit()
+    return len(rows)
+
+
+def run_archive(
+    db: Session,
+    horizon_months: Optional[int] = None,
+    company_ids: Optional[list[int]] = None,
+    today: Optional[date] = None,
+    store: Optional[ArchiveStore] = None,
+) -> ArchiveReport:
+    """Archiva, empresa por empresa y mes por mes, lo anterior al horizonte."""
+    horizon = horizon_months if horizon_months is not None else settings.ARCHIVE_HORIZON_MONTHS
+    if horizon < MIN_HORIZON_MONTHS:
+        raise ArchiveError(f"El horizonte mínimo es {MIN_HORIZON_MONTHS} meses (ventana del dashboard)")
+    store = store or ArchiveStore()
+    cutoff = add_months(month_start(today or date.today()), -horizon)
+    cutoff_dt = datetime(cutoff.year, cutoff.month, 1)
+    report = ArchiveReport(cutoff=cutoff)
+
+    query = select(CFDI.company_id, func.min(CFDI.fecha_emision)).where(CFDI.fecha_emision < cutoff_dt)
+    if company_ids:
+        query = query.where(CFDI.company_id.in_(company_ids))
+    pending = db.execute(query.group_by(CFDI.company_id).order_by(CFDI.company_id)).all()
+
+    for company_id, first in pending:
+        report.companies += 1
+        month = month_start(first)
+        while month < cutoff:
+            moved = archive_month(db, store, company_id, month)
+            if moved:
+                report.months += 1
+                report.rows += moved
+                report.archived.append(f"{company_id}/{month:%Y-%m}")
+            month = add_months(month, 1)
+    if report.rows:
+        logger.info("Archivo: %d CFDIs de %d meses (corte %s)", report.rows, report.months, cutoff)
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Archivo frío de CFDIs en Parquet")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("status", help="Meses archivados por empresa")
+    p_run = sub.add_parser("run", help="Archiva lo anterior al horizonte")
+    p_run.add_argument("--horizon-months", type=int, default=settings.ARCHIVE_HORIZON_MONTHS)
+    p_run.add_argument("--company", type=int, action="append", dest="company_ids")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(levelname)s %(message)s")
+
+    from app.database import SessionLocal
+    db = SessionLocal()
+    try:
+        if args.command == "status":
+            store = ArchiveStore()
+            rows = db.execute(
+                select(CFDIRollup.company_id, func.count(func.distinct(CFDIRollup.periodo)), func.sum(CFDIRollup.num_cfdis))
+                .group_by(CFDIRollup.company_id).order_by(CFDIRollup.company_id)
+            ).all()
+            if not rows:
+                print("Sin CFDIs archivados")
+            for company_id, months, total in rows:
+                size = sum(p.stat().st_size for p in store.company_dir(company_id).glob("*.parquet"))
+                print(f"empresa {company_id:>5}: {months:>3} meses {int(total):>10} CFDIs {size / 1024:>10.0f} KiB")
+        else:
+            report = run_archive(db, args.horizon_months, args.company_ids)
+            print(f"Corte {report.cutoff}: {report.rows} CFDIs en {report.months} meses de {report.companies} empresas")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
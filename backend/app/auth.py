@@ -0,0 +1,44 @@
+"""
+Contraseñas y tokens JWT
+
+bcrypt y jose se importan en la primera llamada y no al arrancar el
+proceso: la mayoría de los requests no los usan y cada worker nuevo debe
+quedar listo cuanto antes.
+"""
+from datetime import datetime, timedelta
+from typing import Optional
+
+from app.config import settings
+
+
+class InvalidToken(Exception):
+    """Token mal formado, con firma inválida o vencido."""
+
+
+def verify_password(plain_password: str, hashed_password: str) -> bool:
+    import bcrypt
+    return bcrypt.checkpw(plain_password.encode("utf-8"), hashed_password.encode("utf-8"))
+
+
+def hash_password(password: str) -> str:
+    import bcrypt
+    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
+
+
+def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
+    from jose import jwt
+    to_encode = data.copy()
+    expire = datetime.utcnow() + (expires_delta or timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES))
+    to_encode.update({"exp": expire})
+    return jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
+
+
+def token_user_id(token: str) -> Optional[int]:
+    """ID del usuario (`sub`) de un token válido; None si no trae `sub`. Lanza InvalidToken."""
+    from jose import JWTError, jwt
+    try:
+        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+        user_id = payload.get("sub")
+        return int(user_id) if user_id is not None else None
+    except (JWTError, ValueError) as e:
+        raise InvalidToken(str(e)) from e
@@ -0,0 +1,86 @@
+"""
+Caches en memoria con expiración
+
+Para resultados derivados que se piden en cada carga del dashboard y cambian
+solo cuando entran CFDIs. Cada cache reporta aciertos y fallos en
+`poa_cache_requests_total{cache=...}`. Las llaves son tuplas cuyo primer
+elemento es el `company_id`, para poder invalidar por empresa.
+
+El cache es por proceso y la ingesta solo invalida el proceso donde corre
+(p. ej. el worker de la cola). Por eso las llaves del dashboard llevan
+`Company.data_version`: la ingesta la sube en su transacción y los demás
+procesos dejan de encontrar la entrada vieja en cuanto leen la versión
+nueva; el TTL solo limpia las entradas huérfanas.
+"""
+from typing import Callable, Hashable, Optional
+import threading
+import time
+
+from app.config import settings
+from app.observability import record_cache
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Cache LRU aproximado (descarta el más viejo) con expiración por entrada."""
+
+    def __init__(self, name: str, ttl_seconds: float, maxsize: int = 1024):
+        self.name = name
+        self.ttl = ttl_seconds
+        self.maxsize = maxsize
+        self._data: dict[Hashable, tuple[float, object]] = {}
+        self._lock = threading.Lock()
+        CACHES[name] = self
+
+    def get(self, key: Hashable, default=None):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] <= now:
+                del self._data[key]
+                entry = None
+        record_cache(self.name, entry is not None)
+        return default if entry is None else entry[1]
+
+    def set(self, key: Hashable, value) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+            if len(self._data) >= self.maxsize:
+                # Los dicts conservan el orden de inserción: el primero es el más viejo
+                del self._data[next(iter(self._data))]
+            self._data[key] = (time.monotonic() + self.ttl, value)
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], object]):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = compute()
+            self.set(key, value)
+        return value
+
+    def invalidate(self, company_id: Optional[int] = None) -> int:
+        """Borra las entradas de la empresa (o todas). Regresa cuántas borró."""
+        with self._lock:
+            if company_id is None:
+                removed = len(self._data)
+                self._data.clear()
+                return removed
+            keys = [k for k in self._data if isinstance(k, tuple) and k and k[0] == company_id]
+            for k in keys:
+                del self._data[k]
+            return len(keys)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+CACHES: dict[str, TTLCache] = {}
+
+# Datos derivados del dashboard (flujo de efectivo, categorías); llaves (company_id, tipo, data_version, ...)
+dashboard_cache = TTLCache("dashboard", settings.DASHBOARD_CACHE_TTL_SECONDS)
+
+
+def invalidate_company(company_id: int) -> None:
+    """Invalida los datos de una empresa en todos los caches (al ingerir o cambiar CFDIs)."""
+    for cache in list(CACHES.values()):
+        cache.invalidate(company_id)
@@ -0,0 +1,138 @@
+"""
+Catálogo c_ClaveProdServ del SAT
+
+El catálogo completo (~50 mil claves) se carga una sola vez por proceso
+desde el CSV que publica el SAT (`SAT_CLAVE_PROD_SERV_CSV`; primeras dos
+columnas: clave y descripción). Las claves van en un `array` de enteros
+ordenado y las descripciones en una lista paralela: unos cuantos MB en
+lugar de un dict de objetos str por clave, y la búsqueda es binaria.
+
+La categoría de una clave es su segmento (los dos primeros dígitos), con
+nombres cortos para las gráficas; no depende de que el CSV exista.
+"""
+from array import array
+from bisect import bisect_left
+from functools import lru_cache
+from pathlib import Path
+from typing import Iterable, Optional
+import csv
+import logging
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+OTROS = "Otros"
+
+# Segmentos del catálogo (estándar UNSPSC) con nombres cortos
+SEGMENTOS = {
+    "01": "No existe en el catálogo",
+    "10": "Material vivo animal y vegetal",
+    "11": "Minerales y materiales no comestibles",
+    "12": "Químicos",
+    "13": "Resinas, caucho y elastómeros",
+    "14": "Papel",
+    "15": "Combustibles y lubricantes",
+    "20": "Maquinaria de minería y perforación",
+    "21": "Maquinaria agrícola",
+    "22": "Maquinaria de construcción",
+    "23": "Maquinaria industrial",
+    "24": "Manejo y almacenamiento de materiales",
+    "25": "Vehículos y refacciones",
+    "26": "Generación y distribución de energía",
+    "27": "Herramientas",
+    "30": "Materiales de construcción",
+    "31": "Componentes de manufactura",
+    "32": "Componentes electrónicos",
+    "39": "Material eléctrico e iluminación",
+    "40": "Climatización y fluidos",
+    "41": "Equipo de laboratorio y medición",
+    "42": "Equipo médico",
+    "43": "Tecnologías de información",
+    "44": "Equipo y artículos de oficina",
+    "45": "Impresión, fotografía y audiovisual",
+    "46": "Seguridad y protección",
+    "47": "Limpieza",
+    "48": "Equipo para la industria de servicios",
+    "49": "Deportes y recreación",
+    "50": "Alimentos y bebidas",
+    "51": "Medicamentos",
+    "52": "Artículos domésticos y electrónica de consumo",
+    "53": "Ropa y cuidado personal",
+    "54": "Joyería y relojería",
+    "55": "Publicaciones",
+    "56": "Muebles y decoración",
+    "60": "Material educativo y artístico",
+    "64": "Instrumentos financieros",
+    "70": "Servicios agropecuarios",
+    "71": "Servicios de minería, petróleo y gas",
+    "72": "Construcción y mantenimiento",
+    "73": "Servicios de manufactura",
+    "76": "Limpieza y tratamiento de residuos",
+    "77": "Servicios medioambientales",
+    "78": "Transporte y logística",
+    "80": "Servicios profesionales y administrativos",
+    "81": "Ingeniería, investigación y tecnología",
+    "82": "Diseño y artes gráficas",
+    "83": "Servicios públicos",
+    "84": "Servicios financieros y seguros",
+    "85": "Servicios de salud",
+    "86": "Educación y capacitación",
+    "90": "Viajes, alimentos y entretenimiento",
+    "91": "Servicios personales y domésticos",
+    "92": "Defensa y seguridad pública",
+    "93": "Asuntos políticos y cívicos",
+    "94": "Organizaciones y clubes",
+    "95": "Terrenos y edificios",
+}
+
+
+def categoria(clave: str) -> str:
+    """Nombre del segmento de una ClaveProdServ, u `OTROS` si no se conoce."""
+    return SEGMENTOS.get(clave[:2], OTROS)
+
+
+class ClaveProdServCatalog:
+    """Búsqueda clave -> descripción sobre arreglos ordenados."""
+
+    def __init__(self, entries: Iterable[tuple[int, str]] = ()):
+        pairs = sorted(entries)
+        self._claves = array("I", (clave for clave, _ in pairs))
+        self._descripciones = [descripcion for _, descripcion in pairs]
+
+    def __len__(self) -> int:
+        return len(self._claves)
+
+    def __contains__(self, clave: str) -> bool:
+        return self.descripcion(clave) is not None
+
+    def descripcion(self, clave: str) -> Optional[str]:
+        if not clave.isdigit():
+            return None
+        key = int(clave)
+        i = bisect_left(self._claves, key)
+        if i < len(self._claves) and self._claves[i] == key:
+            return self._descripciones[i]
+        return None
+
+    @classmethod
+    def from_csv(cls, path: Path) -> "ClaveProdServCatalog":
+        """Lee clave y descripción; ignora encabezados y renglones sin clave numérica."""
+        def entries():
+            with open(path, newline="", encoding="utf-8-sig") as f:
+                for row in csv.reader(f):
+                    if len(row) >= 2 and row[0].strip().isdigit():
+                        yield int(row[0].strip()), row[1].strip()
+
+        return cls(entries())
+
+
+@lru_cache(maxsize=1)
+def clave_prod_serv_catalog() -> ClaveProdServCatalog:
+    """Catálogo del proceso; vacío si no hay CSV configurado (las categorías siguen funcionando)."""
+    path = Path(settings.SAT_CLAVE_PROD_SERV_CSV) if settings.SAT_CLAVE_PROD_SERV_CSV else None
+    if path is None or not path.exists():
+        return ClaveProdServCatalog()
+    catalog = ClaveProdServCatalog.from_csv(path)
+    logger.info("Catálogo c_ClaveProdServ: %d claves desde %s", len(catalog), path)
+    return catalog
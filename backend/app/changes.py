@@ -0,0 +1,457 @@
+"""
+Feed de cambios por empresa (Server-Sent Events)
+
+GET /api/companies/{id}/changes mantiene abierta una respuesta
+`text/event-stream` y empuja deltas chicos cuando cambian los datos de la
+empresa, para que el frontend no tenga que volver a pedir el dashboard
+completo (ni el usuario refrescar) mientras corre una sincronización:
+  - `data`: versión, total de CFDIs, última sincronización, totales
+    mensuales de los meses tocados y los renglones del semáforo que
+    cambiaron (`estado: null` = alerta eliminada). Su `id` es la versión.
+  - `job`: progreso y estado de los trabajos de la empresa.
+  - `resync`: el cliente se atrasó (o se reconectó con un `Last-Event-ID`
+    viejo) y debe volver a pedir el bundle completo.
+
+`companies.data_version` sube con `bump_version()` en la misma transacción
+que escribe los CFDIs; el aviso sale al hacer commit (nunca por datos que
+terminaron en rollback). El aviso solo lleva la empresa y los meses: cada
+proceso web calcula el delta una vez por empresa, lo serializa una vez y
+manda los mismos bytes a todos sus suscriptores. Las ráfagas (una
+sincronización escribe página por página) se juntan en un delta cada
+CHANGES_MIN_INTERVAL_SECONDS como máximo.
+
+El broker se elige con CHANGES_BROKER:
+  - "local": reparte dentro del proceso. Basta con un solo proceso web y el
+    worker embebido (JOBS_EMBEDDED_WORKER).
+  - "postgres": LISTEN/NOTIFY; los avisos de los workers de la cola y de
+    los demás procesos web llegan a todos los procesos.
+"""
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime
+from typing import AsyncIterator, Iterable, Optional
+import asyncio
+import contextvars
+import json
+import logging
+import threading
+import time
+
+from select import select as wait_readable
+
+from sqlalchemy import event, select, text, update
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from app.config import settings
+from app.database import SessionLocal, engine
+from app.models import Company
+from app.observability.metrics import REGISTRY
+from app.partitioning import add_months
+from app.responses import dumps
+from app.services.counterparties import month_of
+from app.services.reads import cfdi_count
+from app.services.sections import semaforo_items
+from app.services.totals import monthly_totals
+
+logger = logging.getLogger("poa.changes")
+
+_PENDING = "poa_changes"  # Llave en Session.info de los avisos que salen al hacer commit
+
+
+@dataclass(frozen=True)
+class Change:
+    """Aviso de cambio; viaja entre procesos, así que solo lleva lo mínimo."""
+    company_id: int
+    kind: str  # "data" o "job"
+    months: tuple[datetime, ...] = ()
+    data: Optional[dict] = None  # Estado del trabajo, en los de tipo "job"
+
+    def encode(self) -> str:
+        return json.dumps({
+            "company_id": self.company_id,
+            "kind": self.kind,
+            "months": [m.isoformat() for m in self.months],
+            "data": self.data,
+        })
+
+    @classmethod
+    def decode(cls, raw: str) -> "Change":
+        value = json.loads(raw)
+        return cls(
+            company_id=value["company_id"],
+            kind=value["kind"],
+            months=tuple(datetime.fromisoformat(m) for m in value["months"]),
+            data=value["data"],
+        )
+
+
+def bump_version(db: Session, company_id: int, months: Iterable = ()) -> None:
+    """
+    Sube `data_version` de la empresa en la transacción de `db` y agenda el
+    aviso con los meses tocados (fechas cualesquiera dentro del mes) para
+    cuando esa transacción haga commit.
+    """
+    db.execute(
+        update(Company).where(Company.id == company_id)
+        .values(data_version=Company.data_version + 1)
+        .execution_options(synchronize_session=False)
+    )
+    pending = db.info.setdefault(_PENDING, {})
+    pending.setdefault(company_id, set()).update(month_of(m) for m in months)
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_pending(session: Session) -> None:
+    pending = session.info.pop(_PENDING, None)
+    for company_id, months in (pending or {}).items():
+        publish(Change(company_id, "data", tuple(sorted(months))))
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending(session: Session) -> None:
+    session.info.pop(_PENDING, None)
+
+
+def job_companies(company_id: Optional[int], payload: Optional[dict]) -> set[int]:
+    """Empresas a las que se reporta un trabajo: la suya y las de `company_ids` del payload."""
+    companies = set((payload or {}).get("company_ids") or ())
+    if company_id is not None:
+        companies.add(company_id)
+    return companies
+
+
+def publish_job(companies: Iterable[int], job_id: int, kind: str, status: str,
+                progress: int, message: Optional[str] = None) -> None:
+    """Avisa el progreso de un trabajo; el llamador ya hizo commit de ese progreso."""
+    data = {"job_id": job_id, "kind": kind, "status": status, "progress": progress, "message": message}
+    for company_id in companies:
+        publish(Change(company_id, "job", data=data))
+
+
+def publish(change: Change) -> None:
+    """Entrega `change` al broker sin que un fallo del feed afecte a quien escribió los datos."""
+    try:
+        broker.publish(change)
+    except Exception:
+        logger.exception("No se pudo publicar el cambio de la empresa %s", change.company_id)
+
+
+# ── Eventos SSE ──
+
+def sse_frame(event_name: str, data, event_id: Optional[int] = None) -> bytes:
+    """Un evento SSE; orjson no emite saltos de línea, así que cabe en un solo `data:`."""
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{head}event: {event_name}\ndata: ".encode() + dumps(data) + b"\n\n"
+
+
+RESYNC = sse_frame("resync", {})
+HEARTBEAT = b": ping\n\n"
+
+
+@dataclass
+class CompanyState:
+    version: int
+    semaforo: dict[str, dict]
+
+
+def load_state(company_id: int) -> Optional[CompanyState]:
+    """
+    Versión y semáforo actuales, con una sesión propia que se cierra de
+    inmediato: una conexión SSE no debe retener una conexión del pool.
+    None si la empresa no existe.
+    """
+    db = SessionLocal()
+    try:
+        version = db.execute(select(Company.data_version).where(Company.id == company_id)).scalar()
+        if version is None:
+            return None
+        return CompanyState(version, {item["nombre"]: item for item in semaforo_items(db, company_id)})
+    finally:
+        db.close()
+
+
+def compute_delta(company_id: int, months: Iterable[datetime], before: dict[str, dict]) -> Optional[tuple[dict, dict]]:
+    """
+    Delta de la empresa contra el semáforo `before`, con su propia sesión.
+    Regresa (payload del evento `data`, semáforo nuevo) o None si la empresa ya no existe.
+    """
+    db = SessionLocal()
+    try:
+        company = db.execute(
+            select(Company.id, Company.rfc, Company.sat_last_sync, Company.data_version)
+            .where(Company.id == company_id)
+        ).first()
+        if company is None:
+            return None
+        ranges = [(m, month_of(add_months(m, 1))) for m in sorted(months)]
+        totals = monthly_totals(db, company, ranges)
+        semaforo = {item["nombre"]: item for item in semaforo_items(db, company_id)}
+        changed = [item for nombre, item in semaforo.items() if before.get(nombre) != item]
+        changed += [{"nombre": nombre, "estado": None} for nombre in before if nombre not in semaforo]
+        payload = {
+            "version": company.data_version,
+            "total_cfdis": cfdi_count(db, company_id),
+            "last_sync": company.sat_last_sync,
+            "meses": [
+                {"periodo": start.strftime("%Y-%m"), "mes": start.strftime("%b"), "ingresos": ing, "egresos": egr}
+                for (start, _), (ing, egr) in zip(ranges, totals)
+            ],
+            "semaforo": changed,
+        }
+        return payload, semaforo
+    finally:
+        db.close()
+
+
+# ── Reparto en el proceso ──
+
+EVENTS = REGISTRY.counter("poa_changes_events_total", "Eventos del feed de cambios repartidos", ("event",))
+DELIVERIES = REGISTRY.counter("poa_changes_deliveries_total", "Eventos encolados a suscriptores", ("event",))
+RESYNCS = REGISTRY.counter("poa_changes_resyncs_total", "Suscriptores atrasados a los que se pidió resincronizar")
+
+
+class Subscriber:
+    """Una conexión SSE: cola acotada de eventos ya serializados."""
+
+    def __init__(self, company_id: int, maxsize: int):
+        self.company_id = company_id
+        self.maxsize = maxsize
+        self._frames: deque[bytes] = deque()
+        self._ready = asyncio.Event()
+
+    def push(self, frame: bytes) -> bool:
+        """Encola `frame`; si la cola está llena la cambia por un `resync`. False si se atrasó."""
+        if len(self._frames) >= self.maxsize:
+            self._frames.clear()
+            self._frames.append(RESYNC)
+            self._ready.set()
+            return False
+        self._frames.append(frame)
+        self._ready.set()
+        return True
+
+    async def next(self, timeout: float) -> Optional[bytes]:
+        """Siguiente evento, o None si pasan `timeout` segundos sin eventos."""
+        if not self._frames:
+            self._ready.clear()
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return None
+        return self._frames.popleft()
+
+
+class CompanyTopic:
+    """Suscriptores de una empresa en este proceso y el último estado que vieron."""
+
+    def __init__(self, company_id: int, state: CompanyState, min_interval: float):
+        self.company_id = company_id
+        self.state = state
+        self.min_interval = min_interval
+        self.subscribers: set[Subscriber] = set()
+        self._months: set[datetime] = set()
+        self._dirty = False
+        self._task: Optional[asyncio.Task] = None
+
+    def fanout(self, event_name: str, frame: bytes) -> None:
+        EVENTS.inc(1, event_name)
+        DELIVERIES.inc(len(self.subscribers), event_name)
+        for subscriber in list(self.subscribers):
+            if not subscriber.push(frame):
+                RESYNCS.inc()
+
+    def notify(self, change: Change) -> None:
+        if change.kind == "job":
+            self.fanout("job", sse_frame("job", change.data))
+            return
+        self._months.update(change.months)
+        self._dirty = True
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._flush())
+
+    async def _flush(self) -> None:
+        """Calcula y reparte deltas mientras haya cambios, a lo más uno por intervalo."""
+        try:
+            while self._dirty and self.subscribers:
+                months, self._months, self._dirty = self._months, set(), False
+                result = await run_in_threadpool(compute_delta, self.company_id, months, self.state.semaforo)
+                if result is None:
+                    break
+                payload, self.state.semaforo = result
+                if payload["version"] > self.state.version or payload["meses"] or payload["semaforo"]:
+                    self.state.version = max(self.state.version, payload["version"])
+                    self.fanout("data", sse_frame("data", payload, payload["version"]))
+                await asyncio.sleep(self.min_interval)
+        except Exception:
+            logger.exception("No se pudo calcular el delta de la empresa %s", self.company_id)
+        finally:
+            self._task = None
+
+
+class LocalBroker:
+    """Reparte los avisos entre los suscriptores de este proceso."""
+
+    def __init__(self, max_subscribers: int = 2000, queue_size: int = 32, min_interval: float = 1.0):
+        self.max_subscribers = max_subscribers
+        self.queue_size = queue_size
+        self.min_interval = min_interval
+        self.topics: dict[int, CompanyTopic] = {}
+        self.subscribers = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def full(self) -> bool:
+        return self.subscribers >= self.max_subscribers
+
+    def start(self) -> None:
+        """Arranque perezoso al llegar el primer suscriptor (ya en el worker, después del fork)."""
+
+    def publish(self, change: Change) -> None:
+        """Llamable desde cualquier hilo."""
+        self.dispatch(change)
+
+    def dispatch(self, change: Change) -> None:
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return  # Nadie suscrito en este proceso
+        # Contexto vacío: el cálculo del delta no debe contar en el request que publicó
+        loop.call_soon_threadsafe(self._deliver, change, context=contextvars.Context())
+
+    def _deliver(self, change: Change) -> None:
+        topic = self.topics.get(change.company_id)
+        if topic is not None:
+            topic.notify(change)
+
+    def resync_all(self) -> None:
+        """Pide a todos los suscriptores que resincronicen (se pudieron perder avisos)."""
+        for topic in list(self.topics.values()):
+            topic.fanout("resync", RESYNC)
+
+    def subscribe(self, company_id: int, state: CompanyState) -> Subscriber:
+        """Registra un suscriptor; se llama desde el event loop."""
+        self._loop = asyncio.get_running_loop()
+        self.start()
+        topic = self.topics.get(company_id)
+        if topic is None:
+            topic = self.topics[company_id] = CompanyTopic(company_id, state, self.min_interval)
+        elif state.version > topic.state.version:
+            # El tema quedó atrás (p. ej. el aviso llegó a otro proceso): recalcular
+            topic.notify(Change(company_id, "data"))
+        subscriber = Subscriber(company_id, self.queue_size)
+        topic.subscribers.add(subscriber)
+        self.subscribers += 1
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        topic = self.topics.get(subscriber.company_id)
+        if topic is None or subscriber not in topic.subscribers:
+            return
+        topic.subscribers.discard(subscriber)
+        self.subscribers -= 1
+        if not topic.subscribers:
+            del self.topics[subscriber.company_id]
+
+
+class PostgresBroker(LocalBroker):
+    """
+    Avisos entre procesos con LISTEN/NOTIFY. `publish` hace NOTIFY y la
+    entrega a los suscriptores, también los de este proceso, llega por el
+    hilo que escucha el canal, con una conexión propia fuera del pool.
+    """
+
+    def __init__(self, channel: str = "poa_changes", **kwargs):
+        super().__init__(**kwargs)
+        self.channel = channel
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def publish(self, change: Change) -> None:
+        with engine.begin() as conn:
+            conn.execute(text("SELECT pg_notify(:channel, :payload)"),
+                         {"channel": self.channel, "payload": change.encode()})
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._listen, name="poa-changes-listen", daemon=True)
+                self._thread.start()
+
+    def _connect(self):
+        raw = engine.raw_connection()
+        raw.detach()
+        conn = raw.driver_connection
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute(f"LISTEN {self.channel}")
+        return conn
+
+    def _listen(self) -> None:
+        backoff = 1.0
+        reconnecting = False
+        while True:
+            conn = None
+            try:
+                conn = self._connect()
+                backoff = 1.0
+                if reconnecting:
+                    # Los avisos de mientras no hubo conexión se perdieron
+                    self._loop.call_soon_threadsafe(self.resync_all, context=contextvars.Context())
+                while True:
+                    if not wait_readable([conn], [], [], 5.0)[0]:
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        self.dispatch(Change.decode(conn.notifies.pop(0).payload))
+            except Exception:
+                logger.exception("Se perdió la conexión LISTEN %s; reintentando en %.0fs", self.channel, backoff)
+            finally:
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+            reconnecting = True
+            time.sleep(backoff)
+            backoff = min(backoff * 2, 30.0)
+
+
+def get_broker() -> LocalBroker:
+    """
+    Broker configurado por `CHANGES_BROKER`. Con "auto" se usa LISTEN/NOTIFY
+    si la base es PostgreSQL: con varios workers web o la cola en otro
+    proceso, el broker local no entregaría los avisos de los demás.
+    """
+    options = dict(
+        max_subscribers=settings.CHANGES_MAX_SUBSCRIBERS,
+        queue_size=settings.CHANGES_QUEUE_SIZE,
+        min_interval=settings.CHANGES_MIN_INTERVAL_SECONDS,
+    )
+    kind = settings.CHANGES_BROKER
+    if kind == "auto":
+        kind = "postgres" if engine.dialect.name == "postgresql" else "local"
+    if kind == "postgres":
+        return PostgresBroker(**options)
+    return LocalBroker(**options)
+
+
+broker = get_broker()
+
+REGISTRY.gauge("poa_changes_subscribers", "Conexiones SSE abiertas en el proceso", callback=lambda: {(): broker.subscribers})
+REGISTRY.gauge("poa_changes_topics", "Empresas con suscriptores en el proceso", callback=lambda: {(): len(broker.topics)})
+
+
+async def event_stream(company_id: int, state: CompanyState, last_event_id: Optional[str],
+                       heartbeat: float) -> AsyncIterator[bytes]:
+    """Cuerpo de la respuesta SSE; se suscribe al empezar y se da de baja al desconectarse el cliente."""
+    subscriber = broker.subscribe(company_id, state)
+    try:
+        yield b"retry: 3000\n\n"
+        yield sse_frame("hello", {"version": state.version}, state.version)
+        if last_event_id and (not last_event_id.isdigit() or int(last_event_id) != state.version):
+            yield RESYNC
+        while True:
+            frame = await subscriber.next(heartbeat)
+            yield HEARTBEAT if frame is None else frame
+    finally:
+        broker.unsubscribe(subscriber)
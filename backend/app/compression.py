@@ -0,0 +1,187 @@
+"""
+Compresión de respuestas (gzip y, si está instalado, brotli)
+
+`CompressionMiddleware` comprime según `Accept-Encoding` las respuestas de
+tipos de texto (JSON, CSV, HTML) de al menos COMPRESSION_MIN_SIZE bytes:
+el dashboard, las páginas de 100 CFDIs o /api/credit bajan a una fracción
+de su tamaño, lo que importa en las conexiones lentas de muchos despachos.
+Las respuestas en streaming (exportación CSV) se comprimen bloque por bloque
+con un flush por bloque, así el cliente recibe datos desde el principio y
+la memoria no crece con el tamaño del archivo.
+
+Los niveles por omisión (gzip 5, brotli 4) son los rápidos: casi toda la
+ganancia de tamaño en JSON con una fracción del CPU de los máximos.
+
+Para payloads que no cambian (catálogos), `PrecompressedJSON` serializa y
+comprime una sola vez con el nivel máximo y responde con ETag, así que un
+request cuesta lo mismo que servir bytes ya hechos (o un 304). El
+middleware no vuelve a comprimir respuestas que ya traen
+`Content-Encoding`.
+"""
+from hashlib import sha1
+from typing import Any, Optional
+import zlib
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import Response
+
+from app.responses import dumps
+
+try:
+    import brotli
+except ImportError:  # opcional: sin brotli solo se ofrece gzip
+    brotli = None
+
+COMPRESSIBLE_TYPES = ("application/json", "text/", "application/javascript", "application/xml")
+
+
+def _accepted(accept_encoding: str) -> set[str]:
+    """Codificaciones con q > 0 en un header Accept-Encoding."""
+    accepted = set()
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        q = params.strip()
+        if q.startswith("q="):
+            try:
+                if float(q[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        if name:
+            accepted.add(name.strip())
+    return accepted
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """"br" si el cliente lo acepta y brotli está instalado; si no "gzip"; None sin compresión."""
+    accepted = _accepted(accept_encoding)
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted or "*" in accepted:
+        return "gzip"
+    return None
+
+
+class _Compressor:
+    """Compresor incremental con la misma interfaz para gzip y brotli."""
+
+    def __init__(self, encoding: str, gzip_level: int, brotli_quality: int):
+        if encoding == "br":
+            self._br = brotli.Compressor(quality=brotli_quality)
+            self._gz = None
+        else:
+            self._gz = zlib.compressobj(gzip_level, zlib.DEFLATED, 31)
+            self._br = None
+
+    def chunk(self, data: bytes) -> bytes:
+        """Comprime un bloque y hace flush para que el cliente lo pueda leer ya."""
+        if self._br is not None:
+            return self._br.process(data) + self._br.flush()
+        return self._gz.compress(data) + self._gz.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data: bytes = b"") -> bytes:
+        if self._br is not None:
+            return self._br.process(data) + self._br.finish()
+        return self._gz.compress(data) + self._gz.flush()
+
+
+def compress(data: bytes, encoding: str, gzip_level: int = 9, brotli_quality: int = 11) -> bytes:
+    return _Compressor(encoding, gzip_level, brotli_quality).finish(data)
+
+
+def _compressible(headers: Headers) -> bool:
+    if "content-encoding" in headers:
+        return False
+    content_type = headers.get("content-type", "")
+    return content_type.startswith(COMPRESSIBLE_TYPES) or "+json" in content_type
+
+
+class CompressionMiddleware:
+    """Middleware ASGI de compresión con umbral de tamaño y soporte de streaming."""
+
+    def __init__(self, app, minimum_size: int = 1024, gzip_level: int = 5, brotli_quality: int = 4):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+        compressor: Optional[_Compressor] = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start, compressor, passthrough
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if compressor is None:
+                headers = Headers(raw=start["headers"])
+                # Un solo bloque chico o un tipo no comprimible se manda tal cual
+                if not _compressible(headers) or (not more_body and len(body) < self.minimum_size):
+                    passthrough = True
+                    await send(start)
+                    await send(message)
+                    return
+                compressor = _Compressor(encoding, self.gzip_level, self.brotli_quality)
+                mutable = MutableHeaders(raw=start["headers"])
+                mutable["Content-Encoding"] = encoding
+                mutable.add_vary_header("Accept-Encoding")
+                if more_body:
+                    del mutable["Content-Length"]
+                    await send(start)
+                else:
+                    body = compressor.finish(body)
+                    mutable["Content-Length"] = str(len(body))
+                    await send(start)
+                    await send({"type": "http.response.body", "body": body})
+                    return
+
+            if more_body:
+                chunk = compressor.chunk(body)
+                if chunk:
+                    await send({"type": "http.response.body", "body": chunk, "more_body": True})
+            else:
+                await send({"type": "http.response.body", "body": compressor.finish(body)})
+
+        await self.app(scope, receive, send_wrapper)
+
+
+class PrecompressedJSON:
+    """JSON estático serializado y comprimido una sola vez, servido con ETag."""
+
+    def __init__(self, content: Any, max_age: int = 3600):
+        body = dumps(content)
+        # Débil: las variantes comprimidas no son idénticas byte a byte
+        self.etag = f'W/"{sha1(body).hexdigest()[:20]}"'
+        self.max_age = max_age
+        self.variants = {None: body, "gzip": compress(body, "gzip")}
+        if brotli is not None:
+            self.variants["br"] = compress(body, "br")
+
+    def response(self, accept_encoding: str = "", if_none_match: Optional[str] = None) -> Response:
+        headers = {
+            "ETag": self.etag,
+            "Cache-Control": f"public, max-age={self.max_age}",
+            "Vary": "Accept-Encoding",
+        }
+        if if_none_match and self.etag in if_none_match:
+            return Response(status_code=304, headers=headers)
+        encoding = choose_encoding(accept_encoding)
+        if encoding is not None:
+            headers["Content-Encoding"] = encoding
+        return Response(self.variants[encoding], media_type="application/json", headers=headers)
@@ -1,6 +1,7 @@
 """
 Configuración del Sistema POA
 """
+from pydantic import model_validator
 from pydantic_settings import BaseSettings
 from functools import lru_cache
 
@@ -13,12 +14,91 @@ class Settings(BaseSettings):
 
     # Database (SQLite for local dev, PostgreSQL for production)
     DATABASE_URL: str = "sqlite:///./poa_dev.db"
+    DB_SCHEMA_MODE: str = "migrate"  # Al arrancar: "migrate" (alembic), "create" (create_all, solo dev) u "off"
 
     # Security
     SECRET_KEY: str = "dev-secret-key-change-in-production"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24  # 24 hours
     ALGORITHM: str = "HS256"
 
+    # Observabilidad
+    METRICS_ENABLED: bool = True
+    QUERY_BUDGET_MODE: str = "off"  # "off", "warn" (log) o "raise" (falla pruebas)
+    QUERY_REPEAT_THRESHOLD: int = 5  # Misma forma de SQL repetida más veces = posible N+1
+    PROFILING_ENABLED: bool = False  # Permite perfilar requests con X-POA-Profile (solo depuración)
+    PROFILING_ADMIN_TOKEN: str = ""  # Requerido en X-Admin-Token; vacío = nadie puede perfilar
+    PROFILING_INTERVAL_MS: float = 1.0
+    PROFILE_DIR: str = "./profiles"
+    PROFILE_KEEP: int = 50
+
+    # Cola de trabajos en segundo plano
+    JOBS_MAX_ATTEMPTS: int = 3
+    JOBS_RETRY_BASE_SECONDS: int = 5
+    JOBS_LOCK_TIMEOUT_SECONDS: int = 300
+    JOBS_POLL_INTERVAL_SECONDS: float = 1.0
+    JOBS_EMBEDDED_WORKER: bool = False  # Worker en hilo del proceso web (solo dev)
+
+    # Sincronización SAT
+    SAT_CLIENT: str = ""  # "http" o "fake" (en memoria, solo con DEBUG); vacío = "fake" con DEBUG, error sin él
+    SAT_BASE_URL: str = "http://localhost:8090"
+    SAT_INITIAL_SYNC_DAYS: int = 30  # Ventana de la primera descarga sin marca de agua
+    SAT_SYNC_CONCURRENCY: int = 8
+    SAT_SYNC_PAGE_SIZE: int = 500
+    SAT_SYNC_MAX_RETRIES: int = 3
+    SAT_SYNC_BACKOFF_SECONDS: float = 2.0
+    SAT_SYNC_MAX_COOLDOWN_SECONDS: int = 3600
+
+    # Verificación de cancelaciones con el SAT (ver app/sat/verify.py)
+    SAT_STATUS_WINDOW_DAYS: int = 90  # Solo CFDIs vigentes emitidos en esta ventana
+    SAT_STATUS_RECHECK_HOURS: int = 24  # No re-consultar un CFDI antes de esto
+    SAT_STATUS_CONCURRENCY: int = 16
+    SAT_STATUS_RATE_PER_SECOND: float = 50.0  # 0 = sin límite
+    SAT_STATUS_BATCH_SIZE: int = 1000
+    SAT_STATUS_MAX_RETRIES: int = 2
+
+    # Particionamiento mensual de cfdis (solo PostgreSQL, ver app/partitioning.py)
+    CFDI_PARTITIONED: bool = False  # La tabla ya fue convertida: unicidad por (uuid, fecha_emision)
+    CFDI_PARTITION_MONTHS_AHEAD: int = 3
+
+    # Archivo frío de CFDIs en Parquet (ver app/archive.py)
+    ARCHIVE_DIR: str = "./archive"
+    ARCHIVE_HORIZON_MONTHS: int = 24  # Meses que se quedan en cfdis (mínimo 9)
+    ARCHIVE_COMPRESSION: str = "zstd"
+    ARCHIVE_ROW_GROUP_SIZE: int = 10000
+
+    # Despliegue multiproceso con gunicorn (ver gunicorn.conf.py y app/prefork.py)
+    WEB_CONCURRENCY: int = 2  # Workers
+    WORKER_MAX_REQUESTS: int = 0  # Reciclar cada worker tras N requests (con jitter); 0 = nunca
+    WORKER_MAX_RSS_MB: int = 0  # Reciclar el worker al pasar este RSS; 0 = sin límite
+    WORKER_RSS_CHECK_SECONDS: float = 15.0
+
+    # Control de admisión por tenant (ver app/admission.py); límites de costo por proceso
+    ADMISSION_ENABLED: bool = True
+    ADMISSION_TENANT_CAPACITY: int = 8  # Costo en curso por usuario (o IP) y por empresa
+    ADMISSION_GLOBAL_CAPACITY: int = 32  # Costo en curso en todo el proceso
+    ADMISSION_QUEUE_TIMEOUT_SECONDS: float = 2.0  # Espera máxima antes de responder 429/503
+    ADMISSION_MAX_QUEUE: int = 16  # Requests en cola por llave; más allá se rechaza de inmediato
+    ADMISSION_RETRY_AFTER_SECONDS: int = 1
+
+    # Compresión de respuestas (ver app/compression.py)
+    COMPRESSION_ENABLED: bool = True
+    COMPRESSION_MIN_SIZE: int = 1024  # Bytes; las respuestas más chicas van sin comprimir
+    COMPRESSION_GZIP_LEVEL: int = 5
+    COMPRESSION_BROTLI_QUALITY: int = 4  # Solo si brotli está instalado
+
+    # Feed de cambios por empresa con Server-Sent Events (ver app/changes.py)
+    CHANGES_BROKER: str = "auto"  # "local" (en proceso), "postgres" (LISTEN/NOTIFY entre procesos) o "auto" (postgres con PostgreSQL)
+    CHANGES_MAX_SUBSCRIBERS: int = 2000  # Conexiones abiertas por proceso; más allá se responde 503
+    CHANGES_QUEUE_SIZE: int = 32  # Eventos pendientes por suscriptor antes de pedirle que resincronice
+    CHANGES_MIN_INTERVAL_SECONDS: float = 1.0  # Un delta por empresa como máximo en este intervalo
+    CHANGES_HEARTBEAT_SECONDS: float = 15.0
+
+    # Caches en memoria (ver app/cache.py)
+    DASHBOARD_CACHE_TTL_SECONDS: int = 300  # Acota lo viejo en procesos que no hicieron la ingesta
+
+    # Catálogos del SAT (ver app/catalogs.py)
+    SAT_CLAVE_PROD_SERV_CSV: str = ""  # CSV de c_ClaveProdServ; vacío = solo categorías por segmento
+
     # CORS
     CORS_ORIGINS: list[str] = [
         "http://localhost:3000",
@@ -31,6 +111,19 @@ class Settings(BaseSettings):
         env_file = ".env"
         env_file_encoding = "utf-8"
 
+    @model_validator(mode="after")
+    def _check_sat_client(self) -> "Settings":
+        # Un despliegue sin SAT_CLIENT no debe sincronizar en silencio contra el SAT falso
+        if not self.SAT_CLIENT and self.DEBUG:
+            self.SAT_CLIENT = "fake"
+        if not self.SAT_CLIENT and not self.DEBUG:
+            raise ValueError("SAT_CLIENT es obligatorio con DEBUG=false")
+        if self.SAT_CLIENT not in ("http", "fake"):
+            raise ValueError(f"SAT_CLIENT debe ser 'http' o 'fake' (recibido {self.SAT_CLIENT!r})")
+        if self.SAT_CLIENT == "fake" and not self.DEBUG:
+            raise ValueError("SAT_CLIENT=fake solo se permite con DEBUG=true")
+        return self
+
 
 @lru_cache
 def get_settings() -> Settings:
@@ -1,10 +1,23 @@
 """
 Configuración de Base de Datos
+
+El esquema lo preparan las migraciones de Alembic (`init_db`), no el import
+de la aplicación: importar `app.main` no abre conexiones.
 """
-from sqlalchemy import create_engine
+from pathlib import Path
+from typing import Optional
+import logging
+
+from sqlalchemy import create_engine, inspect, text
 from sqlalchemy.orm import sessionmaker, declarative_base
 from app.config import settings
 
+logger = logging.getLogger("poa.database")
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+# Llave del advisory lock de PostgreSQL que serializa migraciones concurrentes
+_MIGRATION_LOCK = 0x504F41
+
 # SQLite needs check_same_thread=False
 connect_args = {"check_same_thread": False} if "sqlite" in settings.DATABASE_URL else {}
 
@@ -25,3 +38,40 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+def init_db(mode: Optional[str] = None) -> None:
+    """
+    Prepara el esquema según `mode` (DB_SCHEMA_MODE por omisión):
+      - "migrate": `alembic upgrade head`. En PostgreSQL toma un advisory
+        lock, así varios workers que arrancan a la vez no migran en paralelo.
+      - "create": `create_all` sin migraciones (solo desarrollo y pruebas).
+      - "off": nada; las migraciones corren como paso del despliegue.
+    """
+    mode = mode or settings.DB_SCHEMA_MODE
+    if mode == "off":
+        return
+    if mode == "create":
+        import app.models  # noqa: F401  (registra las tablas en Base.metadata)
+        Base.metadata.create_all(bind=engine)
+        return
+    if mode != "migrate":
+        raise ValueError(f"DB_SCHEMA_MODE inválido: {mode!r} (migrate, create u off)")
+
+    from alembic import command
+    from alembic.config import Config
+
+    config = Config()
+    config.set_main_option("script_location", str(BACKEND_DIR / "migrations"))
+    with engine.begin() as connection:
+        if connection.dialect.name == "postgresql":
+            connection.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": _MIGRATION_LOCK})
+        tables = set(inspect(connection).get_table_names())
+        if tables and "alembic_version" not in tables:
+            raise RuntimeError(
+                "La base tiene tablas pero no versión de Alembic (se creó con create_all). "
+                "Márcala con `alembic stamp 0001` y reinicia, o usa DB_SCHEMA_MODE=create."
+            )
+        config.attributes["connection"] = connection
+        command.upgrade(config, "head")
+    logger.info("Esquema al día (alembic head)")
@@ -0,0 +1,11 @@
+"""
+Cola de Trabajos en Segundo Plano
+
+Cola respaldada por la tabla `jobs` (SQLite o PostgreSQL), sin broker externo.
+Los endpoints encolan y responden 202; los workers (`python -m app.jobs.worker`)
+reclaman, ejecutan y reportan progreso.
+"""
+from app.jobs.queue import enqueue, claim_next, JobContext
+from app.jobs.registry import job_handler, HANDLERS
+
+__all__ = ["enqueue", "claim_next", "JobContext", "job_handler", "HANDLERS"]
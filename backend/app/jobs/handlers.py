@@ -0,0 +1,72 @@
+"""
+Handlers de trabajos incluidos en la aplicación
+"""
+from app.jobs.registry import job_handler
+from app.jobs.queue import JobContext
+
+
+@job_handler("seed")
+def seed_job(ctx: JobContext) -> dict:
+    """Siembra datos de demo fuera del request (ver POST /api/seed?background=true)."""
+    from app.seeds import seed_database
+
+    return seed_database(ctx.db, ctx.payload.get("scenario"), progress=ctx.progress)
+
+
+@job_handler("sat_sync")
+def sat_sync_job(ctx: JobContext) -> dict:
+    """Sincroniza con el SAT las empresas del payload (o todas las conectadas)."""
+    import asyncio
+    from app.sat import SATSyncWorker, get_sat_client
+
+    async def run():
+        client = get_sat_client()
+        try:
+            return await SATSyncWorker(client).run(ctx.payload.get("company_ids"))
+        finally:
+            await client.aclose()
+
+    report = asyncio.run(run())
+    if report.failed and not report.synced:
+        raise RuntimeError(f"Sync SAT falló para {report.failed} empresas")
+    return report.as_dict()
+
+
+@job_handler("sat_verify")
+def sat_verify_job(ctx: JobContext) -> dict:
+    """Verifica con el SAT el estado de los CFDIs recientes de las empresas del payload (o todas)."""
+    import asyncio
+    from app.sat import CancellationVerifier, get_sat_status_client
+
+    async def run():
+        client = get_sat_status_client()
+        try:
+            return await CancellationVerifier(client).run(ctx.payload.get("company_ids"))
+        finally:
+            await client.aclose()
+
+    report = asyncio.run(run())
+    if report.failed and not report.checked:
+        raise RuntimeError(f"Verificación SAT sin respuesta para {report.failed} CFDIs")
+    return report.as_dict()
+
+
+@job_handler("cfdi_partitions")
+def cfdi_partitions_job(ctx: JobContext) -> dict:
+    """Crea las particiones mensuales futuras de cfdis (PostgreSQL con CFDI_PARTITIONED)."""
+    from app.config import settings
+    from app.partitioning import ensure_future_partitions
+
+    months = ctx.payload.get("months_ahead", settings.CFDI_PARTITION_MONTHS_AHEAD)
+    created = ensure_future_partitions(ctx.db.connection(), months)
+    ctx.db.commit()
+    return {"created": created}
+
+
+@job_handler("cfdi_archive")
+def cfdi_archive_job(ctx: JobContext) -> dict:
+    """Mueve a Parquet los CFDIs anteriores al horizonte y deja sus acumulados."""
+    from app.archive import run_archive
+
+    report = run_archive(ctx.db, ctx.payload.get("horizon_months"), ctx.payload.get("company_ids"))
+    return report.as_dict()
@@ -0,0 +1,195 @@
+"""
+Operaciones de la cola: encolar, reclamar, progreso, éxito y reintentos
+"""
+from datetime import datetime, timedelta
+from typing import Any, Optional
+import json
+
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from app.changes import job_companies, publish_job
+from app.config import settings
+from app.database import SessionLocal
+from app.models.job import Job, JobStatus
+
+
+def enqueue(
+    db: Session,
+    kind: str,
+    payload: Optional[dict] = None,
+    company_id: Optional[int] = None,
+    max_attempts: Optional[int] = None,
+    delay_seconds: float = 0,
+) -> Job:
+    """Crea un trabajo en estado `queued` y hace commit."""
+    job = Job(
+        kind=kind,
+        payload_json=json.dumps(payload or {}, ensure_ascii=False),
+        status=JobStatus.QUEUED,
+        progress=0,
+        attempts=0,
+        max_attempts=max_attempts or settings.JOBS_MAX_ATTEMPTS,
+        run_after=datetime.now() + timedelta(seconds=delay_seconds),
+        company_id=company_id,
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def claim_next(db: Session, worker_id: str, kinds: Optional[list[str]] = None) -> Optional[Job]:
+    """
+    Reclama el siguiente trabajo listo.
+
+    En PostgreSQL el SELECT usa FOR UPDATE SKIP LOCKED; en SQLite se ignora y
+    el UPDATE condicionado a `status = queued` garantiza que solo un worker
+    gana el trabajo.
+    """
+    for _ in range(5):
+        now = datetime.now()
+        query = (
+            select(Job.id)
+            .where(Job.status == JobStatus.QUEUED, Job.run_after <= now)
+            .order_by(Job.run_after, Job.id)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+        )
+        if kinds:
+            query = query.where(Job.kind.in_(kinds))
+        job_id = db.execute(query).scalar()
+        if job_id is None:
+            db.rollback()
+            return None
+
+        claimed = db.execute(
+            update(Job)
+            .where(Job.id == job_id, Job.status == JobStatus.QUEUED)
+            .values(
+                status=JobStatus.RUNNING,
+                locked_by=worker_id,
+                locked_at=now,
+                started_at=now,
+                attempts=Job.attempts + 1,
+            )
+        ).rowcount
+        db.commit()
+        if claimed == 1:
+            return db.get(Job, job_id)
+    return None
+
+
+def requeue_stale(db: Session, timeout_seconds: Optional[int] = None) -> int:
+    """
+    Regresa a la cola los trabajos cuyo worker dejó de reportar (murió) y
+    marca como fallidos los que ya agotaron sus intentos, como `mark_failed`:
+    un trabajo que tumba al worker no se reintenta para siempre.
+    """
+    now = datetime.now()
+    cutoff = now - timedelta(seconds=timeout_seconds or settings.JOBS_LOCK_TIMEOUT_SECONDS)
+    stale = (Job.status == JobStatus.RUNNING, Job.locked_at < cutoff)
+
+    exhausted = db.execute(select(Job.id).where(*stale, Job.attempts >= Job.max_attempts)).scalars().all()
+    failed = 0
+    if exhausted:
+        failed = db.execute(
+            update(Job)
+            .where(Job.id.in_(exhausted), *stale)
+            .values(
+                status=JobStatus.FAILED,
+                error="El worker dejó de reportar y se agotaron los intentos",
+                locked_by=None,
+                locked_at=None,
+                finished_at=now,
+            )
+        ).rowcount
+    requeued = db.execute(
+        update(Job)
+        .where(*stale, Job.attempts < Job.max_attempts)
+        .values(status=JobStatus.QUEUED, locked_by=None, locked_at=None, run_after=now)
+    ).rowcount
+    db.commit()
+
+    if failed:
+        for job in db.scalars(select(Job).where(Job.id.in_(exhausted), Job.status == JobStatus.FAILED)):
+            _publish_status(job)
+    return requeued + failed
+
+
+def _progress_update(job_id: int, progress: int, message: Optional[str]):
+    return (
+        update(Job)
+        .where(Job.id == job_id)
+        .values(progress=max(0, min(100, int(progress))), progress_message=message, locked_at=datetime.now())
+    )
+
+
+def report_progress(job_id: int, progress: int, message: Optional[str] = None) -> None:
+    """Actualiza el progreso en su propia transacción (también sirve de heartbeat)."""
+    db = SessionLocal()
+    try:
+        db.execute(_progress_update(job_id, progress, message))
+        db.commit()
+    finally:
+        db.close()
+
+
+def mark_succeeded(db: Session, job: Job, result: Optional[dict]) -> None:
+    job.status = JobStatus.SUCCEEDED
+    job.progress = 100
+    job.result_json = json.dumps(result, ensure_ascii=False, default=str) if result is not None else None
+    job.error = None
+    job.locked_by = None
+    job.finished_at = datetime.now()
+    db.commit()
+    _publish_status(job)
+
+
+def _publish_status(job: Job) -> None:
+    payload = json.loads(job.payload_json) if job.payload_json else None
+    publish_job(job_companies(job.company_id, payload), job.id, job.kind, job.status.value, job.progress,
+                job.error.splitlines()[-1] if job.error else None)
+
+
+def mark_failed(db: Session, job: Job, error: str) -> None:
+    """Reprograma con backoff exponencial o marca como fallido al agotar intentos."""
+    job.error = error
+    job.locked_by = None
+    job.locked_at = None
+    if job.attempts < job.max_attempts:
+        delay = settings.JOBS_RETRY_BASE_SECONDS * 2 ** (job.attempts - 1)
+        job.status = JobStatus.QUEUED
+        job.run_after = datetime.now() + timedelta(seconds=delay)
+    else:
+        job.status = JobStatus.FAILED
+        job.finished_at = datetime.now()
+    db.commit()
+    _publish_status(job)
+
+
+class JobContext:
+    """Lo que recibe un handler: sesión propia, payload y reporte de progreso."""
+
+    def __init__(self, job: Job, db: Session):
+        self.job_id = job.id
+        self.kind = job.kind
+        self.company_id = job.company_id
+        self.attempt = job.attempts
+        self.payload: dict[str, Any] = json.loads(job.payload_json) if job.payload_json else {}
+        self.db = db
+
+    def progress(self, progress: int, message: Optional[str] = None) -> None:
+        """
+        Reporta avance. En SQLite (un solo escritor) se escribe con la sesión
+        del handler y se confirma, lo que hace de checkpoint del trabajo hecho;
+        en PostgreSQL va en una transacción independiente. Después se avisa al
+        feed de cambios de las empresas del trabajo.
+        """
+        if self.db.get_bind().dialect.name == "sqlite":
+            self.db.execute(_progress_update(self.job_id, progress, message))
+            self.db.commit()
+        else:
+            report_progress(self.job_id, progress, message)
+        publish_job(job_companies(self.company_id, self.payload), self.job_id, self.kind,
+                    JobStatus.RUNNING.value, max(0, min(100, int(progress))), message)
@@ -0,0 +1,21 @@
+"""
+Registro de handlers de trabajos
+"""
+from typing import Callable, Optional
+
+# kind -> handler(ctx) -> dict | None
+HANDLERS: dict[str, Callable] = {}
+
+
+def job_handler(kind: str):
+    """Registra una función como handler para los trabajos de tipo `kind`."""
+    def decorator(func: Callable) -> Callable:
+        if kind in HANDLERS:
+            raise ValueError(f"Handler duplicado para trabajos '{kind}'")
+        HANDLERS[kind] = func
+        return func
+    return decorator
+
+
+def get_handler(kind: str) -> Optional[Callable]:
+    return HANDLERS.get(kind)
@@ -0,0 +1,168 @@
+"""
+Worker de la cola de trabajos
+
+Uso:
+    python -m app.jobs.worker                 # 1 proceso, corre indefinidamente
+    python -m app.jobs.worker --processes 4   # 4 procesos; el supervisor reinicia los que mueran
+    python -m app.jobs.worker --burst         # procesa lo pendiente y termina
+"""
+from typing import Optional
+import argparse
+import logging
+import multiprocessing
+import os
+import socket
+import threading
+import time
+import traceback
+
+from app.config import settings
+from app.database import SessionLocal
+from app.jobs.queue import claim_next, requeue_stale, mark_succeeded, mark_failed, JobContext
+from app.jobs.registry import get_handler
+import app.jobs.handlers  # noqa: F401  (registra los handlers incluidos)
+
+logger = logging.getLogger("poa.jobs")
+
+MAX_ERROR_BACKOFF_SECONDS = 60.0
+SUPERVISOR_CHECK_SECONDS = 1.0
+
+
+def run_job(job_id: int) -> None:
+    """Ejecuta un trabajo ya reclamado con una sesión dedicada."""
+    db = SessionLocal()
+    try:
+        from app.models.job import Job
+
+        job = db.get(Job, job_id)
+        handler = get_handler(job.kind)
+        if handler is None:
+            job.attempts = job.max_attempts
+            mark_failed(db, job, f"Sin handler registrado para '{job.kind}'")
+            return
+
+        ctx = JobContext(job, db)
+        try:
+            result = handler(ctx)
+        except Exception:
+            db.rollback()
+            job = db.get(Job, job_id)
+            logger.exception("Trabajo %s (%s) falló en intento %s", job.id, job.kind, job.attempts)
+            mark_failed(db, job, traceback.format_exc(limit=5))
+            return
+
+        job = db.get(Job, job_id)
+        mark_succeeded(db, job, result)
+        logger.info("Trabajo %s (%s) completado", job.id, job.kind)
+    finally:
+        db.close()
+
+
+def run_worker(
+    worker_id: Optional[str] = None,
+    kinds: Optional[list[str]] = None,
+    poll_interval: Optional[float] = None,
+    burst: bool = False,
+    stop_event: Optional[threading.Event] = None,
+) -> int:
+    """Ciclo principal: reclama y ejecuta trabajos. Regresa cuántos procesó."""
+    worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+    poll_interval = poll_interval if poll_interval is not None else settings.JOBS_POLL_INTERVAL_SECONDS
+    processed = 0
+    failures = 0
+    last_stale_check = 0.0
+
+    def wait(seconds: float) -> None:
+        if stop_event:
+            stop_event.wait(seconds)
+        else:
+            time.sleep(seconds)
+
+    while not (stop_event and stop_event.is_set()):
+        # Un error de la base (conexión caída, lock) no debe matar el ciclo: se registra,
+        # se espera con backoff exponencial y se reintenta
+        try:
+            db = SessionLocal()
+            try:
+                if time.monotonic() - last_stale_check > settings.JOBS_LOCK_TIMEOUT_SECONDS / 2:
+                    requeue_stale(db)
+                    last_stale_check = time.monotonic()
+                job = claim_next(db, worker_id, kinds)
+                job_id = job.id if job else None
+            finally:
+                db.close()
+
+            if job_id is not None:
+                run_job(job_id)
+                processed += 1
+            failures = 0
+        except Exception:
+            failures += 1
+            delay = min(max(poll_interval, 1.0) * 2 ** (failures - 1), MAX_ERROR_BACKOFF_SECONDS)
+            logger.exception("Error en el ciclo del worker %s; reintento en %.1fs", worker_id, delay)
+            wait(delay)
+            continue
+
+        if job_id is None:
+            if burst:
+                break
+            wait(poll_interval)
+
+    return processed
+
+
+def start_embedded_worker() -> threading.Event:
+    """Worker en un hilo del proceso web (solo para desarrollo local)."""
+    stop_event = threading.Event()
+    thread = threading.Thread(
+        target=run_worker,
+        kwargs={"stop_event": stop_event},
+        name="poa-embedded-job-worker",
+        daemon=True,
+    )
+    thread.start()
+    return stop_event
+
+
+def _process_main(kinds: Optional[list[str]], poll_interval: float, burst: bool) -> None:
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(levelname)s %(message)s")
+    run_worker(kinds=kinds, poll_interval=poll_interval, burst=burst)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Worker de la cola de trabajos POA")
+    parser.add_argument("--processes", type=int, default=1, help="Número de procesos worker")
+    parser.add_argument("--kinds", nargs="*", help="Solo procesar estos tipos de trabajo")
+    parser.add_argument("--poll", type=float, default=settings.JOBS_POLL_INTERVAL_SECONDS, help="Segundos entre sondeos")
+    parser.add_argument("--burst", action="store_true", help="Terminar cuando la cola esté vacía")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(levelname)s %(message)s")
+
+    if args.processes <= 1:
+        _process_main(args.kinds, args.poll, args.burst)
+        return
+
+    def spawn() -> multiprocessing.Process:
+        proc = multiprocessing.Process(target=_process_main, args=(args.kinds, args.poll, args.burst), daemon=False)
+        proc.start()
+        return proc
+
+    procs = [spawn() for _ in range(args.processes)]
+    try:
+        if args.burst:
+            for p in procs:
+                p.join()
+            return
+        # Supervisor: un hijo que muere (OOM, error fuera del ciclo) se reemplaza
+        while True:
+            time.sleep(SUPERVISOR_CHECK_SECONDS)
+            for i, p in enumerate(procs):
+                if not p.is_alive():
+                    logger.warning("Proceso worker %s terminó (código %s); se reinicia", p.pid, p.exitcode)
+                    procs[i] = spawn()
+    except KeyboardInterrupt:
+        for p in procs:
+            p.terminate()
+
+if __name__ == "__main__":
+    main()
@@ -2,41 +2,73 @@
 Sistema POA — API Principal
 Capa de Inteligencia Financiera Automatizada
 """
-from fastapi import FastAPI, Depends, HTTPException, Query
+from fastapi import FastAPI, Depends, HTTPException, Query, Header
+from fastapi.responses import JSONResponse, PlainTextResponse, FileResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import OAuth2PasswordBearer
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from sqlalchemy import func, desc
+from sqlalchemy import func, desc, select
+from contextlib import asynccontextmanager
 from typing import Optional
-from datetime import datetime, timedelta
+from datetime import date, datetime
 from decimal import Decimal
-from jose import JWTError, jwt
-import bcrypt
+import asyncio
 import json
 
 from app.config import settings
-from app.database import engine, get_db, Base
-from app.models import User, Company, CFDI, FiscalAlert, HealthScore
+from app.auth import InvalidToken, verify_password, hash_password, create_access_token, token_user_id
+from app.responses import ORJSONResponse
+from app.database import engine, get_db, init_db
+from app.models import User, Company, CFDI, Job
 from app.models.cfdi import TipoCFDI, EstadoCFDI
 from app.models.user import UserRole
 from app.schemas.analytics import (
     DashboardStats,
-    RevenueData,
-    TopClient,
-    TopProvider,
-    CashFlowData,
-    SemaforoItem,
+    CounterpartyRanking,
+    ReceivablesAging,
     HealthScoreResponse,
-    ScoreComponent,
-    PieChartData,
+    CompanyBundle,
 )
 from app.schemas.company import CompanyResponse, CompanyWithStats
-from app.schemas.cfdi import CFDIResponse, CFDIListResponse
-from app.seeds import seed_database, SCENARIOS
-from app.models.fiscal_alert import AlertSeverity
+from app.schemas.cfdi import CFDIListResponse, CFDISearchResponse, CFDIDetailResponse
+from app.schemas.portfolio import PortfolioDashboard
+from app.schemas.job import JobResponse, JobAccepted
+from app.jobs import enqueue
+from app.observability import REGISTRY, MetricsMiddleware, instrument_engine, register_pool_metrics
+from app.observability.querybudget import QueryBudgetMiddleware, query_budget, TRACKER as QUERY_TRACKER
+from app.observability.profiling import ProfilingMiddleware, ProfileStore, admin_token_valid
+from app.admission import AdmissionMiddleware, request_cost
+from app.compression import CompressionMiddleware
+from app.changes import broker as changes_broker, event_stream, load_state
+from app.services.portfolio import build_portfolio, company_stats_map, company_with_stats
+from app.services.reads import company_row, company_rows, latest_health
+from app.services.counterparties import top_counterparties, ranking_item, month_of, CLIENTE
+from app.services.receivables import aging_buckets, cxc_score
+from app.services.credit import catalog_payload
+from app.services.sections import (
+    SECTIONS,
+    load_snapshot,
+    dashboard_data,
+    dashboard_section,
+    health_section,
+    predictions_section,
+    credit_section,
+)
+from app.partitioning import add_months
+from app.services.export import stream_cfdi_csv
+from app.services.search import CFDISearch, InvalidCursor, MIN_TEXT_LENGTH, search_cfdis
+from app.archive import ArchiveStore, ArchiveError, require_pyarrow
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # El esquema se prepara al arrancar el servidor, no al importar el módulo
+    init_db()
+    if settings.JOBS_EMBEDDED_WORKER:
+        from app.jobs.worker import start_embedded_worker
+        start_embedded_worker()
+    yield
 
-# Crear tablas
-Base.metadata.create_all(bind=engine)
 
 app = FastAPI(
     title=settings.APP_NAME,
@@ -44,8 +76,18 @@ app = FastAPI(
     description="Capa de Inteligencia Financiera Automatizada para PyMEs mexicanas",
     docs_url="/docs",
     redoc_url="/redoc",
+    lifespan=lifespan,
 )
 
+
+# Control de admisión por tenant (dentro de CORS para que los 429/503 lleguen al navegador)
+if settings.ADMISSION_ENABLED:
+    app.add_middleware(
+        AdmissionMiddleware,
+        routes=app.router.routes,
+        retry_after=settings.ADMISSION_RETRY_AFTER_SECONDS,
+    )
+
 # CORS
 app.add_middleware(
     CORSMiddleware,
@@ -55,27 +97,49 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Presupuesto de consultas por ruta (dev/pruebas)
+if settings.QUERY_BUDGET_MODE != "off":
+    app.add_middleware(
+        QueryBudgetMiddleware,
+        mode=settings.QUERY_BUDGET_MODE,
+        repeat_threshold=settings.QUERY_REPEAT_THRESHOLD,
+    )
 
-# ═══════════════════════════════════════════════
-# Auth Utilities
-# ═══════════════════════════════════════════════
-
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login", auto_error=False)
-
+# Archivo Parquet de CFDIs viejos (solo lectura desde la API)
+archive_store = ArchiveStore()
+
+# Perfilado por request (solo depuración, requiere token de administrador)
+profile_store = ProfileStore(settings.PROFILE_DIR, keep=settings.PROFILE_KEEP)
+if settings.PROFILING_ENABLED:
+    app.add_middleware(
+        ProfilingMiddleware,
+        store=profile_store,
+        admin_token=settings.PROFILING_ADMIN_TOKEN,
+        interval=settings.PROFILING_INTERVAL_MS / 1000,
+    )
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return bcrypt.checkpw(plain_password.encode("utf-8"), hashed_password.encode("utf-8"))
+# Compresión gzip/brotli de respuestas grandes (JSON y CSV)
+if settings.COMPRESSION_ENABLED:
+    app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=settings.COMPRESSION_MIN_SIZE,
+        gzip_level=settings.COMPRESSION_GZIP_LEVEL,
+        brotli_quality=settings.COMPRESSION_BROTLI_QUALITY,
+    )
 
+# Métricas (middleware más externo para medir el request completo)
+if settings.METRICS_ENABLED or settings.QUERY_BUDGET_MODE != "off" or settings.PROFILING_ENABLED:
+    instrument_engine(engine)
+if settings.METRICS_ENABLED:
+    register_pool_metrics(engine)
+    app.add_middleware(MetricsMiddleware)
 
-def hash_password(password: str) -> str:
-    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
 
+# ═══════════════════════════════════════════════
+# Auth Utilities
+# ═══════════════════════════════════════════════
 
-def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
-    to_encode = data.copy()
-    expire = datetime.utcnow() + (expires_delta or timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES))
-    to_encode.update({"exp": expire})
-    return jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login", auto_error=False)
 
 
 def get_current_user(
@@ -86,12 +150,10 @@ def get_current_user(
     if not token:
         return None
     try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        user_id_str = payload.get("sub")
-        if user_id_str is None:
-            return None
-        user_id = int(user_id_str)
-    except (JWTError, ValueError):
+        user_id = token_user_id(token)
+    except InvalidToken:
+        return None
+    if user_id is None:
         return None
     return db.query(User).filter(User.id == user_id).first()
 
@@ -104,12 +166,10 @@ def require_auth(
     if not token:
         raise HTTPException(status_code=401, detail="No autenticado")
     try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        user_id_str = payload.get("sub")
-        if user_id_str is None:
-            raise HTTPException(status_code=401, detail="Token inválido")
-        user_id = int(user_id_str)
-    except (JWTError, ValueError):
+        user_id = token_user_id(token)
+    except InvalidToken:
+        raise HTTPException(status_code=401, detail="Token inválido")
+    if user_id is None:
         raise HTTPException(status_code=401, detail="Token inválido")
     user = db.query(User).filter(User.id == user_id).first()
     if not user or not user.is_active:
@@ -203,17 +263,63 @@ def get_me(current_user: User = Depends(require_auth)):
 # ═══════════════════════════════════════════════
 
 @app.get("/health")
+@request_cost(0)
 def health_check():
     return {"status": "healthy", "version": settings.APP_VERSION}
 
 
+@app.get("/metrics", include_in_schema=False)
+@request_cost(0)
+def metrics():
+    """Métricas en formato de exposición de Prometheus"""
+    if not settings.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Métricas deshabilitadas")
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.get("/api/debug/query-report", include_in_schema=False)
+def query_report(limit: int = Query(20, ge=1, le=100)):
+    """Rutas con más consultas SQL, violaciones de presupuesto y posibles N+1"""
+    if settings.QUERY_BUDGET_MODE == "off":
+        raise HTTPException(status_code=404, detail="Presupuesto de consultas deshabilitado")
+    return QUERY_TRACKER.report(limit)
+
+
+def require_profiling_admin(x_admin_token: Optional[str] = Header(None)):
+    if not settings.PROFILING_ENABLED:
+        raise HTTPException(status_code=404, detail="Perfilado deshabilitado")
+    if not admin_token_valid(settings.PROFILING_ADMIN_TOKEN, x_admin_token):
+        raise HTTPException(status_code=403, detail="Token de administrador inválido")
+
+
+@app.get("/api/debug/profiles", include_in_schema=False, dependencies=[Depends(require_profiling_admin)])
+def list_profiles():
+    """Perfiles guardados, del más reciente al más antiguo"""
+    return profile_store.list()
+
+
+@app.get("/api/debug/profiles/{profile_id}", include_in_schema=False, dependencies=[Depends(require_profiling_admin)])
+def get_profile(profile_id: str, format: str = Query("json", pattern="^(json|html|folded)$")):
+    """Perfil de un request: resumen + SQL (json), flamegraph (html) o pilas folded"""
+    profile = profile_store.load(profile_id)
+    if not profile:
+        raise HTTPException(status_code=404, detail="Perfil no encontrado")
+    if format == "html":
+        return FileResponse(profile_store.html_path(profile_id), media_type="text/html")
+    if format == "folded":
+        return PlainTextResponse(profile["folded"])
+    return {"id": profile["id"], "summary": profile["summary"], "sql": profile["sql"]}
+
+
 # ═══════════════════════════════════════════════
 # Seeding Endpoints
 # ═══════════════════════════════════════════════
 
 @app.post("/api/seed")
+@request_cost(8)
 def seed_demo_data(
     scenario: Optional[str] = Query(None, pattern="^[ABC]$"),
+    background: bool = Query(False),
     db: Session = Depends(get_db),
 ):
     """
@@ -222,7 +328,14 @@ def seed_demo_data(
     - scenario=B: Scale-up en Riesgo
     - scenario=C: Despacho Contable
     - Sin parámetro: Todos los escenarios
+    - background=true: encola el trabajo y responde 202 (ver /api/jobs/{id})
     """
+    if background:
+        job = enqueue(db, "seed", {"scenario": scenario})
+        return job_accepted(job)
+
+    from app.seeds import seed_database
+
     try:
         stats = seed_database(db, scenario)
         return {
@@ -234,10 +347,51 @@ def seed_demo_data(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def job_accepted(job: Job) -> JSONResponse:
+    """Respuesta 202 estándar para operaciones encoladas."""
+    body = JobAccepted(job_id=job.id, status=job.status, status_url=f"/api/jobs/{job.id}")
+    return JSONResponse(status_code=202, content=body.model_dump(mode="json"))
+
+
 @app.get("/api/scenarios")
-def get_scenarios():
+@request_cost(0)
+def get_scenarios(
+    accept_encoding: str = Header("", include_in_schema=False),
+    if_none_match: Optional[str] = Header(None, include_in_schema=False),
+):
     """Retorna información sobre los escenarios disponibles"""
-    return SCENARIOS
+    from app.seeds import scenarios_payload
+
+    return scenarios_payload().response(accept_encoding, if_none_match)
+
+
+# ═══════════════════════════════════════════════
+# Jobs Endpoints
+# ═══════════════════════════════════════════════
+
+@app.get("/api/jobs/{job_id}", response_model=JobResponse)
+def get_job(job_id: int, db: Session = Depends(get_db)):
+    """Estado, progreso y resultado de un trabajo en segundo plano"""
+
+    job = db.query(Job).filter(Job.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado")
+
+    return JobResponse(
+        id=job.id,
+        kind=job.kind,
+        status=job.status,
+        progress=job.progress or 0,
+        progress_message=job.progress_message,
+        attempts=job.attempts or 0,
+        max_attempts=job.max_attempts,
+        result=json.loads(job.result_json) if job.result_json else None,
+        error=job.error,
+        company_id=job.company_id,
+        created_at=job.created_at,
+        started_at=job.started_at,
+        finished_at=job.finished_at,
+    )
 
 
 # ═══════════════════════════════════════════════
@@ -245,194 +399,91 @@ def get_scenarios():
 # ═══════════════════════════════════════════════
 
 @app.get("/api/dashboard/{company_id}", response_model=DashboardStats)
+@query_budget(12)
+@request_cost(4)
 def get_dashboard_stats(company_id: int, db: Session = Depends(get_db)):
     """Obtiene estadísticas del dashboard para una empresa"""
 
-    company = db.query(Company).filter(Company.id == company_id).first()
+    company = company_row(db, company_id)
     if not company:
         raise HTTPException(status_code=404, detail="Empresa no encontrada")
 
     today = datetime.now()
-    current_month_start = today.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-    last_month_start = (current_month_start - timedelta(days=1)).replace(day=1)
-
-    # Calcular ingresos del mes actual
-    ingresos_mes = db.query(func.sum(CFDI.total)).filter(
-        CFDI.company_id == company_id,
-        CFDI.tipo_comprobante == TipoCFDI.INGRESO,
-        CFDI.emisor_rfc == company.rfc,
-        CFDI.fecha_emision >= current_month_start,
-        CFDI.estado == EstadoCFDI.VIGENTE,
-    ).scalar() or Decimal(0)
-
-    # Calcular egresos del mes actual
-    egresos_mes = db.query(func.sum(CFDI.total)).filter(
-        CFDI.company_id == company_id,
-        CFDI.tipo_comprobante == TipoCFDI.EGRESO,
-        CFDI.fecha_emision >= current_month_start,
-        CFDI.estado == EstadoCFDI.VIGENTE,
-    ).scalar() or Decimal(0)
-
-    # Ingresos mes anterior para variación
-    ingresos_anterior = db.query(func.sum(CFDI.total)).filter(
-        CFDI.company_id == company_id,
-        CFDI.tipo_comprobante == TipoCFDI.INGRESO,
-        CFDI.emisor_rfc == company.rfc,
-        CFDI.fecha_emision >= last_month_start,
-        CFDI.fecha_emision < current_month_start,
-        CFDI.estado == EstadoCFDI.VIGENTE,
-    ).scalar() or Decimal(1)
-
-    # Margen bruto
-    margen = float((ingresos_mes - egresos_mes) / ingresos_mes * 100) if ingresos_mes > 0 else 0
-
-    # Health Score
-    health = db.query(HealthScore).filter(
-        HealthScore.company_id == company_id
-    ).order_by(desc(HealthScore.created_at)).first()
-
-    # Revenue data (últimos 8 meses)
-    revenue_data = []
-    for i in range(7, -1, -1):
-        month_start = (today - timedelta(days=30 * i)).replace(day=1)
-        month_end = (month_start + timedelta(days=32)).replace(day=1)
-
-        ing = db.query(func.sum(CFDI.total)).filter(
-            CFDI.company_id == company_id,
-            CFDI.tipo_comprobante == TipoCFDI.INGRESO,
-            CFDI.emisor_rfc == company.rfc,
-            CFDI.fecha_emision >= month_start,
-            CFDI.fecha_emision < month_end,
-        ).scalar() or 0
-
-        egr = db.query(func.sum(CFDI.total)).filter(
-            CFDI.company_id == company_id,
-            CFDI.tipo_comprobante == TipoCFDI.EGRESO,
-            CFDI.fecha_emision >= month_start,
-            CFDI.fecha_emision < month_end,
-        ).scalar() or 0
-
-        revenue_data.append(RevenueData(
-            mes=month_start.strftime("%b"),
-            ingresos=float(ing),
-            egresos=float(egr),
-        ))
-
-    # Top clientes
-    top_clientes_query = db.query(
-        CFDI.receptor_rfc,
-        CFDI.receptor_nombre,
-        func.sum(CFDI.total).label("total"),
-        func.count(CFDI.id).label("count"),
-    ).filter(
-        CFDI.company_id == company_id,
-        CFDI.tipo_comprobante == TipoCFDI.INGRESO,
-        CFDI.emisor_rfc == company.rfc,
-    ).group_by(CFDI.receptor_rfc, CFDI.receptor_nombre).order_by(
-        desc("total")
-    ).limit(5).all()
-
-    top_clientes = [
-        TopClient(
-            nombre=c.receptor_nombre or c.receptor_rfc,
-            rfc=c.receptor_rfc,
-            monto=float(c.total),
-            facturas=c.count,
-            tendencia="up" if i % 2 == 0 else "down",
-        )
-        for i, c in enumerate(top_clientes_query)
-    ]
-
-    # Top proveedores
-    top_proveedores_query = db.query(
-        CFDI.emisor_rfc,
-        CFDI.emisor_nombre,
-        func.sum(CFDI.total).label("total"),
-        func.count(CFDI.id).label("count"),
-    ).filter(
-        CFDI.company_id == company_id,
-        CFDI.tipo_comprobante == TipoCFDI.EGRESO,
-    ).group_by(CFDI.emisor_rfc, CFDI.emisor_nombre).order_by(
-        desc("total")
-    ).limit(5).all()
-
-    top_proveedores = [
-        TopProvider(
-            nombre=p.emisor_nombre or p.emisor_rfc,
-            rfc=p.emisor_rfc,
-            monto=float(p.total),
-            facturas=p.count,
-            tendencia="up" if i % 2 == 1 else "down",
-        )
-        for i, p in enumerate(top_proveedores_query)
-    ]
-
-    # Semáforo fiscal
-    alerts = db.query(FiscalAlert).filter(
-        FiscalAlert.company_id == company_id
-    ).all()
+    snapshot = load_snapshot(db, company, today, ("dashboard",))
+    # Dicts con la forma de DashboardStats, serializados una sola vez con orjson
+    return ORJSONResponse(dashboard_section(snapshot, dashboard_data(db, company, today)))
 
-    semaforo = []
-    for a in alerts:
-        meta = {}
-        if a.metadata_json:
-            try:
-                meta = json.loads(a.metadata_json)
-            except (json.JSONDecodeError, TypeError):
-                pass
-        semaforo.append(SemaforoItem(
-            nombre=a.titulo,
-            estado=a.severity.value,
-            detalle=a.detalle or "",
-            ejemplo=meta.get("ejemplo"),
-            accion_recomendada=meta.get("accion_recomendada"),
-        ))
-
-    # Cash flow simulado (para el mes actual)
-    cash_flow_data = []
-    base_saldo = float(ingresos_mes) * 0.3
-    for day in range(1, 32, 3):
-        base_saldo += float(ingresos_mes) * 0.02 * (1 + (day / 31) * 0.5)
-        cash_flow_data.append(CashFlowData(dia=f"{day:02d}", saldo=base_saldo))
-
-    # Ingresos por categoría (simulado)
-    categorias = [
-        PieChartData(name="Servicios profesionales", value=42, color="#10b981"),
-        PieChartData(name="Productos", value=28, color="#06b6d4"),
-        PieChartData(name="Consultoría", value=18, color="#8b5cf6"),
-        PieChartData(name="Otros", value=12, color="#f59e0b"),
-    ]
-
-    # Total CFDIs
-    total_cfdis = db.query(func.count(CFDI.id)).filter(
-        CFDI.company_id == company_id
-    ).scalar() or 0
-
-    return DashboardStats(
-        ingresos_mes=float(ingresos_mes),
-        egresos_mes=float(egresos_mes),
-        margen_bruto=round(margen, 1),
-        health_score=health.score_total if health else 0,
-        ingresos_variacion=round(float((ingresos_mes - ingresos_anterior) / ingresos_anterior * 100), 1) if ingresos_anterior else 0,
-        egresos_variacion=-3.1,  # Simplificado para demo
-        margen_variacion=2.4,
-        score_variacion=3,
-        revenue_data=revenue_data,
-        cash_flow_data=cash_flow_data,
-        top_clientes=top_clientes,
-        top_proveedores=top_proveedores,
-        ingresos_por_categoria=categorias,
-        semaforo=semaforo,
-        total_cfdis=total_cfdis,
-        last_sync=company.sat_last_sync,
-    )
+
+@app.get("/api/companies/{company_id}/counterparties", response_model=CounterpartyRanking)
+@query_budget(2)
+@request_cost(2)
+def get_counterparties(
+    company_id: int,
+    rol: str = Query(CLIENTE, pattern="^(cliente|proveedor)$"),
+    desde: Optional[str] = Query(None, pattern=r"^\d{4}-(0[1-9]|1[0-2])$", description="Mes inicial AAAA-MM (incluido)"),
+    hasta: Optional[str] = Query(None, pattern=r"^\d{4}-(0[1-9]|1[0-2])$", description="Mes final AAAA-MM (incluido)"),
+    limit: int = Query(10, ge=1, le=100),
+    db: Session = Depends(get_db),
+):
+    """Ranking de clientes o proveedores por monto facturado en un periodo, con tendencia mensual"""
+
+    if not company_row(db, company_id):
+        raise HTTPException(status_code=404, detail="Empresa no encontrada")
+
+    inicio = datetime.strptime(desde, "%Y-%m") if desde else None
+    fin = month_of(add_months(datetime.strptime(hasta, "%Y-%m"), 1)) if hasta else None
+    if inicio and fin and inicio >= fin:
+        raise HTTPException(status_code=422, detail="`desde` debe ser anterior o igual a `hasta`")
+
+    rows = top_counterparties(db, company_id, rol, limit, inicio, fin)
+    return ORJSONResponse({
+        "rol": rol,
+        "desde": desde,
+        "hasta": hasta,
+        "contrapartes": [ranking_item(r) for r in rows],
+    })
+
+
+@app.get("/api/companies/{company_id}/receivables/aging", response_model=ReceivablesAging)
+@query_budget(2)
+@request_cost(2)
+def get_receivables_aging(company_id: int, db: Session = Depends(get_db)):
+    """Saldo por cobrar de facturas PPD por antigüedad (0-30, 31-60, 61-90, 90+ días)"""
+
+    if not company_row(db, company_id):
+        raise HTTPException(status_code=404, detail="Empresa no encontrada")
+
+    buckets = aging_buckets(db, company_id)
+    return ORJSONResponse({
+        "saldo_total": round(sum(b["saldo"] for b in buckets.values()), 2),
+        "score": cxc_score(buckets),
+        "tramos": [{"rango": rango, **b} for rango, b in buckets.items()],
+    })
 
 
 # ═══════════════════════════════════════════════
 # CFDIs Endpoints
 # ═══════════════════════════════════════════════
 
+# Columnas de CFDIResponse, en el orden del esquema
+CFDI_LIST_COLUMNS = (
+    CFDI.uuid, CFDI.folio, CFDI.serie, CFDI.tipo_comprobante,
+    CFDI.emisor_rfc, CFDI.emisor_nombre, CFDI.receptor_rfc, CFDI.receptor_nombre,
+    CFDI.subtotal, CFDI.total, CFDI.moneda, CFDI.fecha_emision,
+    CFDI.id, CFDI.estado, CFDI.iva, CFDI.fecha_timbrado, CFDI.uso_cfdi, CFDI.created_at,
+)
+CFDI_LIST_KEYS = tuple(c.key for c in CFDI_LIST_COLUMNS)
+
+# Detalle: las de la lista más montos, pago y XML
+CFDI_DETAIL_COLUMNS = CFDI_LIST_COLUMNS + (
+    CFDI.descuento, CFDI.isr_retenido, CFDI.iva_retenido, CFDI.tipo_cambio, CFDI.fecha_cancelacion,
+    CFDI.uso_cfdi_descripcion, CFDI.metodo_pago, CFDI.forma_pago, CFDI.xml_content,
+)
+CFDI_DETAIL_KEYS = tuple(c.key for c in CFDI_DETAIL_COLUMNS)
+
+
 @app.get("/api/companies/{company_id}/cfdis", response_model=CFDIListResponse)
+@query_budget(2)
 def get_cfdis(
     company_id: int,
     page: int = Query(1, ge=1),
@@ -442,22 +493,175 @@ def get_cfdis(
 ):
     """Lista CFDIs de una empresa con paginación y filtros"""
 
-    query = db.query(CFDI).filter(CFDI.company_id == company_id)
-
+    filters = [CFDI.company_id == company_id]
     if tipo:
-        tipo_enum = TipoCFDI.INGRESO if tipo == "ingreso" else TipoCFDI.EGRESO
-        query = query.filter(CFDI.tipo_comprobante == tipo_enum)
-
-    total = query.count()
-    cfdis = query.order_by(desc(CFDI.fecha_emision)).offset(
-        (page - 1) * per_page
-    ).limit(per_page).all()
-
-    return CFDIListResponse(
-        total=total,
-        page=page,
-        per_page=per_page,
-        cfdis=[CFDIResponse.model_validate(c) for c in cfdis],
+        filters.append(CFDI.tipo_comprobante == (TipoCFDI.INGRESO if tipo == "ingreso" else TipoCFDI.EGRESO))
+
+    total = db.execute(select(func.count(CFDI.id)).where(*filters)).scalar()
+    rows = db.execute(
+        select(*CFDI_LIST_COLUMNS)
+        .where(*filters)
+        .order_by(desc(CFDI.fecha_emision))
+        .offset((page - 1) * per_page)
+        .limit(per_page)
+    ).all()
+
+    # Filas armadas desde las tuplas de SQL; el esquema de OpenAPI sigue siendo CFDIListResponse
+    return ORJSONResponse({
+        "total": total,
+        "page": page,
+        "per_page": per_page,
+        "cfdis": [dict(zip(CFDI_LIST_KEYS, row)) for row in rows],
+    })
+
+
+# En SQLite, hasta 5 sondeos de densidad (ver app/services/search.py), la página y, la
+# primera vez, la revisión de cfdis_fts
+@app.get("/api/companies/{company_id}/cfdis/search", response_model=CFDISearchResponse)
+@query_budget(7)
+@request_cost(2)
+def search_company_cfdis(
+    company_id: int,
+    q: Optional[str] = Query(None, min_length=MIN_TEXT_LENGTH, max_length=255,
+                             description="Nombre de emisor o receptor (subcadena)"),
+    rfc: Optional[str] = Query(None, min_length=MIN_TEXT_LENGTH, max_length=13,
+                               description="Prefijo del RFC de emisor o receptor"),
+    folio: Optional[str] = Query(None, max_length=50),
+    serie: Optional[str] = Query(None, max_length=25),
+    uuid: Optional[str] = Query(None, min_length=MIN_TEXT_LENGTH, max_length=36, description="Fragmento del UUID"),
+    desde: Optional[date] = Query(None, description="Fecha de emisión inicial (incluida)"),
+    hasta: Optional[date] = Query(None, description="Fecha de emisión final (excluida)"),
+    monto_min: Optional[Decimal] = Query(None, ge=0),
+    monto_max: Optional[Decimal] = Query(None, ge=0),
+    estado: Optional[str] = Query(None, pattern="^(vigente|cancelado)$"),
+    tipo: Optional[str] = Query(None, pattern="^(ingreso|egreso|traslado|nomina|pago)$"),
+    cursor: Optional[str] = Query(None, description="next_cursor de la página anterior"),
+    per_page: int = Query(50, ge=1, le=100),
+    db: Session = Depends(get_db),
+):
+    """Busca CFDIs de la empresa con filtros combinados, del más reciente al más viejo, paginando por cursor"""
+
+    params = CFDISearch(
+        q=q, rfc=rfc, folio=folio, serie=serie, uuid=uuid, desde=desde, hasta=hasta,
+        monto_min=monto_min, monto_max=monto_max,
+        estado=EstadoCFDI(estado) if estado else None,
+        tipo=TipoCFDI[tipo.upper()] if tipo else None,
+    )
+    try:
+        rows, next_cursor = search_cfdis(db, company_id, params, CFDI_LIST_COLUMNS, per_page, cursor)
+    except InvalidCursor as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+    return ORJSONResponse({
+        "per_page": per_page,
+        "next_cursor": next_cursor,
+        "cfdis": [dict(zip(CFDI_LIST_KEYS, row)) for row in rows],
+    })
+
+
+@app.get("/api/companies/{company_id}/cfdis/export")
+@request_cost(4)
+def export_cfdis(
+    company_id: int,
+    desde: Optional[date] = Query(None, description="Fecha de emisión inicial (incluida)"),
+    hasta: Optional[date] = Query(None, description="Fecha de emisión final (excluida)"),
+    db: Session = Depends(get_db),
+):
+    """Exporta a CSV los CFDIs de la empresa, incluidos los archivados, en orden de emisión"""
+
+    company = company_row(db, company_id)
+    if not company:
+        raise HTTPException(status_code=404, detail="Empresa no encontrada")
+    if archive_store.months(company_id):
+        try:
+            require_pyarrow()
+        except ArchiveError as exc:
+            raise HTTPException(status_code=503, detail=str(exc))
+
+    desde_dt = datetime.combine(desde, datetime.min.time()) if desde else None
+    hasta_dt = datetime.combine(hasta, datetime.min.time()) if hasta else None
+    return StreamingResponse(
+        stream_cfdi_csv(archive_store, company_id, desde_dt, hasta_dt),
+        media_type="text/csv; charset=utf-8",
+        headers={"Content-Disposition": f'attachment; filename="cfdis-{company.rfc}.csv"'},
+    )
+
+
+@app.get("/api/companies/{company_id}/cfdis/{uuid}", response_model=CFDIDetailResponse)
+@query_budget(1)
+def get_cfdi(company_id: int, uuid: str, db: Session = Depends(get_db)):
+    """Detalle de un CFDI por UUID, de la tabla o del archivo Parquet"""
+
+    row = db.execute(
+        select(*CFDI_DETAIL_COLUMNS).where(CFDI.company_id == company_id, CFDI.uuid == uuid)
+    ).first()
+    if row:
+        return ORJSONResponse({**dict(zip(CFDI_DETAIL_KEYS, row)), "archivado": False})
+
+    try:
+        archived = archive_store.find(company_id, uuid)
+    except ArchiveError as exc:
+        raise HTTPException(status_code=503, detail=str(exc))
+    if not archived:
+        raise HTTPException(status_code=404, detail="CFDI no encontrado")
+    return ORJSONResponse({**{k: archived[k] for k in CFDI_DETAIL_KEYS}, "archivado": True})
+
+
+# ═══════════════════════════════════════════════
+# Sincronización SAT
+# ═══════════════════════════════════════════════
+
+@app.post("/api/companies/{company_id}/sat/sync", status_code=202, response_model=JobAccepted)
+def sync_company_sat(company_id: int, db: Session = Depends(get_db)):
+    """Encola una sincronización incremental con el SAT para la empresa"""
+
+    company = company_row(db, company_id)
+    if not company:
+        raise HTTPException(status_code=404, detail="Empresa no encontrada")
+    if not company.sat_connected:
+        raise HTTPException(status_code=409, detail="La empresa no tiene conexión SAT")
+
+    job = enqueue(db, "sat_sync", {"company_ids": [company_id]}, company_id=company_id)
+    return job_accepted(job)
+
+
+@app.post("/api/companies/{company_id}/sat/verify", status_code=202, response_model=JobAccepted)
+def verify_company_sat(company_id: int, db: Session = Depends(get_db)):
+    """Encola la verificación con el SAT del estado de los CFDIs recientes de la empresa"""
+
+    company = company_row(db, company_id)
+    if not company:
+        raise HTTPException(status_code=404, detail="Empresa no encontrada")
+    if not company.sat_connected:
+        raise HTTPException(status_code=409, detail="La empresa no tiene conexión SAT")
+
+    job = enqueue(db, "sat_verify", {"company_ids": [company_id]}, company_id=company_id)
+    return job_accepted(job)
+
+
+# ═══════════════════════════════════════════════
+# Feed de Cambios (Server-Sent Events)
+# ═══════════════════════════════════════════════
+
+@app.get("/api/companies/{company_id}/changes")
+@request_cost(0)
+async def stream_company_changes(company_id: int, last_event_id: Optional[str] = Header(None)):
+    """Deltas de la empresa (CFDIs, totales mensuales, semáforo, trabajos) en text/event-stream.
+
+    Sin costo de admisión: la conexión queda abierta y casi siempre ociosa.
+    No usa `get_db`, que retendría una conexión del pool mientras dure el
+    stream; ver app/changes.py.
+    """
+    if changes_broker.full:
+        raise HTTPException(status_code=503, detail="Demasiadas conexiones de cambios abiertas",
+                            headers={"Retry-After": "30"})
+    state = await run_in_threadpool(load_state, company_id)
+    if state is None:
+        raise HTTPException(status_code=404, detail="Empresa no encontrada")
+    return StreamingResponse(
+        event_stream(company_id, state, last_event_id, settings.CHANGES_HEARTBEAT_SECONDS),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
 
 
@@ -466,32 +670,14 @@ def get_cfdis(
 # ═══════════════════════════════════════════════
 
 @app.get("/api/companies/{company_id}/health-score", response_model=HealthScoreResponse)
+@query_budget(1)
 def get_health_score(company_id: int, db: Session = Depends(get_db)):
     """Obtiene el score de salud financiera de una empresa"""
 
-    score = db.query(HealthScore).filter(
-        HealthScore.company_id == company_id
-    ).order_by(desc(HealthScore.created_at)).first()
-
+    score = health_section(latest_health(db, company_id))
     if not score:
         raise HTTPException(status_code=404, detail="Score no encontrado")
-
-    componentes = [
-        ScoreComponent(nombre="Liquidez estimada", valor=score.liquidez, peso="20%"),
-        ScoreComponent(nombre="Cumplimiento fiscal", valor=score.cumplimiento_fiscal, peso="20%"),
-        ScoreComponent(nombre="Diversificación clientes", valor=score.diversificacion_clientes, peso="15%"),
-        ScoreComponent(nombre="Tendencia de ingresos", valor=score.tendencia_ingresos, peso="15%"),
-        ScoreComponent(nombre="Margen operativo", valor=score.margen_operativo, peso="10%"),
-        ScoreComponent(nombre="Estacionalidad controlada", valor=score.estacionalidad, peso="10%"),
-        ScoreComponent(nombre="Antigüedad de CxC", valor=score.antiguedad_cxc, peso="5%"),
-        ScoreComponent(nombre="Riesgo proveedores", valor=score.riesgo_proveedores, peso="5%"),
-    ]
-
-    return HealthScoreResponse(
-        score_total=score.score_total,
-        componentes=componentes,
-        periodo="Jul 2025 – Feb 2026",
-    )
+    return ORJSONResponse(score)
 
 
 # ═══════════════════════════════════════════════
@@ -499,126 +685,52 @@ def get_health_score(company_id: int, db: Session = Depends(get_db)):
 # ═══════════════════════════════════════════════
 
 @app.get("/api/companies", response_model=list[CompanyWithStats])
+@query_budget(4)
 def list_companies(
     scenario: Optional[str] = Query(None, pattern="^[ABC]$"),
     db: Session = Depends(get_db),
 ):
     """Lista todas las empresas, opcionalmente filtradas por escenario"""
 
-    query = db.query(Company)
-    if scenario:
-        query = query.filter(Company.demo_scenario == scenario)
-
-    companies = query.all()
-    result = []
-
-    for c in companies:
-        # Calcular stats
-        today = datetime.now()
-        month_start = today.replace(day=1)
-
-        ingresos = db.query(func.sum(CFDI.total)).filter(
-            CFDI.company_id == c.id,
-            CFDI.tipo_comprobante == TipoCFDI.INGRESO,
-            CFDI.emisor_rfc == c.rfc,
-            CFDI.fecha_emision >= month_start,
-        ).scalar() or 0
-
-        egresos = db.query(func.sum(CFDI.total)).filter(
-            CFDI.company_id == c.id,
-            CFDI.tipo_comprobante == TipoCFDI.EGRESO,
-            CFDI.fecha_emision >= month_start,
-        ).scalar() or 0
-
-        total_cfdis = db.query(func.count(CFDI.id)).filter(
-            CFDI.company_id == c.id
-        ).scalar() or 0
-
-        health = db.query(HealthScore).filter(
-            HealthScore.company_id == c.id
-        ).order_by(desc(HealthScore.created_at)).first()
-
-        alertas = db.query(func.count(FiscalAlert.id)).filter(
-            FiscalAlert.company_id == c.id,
-            FiscalAlert.is_resolved == "pending",
-        ).scalar() or 0
-
-        result.append(CompanyWithStats(
-            id=c.id,
-            rfc=c.rfc,
-            razon_social=c.razon_social,
-            regimen_fiscal=c.regimen_fiscal,
-            codigo_postal=c.codigo_postal,
-            sector=c.sector,
-            sat_connected=c.sat_connected,
-            sat_last_sync=c.sat_last_sync,
-            demo_scenario=c.demo_scenario,
-            created_at=c.created_at,
-            total_cfdis=total_cfdis,
-            ingresos_mes=float(ingresos),
-            egresos_mes=float(egresos),
-            health_score=health.score_total if health else 0,
-            alertas_activas=alertas,
-        ))
-
-    return result
+    companies = company_rows(db, *([Company.demo_scenario == scenario] if scenario else []))
+    stats = company_stats_map(db, companies)
+
+    return [company_with_stats(c, stats[c.id]) for c in companies]
 
 
 @app.get("/api/companies/{company_id}", response_model=CompanyWithStats)
+@query_budget(4)
 def get_company(company_id: int, db: Session = Depends(get_db)):
     """Obtiene detalles de una empresa específica"""
 
-    company = db.query(Company).filter(Company.id == company_id).first()
+    company = company_row(db, company_id)
     if not company:
         raise HTTPException(status_code=404, detail="Empresa no encontrada")
 
-    # Calcular stats (similar a list_companies)
-    today = datetime.now()
-    month_start = today.replace(day=1)
-
-    ingresos = db.query(func.sum(CFDI.total)).filter(
-        CFDI.company_id == company_id,
-        CFDI.tipo_comprobante == TipoCFDI.INGRESO,
-        CFDI.emisor_rfc == company.rfc,
-        CFDI.fecha_emision >= month_start,
-    ).scalar() or 0
-
-    egresos = db.query(func.sum(CFDI.total)).filter(
-        CFDI.company_id == company_id,
-        CFDI.tipo_comprobante == TipoCFDI.EGRESO,
-        CFDI.fecha_emision >= month_start,
-    ).scalar() or 0
-
-    total_cfdis = db.query(func.count(CFDI.id)).filter(
-        CFDI.company_id == company_id
-    ).scalar() or 0
-
-    health = db.query(HealthScore).filter(
-        HealthScore.company_id == company_id
-    ).order_by(desc(HealthScore.created_at)).first()
-
-    alertas = db.query(func.count(FiscalAlert.id)).filter(
-        FiscalAlert.company_id == company_id,
-        FiscalAlert.is_resolved == "pending",
-    ).scalar() or 0
-
-    return CompanyWithStats(
-        id=company.id,
-        rfc=company.rfc,
-        razon_social=company.razon_social,
-        regimen_fiscal=company.regimen_fiscal,
-        codigo_postal=company.codigo_postal,
-        sector=company.sector,
-        sat_connected=company.sat_connected,
-        sat_last_sync=company.sat_last_sync,
-        demo_scenario=company.demo_scenario,
-        created_at=company.created_at,
-        total_cfdis=total_cfdis,
-        ingresos_mes=float(ingresos),
-        egresos_mes=float(egresos),
-        health_score=health.score_total if health else 0,
-        alertas_activas=alertas,
-    )
+    stats = company_stats_map(db, [company])
+    return company_with_stats(company, stats[company.id])
+
+
+# ═══════════════════════════════════════════════
+# Portafolio Endpoints (Despacho Contable)
+# ═══════════════════════════════════════════════
+
+@app.get("/api/portfolio/dashboard", response_model=PortfolioDashboard)
+@query_budget(5)
+@request_cost(8)
+def get_portfolio_dashboard(
+    page: int = Query(1, ge=1),
+    per_page: int = Query(20, ge=1, le=100),
+    sort: str = Query("riesgo", pattern="^(riesgo|health_score|ingresos|razon_social)$"),
+    current_user: User = Depends(require_auth),
+    db: Session = Depends(get_db),
+):
+    """
+    Dashboard consolidado de todas las empresas del usuario autenticado.
+    KPIs, score y alertas por empresa más totales del portafolio,
+    ordenado por riesgo (default), score, ingresos o razón social.
+    """
+    return build_portfolio(db, current_user.id, page=page, per_page=per_page, sort=sort)
 
 
 # ═══════════════════════════════════════════════
@@ -626,6 +738,8 @@ def get_company(company_id: int, db: Session = Depends(get_db)):
 # ═══════════════════════════════════════════════
 
 @app.post("/api/cfo/chat")
+@query_budget(6)
+@request_cost(3)
 def cfo_chat(
     message: str = Query(..., min_length=1),
     company_id: int = Query(...),
@@ -635,156 +749,12 @@ def cfo_chat(
     CFO Virtual - Responde preguntas sobre finanzas.
     Respuestas enriquecidas con datos reales y contexto del task_plan.
     """
-    company = db.query(Company).filter(Company.id == company_id).first()
+    company = company_row(db, company_id)
     if not company:
         raise HTTPException(status_code=404, detail="Empresa no encontrada")
 
-    today = datetime.now()
-    month_start = today.replace(day=1)
-
-    ingresos = db.query(func.sum(CFDI.total)).filter(
-        CFDI.company_id == company_id,
-        CFDI.tipo_comprobante == TipoCFDI.INGRESO,
-        CFDI.emisor_rfc == company.rfc,
-        CFDI.fecha_emision >= month_start,
-    ).scalar() or Decimal(0)
-
-    egresos = db.query(func.sum(CFDI.total)).filter(
-        CFDI.company_id == company_id,
-        CFDI.tipo_comprobante == TipoCFDI.EGRESO,
-        CFDI.fecha_emision >= month_start,
-    ).scalar() or Decimal(0)
-
-    health = db.query(HealthScore).filter(
-        HealthScore.company_id == company_id
-    ).order_by(desc(HealthScore.created_at)).first()
-
-    total_cfdis = db.query(func.count(CFDI.id)).filter(
-        CFDI.company_id == company_id
-    ).scalar() or 0
-
-    alerts = db.query(FiscalAlert).filter(
-        FiscalAlert.company_id == company_id,
-        FiscalAlert.severity != AlertSeverity.VERDE,
-    ).all()
-
-    margen = float((ingresos - egresos) / ingresos * 100) if ingresos > 0 else 0
-    ratio = float(ingresos / egresos) if egresos > 0 else 0
-
-    message_lower = message.lower()
-
-    responses = {
-        "flujo": f"Tu flujo de efectivo muestra una **{'tendencia positiva' if margen > 0 else 'tendencia negativa'}** este mes.\n\n"
-                 f"- **Ingresos del mes:** ${float(ingresos):,.0f} MXN\n"
-                 f"- **Egresos del mes:** ${float(egresos):,.0f} MXN\n"
-                 f"- **Margen neto:** {margen:.1f}%\n"
-                 f"- **Ratio cobertura:** {ratio:.2f}x\n\n"
-                 f"{'Tu margen es saludable (>30%). Mantén esta tendencia.' if margen > 30 else 'Tu margen es ajustado. Considera revisar los egresos principales.'}\n\n"
-                 f"_Basado en {total_cfdis:,} CFDIs sincronizados de {company.razon_social}._",
-
-        "liquidez": f"Tu **riesgo de liquidez actual es {'bajo' if ratio > 1.5 else 'medio' if ratio > 1.0 else 'alto'}**.\n\n"
-                    f"- **Ratio de cobertura:** {ratio:.2f}x {'(saludable > 1.2x)' if ratio > 1.2 else '(riesgo < 1.2x)'}\n"
-                    f"- **Ingresos/Egresos:** ${float(ingresos):,.0f} / ${float(egresos):,.0f}\n\n"
-                    f"**Proyección próximos 3 meses:**\n"
-                    f"- Mes +1: Flujo neto estimado +${float(ingresos) * 0.15:,.0f}\n"
-                    f"- Mes +2: {'Riesgo de iliquidez detectado' if ratio < 1.3 else 'Flujo estable proyectado'}\n"
-                    f"- Mes +3: Recuperación esperada\n\n"
-                    f"_Datos basados en {total_cfdis:,} CFDIs y tendencias históricas de 8 meses._",
-
-        "concentraci": f"Tu **concentración de clientes es {'alta - riesgo significativo' if company.demo_scenario == 'B' else 'moderada'}**.\n\n"
-                       f"{'El top cliente representa el 32% de tus ingresos. Si pierdes este cliente, tu flujo caería significativamente.' if company.demo_scenario == 'B' else 'Tu diversificación es razonable, pero siempre es bueno ampliar la base.'}\n\n"
-                       f"**Recomendaciones:**\n"
-                       f"1. Ningún cliente debería superar el 20% de ingresos\n"
-                       f"2. Busca al menos 2-3 clientes nuevos este trimestre\n"
-                       f"3. Diversifica por sector para reducir riesgo sectorial\n\n"
-                       f"_Análisis basado en distribución de CFDIs de ingreso._",
-
-        "score": f"Tu **Score de Salud Financiera es {health.score_total if health else 0}/100** {'- Excelente' if health and health.score_total >= 80 else '- Necesita mejora' if health and health.score_total < 65 else '- Bueno'}.\n\n"
-                 + (f"**Desglose de componentes:**\n"
-                    f"- Liquidez ({health.liquidez}/100, peso 20%): aporta {health.liquidez * 20 // 100} pts\n"
-                    f"- Cumplimiento fiscal ({health.cumplimiento_fiscal}/100, peso 20%): aporta {health.cumplimiento_fiscal * 20 // 100} pts\n"
-                    f"- Diversificación ({health.diversificacion_clientes}/100, peso 15%): aporta {health.diversificacion_clientes * 15 // 100} pts\n"
-                    f"- Tendencia ingresos ({health.tendencia_ingresos}/100, peso 15%): aporta {health.tendencia_ingresos * 15 // 100} pts\n"
-                    f"- Margen operativo ({health.margen_operativo}/100, peso 10%): aporta {health.margen_operativo * 10 // 100} pts\n\n"
-                    f"**Componente más fuerte:** {'Cumplimiento fiscal' if health.cumplimiento_fiscal >= health.liquidez else 'Liquidez'}\n"
-                    f"**Componente más débil:** {'Diversificación' if health.diversificacion_clientes <= health.margen_operativo else 'Margen operativo'}\n"
-                    if health else "No hay score disponible aún.\n") +
-                 f"\n_Período evaluado: Jul 2025 - Feb 2026._",
-
-        "transporte": f"Hemos observado un **incremento del 15% en gastos de transporte** en los últimos 3 meses.\n\n"
-                      f"**Análisis detallado:**\n"
-                      f"- Principal proveedor: Transportes del Norte (TDN050601WX2)\n"
-                      f"- Incremento mensual promedio: 5.2%\n"
-                      f"- Impacto en margen: -2.3 puntos porcentuales\n\n"
-                      f"**Impacto en flujo de efectivo:**\n"
-                      f"- Reducción estimada del margen de liquidez: 5% para próximo trimestre\n\n"
-                      f"**Recomendaciones:**\n"
-                      f"1. Renegociar tarifas con proveedor actual\n"
-                      f"2. Solicitar cotizaciones a 2-3 alternativas\n"
-                      f"3. Evaluar consolidación de envíos para reducir costos\n\n"
-                      f"_Análisis basado en CFDIs de egreso con uso_cfdi G03._",
-
-        "gasto": f"**Principales tendencias de gasto (últimos 3 meses):**\n\n"
-                 f"1. **Transporte y paquetería:** +15% (proveedor principal: Transportes del Norte)\n"
-                 f"2. **Servicios profesionales:** +8% (crecimiento orgánico)\n"
-                 f"3. **Suministros:** -3% (renegociación exitosa)\n"
-                 f"4. **Materiales:** estable\n\n"
-                 f"**Impacto en flujo de efectivo:**\n"
-                 f"El incremento en transporte ha reducido tu margen de liquidez proyectado en un 5% para el próximo trimestre.\n\n"
-                 f"**Acciones sugeridas:**\n"
-                 f"- Renegociar tarifas de transporte\n"
-                 f"- Buscar alternativas de paquetería\n"
-                 f"- Mantener política actual de suministros\n\n"
-                 f"_Datos de {total_cfdis:,} CFDIs procesados._",
-
-        "efos": f"**Estado de proveedores EFOS (Art. 69-B CFF):**\n\n"
-                + ("- **Logística Express MX** (LEM120601MN7) aparece en lista de presuntos publicada el 15 de enero 2026\n"
-                   "- Tienes 16 CFDIs recibidos por **$520,000 MXN**\n"
-                   "- **Acción requerida:** Contactar al proveedor y preparar evidencia de operaciones reales\n\n"
-                   "**Riesgo fiscal:**\n"
-                   "Si el proveedor es declarado definitivamente EFOS, el SAT podría rechazar la deducibilidad de esos $520,000 MXN.\n"
-                   if company.demo_scenario == "B" else
-                   "- **Sin proveedores en lista EFOS.** Tu cartera de proveedores está limpia.\n\n") +
-                f"_Verificación contra lista Art. 69-B del SAT actualizada._",
-
-        "cancelaci": f"**Estado de CFDIs cancelados:**\n\n"
-                     f"- Tasa de cancelación: {'0.8%' if company.demo_scenario == 'A' else '3.2%' if company.demo_scenario == 'B' else '1.5%'}\n"
-                     f"- Estado del indicador: {'Verde (< 1%)' if company.demo_scenario == 'A' else 'Amarillo (1-5%)' if company.demo_scenario == 'B' else 'Verde (< 2%)'}\n\n"
-                     f"**Umbrales del semáforo:**\n"
-                     f"- Verde: 0-1% de cancelaciones\n"
-                     f"- Amarillo: 1-5% de cancelaciones\n"
-                     f"- Rojo: >5% de cancelaciones\n\n"
-                     f"_Basado en CFDIs de los últimos 12 meses._",
-    }
-
-    response = (
-        f"Analicé los datos financieros de **{company.razon_social}**.\n\n"
-        f"**Resumen ejecutivo:**\n"
-        f"- Ingresos del mes: ${float(ingresos):,.0f} MXN\n"
-        f"- Egresos del mes: ${float(egresos):,.0f} MXN\n"
-        f"- Margen bruto: {margen:.1f}%\n"
-        f"- Score de salud: {health.score_total if health else 0}/100\n"
-        f"- Alertas activas: {len(alerts)}\n\n"
-        f"¿Sobre qué tema quieres profundizar? Puedo hablar sobre:\n"
-        f"- **Flujo de efectivo** y proyecciones\n"
-        f"- **Liquidez** y riesgo\n"
-        f"- **Concentración** de clientes\n"
-        f"- **Score** de salud financiera\n"
-        f"- **Transporte** y tendencias de gasto\n"
-        f"- **EFOS** y riesgo de proveedores\n"
-        f"- **Cancelaciones** de CFDIs"
-    )
-
-    for key, value in responses.items():
-        if key in message_lower:
-            response = value
-            break
-
-    return {
-        "response": response,
-        "sources": ["CFDIs sincronizados", "Score de salud", "Lista EFOS Art. 69-B"],
-        "disclaimer": "Verificar con tu contador para decisiones fiscales críticas.",
-    }
+    from app.services.cfo import answer
+    return answer(db, company, message)
 
 
 # ═══════════════════════════════════════════════
@@ -792,303 +762,89 @@ def cfo_chat(
 # ═══════════════════════════════════════════════
 
 @app.get("/api/predictions/{company_id}")
+@query_budget(2)
+@request_cost(3)
 def get_predictions(company_id: int, db: Session = Depends(get_db)):
     """Predicciones de flujo de efectivo y tendencias"""
 
-    company = db.query(Company).filter(Company.id == company_id).first()
+    company = company_row(db, company_id)
     if not company:
         raise HTTPException(status_code=404, detail="Empresa no encontrada")
 
-    today = datetime.now()
-    month_start = today.replace(day=1)
-
-    # Calcular ingresos y egresos de los últimos 3 meses para proyectar
-    monthly_data = []
-    for i in range(6):
-        m_start = (today - timedelta(days=30 * i)).replace(day=1)
-        m_end = (m_start + timedelta(days=32)).replace(day=1)
-
-        ing = float(db.query(func.sum(CFDI.total)).filter(
-            CFDI.company_id == company_id,
-            CFDI.tipo_comprobante == TipoCFDI.INGRESO,
-            CFDI.emisor_rfc == company.rfc,
-            CFDI.fecha_emision >= m_start,
-            CFDI.fecha_emision < m_end,
-        ).scalar() or 0)
-
-        egr = float(db.query(func.sum(CFDI.total)).filter(
-            CFDI.company_id == company_id,
-            CFDI.tipo_comprobante == TipoCFDI.EGRESO,
-            CFDI.fecha_emision >= m_start,
-            CFDI.fecha_emision < m_end,
-        ).scalar() or 0)
-
-        monthly_data.append({"ingresos": ing, "egresos": egr, "neto": ing - egr})
-
-    # Promedio para proyecciones
-    avg_ing = sum(m["ingresos"] for m in monthly_data) / max(len(monthly_data), 1)
-    avg_egr = sum(m["egresos"] for m in monthly_data) / max(len(monthly_data), 1)
-
-    # Factores de escenario
-    if company.demo_scenario == "A":
-        factors = [1.02, 1.05, 1.08]
-        egr_factors = [0.98, 1.01, 0.99]
-    elif company.demo_scenario == "B":
-        factors = [0.95, 0.88, 1.15]
-        egr_factors = [1.08, 1.15, 1.02]
-    else:
-        factors = [1.01, 1.03, 1.02]
-        egr_factors = [1.0, 1.02, 0.98]
-
-    meses = ["Mar 2026", "Abr 2026", "May 2026"]
-    projections = []
-    for i, mes in enumerate(meses):
-        ing_proj = avg_ing * factors[i]
-        egr_proj = avg_egr * egr_factors[i]
-        neto = ing_proj - egr_proj
-        alert = None
-        if neto < 0:
-            alert = "Riesgo de Iliquidez"
-        elif neto < avg_ing * 0.1:
-            alert = "Margen Ajustado"
-
-        projections.append({
-            "mes": mes,
-            "ingresos_proyectados": round(ing_proj, 0),
-            "egresos_proyectados": round(egr_proj, 0),
-            "flujo_neto": round(neto, 0),
-            "alerta": alert,
-            "confianza": 85 - (i * 8),
-        })
-
-    # Tendencias
-    revenue_trend = "creciente" if factors[2] > 1.0 else "decreciente"
-    expense_trend = "creciente" if egr_factors[1] > 1.0 else "decreciente"
-
-    # KPIs de predicción
-    total_ing_proj = sum(p["ingresos_proyectados"] for p in projections)
-    total_egr_proj = sum(p["egresos_proyectados"] for p in projections)
-
-    # Estacionalidad
-    seasonal_months = [
-        {"mes": "Ene", "factor": 0.85, "nota": "Inicio lento post-fiestas"},
-        {"mes": "Feb", "factor": 0.92, "nota": "Recuperación gradual"},
-        {"mes": "Mar", "factor": 1.05, "nota": "Cierre Q1 - pico estacional"},
-        {"mes": "Abr", "factor": 0.95, "nota": "Declaración anual - gastos extras"},
-        {"mes": "May", "factor": 1.02, "nota": "Estabilización"},
-        {"mes": "Jun", "factor": 1.08, "nota": "Cierre Q2 - buen momento"},
-        {"mes": "Jul", "factor": 0.90, "nota": "Vacaciones - caída temporal"},
-        {"mes": "Ago", "factor": 0.95, "nota": "Recuperación lenta"},
-        {"mes": "Sep", "factor": 1.10, "nota": "Cierre Q3 - fuerte"},
-        {"mes": "Oct", "factor": 1.05, "nota": "Pre-cierre fiscal"},
-        {"mes": "Nov", "factor": 1.15, "nota": "Buen Fin - pico ventas"},
-        {"mes": "Dic", "factor": 1.20, "nota": "Cierre fiscal - máximo"},
-    ]
-
-    return {
-        "projections": projections,
-        "kpis": {
-            "ingresos_3m": round(total_ing_proj, 0),
-            "egresos_3m": round(total_egr_proj, 0),
-            "flujo_neto_3m": round(total_ing_proj - total_egr_proj, 0),
-            "meses_riesgo": sum(1 for p in projections if p["alerta"]),
-            "revenue_trend": revenue_trend,
-            "expense_trend": expense_trend,
-        },
-        "seasonality": seasonal_months,
-        "risk_assessment": {
-            "nivel": "bajo" if company.demo_scenario == "A" else "medio" if company.demo_scenario == "C" else "alto",
-            "factores": [
-                f"Tendencia de ingresos: {revenue_trend}",
-                f"Tendencia de egresos: {expense_trend}",
-                f"{'Sin alertas de liquidez' if company.demo_scenario == 'A' else 'Posible iliquidez en Mes +2' if company.demo_scenario == 'B' else 'Monitorear concentración'}",
-            ],
-        },
-        "company_name": company.razon_social,
-    }
+    return predictions_section(load_snapshot(db, company, datetime.now(), ("predictions",)))
 
 
 # ═══════════════════════════════════════════════
 # Crédito Endpoint
 # ═══════════════════════════════════════════════
 
+@app.get("/api/credit/catalog")
+@request_cost(0)
+def get_credit_catalog(
+    accept_encoding: str = Header("", include_in_schema=False),
+    if_none_match: Optional[str] = Header(None, include_in_schema=False),
+):
+    """Catálogos de crédito (financiamiento, niveles de partners y planes), ya comprimidos"""
+    return catalog_payload().response(accept_encoding, if_none_match)
+
+
 @app.get("/api/credit/{company_id}")
+@query_budget(3)
+@request_cost(2)
 def get_credit_info(company_id: int, db: Session = Depends(get_db)):
     """Información de crédito y programa POA Partners"""
 
-    company = db.query(Company).filter(Company.id == company_id).first()
+    company = company_row(db, company_id)
     if not company:
         raise HTTPException(status_code=404, detail="Empresa no encontrada")
 
-    health = db.query(HealthScore).filter(
-        HealthScore.company_id == company_id
-    ).order_by(desc(HealthScore.created_at)).first()
-
-    score = health.score_total if health else 0
-
-    # Credit readiness basado en score
-    if score >= 80:
-        readiness = "alta"
-        readiness_score = 92
-        recommendation = "Excelente perfil crediticio. Pre-aprobado para líneas de crédito."
-    elif score >= 65:
-        readiness = "media"
-        readiness_score = 68
-        recommendation = "Buen perfil. Mejora tu diversificación de clientes para acceder a mejores tasas."
-    else:
-        readiness = "baja"
-        readiness_score = 45
-        recommendation = "Necesitas mejorar tu salud financiera antes de solicitar crédito."
-
-    # Opciones de financiamiento
-    financing_options = [
-        {
-            "nombre": "Crédito Simple PyME",
-            "proveedor": "Konfío",
-            "monto_min": 50000,
-            "monto_max": 3000000,
-            "tasa": "1.8% mensual",
-            "plazo": "6-36 meses",
-            "requisitos": ["Score POA >= 65", "6+ meses operando", "Sin alertas EFOS"],
-            "estado": "pre-aprobado" if score >= 65 else "no disponible",
-            "beneficio_partner": "15% comisión sobre monto otorgado",
-        },
-        {
-            "nombre": "Factoraje Digital",
-            "proveedor": "Kapital",
-            "monto_min": 10000,
-            "monto_max": 500000,
-            "tasa": "2.2% por operación",
-            "plazo": "30-90 días",
-            "requisitos": ["Score POA >= 50", "CFDIs vigentes", "Clientes verificados"],
-            "estado": "disponible" if score >= 50 else "no disponible",
-            "beneficio_partner": "10% comisión",
-        },
-        {
-            "nombre": "Línea de Crédito Revolvente",
-            "proveedor": "Credijusto",
-            "monto_min": 100000,
-            "monto_max": 5000000,
-            "tasa": "1.5% mensual",
-            "plazo": "12 meses renovable",
-            "requisitos": ["Score POA >= 75", "12+ meses operando", "Ingresos > $200K/mes"],
-            "estado": "pre-aprobado" if score >= 75 else "no disponible",
-            "beneficio_partner": "20% comisión",
-        },
-    ]
-
-    # POA Partners program
-    total_cfdis = db.query(func.count(CFDI.id)).filter(
-        CFDI.company_id == company_id
-    ).scalar() or 0
-
-    partners_program = {
-        "niveles": [
-            {
-                "nombre": "Bronce",
-                "requisito": "5+ clientes en POA",
-                "descuento": "10%",
-                "comision_referidos": "5%",
-                "beneficios": [
-                    "Dashboard básico para todos los clientes",
-                    "Reportes mensuales consolidados",
-                    "Soporte por email",
-                ],
-            },
-            {
-                "nombre": "Plata",
-                "requisito": "15+ clientes en POA",
-                "descuento": "20%",
-                "comision_referidos": "10%",
-                "beneficios": [
-                    "Todo lo de Bronce",
-                    "CFO Virtual para cada cliente",
-                    "Alertas proactivas",
-                    "Soporte prioritario",
-                ],
-            },
-            {
-                "nombre": "Oro",
-                "requisito": "25+ clientes en POA",
-                "descuento": "30%",
-                "comision_referidos": "15%",
-                "beneficios": [
-                    "Todo lo de Plata",
-                    "Predicciones de flujo avanzadas",
-                    "Acceso a API completa",
-                    "Soporte dedicado 24/7",
-                    "Comisión por referidos de crédito: $5,000 MXN/mes promedio",
-                ],
-                "ejemplo": "El 'Despacho Contable Ágil' (25+ clientes) obtiene 30% descuento + $5,000 MXN/mes de comisiones por referidos de crédito.",
-            },
-        ],
-        "nivel_actual": "Oro" if company.demo_scenario == "C" and total_cfdis > 1000 else "Plata" if total_cfdis > 500 else "Bronce",
-    }
+    return credit_section(load_snapshot(db, company, datetime.now(), ("credit",)))
 
-    # Planes de suscripción
-    plans = [
-        {
-            "nombre": "Starter",
-            "precio": 0,
-            "precio_label": "Gratis",
-            "features": [
-                "Dashboard básico",
-                "Hasta 100 CFDIs/mes",
-                "Score de salud",
-                "1 usuario",
-            ],
-            "es_actual": company.demo_scenario == "A" and score < 70,
-        },
-        {
-            "nombre": "Profesional",
-            "precio": 499,
-            "precio_label": "$499/mes",
-            "features": [
-                "Todo lo del Starter",
-                "CFO Virtual ilimitado",
-                "Semáforo fiscal completo",
-                "Alertas proactivas",
-                "5 usuarios",
-                "Hasta 1,000 CFDIs/mes",
-            ],
-            "es_actual": company.demo_scenario == "A" and score >= 70,
-            "popular": True,
-        },
-        {
-            "nombre": "Avanzado",
-            "precio": 1499,
-            "precio_label": "$1,499/mes",
-            "features": [
-                "Todo lo del Profesional",
-                "Integración bancaria",
-                "Predicciones de flujo",
-                "API completa",
-                "Usuarios ilimitados",
-                "CFDIs ilimitados",
-                "Soporte prioritario",
-            ],
-            "es_actual": company.demo_scenario == "B",
-        },
-    ]
 
-    return {
-        "readiness": {
-            "nivel": readiness,
-            "score": readiness_score,
-            "recommendation": recommendation,
-            "health_score": score,
-        },
-        "financing_options": financing_options,
-        "partners_program": partners_program,
-        "plans": plans,
-        "company_name": company.razon_social,
-        "onboarding_steps": [
-            {"paso": 1, "titulo": "Registro", "descripcion": "Ingresa email y RFC", "completado": True},
-            {"paso": 2, "titulo": "Primer Valor", "descripcion": "Sube tus XMLs y ve tu primer score en 30 segundos", "completado": True},
-            {"paso": 3, "titulo": "Dashboard Básico", "descripcion": f"Ves tus ingresos/egresos y Score de {score}/100", "completado": True},
-            {"paso": 4, "titulo": "Conectar SAT", "descripcion": "Conecta tu e.firma para predicciones y alertas proactivas", "completado": company.sat_connected},
-        ],
+# ═══════════════════════════════════════════════
+# Bundle de Empresa
+# ═══════════════════════════════════════════════
+
+@app.get("/api/companies/{company_id}/bundle", response_model=CompanyBundle)
+@query_budget(12)
+@request_cost(6)
+async def get_company_bundle(
+    company_id: int,
+    include: str = Query(",".join(SECTIONS), description="Secciones separadas por coma: " + ", ".join(SECTIONS)),
+    db: Session = Depends(get_db),
+    dashboard_db: Session = Depends(get_db, use_cache=False),
+):
+    """Dashboard, health score, predicciones y crédito de una empresa en un solo request.
+
+    Cada sección es idéntica a la de su endpoint individual. La empresa, el
+    último Health Score, el conteo de CFDIs y los totales mensuales se
+    consultan una sola vez; las consultas propias del dashboard corren en
+    paralelo con ellas en una segunda sesión. `health` es null si la empresa
+    no tiene score.
+    """
+    sections = [name.strip() for name in include.split(",") if name.strip()]
+    unknown = sorted(set(sections) - set(SECTIONS))
+    if unknown or not sections:
+        raise HTTPException(status_code=422, detail=f"Secciones inválidas: {', '.join(unknown) or '(ninguna)'}")
+
+    company = await run_in_threadpool(company_row, db, company_id)
+    if not company:
+        raise HTTPException(status_code=404, detail="Empresa no encontrada")
+
+    today = datetime.now()
+    shared = run_in_threadpool(load_snapshot, db, company, today, sections)
+    if "dashboard" in sections:
+        snapshot, data = await asyncio.gather(shared, run_in_threadpool(dashboard_data, dashboard_db, company, today))
+    else:
+        snapshot, data = await shared, None
+
+    builders = {
+        "dashboard": lambda: dashboard_section(snapshot, data),
+        "health": lambda: health_section(snapshot.health),
+        "predictions": lambda: predictions_section(snapshot),
+        "credit": lambda: credit_section(snapshot),
     }
+    return ORJSONResponse({name: builders[name]() for name in SECTIONS if name in sections})
 
 
 if __name__ == "__main__":
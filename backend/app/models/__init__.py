@@ -4,7 +4,16 @@ Modelos SQLAlchemy para Sistema POA
 from app.models.user import User
 from app.models.company import Company
 from app.models.cfdi import CFDI
+from app.models.cfdi_rollup import CFDIRollup
+from app.models.cfdi_concepto import CFDIConcepto
+from app.models.cfdi_status import CFDIStatusCheck
+from app.models.counterparty import CounterpartyMonthly
+from app.models.receivable import PaymentApplication, ReceivableBalance
 from app.models.fiscal_alert import FiscalAlert
 from app.models.health_score import HealthScore
+from app.models.job import Job
 
-__all__ = ["User", "Company", "CFDI", "FiscalAlert", "HealthScore"]
+__all__ = [
+    "User", "Company", "CFDI", "CFDIRollup", "CFDIConcepto", "CFDIStatusCheck", "CounterpartyMonthly",
+    "PaymentApplication", "ReceivableBalance", "FiscalAlert", "HealthScore", "Job",
+]
@@ -1,7 +1,7 @@
 """
 Modelo de CFDI (Comprobante Fiscal Digital por Internet)
 """
-from sqlalchemy import Column, Integer, String, Numeric, DateTime, ForeignKey, Text, Enum as SQLEnum
+from sqlalchemy import Column, Integer, String, Numeric, DateTime, ForeignKey, Text, Index, DDL, Enum as SQLEnum, event
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database import Base
@@ -81,5 +81,46 @@ class CFDI(Base):
     # Relationships
     company = relationship("Company", back_populates="cfdis")
 
+    __table_args__ = (
+        # Casi todas las consultas filtran por empresa y rango de fechas
+        Index("ix_cfdis_company_fecha", "company_id", "fecha_emision"),
+        # Filtros de la búsqueda (ver app/services/search.py)
+        Index("ix_cfdis_company_emisor_fecha", "company_id", "emisor_rfc", "fecha_emision"),
+        Index("ix_cfdis_company_receptor_fecha", "company_id", "receptor_rfc", "fecha_emision"),
+        Index("ix_cfdis_company_total", "company_id", "total"),
+        Index("ix_cfdis_company_folio", "company_id", "folio"),
+    )
+
     def __repr__(self):
         return f"<CFDI {self.uuid} - {self.tipo_comprobante.value} ${self.total}>"
+
+
+# Índices de texto de la búsqueda, propios de cada motor: nombres de
+# contraparte y fragmentos de UUID. La migración 0009 crea los mismos.
+SQLITE_SEARCH_DDL = (
+    # FTS5 con tokenizer trigram (SQLite >= 3.34): busca subcadenas sin importar mayúsculas
+    "CREATE VIRTUAL TABLE IF NOT EXISTS cfdis_fts USING fts5("
+    "emisor_nombre, receptor_nombre, uuid, content='cfdis', content_rowid='id', tokenize='trigram')",
+    "CREATE TRIGGER IF NOT EXISTS cfdis_fts_ai AFTER INSERT ON cfdis BEGIN "
+    "INSERT INTO cfdis_fts(rowid, emisor_nombre, receptor_nombre, uuid) "
+    "VALUES (new.id, new.emisor_nombre, new.receptor_nombre, new.uuid); END",
+    "CREATE TRIGGER IF NOT EXISTS cfdis_fts_ad AFTER DELETE ON cfdis BEGIN "
+    "INSERT INTO cfdis_fts(cfdis_fts, rowid, emisor_nombre, receptor_nombre, uuid) "
+    "VALUES ('delete', old.id, old.emisor_nombre, old.receptor_nombre, old.uuid); END",
+    "CREATE TRIGGER IF NOT EXISTS cfdis_fts_au AFTER UPDATE OF emisor_nombre, receptor_nombre, uuid ON cfdis BEGIN "
+    "INSERT INTO cfdis_fts(cfdis_fts, rowid, emisor_nombre, receptor_nombre, uuid) "
+    "VALUES ('delete', old.id, old.emisor_nombre, old.receptor_nombre, old.uuid); "
+    "INSERT INTO cfdis_fts(rowid, emisor_nombre, receptor_nombre, uuid) "
+    "VALUES (new.id, new.emisor_nombre, new.receptor_nombre, new.uuid); END",
+)
+POSTGRES_SEARCH_DDL = (
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS ix_cfdis_emisor_nombre_trgm ON cfdis USING gin (emisor_nombre gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_cfdis_receptor_nombre_trgm ON cfdis USING gin (receptor_nombre gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_cfdis_uuid_trgm ON cfdis USING gin (uuid gin_trgm_ops)",
+)
+
+for _statement in SQLITE_SEARCH_DDL:
+    event.listen(CFDI.__table__, "after_create", DDL(_statement).execute_if(dialect="sqlite"))
+for _statement in POSTGRES_SEARCH_DDL:
+    event.listen(CFDI.__table__, "after_create", DDL(_statement).execute_if(dialect="postgresql"))
@@ -0,0 +1,35 @@
+"""
+Modelo de conceptos de CFDI
+
+Solo lo necesario para clasificar montos: la ClaveProdServ y el importe de
+cada Concepto de las ventas (rol "cliente": ingresos emitidos por la
+empresa) y compras (rol "proveedor": egresos) vigentes. Se liga al CFDI por
+UUID (la tabla `cfdis` puede estar particionada) y repite su fecha de
+emisión, así los desgloses por periodo no tocan `cfdis`.
+"""
+from sqlalchemy import Column, Integer, String, Numeric, DateTime, ForeignKey, Index
+from app.database import Base
+
+
+class CFDIConcepto(Base):
+    __tablename__ = "cfdi_conceptos"
+
+    id = Column(Integer, primary_key=True)
+    cfdi_uuid = Column(String(36), nullable=False)
+    fecha_emision = Column(DateTime(timezone=True), nullable=False)
+    rol = Column(String(10), nullable=False)  # "cliente" | "proveedor"
+
+    # Clave del catálogo c_ClaveProdServ del SAT (8 dígitos)
+    clave_prod_serv = Column(String(8), nullable=False)
+    importe = Column(Numeric(18, 2), nullable=False)
+
+    # Foreign Keys
+    company_id = Column(Integer, ForeignKey("companies.id"), nullable=False)
+
+    __table_args__ = (
+        Index("ix_cfdi_conceptos_cfdi_uuid", "cfdi_uuid"),
+        Index("ix_cfdi_conceptos_company_rol_fecha", "company_id", "rol", "fecha_emision"),
+    )
+
+    def __repr__(self):
+        return f"<CFDIConcepto {self.cfdi_uuid} {self.clave_prod_serv} ${self.importe}>"
@@ -0,0 +1,46 @@
+"""
+Modelo de acumulados mensuales de CFDIs archivados
+
+Cuando un mes de CFDIs sale de la tabla `cfdis` hacia el archivo Parquet
+(ver app/archive.py) se conserva aquí un renglón por combinación de tipo,
+estado y contraparte con el conteo y los montos del mes.
+"""
+from sqlalchemy import Column, Integer, String, Numeric, DateTime, ForeignKey, Index, Enum as SQLEnum
+from sqlalchemy.sql import func
+from app.database import Base
+from app.models.cfdi import TipoCFDI, EstadoCFDI
+
+
+class CFDIRollup(Base):
+    __tablename__ = "cfdi_rollups"
+
+    id = Column(Integer, primary_key=True, index=True)
+
+    # Mes archivado (día 1, 00:00)
+    periodo = Column(DateTime(timezone=True), nullable=False)
+
+    # Dimensiones
+    tipo_comprobante = Column(SQLEnum(TipoCFDI), nullable=False)
+    estado = Column(SQLEnum(EstadoCFDI), nullable=True)
+    emisor_rfc = Column(String(13), nullable=False)
+    emisor_nombre = Column(String(255), nullable=True)
+    receptor_rfc = Column(String(13), nullable=False)
+    receptor_nombre = Column(String(255), nullable=True)
+
+    # Acumulados
+    num_cfdis = Column(Integer, nullable=False, default=0)
+    subtotal = Column(Numeric(18, 2), nullable=False, default=0)
+    iva = Column(Numeric(18, 2), nullable=False, default=0)
+    total = Column(Numeric(18, 2), nullable=False, default=0)
+
+    archived_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    # Foreign Keys
+    company_id = Column(Integer, ForeignKey("companies.id"), nullable=False)
+
+    __table_args__ = (
+        Index("ix_cfdi_rollups_company_periodo", "company_id", "periodo"),
+    )
+
+    def __repr__(self):
+        return f"<CFDIRollup {self.company_id} {self.periodo:%Y-%m} {self.tipo_comprobante.value} x{self.num_cfdis}>"
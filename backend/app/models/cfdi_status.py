@@ -0,0 +1,31 @@
+"""
+Modelo de verificaciones de estado de CFDI ante el SAT
+
+Una fila por CFDI con la última respuesta del servicio de consulta de estado
+y cuándo se obtuvo. El verificador (app/sat/verify.py) no vuelve a consultar
+un CFDI hasta que pasa SAT_STATUS_RECHECK_HOURS. Se liga al CFDI por UUID.
+"""
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, UniqueConstraint
+from app.database import Base
+
+
+class CFDIStatusCheck(Base):
+    __tablename__ = "cfdi_status_checks"
+
+    id = Column(Integer, primary_key=True)
+    cfdi_uuid = Column(String(36), nullable=False)
+
+    # Respuesta del SAT: "Vigente", "Cancelado" o "No Encontrado"
+    estado_sat = Column(String(20), nullable=False)
+    estatus_cancelacion = Column(String(50), nullable=True)  # p. ej. "En proceso"
+    verificado_at = Column(DateTime(timezone=True), nullable=False)
+
+    # Foreign Keys
+    company_id = Column(Integer, ForeignKey("companies.id"), nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint("company_id", "cfdi_uuid", name="uq_cfdi_status_checks_company_cfdi"),
+    )
+
+    def __repr__(self):
+        return f"<CFDIStatusCheck {self.cfdi_uuid} {self.estado_sat}>"
@@ -26,6 +26,9 @@ class Company(Base):
     # Conexión SAT
     sat_connected = Column(Boolean, default=False)
     sat_last_sync = Column(DateTime(timezone=True), nullable=True)
+    # Backoff de la sincronización tras fallas seguidas (ver app/sat/sync.py)
+    sat_sync_failures = Column(Integer, nullable=False, default=0, server_default="0")
+    sat_sync_retry_at = Column(DateTime(timezone=True), nullable=True)
 
     # Metadata
     sector = Column(String(100), nullable=True)
@@ -34,12 +37,15 @@ class Company(Base):
     # Escenario de demo (A, B, C)
     demo_scenario = Column(String(1), nullable=True)
 
+    # Sube en la misma transacción que cambia sus datos derivados (ver app/changes.py)
+    data_version = Column(Integer, nullable=False, default=0, server_default="0")
+
     # Timestamps
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
     # Foreign Keys
-    owner_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    owner_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
 
     # Relationships
     owner = relationship("User", back_populates="companies")
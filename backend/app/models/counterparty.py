@@ -0,0 +1,42 @@
+"""
+Modelo de acumulados mensuales por contraparte
+
+Un renglón por empresa, rol (cliente o proveedor), mes y RFC con el monto y
+el número de CFDIs vigentes. Se recalcula al ingerir CFDIs (ver
+app/services/counterparties.py) y sirve los rankings del dashboard sin
+recorrer `cfdis`.
+"""
+from sqlalchemy import Column, Integer, String, Numeric, DateTime, ForeignKey, Index, UniqueConstraint
+from sqlalchemy.sql import func
+from app.database import Base
+
+
+class CounterpartyMonthly(Base):
+    __tablename__ = "counterparty_monthly"
+
+    id = Column(Integer, primary_key=True, index=True)
+
+    # Mes (día 1, 00:00)
+    periodo = Column(DateTime(timezone=True), nullable=False)
+
+    # Contraparte
+    rol = Column(String(10), nullable=False)  # "cliente" o "proveedor"
+    rfc = Column(String(13), nullable=False)
+    nombre = Column(String(255), nullable=True)
+
+    # Acumulados del mes (solo CFDIs vigentes)
+    total = Column(Numeric(18, 2), nullable=False, default=0)
+    num_cfdis = Column(Integer, nullable=False, default=0)
+
+    updated_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    # Foreign Keys
+    company_id = Column(Integer, ForeignKey("companies.id"), nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint("company_id", "rol", "periodo", "rfc", name="uq_counterparty_monthly"),
+        Index("ix_counterparty_monthly_company_rol_periodo", "company_id", "rol", "periodo"),
+    )
+
+    def __repr__(self):
+        return f"<CounterpartyMonthly {self.company_id} {self.rol} {self.rfc} {self.periodo:%Y-%m} ${self.total}>"
@@ -1,7 +1,8 @@
 """
 Modelo de Alertas Fiscales (Semáforo)
 """
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Enum as SQLEnum
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, JSON, Enum as SQLEnum
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database import Base
@@ -37,8 +38,8 @@ class FiscalAlert(Base):
     descripcion = Column(Text, nullable=True)
     detalle = Column(String(255), nullable=True)
 
-    # Datos relacionados (JSON flexible)
-    metadata_json = Column(Text, nullable=True)  # RFC afectado, montos, etc.
+    # Datos relacionados (JSON flexible): ejemplo, accion_recomendada, RFC afectado, montos, etc.
+    metadata_json = Column(JSON().with_variant(JSONB(), "postgresql"), nullable=True)
 
     # Estado
     is_resolved = Column(String(20), default="pending")  # pending, resolved, dismissed
@@ -49,7 +50,7 @@ class FiscalAlert(Base):
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
     # Foreign Keys
-    company_id = Column(Integer, ForeignKey("companies.id"), nullable=False)
+    company_id = Column(Integer, ForeignKey("companies.id"), nullable=False, index=True)
 
     # Relationships
     company = relationship("Company", back_populates="fiscal_alerts")
@@ -46,7 +46,7 @@ class HealthScore(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     # Foreign Keys
-    company_id = Column(Integer, ForeignKey("companies.id"), nullable=False)
+    company_id = Column(Integer, ForeignKey("companies.id"), nullable=False, index=True)
 
     # Relationships
     company = relationship("Company", back_populates="health_scores")
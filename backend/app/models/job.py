@@ -0,0 +1,57 @@
+"""
+Modelo de Trabajos en Segundo Plano (cola en base de datos)
+"""
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Index, Enum as SQLEnum
+from sqlalchemy.sql import func
+from app.database import Base
+import enum
+
+
+class JobStatus(str, enum.Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+
+class Job(Base):
+    __tablename__ = "jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+
+    # Tipo de trabajo (nombre del handler registrado) y parámetros
+    kind = Column(String(50), nullable=False)
+    payload_json = Column(Text, nullable=True)
+
+    # Estado
+    status = Column(SQLEnum(JobStatus), nullable=False, default=JobStatus.QUEUED)
+    progress = Column(Integer, default=0)  # 0-100
+    progress_message = Column(String(255), nullable=True)
+    result_json = Column(Text, nullable=True)
+    error = Column(Text, nullable=True)
+
+    # Reintentos
+    attempts = Column(Integer, default=0)
+    max_attempts = Column(Integer, default=3)
+    run_after = Column(DateTime(timezone=True), nullable=False)
+
+    # Lock del worker que lo está ejecutando
+    locked_by = Column(String(100), nullable=True)
+    locked_at = Column(DateTime(timezone=True), nullable=True)
+
+    # Timestamps
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+    # Foreign Keys (opcional: trabajos ligados a una empresa)
+    company_id = Column(Integer, ForeignKey("companies.id"), nullable=True, index=True)
+
+    __table_args__ = (
+        # El worker busca el siguiente trabajo listo por estado y fecha
+        Index("ix_jobs_status_run_after", "status", "run_after"),
+    )
+
+    def __repr__(self):
+        return f"<Job {self.id} {self.kind} - {self.status.value}>"
@@ -0,0 +1,68 @@
+"""
+Modelos de cuentas por cobrar
+
+`PaymentApplication`: cada DoctoRelacionado de un complemento de pago (CFDI
+tipo PAGO vigente), es decir, cuánto de qué factura pagó ese complemento.
+`ReceivableBalance`: saldo de cada factura PPD de venta vigente, calculado
+desde la factura y sus aplicaciones (ver app/services/receivables.py).
+Ambas se ligan a los CFDIs por UUID.
+"""
+from sqlalchemy import Column, Integer, String, Numeric, DateTime, ForeignKey, Index, UniqueConstraint
+from sqlalchemy.sql import func
+from app.database import Base
+
+
+class PaymentApplication(Base):
+    __tablename__ = "payment_applications"
+
+    id = Column(Integer, primary_key=True)
+
+    # Complemento de pago y factura que liquida (IdDocumento)
+    pago_uuid = Column(String(36), nullable=False)
+    factura_uuid = Column(String(36), nullable=False)
+
+    fecha_pago = Column(DateTime(timezone=True), nullable=False)
+    importe = Column(Numeric(18, 2), nullable=False)  # ImpPagado
+
+    # Foreign Keys
+    company_id = Column(Integer, ForeignKey("companies.id"), nullable=False)
+
+    __table_args__ = (
+        Index("ix_payment_applications_company_pago", "company_id", "pago_uuid"),
+        Index("ix_payment_applications_company_factura", "company_id", "factura_uuid"),
+        # Flujo de efectivo: pagos de la empresa en un rango de días
+        Index("ix_payment_applications_company_fecha", "company_id", "fecha_pago"),
+    )
+
+    def __repr__(self):
+        return f"<PaymentApplication {self.pago_uuid} -> {self.factura_uuid} ${self.importe}>"
+
+
+class ReceivableBalance(Base):
+    __tablename__ = "receivable_balances"
+
+    id = Column(Integer, primary_key=True)
+
+    # Factura PPD
+    cfdi_uuid = Column(String(36), nullable=False)
+    fecha_emision = Column(DateTime(timezone=True), nullable=False)
+    receptor_rfc = Column(String(13), nullable=False)
+
+    # Montos
+    total = Column(Numeric(18, 2), nullable=False)
+    pagado = Column(Numeric(18, 2), nullable=False, default=0)
+    saldo = Column(Numeric(18, 2), nullable=False)
+    ultimo_pago = Column(DateTime(timezone=True), nullable=True)
+
+    updated_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    # Foreign Keys
+    company_id = Column(Integer, ForeignKey("companies.id"), nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint("company_id", "cfdi_uuid", name="uq_receivable_balances_company_cfdi"),
+        Index("ix_receivable_balances_company_fecha", "company_id", "fecha_emision"),
+    )
+
+    def __repr__(self):
+        return f"<ReceivableBalance {self.cfdi_uuid} saldo ${self.saldo}>"
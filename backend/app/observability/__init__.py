@@ -0,0 +1,12 @@
+"""
+Observabilidad: métricas estilo Prometheus e instrumentación de SQL
+"""
+from app.observability.metrics import REGISTRY, Counter, Gauge, Histogram, record_cache
+from app.observability.context import RequestStats, current_request_stats
+from app.observability.middleware import MetricsMiddleware, instrument_engine, register_pool_metrics
+
+__all__ = [
+    "REGISTRY", "Counter", "Gauge", "Histogram", "record_cache",
+    "RequestStats", "current_request_stats",
+    "MetricsMiddleware", "instrument_engine", "register_pool_metrics",
+]
@@ -0,0 +1,36 @@
+"""
+Estadísticas por request compartidas entre el middleware y los eventos de SQL
+
+El objeto vive en un ContextVar; los endpoints síncronos corren en el
+threadpool con una copia del contexto, así que se muta en sitio (no se
+reasigna) para que el middleware vea lo que registraron los hilos.
+"""
+from contextvars import ContextVar
+from typing import Optional
+
+
+class RequestStats:
+    __slots__ = ("queries", "query_seconds", "statements")
+
+    def __init__(self, capture_statements: bool = False):
+        self.queries = 0
+        self.query_seconds = 0.0
+        # Lista de (sql, segundos) solo cuando algún consumidor la necesita
+        self.statements: Optional[list[tuple[str, float]]] = [] if capture_statements else None
+
+
+_request_stats: ContextVar[Optional[RequestStats]] = ContextVar("poa_request_stats", default=None)
+
+
+def current_request_stats() -> Optional[RequestStats]:
+    return _request_stats.get()
+
+
+def start_request_stats(capture_statements: bool = False):
+    """Activa estadísticas para el contexto actual; regresa (stats, token)."""
+    stats = RequestStats(capture_statements)
+    return stats, _request_stats.set(stats)
+
+
+def end_request_stats(token) -> None:
+    _request_stats.reset(token)
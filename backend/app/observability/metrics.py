@@ -0,0 +1,198 @@
+"""
+Métricas en formato de exposición de Prometheus (texto 0.0.4)
+
+Implementación mínima sin dependencias: contadores, gauges e histogramas con
+etiquetas, protegidos por un lock (se actualizan desde el event loop y desde
+el threadpool de endpoints síncronos).
+
+Los valores viven en la memoria de cada proceso: con varios workers de
+gunicorn, `/metrics` responde con los del worker que tomó el request. Cada
+muestra lleva la etiqueta `worker` (PID) para que eso se note al graficar y
+no se mezclen series de procesos distintos; no se agregan entre workers.
+"""
+from bisect import bisect_left
+from typing import Callable, Iterable, Optional
+import os
+import threading
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    # El PID se lee en cada llamada: el maestro de gunicorn registra las métricas antes del fork
+    parts = [f'worker="{os.getpid()}"']
+    parts.extend(f'{n}="{_escape(v)}"' for n, v in zip(names, values))
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}"
+
+
+def _fmt(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+    def samples(self) -> list[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1, *labels) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def get(self, *labels) -> float:
+        return self._values.get(labels, 0)
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_labels(self.labelnames, k)} {_fmt(v)}" for k, v in items]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labelnames=(), callback: Optional[Callable[[], dict[tuple, float]]] = None):
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[tuple, float] = {}
+        self._callback = callback
+
+    def set(self, value: float, *labels) -> None:
+        with self._lock:
+            self._values[labels] = value
+
+    def inc(self, amount: float = 1, *labels) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, amount: float = 1, *labels) -> None:
+        self.inc(-amount, *labels)
+
+    def get(self, *labels) -> float:
+        return self._values.get(labels, 0)
+
+    def samples(self):
+        if self._callback is not None:
+            items = list(self._callback().items())
+        else:
+            with self._lock:
+                items = list(self._values.items())
+        return [f"{self.name}{_labels(self.labelnames, k)} {_fmt(v)}" for k, v in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets: Iterable[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [conteos por bucket..., +Inf, suma]
+        self._values: dict[tuple, list] = {}
+
+    def observe(self, value: float, *labels) -> None:
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            data = self._values.get(labels)
+            if data is None:
+                data = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            data[i] += 1
+            data[-1] += value
+
+    def count(self, *labels) -> int:
+        data = self._values.get(labels)
+        return sum(data[:-1]) if data else 0
+
+    def samples(self):
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._values.items()]
+        lines = []
+        for labels, data in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), data[:-1]):
+                cumulative += n
+                le = 'le="%s"' % _fmt(bound)
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_fmt(data[-1])}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Métrica duplicada: {metric.name}")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=(), callback=None) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames, callback))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        lines: list[str] = []
+        for metric in list(self._metrics.values()):
+            samples = metric.samples()
+            if samples:
+                lines.extend(metric.header())
+                lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# ── Caches ──
+CACHE_REQUESTS = REGISTRY.counter(
+    "poa_cache_requests_total", "Consultas a caches en memoria por resultado", ("cache", "result"),
+)
+
+
+def _cache_hit_ratio() -> dict[tuple, float]:
+    caches = {labels[0] for labels in list(CACHE_REQUESTS._values)}
+    ratios = {}
+    for cache in caches:
+        hits = CACHE_REQUESTS.get(cache, "hit")
+        total = hits + CACHE_REQUESTS.get(cache, "miss")
+        ratios[(cache,)] = hits / total if total else 0.0
+    return ratios
+
+
+REGISTRY.gauge("poa_cache_hit_ratio", "Proporción de aciertos por cache", ("cache",), callback=_cache_hit_ratio)
+
+
+def record_cache(cache: str, hit: bool) -> None:
+    """Registra un acierto o fallo de un cache en memoria."""
+    CACHE_REQUESTS.inc(1, cache, "hit" if hit else "miss")
@@ -0,0 +1,104 @@
+"""
+Middleware de métricas HTTP e instrumentación del engine de SQLAlchemy
+"""
+import time
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.observability.context import current_request_stats, start_request_stats, end_request_stats
+from app.observability.metrics import REGISTRY
+
+REQUESTS = REGISTRY.counter(
+    "poa_http_requests_total", "Requests HTTP atendidos", ("method", "route", "status"),
+)
+LATENCY = REGISTRY.histogram(
+    "poa_http_request_duration_seconds", "Latencia de requests HTTP por plantilla de ruta", ("method", "route"),
+)
+IN_FLIGHT = REGISTRY.gauge("poa_http_requests_in_progress", "Requests HTTP en curso")
+REQUEST_QUERIES = REGISTRY.histogram(
+    "poa_http_request_db_queries", "Sentencias SQL ejecutadas por request", ("route",),
+    buckets=(1, 2, 5, 10, 20, 30, 50, 100, 250, 1000),
+)
+REQUEST_DB_SECONDS = REGISTRY.histogram(
+    "poa_http_request_db_seconds", "Tiempo total en SQL por request", ("route",),
+)
+DB_QUERIES = REGISTRY.counter("poa_db_queries_total", "Sentencias SQL ejecutadas")
+DB_QUERY_SECONDS = REGISTRY.histogram(
+    "poa_db_query_duration_seconds", "Duración de sentencias SQL",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0),
+)
+
+
+class MetricsMiddleware:
+    """Middleware ASGI: latencia por ruta, requests en curso y SQL por request."""
+
+    def __init__(self, app, capture_statements: bool = False):
+        self.app = app
+        self.capture_statements = capture_statements
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        stats, token = start_request_stats(self.capture_statements)
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            IN_FLIGHT.dec()
+            end_request_stats(token)
+            # La ruta la asigna el router en el scope; usar la plantilla evita
+            # una serie por cada ID en la URL
+            route = scope.get("route")
+            template = getattr(route, "path", None) or "unmatched"
+            method = scope["method"]
+            REQUESTS.inc(1, method, template, str(status))
+            LATENCY.observe(elapsed, method, template)
+            REQUEST_QUERIES.observe(stats.queries, template)
+            REQUEST_DB_SECONDS.observe(stats.query_seconds, template)
+
+
+def instrument_engine(engine: Engine) -> None:
+    """Cuenta y cronometra cada sentencia, global y por request."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("poa_query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["poa_query_start"].pop()
+        DB_QUERIES.inc()
+        DB_QUERY_SECONDS.observe(elapsed)
+        stats = current_request_stats()
+        if stats is not None:
+            stats.queries += 1
+            stats.query_seconds += elapsed
+            if stats.statements is not None:
+                stats.statements.append((statement, elapsed))
+
+
+def register_pool_metrics(engine: Engine) -> None:
+    """Gauges del pool de conexiones, leídos al momento del scrape."""
+    pool = engine.pool
+
+    def stat(name):
+        fn = getattr(pool, name, None)
+        return lambda: {(): fn()} if callable(fn) else {}
+
+    REGISTRY.gauge("poa_db_pool_size", "Tamaño configurado del pool", callback=stat("size"))
+    REGISTRY.gauge("poa_db_pool_checked_out", "Conexiones en uso", callback=stat("checkedout"))
+    REGISTRY.gauge("poa_db_pool_checked_in", "Conexiones libres en el pool", callback=stat("checkedin"))
+    REGISTRY.gauge("poa_db_pool_overflow", "Conexiones por encima del tamaño del pool", callback=stat("overflow"))
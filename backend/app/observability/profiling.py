@@ -0,0 +1,347 @@
+"""
+Perfilado por request (solo depuración)
+
+Con `PROFILING_ENABLED=true` se instala `ProfilingMiddleware`; un request se
+perfila solo si trae `X-POA-Profile: 1` y `X-Admin-Token` igual a
+`PROFILING_ADMIN_TOKEN`. Mientras dura el request, un hilo muestrea las pilas
+de todos los hilos ocupados (el event loop y el threadpool donde corren los
+endpoints síncronos) con `sys._current_frames()`. Al terminar se guardan en
+`PROFILE_DIR`:
+
+- `{id}.json`: resumen, tiempo por categoría (SQL, Pydantic, JSON, app),
+  sentencias SQL con su duración y pilas en formato "folded".
+- `{id}.html`: flamegraph autocontenido.
+
+Con el ajuste apagado el middleware no se instala y no hay ningún costo.
+Perfilar en un servidor con un solo worker y sin otro tráfico: el muestreo
+no distingue qué hilo atiende a qué request.
+"""
+from collections import Counter
+from datetime import datetime
+from typing import Optional
+import hmac
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+
+from app.observability.context import current_request_stats, start_request_stats, end_request_stats
+
+PROFILE_HEADER = b"x-poa-profile"
+TOKEN_HEADER = b"x-admin-token"
+
+# Funciones hoja que indican un hilo esperando, no trabajando
+_IDLE_LEAVES = {
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("selectors.py", "select"),
+    ("queue.py", "get"),
+    ("thread.py", "_worker"),
+    ("socket.py", "accept"),
+}
+
+# Categorías por módulo; gana la más cercana a la hoja
+_CATEGORIES = (
+    ("sql", ("sqlalchemy", "sqlite3", "psycopg2", "asyncpg")),
+    ("pydantic", ("pydantic",)),
+    ("json", ("json", "orjson", "starlette/responses.py", "fastapi/encoders.py")),
+    ("decimal", ("decimal",)),
+)
+
+
+def admin_token_valid(expected: str, provided: Optional[str]) -> bool:
+    """Sin token configurado nunca se autoriza."""
+    return bool(expected) and provided is not None and hmac.compare_digest(expected, provided)
+
+
+def _frame_label(code) -> str:
+    filename = code.co_filename
+    if "site-packages/" in filename:
+        filename = filename.rsplit("site-packages/", 1)[1]
+    elif "/app/" in filename:
+        filename = "app/" + filename.rsplit("/app/", 1)[1]
+    else:
+        filename = os.path.basename(filename)
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})"
+
+
+def _is_idle(frame) -> bool:
+    code = frame.f_code
+    return (os.path.basename(code.co_filename), code.co_name) in _IDLE_LEAVES
+
+
+def _category(stack: tuple[str, ...]) -> str:
+    for label in reversed(stack):
+        for name, markers in _CATEGORIES:
+            if any(m in label for m in markers):
+                return name
+    for label in reversed(stack):
+        if "(app/" in label:
+            return "app"
+    return "otros"
+
+
+class SamplingProfiler:
+    """Muestrea pilas de los hilos ocupados cada `interval` segundos."""
+
+    def __init__(self, interval: float = 0.001, max_depth: int = 128):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.samples: Counter = Counter()
+        self.total_samples = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _sample(self) -> None:
+        own = threading.get_ident()
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own or _is_idle(frame):
+                continue
+            stack = []
+            while frame is not None and len(stack) < self.max_depth:
+                stack.append(_frame_label(frame.f_code))
+                frame = frame.f_back
+            stack.reverse()
+            self.samples[tuple(stack)] += 1
+            self.total_samples += 1
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="poa-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    def folded(self) -> str:
+        """Formato de Brendan Gregg: `marco;marco;marco N` por línea."""
+        return "\n".join(f"{';'.join(stack)} {n}" for stack, n in self.samples.most_common())
+
+    def categories(self) -> dict[str, float]:
+        totals: Counter = Counter()
+        for stack, n in self.samples.items():
+            totals[_category(stack)] += n
+        total = sum(totals.values()) or 1
+        return {name: round(n / total * 100, 1) for name, n in totals.most_common()}
+
+    def tree(self) -> dict:
+        root = {"name": "request", "value": 0, "children": {}}
+        for stack, n in self.samples.items():
+            root["value"] += n
+            node = root
+            for label in stack:
+                node = node["children"].setdefault(label, {"name": label, "value": 0, "children": {}})
+                node["value"] += n
+
+        def to_list(node):
+            return {
+                "name": node["name"],
+                "value": node["value"],
+                "children": sorted((to_list(c) for c in node["children"].values()), key=lambda c: -c["value"]),
+            }
+        return to_list(root)
+
+
+_HTML = """<!DOCTYPE html>
+<html lang="es"><head><meta charset="utf-8"><title>Perfil __TITLE__</title>
+<style>
+body{font:12px -apple-system,Segoe UI,sans-serif;margin:16px;color:#1f2937}
+#fg{position:relative;width:100%}
+.f{position:absolute;height:17px;overflow:hidden;white-space:nowrap;border:1px solid #fff;
+   box-sizing:border-box;padding:0 3px;cursor:pointer;font-size:11px;line-height:15px}
+table{border-collapse:collapse;margin-top:16px}td,th{border:1px solid #e5e7eb;padding:3px 6px;text-align:left}
+code{font-size:11px}
+</style></head><body>
+<h2>__TITLE__</h2><p id="meta"></p><p id="cats"></p>
+<div id="fg"></div>
+<h3>SQL</h3><table id="sql"><tr><th>ms</th><th>sentencia</th></tr></table>
+<script>
+const P = __DATA__;
+document.getElementById("meta").textContent =
+  `${P.summary.duration_ms} ms totales · ${P.summary.sql_queries} sentencias SQL (${P.summary.sql_ms} ms) · ${P.summary.samples} muestras`;
+document.getElementById("cats").textContent =
+  Object.entries(P.summary.categories).map(([k, v]) => `${k}: ${v}%`).join(" · ");
+const fg = document.getElementById("fg"), W = fg.clientWidth;
+let depthMax = 0;
+function color(name) {
+  if (/sqlalchemy|sqlite3|psycopg/.test(name)) return "#93c5fd";
+  if (/pydantic/.test(name)) return "#c4b5fd";
+  if (/json|responses\\.py|encoders\\.py/.test(name)) return "#fcd34d";
+  if (/\\(app\\//.test(name)) return "#86efac";
+  return "#fca5a5";
+}
+function draw(node, x, depth, scale) {
+  const w = node.value * scale;
+  if (w < 1) return;
+  depthMax = Math.max(depthMax, depth);
+  const d = document.createElement("div");
+  d.className = "f";
+  d.style.left = x + "px"; d.style.top = depth * 17 + "px"; d.style.width = w + "px";
+  d.style.background = color(node.name);
+  d.title = `${node.name}\\n${node.value} muestras`;
+  d.textContent = node.name;
+  d.onclick = () => render(node);
+  fg.appendChild(d);
+  let cx = x;
+  for (const c of node.children) { draw(c, cx, depth + 1, scale); cx += c.value * scale; }
+}
+function render(node) {
+  fg.innerHTML = ""; depthMax = 0;
+  draw(node, 0, 0, node.value ? W / node.value : 0);
+  fg.style.height = (depthMax + 1) * 17 + "px";
+}
+fg.ondblclick = () => render(P.tree);
+render(P.tree);
+const t = document.getElementById("sql");
+for (const s of P.sql) {
+  const r = t.insertRow(); r.insertCell().textContent = s.ms;
+  const c = document.createElement("code"); c.textContent = s.statement; r.insertCell().appendChild(c);
+}
+</script></body></html>
+"""
+
+
+def render_html(profile: dict) -> str:
+    title = f"{profile['summary']['method']} {profile['summary']['path']}"
+    data = json.dumps(profile).replace("</", "<\\/")
+    return _HTML.replace("__TITLE__", title.replace("<", "&lt;")).replace("__DATA__", data)
+
+
+class ProfileStore:
+    """Perfiles en disco, conservando solo los `keep` más recientes."""
+
+    def __init__(self, directory: str, keep: int = 50):
+        self.directory = directory
+        self.keep = keep
+
+    def _path(self, profile_id: str, ext: str) -> str:
+        return os.path.join(self.directory, f"{profile_id}.{ext}")
+
+    def save(self, profile: dict) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self._path(profile["id"], "json"), "w", encoding="utf-8") as f:
+            json.dump(profile, f)
+        with open(self._path(profile["id"], "html"), "w", encoding="utf-8") as f:
+            f.write(render_html(profile))
+        self._prune()
+
+    def _prune(self) -> None:
+        files = sorted(
+            (os.path.join(self.directory, name) for name in os.listdir(self.directory) if name.endswith(".json")),
+            key=os.path.getmtime,
+        )
+        for path in files[:-self.keep] if self.keep else []:
+            for ext in ("json", "html"):
+                try:
+                    os.remove(path[:-4] + ext)
+                except FileNotFoundError:
+                    pass
+
+    def load(self, profile_id: str) -> Optional[dict]:
+        # Los IDs son hex; cualquier otra cosa no puede ser un perfil propio
+        if not profile_id.isalnum():
+            return None
+        try:
+            with open(self._path(profile_id, "json"), encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def html_path(self, profile_id: str) -> Optional[str]:
+        path = self._path(profile_id, "html")
+        return path if profile_id.isalnum() and os.path.exists(path) else None
+
+    def list(self) -> list[dict]:
+        if not os.path.isdir(self.directory):
+            return []
+        summaries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".json"):
+                profile = self.load(name[:-5])
+                if profile:
+                    summaries.append({"id": profile["id"], **profile["summary"]})
+        return sorted(summaries, key=lambda s: s["created_at"], reverse=True)
+
+
+class ProfilingMiddleware:
+    """Perfila requests marcados con `X-POA-Profile` y un token de administrador válido."""
+
+    def __init__(self, app, store: ProfileStore, admin_token: str, interval: float = 0.001):
+        self.app = app
+        self.store = store
+        self.admin_token = admin_token
+        self.interval = interval
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope.get("headers") or [])
+        if headers.get(PROFILE_HEADER, b"") not in (b"1", b"true"):
+            await self.app(scope, receive, send)
+            return
+
+        token = headers.get(TOKEN_HEADER)
+        if not admin_token_valid(self.admin_token, token.decode("latin-1") if token else None):
+            body = b'{"detail":"Token de administrador requerido para perfilar"}'
+            await send({"type": "http.response.start", "status": 403,
+                        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]})
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        profile_id = uuid.uuid4().hex
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [(b"x-poa-profile-id", profile_id.encode())]
+            await send(message)
+
+        # Reutiliza las estadísticas del MetricsMiddleware y activa la captura de SQL
+        stats = current_request_stats()
+        ctx_token = None
+        if stats is None:
+            stats, ctx_token = start_request_stats(capture_statements=True)
+        elif stats.statements is None:
+            stats.statements = []
+
+        profiler = SamplingProfiler(self.interval)
+        started = time.perf_counter()
+        profiler.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            profiler.stop()
+            elapsed = time.perf_counter() - started
+            if ctx_token is not None:
+                end_request_stats(ctx_token)
+            route = scope.get("route")
+            sql = [{"ms": round(sec * 1000, 3), "statement": statement} for statement, sec in stats.statements]
+            self.store.save({
+                "id": profile_id,
+                "summary": {
+                    "created_at": datetime.now().isoformat(),
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "route": getattr(route, "path", None),
+                    "status": status,
+                    "duration_ms": round(elapsed * 1000, 2),
+                    "sql_queries": len(sql),
+                    "sql_ms": round(sum(s["ms"] for s in sql), 2),
+                    "samples": profiler.total_samples,
+                    "interval_ms": self.interval * 1000,
+                    "categories": profiler.categories(),
+                },
+                "sql": sql,
+                "folded": profiler.folded(),
+                "tree": profiler.tree(),
+            })
@@ -0,0 +1,223 @@
+"""
+Presupuesto de consultas por ruta y detector de N+1
+
+Cada endpoint puede declarar cuántas sentencias SQL tiene permitidas con
+`@query_budget(n)`. Con `QUERY_BUDGET_MODE=warn` el middleware registra las
+rutas que se pasan y las sentencias con la misma forma repetidas más de
+`QUERY_REPEAT_THRESHOLD` veces (típico N+1); con `raise` además lanza
+`QueryBudgetExceeded`, lo que hace fallar las pruebas que usan `TestClient`.
+
+Para pruebas sin middleware:
+
+    with count_queries(engine) as q:
+        client.get("/api/companies")
+    q.assert_within(5)
+"""
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+import logging
+import re
+import threading
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.observability.context import current_request_stats, start_request_stats, end_request_stats
+
+logger = logging.getLogger("poa.querybudget")
+
+_WS = re.compile(r"\s+")
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\bIN\s*\((?:\s*(?:\?|%\(\w+\)s|:\w+|\$\d+|__\[POSTCOMPILE_\w+\])\s*,?)+\)", re.IGNORECASE)
+_POSTCOMPILE = re.compile(r"\(__\[POSTCOMPILE_\w+\]\)")
+
+
+def statement_shape(sql: str) -> str:
+    """Normaliza una sentencia: sin literales, listas IN colapsadas, espacios simples."""
+    shape = _WS.sub(" ", sql).strip()
+    shape = _STRING.sub("?", shape)
+    shape = _NUMBER.sub("?", shape)
+    shape = _POSTCOMPILE.sub("(...)", shape)
+    return _IN_LIST.sub("IN (...)", shape)
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Una ruta ejecutó más sentencias SQL que su presupuesto declarado."""
+
+
+def query_budget(max_queries: int) -> Callable:
+    """Declara el máximo de sentencias SQL permitidas para un endpoint."""
+    def decorator(func: Callable) -> Callable:
+        func.__query_budget__ = max_queries
+        return func
+    return decorator
+
+
+def repeated_shapes(statements: list[str], threshold: int) -> list[tuple[str, int]]:
+    """Formas de sentencia que aparecen más de `threshold` veces, de mayor a menor."""
+    counts = Counter(statement_shape(s) for s in statements)
+    return [(shape, n) for shape, n in counts.most_common() if n > threshold]
+
+
+@dataclass
+class RouteQueryStats:
+    route: str
+    budget: Optional[int] = None
+    requests: int = 0
+    total_queries: int = 0
+    max_queries: int = 0
+    violations: int = 0
+    # forma -> máximo de repeticiones vistas en un request
+    repeated: dict[str, int] = field(default_factory=dict)
+
+    @property
+    def avg_queries(self) -> float:
+        return self.total_queries / self.requests if self.requests else 0.0
+
+
+class QueryBudgetTracker:
+    """Acumula estadísticas por ruta para el reporte de peores infractores."""
+
+    def __init__(self):
+        self._routes: dict[str, RouteQueryStats] = {}
+        self._lock = threading.Lock()
+
+    def record(self, route: str, budget: Optional[int], queries: int, repeated: list[tuple[str, int]]) -> None:
+        with self._lock:
+            stats = self._routes.get(route)
+            if stats is None:
+                stats = self._routes[route] = RouteQueryStats(route=route)
+            stats.budget = budget
+            stats.requests += 1
+            stats.total_queries += queries
+            stats.max_queries = max(stats.max_queries, queries)
+            if budget is not None and queries > budget:
+                stats.violations += 1
+            for shape, n in repeated:
+                stats.repeated[shape] = max(stats.repeated.get(shape, 0), n)
+
+    def report(self, limit: int = 20) -> list[dict]:
+        """Rutas ordenadas por violaciones, luego por máximo de consultas."""
+        with self._lock:
+            routes = list(self._routes.values())
+        routes.sort(key=lambda r: (r.violations, max(r.repeated.values(), default=0), r.max_queries), reverse=True)
+        return [
+            {
+                "route": r.route,
+                "budget": r.budget,
+                "requests": r.requests,
+                "avg_queries": round(r.avg_queries, 1),
+                "max_queries": r.max_queries,
+                "violations": r.violations,
+                "repeated": [
+                    {"shape": shape[:300], "max_repeats": n}
+                    for shape, n in sorted(r.repeated.items(), key=lambda i: i[1], reverse=True)[:5]
+                ],
+            }
+            for r in routes[:limit]
+        ]
+
+    def format_report(self, limit: int = 20) -> str:
+        lines = [f"{'ruta':<45} {'presup.':>7} {'reqs':>6} {'prom':>6} {'máx':>5} {'viol':>5}"]
+        for r in self.report(limit):
+            budget = "-" if r["budget"] is None else str(r["budget"])
+            lines.append(
+                f"{r['route']:<45} {budget:>7} {r['requests']:>6} {r['avg_queries']:>6} {r['max_queries']:>5} {r['violations']:>5}"
+            )
+            for rep in r["repeated"]:
+                lines.append(f"    {rep['max_repeats']}x {rep['shape'][:120]}")
+        return "\n".join(lines)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._routes.clear()
+
+
+TRACKER = QueryBudgetTracker()
+
+
+class QueryBudgetMiddleware:
+    """Middleware ASGI que aplica los presupuestos declarados con `@query_budget`."""
+
+    def __init__(self, app, mode: str = "warn", repeat_threshold: int = 5, tracker: QueryBudgetTracker = TRACKER):
+        self.app = app
+        self.mode = mode
+        self.repeat_threshold = repeat_threshold
+        self.tracker = tracker
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        # Reutiliza las estadísticas del MetricsMiddleware si ya existen
+        stats = current_request_stats()
+        token = None
+        if stats is None:
+            stats, token = start_request_stats(capture_statements=True)
+        elif stats.statements is None:
+            stats.statements = []
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            if token is not None:
+                end_request_stats(token)
+
+        route = scope.get("route")
+        if route is None:
+            return
+        template = getattr(route, "path", "unmatched")
+        budget = getattr(getattr(route, "endpoint", None), "__query_budget__", None)
+        statements = [sql for sql, _ in stats.statements]
+        repeated = repeated_shapes(statements, self.repeat_threshold)
+        self.tracker.record(template, budget, len(statements), repeated)
+
+        for shape, n in repeated:
+            logger.warning("Posible N+1 en %s: %dx %s", template, n, shape[:200])
+        if budget is not None and len(statements) > budget:
+            message = f"{template} ejecutó {len(statements)} sentencias SQL (presupuesto: {budget})"
+            logger.warning(message)
+            if self.mode == "raise":
+                raise QueryBudgetExceeded(message)
+
+
+class QueryCounter:
+    """Resultado de `count_queries`: sentencias ejecutadas mientras estuvo activo."""
+
+    def __init__(self):
+        self.statements: list[str] = []
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    def repeated(self, threshold: int = 5) -> list[tuple[str, int]]:
+        return repeated_shapes(self.statements, threshold)
+
+    def assert_within(self, budget: int, repeat_threshold: Optional[int] = None) -> None:
+        if self.count > budget:
+            raise QueryBudgetExceeded(f"Se ejecutaron {self.count} sentencias SQL (presupuesto: {budget})")
+        if repeat_threshold is not None:
+            repeated = self.repeated(repeat_threshold)
+            if repeated:
+                shape, n = repeated[0]
+                raise QueryBudgetExceeded(f"Posible N+1: {n}x {shape[:200]}")
+
+
+@contextmanager
+def count_queries(engine: Engine):
+    """Cuenta todas las sentencias del engine (cualquier hilo) dentro del bloque."""
+    counter = QueryCounter()
+
+    def _listener(conn, cursor, statement, parameters, context, executemany):
+        counter.statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", _listener)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, "before_cursor_execute", _listener)
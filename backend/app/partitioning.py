@@ -0,0 +1,282 @@
+"""
+Particionamiento mensual de `cfdis` por `fecha_emision` (solo PostgreSQL)
+
+Para despliegues grandes: convierte la tabla en una tabla particionada por
+rango de mes, crea las particiones futuras por adelantado y permite separar
+(detach) las viejas, ya sea moviéndolas a un esquema de archivo o borrándolas.
+
+En PostgreSQL las llaves únicas de una tabla particionada deben incluir la
+llave de partición, así que la PK queda `(id, fecha_emision)` y la unicidad
+del UUID `(uuid, fecha_emision)`. Con `CFDI_PARTITIONED=true` el upsert de
+ingesta usa ese par como objetivo del ON CONFLICT.
+
+Uso (ventana de mantenimiento para `convert`):
+    python -m app.partitioning status
+    python -m app.partitioning convert --months-ahead 3
+    python -m app.partitioning ensure --months-ahead 3
+    python -m app.partitioning detach --older-than 2023-01 --archive-schema archivo
+    python -m app.partitioning detach --older-than 2023-01 --drop
+"""
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import Optional
+import argparse
+import logging
+import re
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+
+from app.config import settings
+
+logger = logging.getLogger("poa.partitioning")
+
+TABLE = "cfdis"
+DEFAULT_PARTITION = f"{TABLE}_default"
+_BOUND = re.compile(r"FROM \('([^']+)'\) TO \('([^']+)'\)")
+
+
+class PartitioningError(RuntimeError):
+    """Operación no soportada o estado inesperado de la tabla."""
+
+
+@dataclass
+class Partition:
+    name: str
+    schema: str
+    start: Optional[date]  # None para la partición DEFAULT
+    end: Optional[date]
+    rows: int = 0
+
+
+def add_months(d: date, months: int) -> date:
+    total = d.year * 12 + d.month - 1 + months
+    return date(total // 12, total % 12 + 1, 1)
+
+
+def month_start(d) -> date:
+    return date(d.year, d.month, 1)
+
+
+def partition_name(start: date) -> str:
+    return f"{TABLE}_y{start.year}m{start.month:02d}"
+
+
+def _require_postgres(conn: Connection) -> None:
+    if conn.dialect.name != "postgresql":
+        raise PartitioningError(f"El particionamiento solo está soportado en PostgreSQL (dialecto: {conn.dialect.name})")
+
+
+def is_partitioned(conn: Connection) -> bool:
+    _require_postgres(conn)
+    return bool(conn.execute(text(
+        "SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid "
+        "WHERE c.relname = :t AND pg_table_is_visible(c.oid)"
+    ), {"t": TABLE}).first())
+
+
+def list_partitions(conn: Connection, with_counts: bool = False) -> list[Partition]:
+    """Particiones adjuntas a `cfdis`, ordenadas por rango (DEFAULT al final)."""
+    rows = conn.execute(text(
+        "SELECT c.relname, n.nspname, pg_get_expr(c.relpartbound, c.oid) "
+        "FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid "
+        "JOIN pg_namespace n ON n.oid = c.relnamespace "
+        "WHERE i.inhparent = CAST(:t AS regclass)"
+    ), {"t": TABLE}).all()
+    partitions = []
+    for name, schema, bound in rows:
+        match = _BOUND.search(bound or "")
+        start = end = None
+        if match:
+            start = datetime.fromisoformat(match.group(1)).date()
+            end = datetime.fromisoformat(match.group(2)).date()
+        partitions.append(Partition(name=name, schema=schema, start=start, end=end))
+    if with_counts:
+        for p in partitions:
+            p.rows = conn.execute(text(f'SELECT count(*) FROM "{p.schema}"."{p.name}"')).scalar()
+    return sorted(partitions, key=lambda p: (p.start is None, p.start or date.min))
+
+
+def _create_partition(conn: Connection, start: date) -> str:
+    """
+    Crea la partición del mes `start`. Si la DEFAULT ya tiene filas de ese
+    mes, se crea como tabla suelta, se mueven las filas y luego se adjunta.
+    """
+    name = partition_name(start)
+    end = add_months(start, 1)
+    bounds = {"start": start, "end": end}
+    conn.execute(text(f'CREATE TABLE "{name}" (LIKE {TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)'))
+    has_default = conn.execute(text("SELECT to_regclass(:d) IS NOT NULL"), {"d": DEFAULT_PARTITION}).scalar()
+    if has_default:
+        conn.execute(text(
+            f'WITH moved AS (DELETE FROM {DEFAULT_PARTITION} '
+            f'WHERE fecha_emision >= :start AND fecha_emision < :end RETURNING *) '
+            f'INSERT INTO "{name}" SELECT * FROM moved'
+        ), bounds)
+    conn.execute(text(
+        f"ALTER TABLE {TABLE} ATTACH PARTITION \"{name}\" FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+    ))
+    return name
+
+
+def ensure_future_partitions(conn: Connection, months_ahead: int = 3, today: Optional[date] = None) -> list[str]:
+    """Crea las particiones faltantes desde el mes actual hasta `months_ahead` meses adelante."""
+    if not is_partitioned(conn):
+        raise PartitioningError(f"{TABLE} no está particionada; corre `convert` primero")
+    current = month_start(today or date.today())
+    existing = {p.start for p in list_partitions(conn) if p.start}
+    created = []
+    for i in range(months_ahead + 1):
+        start = add_months(current, i)
+        if start not in existing:
+            created.append(_create_partition(conn, start))
+    if created:
+        logger.info("Particiones creadas: %s", ", ".join(created))
+    return created
+
+
+def convert_to_partitioned(conn: Connection, months_ahead: int = 3, keep_legacy: bool = False) -> list[str]:
+    """
+    Reemplaza `cfdis` por una tabla particionada por mes con los mismos datos.
+    Corre en la transacción de `conn`; bloquea la tabla mientras copia.
+    """
+    _require_postgres(conn)
+    if is_partitioned(conn):
+        raise PartitioningError(f"{TABLE} ya está particionada")
+
+    legacy = f"{TABLE}_legacy"
+    conn.execute(text(f"LOCK TABLE {TABLE} IN ACCESS EXCLUSIVE MODE"))
+    conn.execute(text(f"ALTER TABLE {TABLE} RENAME TO {legacy}"))
+    # Los nombres de índices y constraints son globales al esquema: liberarlos para la tabla nueva
+    for (index,) in conn.execute(text(
+        "SELECT indexname FROM pg_indexes WHERE tablename = :t AND schemaname = current_schema()"
+    ), {"t": legacy}).all():
+        conn.execute(text(f'ALTER INDEX "{index}" RENAME TO "{index}_legacy"'))
+    for (constraint,) in conn.execute(text(
+        "SELECT conname FROM pg_constraint WHERE conrelid = CAST(:t AS regclass) AND contype = 'f'"
+    ), {"t": legacy}).all():
+        conn.execute(text(f'ALTER TABLE {legacy} RENAME CONSTRAINT "{constraint}" TO "{constraint}_legacy"'))
+
+    conn.execute(text(
+        f"CREATE TABLE {TABLE} (LIKE {legacy} INCLUDING DEFAULTS) PARTITION BY RANGE (fecha_emision)"
+    ))
+    # La secuencia del id pertenece a la tabla vieja; pasarla a la nueva antes de borrar nada
+    conn.execute(text(f"ALTER SEQUENCE IF EXISTS {TABLE}_id_seq OWNED BY {TABLE}.id"))
+    conn.execute(text(f"ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_pkey PRIMARY KEY (id, fecha_emision)"))
+    conn.execute(text(f"ALTER TABLE {TABLE} ADD CONSTRAINT uq_{TABLE}_uuid_fecha UNIQUE (uuid, fecha_emision)"))
+    conn.execute(text(
+        f"ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_company_id_fkey FOREIGN KEY (company_id) REFERENCES companies (id)"
+    ))
+    for name, columns in (
+        ("ix_cfdis_company_fecha", "(company_id, fecha_emision)"),
+        ("ix_cfdis_emisor_rfc", "(emisor_rfc)"),
+        ("ix_cfdis_receptor_rfc", "(receptor_rfc)"),
+        ("ix_cfdis_uuid", "(uuid)"),
+        ("ix_cfdis_id", "(id)"),
+        ("ix_cfdis_company_emisor_fecha", "(company_id, emisor_rfc, fecha_emision)"),
+        ("ix_cfdis_company_receptor_fecha", "(company_id, receptor_rfc, fecha_emision)"),
+        ("ix_cfdis_company_total", "(company_id, total)"),
+        ("ix_cfdis_company_folio", "(company_id, folio)"),
+        # Búsqueda por texto (pg_trgm, migración 0009)
+        ("ix_cfdis_emisor_nombre_trgm", "USING gin (emisor_nombre gin_trgm_ops)"),
+        ("ix_cfdis_receptor_nombre_trgm", "USING gin (receptor_nombre gin_trgm_ops)"),
+        ("ix_cfdis_uuid_trgm", "USING gin (uuid gin_trgm_ops)"),
+    ):
+        conn.execute(text(f"CREATE INDEX {name} ON {TABLE} {columns}"))
+
+    first, last = conn.execute(text(f"SELECT min(fecha_emision), max(fecha_emision) FROM {legacy}")).one()
+    current = month_start(date.today())
+    start = month_start(first) if first else current
+    end = max(add_months(current, months_ahead), month_start(last) if last else current)
+    created = []
+    while start <= end:
+        created.append(_create_partition(conn, start))
+        start = add_months(start, 1)
+    conn.execute(text(f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF {TABLE} DEFAULT"))
+
+    conn.execute(text(f"INSERT INTO {TABLE} SELECT * FROM {legacy}"))
+    if not keep_legacy:
+        conn.execute(text(f"DROP TABLE {legacy}"))
+    conn.execute(text(f"ANALYZE {TABLE}"))
+    logger.info("%s particionada en %d meses", TABLE, len(created))
+    return created
+
+
+def detach_partitions(
+    conn: Connection,
+    older_than: date,
+    archive_schema: Optional[str] = None,
+    drop: bool = False,
+) -> list[str]:
+    """
+    Separa las particiones cuyo rango termina antes de `older_than`. Se
+    mueven a `archive_schema` (consultables, fuera de los planes de la app)
+    o se borran con `drop=True`.
+    """
+    if not is_partitioned(conn):
+        raise PartitioningError(f"{TABLE} no está particionada")
+    if not drop and not archive_schema:
+        raise PartitioningError("Indica un esquema de archivo o drop=True")
+    if archive_schema:
+        conn.execute(text(f'CREATE SCHEMA IF NOT EXISTS "{archive_schema}"'))
+
+    detached = []
+    for p in list_partitions(conn):
+        if p.end is None or p.end > older_than:
+            continue
+        conn.execute(text(f'ALTER TABLE {TABLE} DETACH PARTITION "{p.schema}"."{p.name}"'))
+        if drop:
+            conn.execute(text(f'DROP TABLE "{p.schema}"."{p.name}"'))
+        else:
+            conn.execute(text(f'ALTER TABLE "{p.schema}"."{p.name}" SET SCHEMA "{archive_schema}"'))
+        detached.append(p.name)
+    if detached:
+        logger.info("Particiones %s: %s", "borradas" if drop else f"archivadas en {archive_schema}", ", ".join(detached))
+    return detached
+
+
+def _parse_month(value: str) -> date:
+    return datetime.strptime(value, "%Y-%m").date()
+
+
+def main(engine: Optional[Engine] = None) -> None:
+    parser = argparse.ArgumentParser(description="Particionamiento mensual de cfdis (PostgreSQL)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("status", help="Lista particiones y filas")
+    p_convert = sub.add_parser("convert", help="Convierte cfdis en tabla particionada")
+    p_convert.add_argument("--months-ahead", type=int, default=3)
+    p_convert.add_argument("--keep-legacy", action="store_true", help="Conservar cfdis_legacy")
+    p_ensure = sub.add_parser("ensure", help="Crea particiones futuras faltantes")
+    p_ensure.add_argument("--months-ahead", type=int, default=3)
+    p_detach = sub.add_parser("detach", help="Separa particiones viejas")
+    p_detach.add_argument("--older-than", type=_parse_month, required=True, help="AAAA-MM (exclusivo)")
+    group = p_detach.add_mutually_exclusive_group(required=True)
+    group.add_argument("--archive-schema")
+    group.add_argument("--drop", action="store_true")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(levelname)s %(message)s")
+
+    if engine is None:
+        from app.database import engine
+    with engine.begin() as conn:
+        if args.command == "status":
+            if not is_partitioned(conn):
+                print(f"{TABLE} no está particionada")
+                return
+            for p in list_partitions(conn, with_counts=True):
+                rango = f"{p.start} .. {p.end}" if p.start else "DEFAULT"
+                print(f"{p.name:<22} {rango:<26} {p.rows:>10} filas")
+        elif args.command == "convert":
+            created = convert_to_partitioned(conn, args.months_ahead, args.keep_legacy)
+            print(f"{len(created)} particiones mensuales creadas")
+            if not settings.CFDI_PARTITIONED:
+                print("Recuerda poner CFDI_PARTITIONED=true para que la ingesta use ON CONFLICT (uuid, fecha_emision)")
+        elif args.command == "ensure":
+            print(ensure_future_partitions(conn, args.months_ahead) or "Sin particiones nuevas")
+        elif args.command == "detach":
+            print(detach_partitions(conn, args.older_than, args.archive_schema, args.drop) or "Nada que separar")
+
+
+if __name__ == "__main__":
+    main()
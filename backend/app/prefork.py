@@ -0,0 +1,96 @@
+"""
+Despliegue multiproceso con gunicorn (--preload)
+
+El proceso maestro importa la app una sola vez y hace fork de cada worker.
+Los hooks de gunicorn.conf.py usan estas funciones:
+  - `warm_shared_state()` (maestro, antes del fork): importa los módulos
+    perezosos y carga los datos estáticos (catálogo c_ClaveProdServ,
+    escenarios de demo, catálogos de crédito) para que los workers los
+    hereden por copy-on-write en lugar de cargarlos cada uno.
+  - `freeze_heap()`: `gc.freeze()` mueve todo lo cargado a la generación
+    permanente; el recolector de los workers ya no lo recorre y no ensucia
+    esas páginas compartidas.
+  - `after_fork()` (worker): descarta las conexiones del pool heredadas del
+    maestro; un socket de base de datos no puede compartirse entre procesos.
+  - `RSSWatchdog` (worker): si el RSS del worker pasa WORKER_MAX_RSS_MB se
+    manda SIGTERM a sí mismo; gunicorn termina los requests en curso y
+    levanta un worker nuevo.
+"""
+from typing import Optional
+import gc
+import logging
+import os
+import signal
+import threading
+
+from app.config import settings
+
+logger = logging.getLogger("poa.prefork")
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def warm_shared_state() -> None:
+    """Carga en el maestro todo lo que los workers leen y nunca modifican."""
+    # Los módulos que app.main importa de forma perezosa (ver benchmarks/startup.py)
+    import bcrypt  # noqa: F401
+    import jose.jwt  # noqa: F401
+    import app.seeds  # noqa: F401
+    import app.services.cfo  # noqa: F401
+    from app.catalogs import clave_prod_serv_catalog
+    from app.seeds import scenarios_payload
+    from app.services.credit import catalog_payload
+
+    clave_prod_serv_catalog()
+    scenarios_payload()
+    catalog_payload()
+
+
+def freeze_heap() -> None:
+    gc.collect()
+    gc.freeze()
+
+
+def after_fork() -> None:
+    from app.database import engine
+    # close=False: no cerrar los sockets del maestro, solo olvidarlos en este proceso
+    engine.dispose(close=False)
+
+
+def rss_mb() -> float:
+    """RSS actual del proceso en MB (Linux: /proc/self/statm)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE / 2**20
+    except OSError:
+        import resource
+        # Sin /proc solo hay el máximo histórico (KB en Linux, bytes en macOS)
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class RSSWatchdog(threading.Thread):
+    """Recicla el worker (SIGTERM a sí mismo) cuando su RSS pasa `max_mb`."""
+
+    def __init__(self, max_mb: Optional[int] = None, interval: Optional[float] = None):
+        super().__init__(name="poa-rss-watchdog", daemon=True)
+        self.max_mb = max_mb if max_mb is not None else settings.WORKER_MAX_RSS_MB
+        self.interval = interval or settings.WORKER_RSS_CHECK_SECONDS
+        self.stop_event = threading.Event()
+
+    def run(self) -> None:
+        while not self.stop_event.wait(self.interval):
+            current = rss_mb()
+            if current > self.max_mb:
+                logger.warning("Worker %s con RSS de %.0f MB (límite %d MB); se recicla",
+                               os.getpid(), current, self.max_mb)
+                os.kill(os.getpid(), signal.SIGTERM)
+                return
+
+
+def start_rss_watchdog() -> Optional[RSSWatchdog]:
+    """Arranca el watchdog si WORKER_MAX_RSS_MB > 0."""
+    if settings.WORKER_MAX_RSS_MB <= 0:
+        return None
+    watchdog = RSSWatchdog()
+    watchdog.start()
+    return watchdog
@@ -0,0 +1,35 @@
+"""
+Respuestas JSON rápidas con orjson
+
+Los endpoints calientes arman dicts o tuplas directamente desde SQL y los
+regresan con `ORJSONResponse`, sin pasar por Pydantic ni `jsonable_encoder`.
+El decorador conserva `response_model` para el esquema de OpenAPI; FastAPI
+no revalida cuando el endpoint regresa un `Response`.
+
+La salida es equivalente a la de Pydantic: `Decimal` como cadena, enums por
+valor y fechas ISO 8601 (UTC con sufijo `Z`).
+"""
+from decimal import Decimal
+from typing import Any
+
+import orjson
+from fastapi.responses import JSONResponse
+
+_OPTIONS = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+
+
+def _default(obj: Any):
+    if isinstance(obj, Decimal):
+        return str(obj)
+    raise TypeError(f"Tipo no serializable: {type(obj).__name__}")
+
+
+def dumps(content: Any) -> bytes:
+    return orjson.dumps(content, default=_default, option=_OPTIONS)
+
+
+class ORJSONResponse(JSONResponse):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
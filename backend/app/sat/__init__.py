@@ -0,0 +1,13 @@
+"""
+Integración con el SAT (descarga masiva y consulta de estado simuladas)
+"""
+from app.sat.client import SATClient, SATPage, SATClientError, HTTPSATClient, get_sat_client
+from app.sat.status import SATStatusClient, StatusQuery, CFDIStatus, HTTPSATStatusClient, get_sat_status_client
+from app.sat.sync import SATSyncWorker, SyncReport
+from app.sat.verify import CancellationVerifier, VerifyReport
+
+__all__ = [
+    "SATClient", "SATPage", "SATClientError", "HTTPSATClient", "get_sat_client",
+    "SATStatusClient", "StatusQuery", "CFDIStatus", "HTTPSATStatusClient", "get_sat_status_client",
+    "SATSyncWorker", "SyncReport", "CancellationVerifier", "VerifyReport",
+]
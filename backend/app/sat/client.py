@@ -0,0 +1,107 @@
+"""
+Clientes del servicio de descarga de CFDIs del SAT
+
+`SATClient` es la interfaz que usa el worker de sincronización; las
+implementaciones concretas son `HTTPSATClient` (servicio real o el servidor
+falso de `app.sat.fake`) y `FakeSATClient` (en memoria, para pruebas).
+"""
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from datetime import datetime
+from decimal import Decimal
+from typing import Optional
+
+import httpx
+
+from app.config import settings
+from app.models.cfdi import TipoCFDI, EstadoCFDI
+
+
+class SATClientError(Exception):
+    """Error al consultar el SAT (reintentable con backoff)."""
+
+
+@dataclass
+class SATPage:
+    cfdis: list[dict]
+    page: int
+    has_more: bool
+    total: Optional[int] = None
+    extra: dict = field(default_factory=dict)
+
+
+class SATClient(ABC):
+    """Interfaz: CFDIs timbrados para un RFC en la ventana (since, until]."""
+
+    @abstractmethod
+    async def fetch_cfdis(
+        self,
+        rfc: str,
+        since: datetime,
+        until: datetime,
+        page: int = 1,
+        page_size: int = 500,
+    ) -> SATPage:
+        ...
+
+    async def aclose(self) -> None:
+        pass
+
+
+_DECIMAL_FIELDS = ("subtotal", "descuento", "iva", "isr_retenido", "iva_retenido", "total", "tipo_cambio")
+_DATETIME_FIELDS = ("fecha_emision", "fecha_timbrado", "fecha_cancelacion")
+
+
+def parse_cfdi(data: dict) -> dict:
+    """Convierte un CFDI del formato JSON del servicio a columnas de `CFDI`."""
+    row = dict(data)
+    for k in _DECIMAL_FIELDS:
+        if row.get(k) is not None:
+            row[k] = Decimal(str(row[k]))
+    for k in _DATETIME_FIELDS:
+        if row.get(k):
+            row[k] = datetime.fromisoformat(row[k])
+    row["tipo_comprobante"] = TipoCFDI(row["tipo_comprobante"])
+    row["estado"] = EstadoCFDI(row.get("estado") or EstadoCFDI.VIGENTE.value)
+    return row
+
+
+class HTTPSATClient(SATClient):
+    """Cliente HTTP (JSON) del servicio de descarga."""
+
+    def __init__(self, base_url: str, timeout: float = 30.0, transport: Optional[httpx.AsyncBaseTransport] = None):
+        self._client = httpx.AsyncClient(base_url=base_url, timeout=timeout, transport=transport)
+
+    async def fetch_cfdis(self, rfc, since, until, page=1, page_size=500) -> SATPage:
+        try:
+            res = await self._client.get("/cfdis", params={
+                "rfc": rfc,
+                "since": since.isoformat(),
+                "until": until.isoformat(),
+                "page": page,
+                "page_size": page_size,
+            })
+        except httpx.HTTPError as e:
+            raise SATClientError(str(e)) from e
+        if res.status_code != 200:
+            raise SATClientError(f"SAT respondió {res.status_code}: {res.text[:200]}")
+        body = res.json()
+        return SATPage(
+            cfdis=[parse_cfdi(c) for c in body["cfdis"]],
+            page=body["page"],
+            has_more=body["has_more"],
+            total=body.get("total"),
+        )
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
+
+def get_sat_client() -> SATClient:
+    """Cliente configurado por `SAT_CLIENT` ("http" o "fake" en memoria)."""
+    if settings.SAT_CLIENT == "http":
+        return HTTPSATClient(settings.SAT_BASE_URL)
+    if settings.SAT_CLIENT == "fake":
+        from app.sat.fake import FakeSATClient
+        return FakeSATClient()
+    raise ValueError(f"SAT_CLIENT desconocido: {settings.SAT_CLIENT!r}")
@@ -0,0 +1,172 @@
+"""
+SAT simulado para desarrollo y pruebas
+
+Genera CFDIs deterministas por RFC y día, de modo que pedir la misma ventana
+dos veces regresa exactamente los mismos UUIDs. La consulta de estado
+cancela de forma determinista una fracción de los UUIDs (`cancel_rate`).
+Se puede usar en memoria (`FakeSATClient`, `FakeSATStatusClient`) o como
+servidor HTTP local:
+
+    uvicorn app.sat.fake:app --port 8090
+    SAT_CLIENT=http SAT_BASE_URL=http://localhost:8090 python -m app.sat.sync
+"""
+from datetime import datetime, timedelta
+from typing import Optional
+import asyncio
+import hashlib
+import random
+import uuid
+
+from fastapi import FastAPI, Query, HTTPException
+
+from app.sat.client import SATClient, SATPage, SATClientError, parse_cfdi
+from app.sat.status import SATStatusClient, StatusQuery, CFDIStatus, VIGENTE, CANCELADO
+from app.seeds.seed_data import CLIENTES_FICTICIOS, PROVEEDORES_FICTICIOS, CLAVES_POR_SECTOR
+
+_NAMESPACE = uuid.UUID("6f1c1c52-6d7e-4f0b-9a57-0f5c3a0a9f11")
+
+
+class FakeSATService:
+    """Generador determinista de CFDIs timbrados."""
+
+    def __init__(
+        self,
+        cfdis_per_day: int = 8,
+        failure_rate: float = 0.0,
+        latency: float = 0.0,
+        cancel_rate: float = 0.02,
+    ):
+        self.cfdis_per_day = cfdis_per_day
+        self.failure_rate = failure_rate
+        self.latency = latency
+        self.cancel_rate = cancel_rate
+
+    def _day(self, rfc: str, day: datetime) -> list[dict]:
+        rng = random.Random(f"{rfc}:{day.date().isoformat()}")
+        cfdis = []
+        for i in range(rng.randint(0, self.cfdis_per_day * 2)):
+            ingreso = rng.random() < 0.7
+            contraparte = rng.choice(CLIENTES_FICTICIOS if ingreso else PROVEEDORES_FICTICIOS)
+            total = round(rng.uniform(2000, 60000), 2)
+            subtotal = round(total / 1.16, 2)
+            timbrado = day + timedelta(seconds=rng.randint(0, 86399))
+            cfdis.append({
+                "uuid": str(uuid.uuid5(_NAMESPACE, f"{rfc}:{day.date().isoformat()}:{i}")),
+                "folio": f"S-{day:%y%m%d}{i:03d}",
+                "serie": "S",
+                "tipo_comprobante": "I" if ingreso else "E",
+                "estado": "vigente",
+                "emisor_rfc": rfc if ingreso else contraparte[1],
+                "emisor_nombre": None if ingreso else contraparte[0],
+                "receptor_rfc": contraparte[1] if ingreso else rfc,
+                "receptor_nombre": contraparte[0] if ingreso else None,
+                "subtotal": str(subtotal),
+                "iva": str(round(total / 1.16 * 0.16, 2)),
+                "total": str(total),
+                "moneda": "MXN",
+                "fecha_emision": (timbrado - timedelta(minutes=rng.randint(1, 120))).isoformat(),
+                "fecha_timbrado": timbrado.isoformat(),
+                "uso_cfdi": "G03",
+                "metodo_pago": "PUE",
+                "forma_pago": "03",
+                "conceptos": [{"clave_prod_serv": rng.choice(CLAVES_POR_SECTOR["Comercio"]), "importe": str(subtotal)}],
+            })
+        return cfdis
+
+    def query(self, rfc: str, since: datetime, until: datetime, page: int, page_size: int) -> dict:
+        if self.failure_rate and random.random() < self.failure_rate:
+            raise SATClientError("Servicio no disponible (simulado)")
+
+        day = since.replace(hour=0, minute=0, second=0, microsecond=0)
+        window = []
+        while day <= until:
+            window.extend(
+                c for c in self._day(rfc, day)
+                if since < datetime.fromisoformat(c["fecha_timbrado"]) <= until
+            )
+            day += timedelta(days=1)
+        window.sort(key=lambda c: (c["fecha_timbrado"], c["uuid"]))
+
+        start = (page - 1) * page_size
+        return {
+            "cfdis": window[start:start + page_size],
+            "page": page,
+            "has_more": start + page_size < len(window),
+            "total": len(window),
+        }
+
+    def status(self, uuid_: str) -> dict:
+        if self.failure_rate and random.random() < self.failure_rate:
+            raise SATClientError("Servicio no disponible (simulado)")
+        # El mismo UUID siempre da la misma respuesta
+        draw = int.from_bytes(hashlib.sha256(uuid_.lower().encode()).digest()[:4], "big") / 2 ** 32
+        if draw < self.cancel_rate:
+            return {"estado": CANCELADO, "estatus_cancelacion": "Cancelado sin aceptación"}
+        return {"estado": VIGENTE, "estatus_cancelacion": None}
+
+
+class FakeSATClient(SATClient):
+    """Cliente en memoria sobre `FakeSATService` (sin red)."""
+
+    def __init__(self, service: Optional[FakeSATService] = None):
+        self.service = service or FakeSATService()
+        self.calls = 0
+
+    async def fetch_cfdis(self, rfc, since, until, page=1, page_size=500) -> SATPage:
+        self.calls += 1
+        if self.service.latency:
+            await asyncio.sleep(self.service.latency)
+        body = self.service.query(rfc, since, until, page, page_size)
+        return SATPage(
+            cfdis=[parse_cfdi(c) for c in body["cfdis"]],
+            page=body["page"],
+            has_more=body["has_more"],
+            total=body["total"],
+        )
+
+
+class FakeSATStatusClient(SATStatusClient):
+    """Cliente de consulta de estado en memoria sobre `FakeSATService`."""
+
+    def __init__(self, service: Optional[FakeSATService] = None):
+        self.service = service or FakeSATService()
+        self.calls = 0
+
+    async def get_status(self, query: StatusQuery) -> CFDIStatus:
+        self.calls += 1
+        if self.service.latency:
+            await asyncio.sleep(self.service.latency)
+        body = self.service.status(query.uuid)
+        return CFDIStatus(query.uuid, body["estado"], body["estatus_cancelacion"])
+
+
+# Servidor HTTP local con el mismo contrato que `HTTPSATClient` y `HTTPSATStatusClient`
+service = FakeSATService()
+app = FastAPI(title="SAT simulado", docs_url="/docs")
+
+
+@app.get("/cfdis")
+def list_cfdis(
+    rfc: str = Query(..., min_length=12, max_length=13),
+    since: datetime = Query(...),
+    until: datetime = Query(...),
+    page: int = Query(1, ge=1),
+    page_size: int = Query(500, ge=1, le=5000),
+):
+    try:
+        return service.query(rfc, since, until, page, page_size)
+    except SATClientError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+
+@app.get("/status")
+def cfdi_status(
+    uuid_: str = Query(..., alias="id", min_length=36, max_length=36),
+    emisor_rfc: str = Query(..., alias="re"),
+    receptor_rfc: str = Query(..., alias="rr"),
+    total: str = Query(..., alias="tt"),
+):
+    try:
+        return service.status(uuid_)
+    except SATClientError as e:
+        raise HTTPException(status_code=503, detail=str(e))
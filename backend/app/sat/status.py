@@ -0,0 +1,110 @@
+"""
+Clientes del servicio de consulta de estado de CFDIs del SAT
+
+El servicio responde un CFDI a la vez a partir de la expresión impresa
+(UUID, RFC emisor, RFC receptor y total). `SATStatusClient` es la interfaz
+que usa el verificador de cancelaciones (app/sat/verify.py); las
+implementaciones son `HTTPSATStatusClient` (servicio con el contrato JSON del
+SAT simulado de `app.sat.fake`) y `FakeSATStatusClient` (en memoria).
+"""
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import Optional
+import asyncio
+import time
+
+import httpx
+
+from app.config import settings
+from app.sat.client import SATClientError
+
+# Valores de `Estado` en la respuesta del SAT
+VIGENTE = "Vigente"
+CANCELADO = "Cancelado"
+NO_ENCONTRADO = "No Encontrado"
+
+
+@dataclass(frozen=True)
+class StatusQuery:
+    uuid: str
+    emisor_rfc: str
+    receptor_rfc: str
+    total: Decimal
+
+
+@dataclass(frozen=True)
+class CFDIStatus:
+    uuid: str
+    estado: str  # VIGENTE, CANCELADO o NO_ENCONTRADO
+    estatus_cancelacion: Optional[str] = None  # "En proceso", "Cancelado sin aceptación", ...
+
+
+class SATStatusClient(ABC):
+    """Interfaz: estado de un CFDI ante el SAT."""
+
+    @abstractmethod
+    async def get_status(self, query: StatusQuery) -> CFDIStatus:
+        ...
+
+    async def aclose(self) -> None:
+        pass
+
+
+class HTTPSATStatusClient(SATStatusClient):
+    """Cliente HTTP (JSON) del servicio de consulta de estado."""
+
+    def __init__(self, base_url: str, timeout: float = 10.0, transport: Optional[httpx.AsyncBaseTransport] = None):
+        self._client = httpx.AsyncClient(base_url=base_url, timeout=timeout, transport=transport)
+
+    async def get_status(self, query: StatusQuery) -> CFDIStatus:
+        try:
+            res = await self._client.get("/status", params={
+                "id": query.uuid,
+                "re": query.emisor_rfc,
+                "rr": query.receptor_rfc,
+                "tt": str(query.total),
+            })
+        except httpx.HTTPError as e:
+            raise SATClientError(str(e)) from e
+        if res.status_code != 200:
+            raise SATClientError(f"SAT respondió {res.status_code}: {res.text[:200]}")
+        body = res.json()
+        return CFDIStatus(query.uuid, body["estado"], body.get("estatus_cancelacion"))
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
+
+class RateLimiter:
+    """Cubeta de fichas compartida: a lo más `rate` consultas por segundo (0 = sin límite)."""
+
+    def __init__(self, rate: float, burst: Optional[int] = None):
+        self.rate = rate
+        self.capacity = burst or max(1, int(rate))
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+def get_sat_status_client() -> SATStatusClient:
+    """Cliente configurado por `SAT_CLIENT` ("http" o "fake" en memoria)."""
+    if settings.SAT_CLIENT == "http":
+        return HTTPSATStatusClient(settings.SAT_BASE_URL)
+    if settings.SAT_CLIENT == "fake":
+        from app.sat.fake import FakeSATStatusClient
+        return FakeSATStatusClient()
+    raise ValueError(f"SAT_CLIENT desconocido: {settings.SAT_CLIENT!r}")
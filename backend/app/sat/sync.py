@@ -0,0 +1,261 @@
+"""
+Sincronización incremental con el SAT
+
+Para cada empresa con `sat_connected`, pide al `SATClient` solo los CFDIs
+timbrados después de su marca de agua (`sat_last_sync`), pagina los
+resultados, los escribe con upserts por lote y avanza la marca de agua al
+final de la ventana. Muchas empresas se procesan en paralelo con un semáforo
+acotado; las que fallan entran en backoff exponencial por empresa, guardado
+en `companies` (sat_sync_failures, sat_sync_retry_at) para que cada trabajo
+`sat_sync`, proceso o reinicio lo respete.
+
+Uso:
+    python -m app.sat.sync                      # una corrida
+    python -m app.sat.sync --interval 900       # programada cada 15 min
+"""
+from dataclasses import dataclass, field, asdict
+from datetime import datetime, timedelta
+from typing import Optional
+import argparse
+import asyncio
+import logging
+import random
+import time
+
+from sqlalchemy import select, update
+
+from app.changes import bump_version
+from app.config import settings
+from app.database import SessionLocal
+from app.models import Company
+from app.sat.client import SATClient, SATClientError, get_sat_client
+from app.services.ingest import upsert_cfdis
+
+logger = logging.getLogger("poa.sat.sync")
+
+
+def _naive(dt: datetime) -> datetime:
+    """Fechas locales sin zona, como las maneja el resto de la app."""
+    return dt.astimezone().replace(tzinfo=None) if dt.tzinfo else dt
+
+
+@dataclass
+class CompanySyncResult:
+    company_id: int
+    rfc: str
+    cfdis: int = 0
+    pages: int = 0
+    attempts: int = 0
+    seconds: float = 0.0
+    watermark: Optional[datetime] = None
+    error: Optional[str] = None
+    skipped: bool = False
+
+
+@dataclass
+class SyncReport:
+    started_at: datetime
+    seconds: float = 0.0
+    companies: int = 0
+    synced: int = 0
+    failed: int = 0
+    skipped: int = 0
+    cfdis: int = 0
+    pages: int = 0
+    cfdis_per_second: float = 0.0
+    results: list[CompanySyncResult] = field(default_factory=list)
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+class SATSyncWorker:
+    """Worker de sincronización; el backoff por empresa vive en la base."""
+
+    def __init__(
+        self,
+        client: SATClient,
+        concurrency: Optional[int] = None,
+        page_size: Optional[int] = None,
+        max_retries: Optional[int] = None,
+        backoff_base: Optional[float] = None,
+    ):
+        self.client = client
+        self.concurrency = concurrency or settings.SAT_SYNC_CONCURRENCY
+        self.page_size = page_size or settings.SAT_SYNC_PAGE_SIZE
+        self.max_retries = max_retries if max_retries is not None else settings.SAT_SYNC_MAX_RETRIES
+        self.backoff_base = backoff_base if backoff_base is not None else settings.SAT_SYNC_BACKOFF_SECONDS
+
+    def _companies(self, company_ids: Optional[list[int]]) -> list[tuple]:
+        """(id, rfc, sat_last_sync, sat_sync_failures, sat_sync_retry_at) de las empresas conectadas."""
+        db = SessionLocal()
+        try:
+            query = select(
+                Company.id, Company.rfc, Company.sat_last_sync, Company.sat_sync_failures, Company.sat_sync_retry_at,
+            ).where(Company.sat_connected.is_(True))
+            if company_ids:
+                query = query.where(Company.id.in_(company_ids))
+            return [tuple(r) for r in db.execute(query.order_by(Company.id)).all()]
+        finally:
+            db.close()
+
+    def _write_page(self, company_id: int, rows: list[dict]) -> int:
+        db = SessionLocal()
+        try:
+            written = upsert_cfdis(db, company_id, rows)
+            db.commit()
+            return written
+        finally:
+            db.close()
+
+    def _advance_watermark(self, company_id: int, watermark: datetime) -> None:
+        db = SessionLocal()
+        try:
+            db.execute(
+                update(Company).where(Company.id == company_id)
+                .values(sat_last_sync=watermark, sat_sync_failures=0, sat_sync_retry_at=None)
+            )
+            bump_version(db, company_id)
+            db.commit()
+        finally:
+            db.close()
+
+    def _record_failure(self, company_id: int, failures: int, retry_at: datetime) -> None:
+        db = SessionLocal()
+        try:
+            db.execute(
+                update(Company).where(Company.id == company_id)
+                .values(sat_sync_failures=failures, sat_sync_retry_at=retry_at)
+            )
+            db.commit()
+        finally:
+            db.close()
+
+    async def _pull(self, company_id: int, rfc: str, since: datetime, until: datetime, result: CompanySyncResult) -> None:
+        page = 1
+        while True:
+            sat_page = await self.client.fetch_cfdis(rfc, since, until, page=page, page_size=self.page_size)
+            if sat_page.cfdis:
+                result.cfdis += await asyncio.to_thread(self._write_page, company_id, sat_page.cfdis)
+            result.pages += 1
+            if not sat_page.has_more:
+                break
+            page += 1
+
+    async def sync_company(
+        self,
+        company_id: int,
+        rfc: str,
+        last_sync: Optional[datetime],
+        until: datetime,
+        semaphore: asyncio.Semaphore,
+        failures: int = 0,
+        retry_at: Optional[datetime] = None,
+    ) -> CompanySyncResult:
+        result = CompanySyncResult(company_id=company_id, rfc=rfc)
+        if retry_at and _naive(retry_at) > until:
+            result.skipped = True
+            return result
+
+        since = _naive(last_sync) if last_sync else until - timedelta(days=settings.SAT_INITIAL_SYNC_DAYS)
+        async with semaphore:
+            started = time.perf_counter()
+            for attempt in range(1, self.max_retries + 2):
+                result.attempts = attempt
+                try:
+                    # Los upserts son idempotentes: reintentar la ventana completa es seguro
+                    await self._pull(company_id, rfc, since, until, result)
+                    await asyncio.to_thread(self._advance_watermark, company_id, until)
+                    result.watermark = until
+                    result.error = None
+                    break
+                except Exception as e:
+                    # Errores del SAT o de la base (IntegrityError, "database is locked"): quedan en
+                    # esta empresa para no tirar la corrida ni los resultados de las demás
+                    if isinstance(e, SATClientError):
+                        result.error = str(e)
+                    else:
+                        logger.exception("Error al sincronizar %s (intento %d)", rfc, attempt)
+                        result.error = f"{type(e).__name__}: {e}"
+                    if attempt > self.max_retries:
+                        break
+                    delay = self.backoff_base * 2 ** (attempt - 1)
+                    await asyncio.sleep(delay * random.uniform(0.5, 1.5))
+            result.seconds = time.perf_counter() - started
+
+        if result.error:
+            failures += 1
+            cooldown = min(settings.SAT_SYNC_MAX_COOLDOWN_SECONDS, self.backoff_base * 2 ** (failures + self.max_retries))
+            logger.warning("Sync de %s falló (%s); siguiente intento en %.0fs", rfc, result.error, cooldown)
+            retry_at = datetime.now() + timedelta(seconds=cooldown)
+            try:
+                await asyncio.to_thread(self._record_failure, company_id, failures, retry_at)
+            except Exception:
+                logger.exception("No se pudo guardar el backoff de %s", rfc)
+        return result
+
+    async def run(self, company_ids: Optional[list[int]] = None) -> SyncReport:
+        """Una corrida sobre todas las empresas conectadas (o `company_ids`)."""
+        report = SyncReport(started_at=datetime.now())
+        until = report.started_at
+        started = time.perf_counter()
+
+        companies = await asyncio.to_thread(self._companies, company_ids)
+        semaphore = asyncio.Semaphore(self.concurrency)
+        report.results = await asyncio.gather(*(
+            self.sync_company(cid, rfc, last_sync, until, semaphore, failures, retry_at)
+            for cid, rfc, last_sync, failures, retry_at in companies
+        ))
+
+        report.seconds = time.perf_counter() - started
+        report.companies = len(companies)
+        for r in report.results:
+            report.cfdis += r.cfdis
+            report.pages += r.pages
+            if r.skipped:
+                report.skipped += 1
+            elif r.error:
+                report.failed += 1
+            else:
+                report.synced += 1
+        report.cfdis_per_second = round(report.cfdis / report.seconds, 1) if report.seconds else 0.0
+        logger.info(
+            "Sync SAT: %d empresas (%d ok, %d fallidas, %d en backoff), %d CFDIs en %.2fs (%.0f CFDIs/s)",
+            report.companies, report.synced, report.failed, report.skipped,
+            report.cfdis, report.seconds, report.cfdis_per_second,
+        )
+        return report
+
+    async def run_forever(self, interval: float) -> None:
+        """Corridas programadas cada `interval` segundos."""
+        while True:
+            started = time.monotonic()
+            await self.run()
+            await asyncio.sleep(max(0.0, interval - (time.monotonic() - started)))
+
+
+async def _main(args) -> None:
+    client = get_sat_client()
+    worker = SATSyncWorker(client, concurrency=args.concurrency, page_size=args.page_size)
+    try:
+        if args.interval:
+            await worker.run_forever(args.interval)
+        else:
+            await worker.run(args.company or None)
+    finally:
+        await client.aclose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Sincronización incremental de CFDIs con el SAT")
+    parser.add_argument("--company", type=int, action="append", help="Solo estas empresas (repetible)")
+    parser.add_argument("--concurrency", type=int, default=settings.SAT_SYNC_CONCURRENCY)
+    parser.add_argument("--page-size", type=int, default=settings.SAT_SYNC_PAGE_SIZE)
+    parser.add_argument("--interval", type=float, default=0, help="Segundos entre corridas (0 = una sola)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(levelname)s %(message)s")
+    asyncio.run(_main(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+"""
+Verificación de cancelaciones con el SAT
+
+Un CFDI se puede cancelar después de timbrado, y la descarga incremental no
+se entera: hay que preguntar su estado al SAT, un CFDI a la vez. Para que
+eso escale solo se consultan los CFDIs cuyo estado todavía puede cambiar:
+vigentes, emitidos en los últimos SAT_STATUS_WINDOW_DAYS y sin verificación
+en las últimas SAT_STATUS_RECHECK_HOURS (`cfdi_status_checks` guarda la
+última respuesta de cada uno).
+
+Por empresa se recorren los candidatos en bloques de SAT_STATUS_BATCH_SIZE
+(keyset por id). Las consultas de un bloque corren en paralelo, acotadas por
+un semáforo y un límite de consultas por segundo compartidos por todas las
+empresas. Las cancelaciones de cada bloque se aplican con UPDATEs masivos
+que además recalculan acumulados, conceptos y saldos (ver
+`apply_cancellations`). Un CFDI cuya consulta falla se reintenta en la
+siguiente corrida.
+
+Uso:
+    python -m app.sat.verify                    # una corrida
+    python -m app.sat.verify --interval 3600    # programada cada hora
+"""
+from dataclasses import dataclass, field, asdict
+from datetime import datetime, timedelta
+from typing import Optional
+import argparse
+import asyncio
+import logging
+import random
+import time
+
+from sqlalchemy import select, delete, insert, and_, or_
+
+from app.config import settings
+from app.database import SessionLocal
+from app.models import Company, CFDI, CFDIStatusCheck
+from app.models.cfdi import EstadoCFDI
+from app.sat.client import SATClientError
+from app.sat.status import SATStatusClient, StatusQuery, CFDIStatus, RateLimiter, CANCELADO, get_sat_status_client
+from app.services.ingest import apply_cancellations
+
+logger = logging.getLogger("poa.sat.verify")
+
+_BATCH = 500
+
+
+@dataclass
+class CompanyVerifyResult:
+    company_id: int
+    rfc: str
+    checked: int = 0
+    cancelled: int = 0
+    failed: int = 0
+    seconds: float = 0.0
+
+
+@dataclass
+class VerifyReport:
+    started_at: datetime
+    seconds: float = 0.0
+    companies: int = 0
+    checked: int = 0
+    cancelled: int = 0
+    failed: int = 0
+    checks_per_second: float = 0.0
+    results: list[CompanyVerifyResult] = field(default_factory=list)
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+class CancellationVerifier:
+    """Worker de verificación de estado; un `RateLimiter` por worker."""
+
+    def __init__(
+        self,
+        client: SATStatusClient,
+        concurrency: Optional[int] = None,
+        rate_per_second: Optional[float] = None,
+        batch_size: Optional[int] = None,
+        window_days: Optional[int] = None,
+        recheck_hours: Optional[int] = None,
+        max_retries: Optional[int] = None,
+        backoff_base: Optional[float] = None,
+    ):
+        self.client = client
+        self.concurrency = concurrency or settings.SAT_STATUS_CONCURRENCY
+        rate = rate_per_second if rate_per_second is not None else settings.SAT_STATUS_RATE_PER_SECOND
+        self.limiter = RateLimiter(rate)
+        self.batch_size = batch_size or settings.SAT_STATUS_BATCH_SIZE
+        self.window_days = window_days or settings.SAT_STATUS_WINDOW_DAYS
+        self.recheck_hours = recheck_hours if recheck_hours is not None else settings.SAT_STATUS_RECHECK_HOURS
+        self.max_retries = max_retries if max_retries is not None else settings.SAT_STATUS_MAX_RETRIES
+        self.backoff_base = backoff_base if backoff_base is not None else settings.SAT_SYNC_BACKOFF_SECONDS
+
+    def _companies(self, company_ids: Optional[list[int]]) -> list[tuple[int, str]]:
+        db = SessionLocal()
+        try:
+            query = select(Company.id, Company.rfc).where(Company.sat_connected.is_(True))
+            if company_ids:
+                query = query.where(Company.id.in_(company_ids))
+            return [tuple(r) for r in db.execute(query.order_by(Company.id)).all()]
+        finally:
+            db.close()
+
+    def _candidates(self, company_id: int, now: datetime, after_id: int) -> list[tuple[int, StatusQuery]]:
+        """Siguiente bloque de CFDIs por verificar con id mayor a `after_id`."""
+        check = CFDIStatusCheck
+        db = SessionLocal()
+        try:
+            rows = db.execute(
+                select(CFDI.id, CFDI.uuid, CFDI.emisor_rfc, CFDI.receptor_rfc, CFDI.total)
+                .outerjoin(check, and_(check.company_id == CFDI.company_id, check.cfdi_uuid == CFDI.uuid))
+                .where(
+                    CFDI.company_id == company_id,
+                    CFDI.id > after_id,
+                    CFDI.fecha_emision >= now - timedelta(days=self.window_days),
+                    or_(CFDI.estado.is_(None), CFDI.estado == EstadoCFDI.VIGENTE),
+                    or_(check.verificado_at.is_(None), check.verificado_at < now - timedelta(hours=self.recheck_hours)),
+                )
+                .order_by(CFDI.id)
+                .limit(self.batch_size)
+            ).all()
+            return [(r.id, StatusQuery(r.uuid, r.emisor_rfc, r.receptor_rfc, r.total)) for r in rows]
+        finally:
+            db.close()
+
+    def _apply(self, company_id: int, statuses: list[CFDIStatus], now: datetime) -> int:
+        """Aplica las cancelaciones del bloque y guarda la verificación de cada CFDI."""
+        db = SessionLocal()
+        try:
+            cancelled = apply_cancellations(db, company_id, (s.uuid for s in statuses if s.estado == CANCELADO), now)
+            uuids = [s.uuid for s in statuses]
+            for i in range(0, len(uuids), _BATCH):
+                db.execute(
+                    delete(CFDIStatusCheck)
+                    .where(CFDIStatusCheck.company_id == company_id, CFDIStatusCheck.cfdi_uuid.in_(uuids[i:i + _BATCH]))
+                    .execution_options(synchronize_session=False)
+                )
+            if statuses:
+                db.execute(insert(CFDIStatusCheck), [
+                    {"company_id": company_id, "cfdi_uuid": s.uuid, "estado_sat": s.estado,
+                     "estatus_cancelacion": s.estatus_cancelacion, "verificado_at": now}
+                    for s in statuses
+                ])
+            db.commit()
+            return cancelled
+        finally:
+            db.close()
+
+    async def _check(self, query: StatusQuery, semaphore: asyncio.Semaphore) -> Optional[CFDIStatus]:
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with semaphore:
+                    await self.limiter.acquire()
+                    return await self.client.get_status(query)
+            except SATClientError as e:
+                if attempt == self.max_retries:
+                    logger.debug("Estado de %s sin respuesta: %s", query.uuid, e)
+                    return None
+            await asyncio.sleep(self.backoff_base * 2 ** attempt * random.uniform(0.5, 1.5))
+        return None
+
+    async def verify_company(
+        self, company_id: int, rfc: str, now: datetime, semaphore: asyncio.Semaphore,
+    ) -> CompanyVerifyResult:
+        result = CompanyVerifyResult(company_id=company_id, rfc=rfc)
+        started = time.perf_counter()
+        after_id = 0
+        while True:
+            batch = await asyncio.to_thread(self._candidates, company_id, now, after_id)
+            if not batch:
+                break
+            after_id = batch[-1][0]
+            statuses = await asyncio.gather(*(self._check(query, semaphore) for _, query in batch))
+            answered = [s for s in statuses if s is not None]
+            result.checked += len(answered)
+            result.failed += len(batch) - len(answered)
+            result.cancelled += await asyncio.to_thread(self._apply, company_id, answered, now)
+            if len(batch) < self.batch_size:
+                break
+        result.seconds = time.perf_counter() - started
+        return result
+
+    async def run(self, company_ids: Optional[list[int]] = None) -> VerifyReport:
+        """Una corrida sobre todas las empresas conectadas (o `company_ids`)."""
+        report = VerifyReport(started_at=datetime.now())
+        started = time.perf_counter()
+
+        companies = await asyncio.to_thread(self._companies, company_ids)
+        semaphore = asyncio.Semaphore(self.concurrency)
+        report.results = await asyncio.gather(*(
+            self.verify_company(cid, rfc, report.started_at, semaphore) for cid, rfc in companies
+        ))
+
+        report.seconds = time.perf_counter() - started
+        report.companies = len(companies)
+        for r in report.results:
+            report.checked += r.checked
+            report.cancelled += r.cancelled
+            report.failed += r.failed
+        report.checks_per_second = round(report.checked / report.seconds, 1) if report.seconds else 0.0
+        logger.info(
+            "Verificación SAT: %d empresas, %d CFDIs consultados (%d cancelados, %d sin respuesta) en %.2fs (%.0f/s)",
+            report.companies, report.checked, report.cancelled, report.failed, report.seconds, report.checks_per_second,
+        )
+        return report
+
+    async def run_forever(self, interval: float) -> None:
+        """Corridas programadas cada `interval` segundos."""
+        while True:
+            started = time.monotonic()
+            await self.run()
+            await asyncio.sleep(max(0.0, interval - (time.monotonic() - started)))
+
+
+async def _main(args) -> None:
+    client = get_sat_status_client()
+    worker = CancellationVerifier(client, concurrency=args.concurrency, rate_per_second=args.rate)
+    try:
+        if args.interval:
+            await worker.run_forever(args.interval)
+        else:
+            await worker.run(args.company or None)
+    finally:
+        await client.aclose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Verificación de cancelaciones de CFDIs con el SAT")
+    parser.add_argument("--company", type=int, action="append", help="Solo estas empresas (repetible)")
+    parser.add_argument("--concurrency", type=int, default=settings.SAT_STATUS_CONCURRENCY)
+    parser.add_argument("--rate", type=float, default=settings.SAT_STATUS_RATE_PER_SECOND,
+                        help="Consultas por segundo (0 = sin límite)")
+    parser.add_argument("--interval", type=float, default=0, help="Segundos entre corridas (0 = una sola)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(levelname)s %(message)s")
+    asyncio.run(_main(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -3,7 +3,7 @@ Schemas Pydantic para validación y serialización
 """
 from app.schemas.user import UserCreate, UserResponse, UserLogin
 from app.schemas.company import CompanyCreate, CompanyResponse, CompanyWithStats
-from app.schemas.cfdi import CFDICreate, CFDIResponse, CFDIUpload
+from app.schemas.cfdi import CFDICreate, CFDIResponse, CFDIDetailResponse, CFDIUpload
 from app.schemas.analytics import (
     DashboardStats,
     RevenueData,
@@ -17,7 +17,7 @@ from app.schemas.analytics import (
 __all__ = [
     "UserCreate", "UserResponse", "UserLogin",
     "CompanyCreate", "CompanyResponse", "CompanyWithStats",
-    "CFDICreate", "CFDIResponse", "CFDIUpload",
+    "CFDICreate", "CFDIResponse", "CFDIDetailResponse", "CFDIUpload",
     "DashboardStats", "RevenueData", "TopClient", "TopProvider",
     "CashFlowData", "SemaforoItem", "HealthScoreResponse",
 ]
@@ -7,6 +7,7 @@ from datetime import datetime
 
 
 class RevenueData(BaseModel):
+    periodo: str  # YYYY-MM, para ubicar los deltas del feed de cambios
     mes: str
     ingresos: float
     egresos: float
@@ -33,6 +34,25 @@ class TopProvider(BaseModel):
     tendencia: str
 
 
+class CounterpartyRanking(BaseModel):
+    rol: str  # "cliente" | "proveedor"
+    desde: Optional[str] = None  # "AAAA-MM", incluido
+    hasta: Optional[str] = None  # "AAAA-MM", incluido
+    contrapartes: List[TopClient]
+
+
+class AgingBucket(BaseModel):
+    rango: str  # "0-30" | "31-60" | "61-90" | "90+" (días desde la emisión)
+    saldo: float
+    facturas: int
+
+
+class ReceivablesAging(BaseModel):
+    saldo_total: float
+    score: int  # 0-100, ponderado por tramo
+    tramos: List[AgingBucket]
+
+
 class SemaforoItem(BaseModel):
     nombre: str
     estado: str  # "verde" | "amarillo" | "rojo"
@@ -85,3 +105,11 @@ class DashboardStats(BaseModel):
     # Metadata
     total_cfdis: int
     last_sync: Optional[datetime] = None
+
+
+class CompanyBundle(BaseModel):
+    """Secciones pedidas en `include`; cada una con la forma de su endpoint individual."""
+    dashboard: Optional[DashboardStats] = None
+    health: Optional[HealthScoreResponse] = None
+    predictions: Optional[dict] = None
+    credit: Optional[dict] = None
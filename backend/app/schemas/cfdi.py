@@ -51,3 +51,24 @@ class CFDIListResponse(BaseModel):
     page: int
     per_page: int
     cfdis: List[CFDIResponse]
+
+
+class CFDISearchResponse(BaseModel):
+    """Página de la búsqueda; `next_cursor` es None en la última"""
+    per_page: int
+    next_cursor: Optional[str] = None
+    cfdis: List[CFDIResponse]
+
+
+class CFDIDetailResponse(CFDIResponse):
+    """Detalle de un CFDI; `archivado` indica que viene del archivo Parquet"""
+    descuento: Optional[Decimal] = None
+    isr_retenido: Optional[Decimal] = None
+    iva_retenido: Optional[Decimal] = None
+    tipo_cambio: Optional[Decimal] = None
+    fecha_cancelacion: Optional[datetime] = None
+    uso_cfdi_descripcion: Optional[str] = None
+    metodo_pago: Optional[str] = None
+    forma_pago: Optional[str] = None
+    xml_content: Optional[str] = None
+    archivado: bool = False
@@ -0,0 +1,30 @@
+"""
+Schemas de Trabajos en Segundo Plano
+"""
+from pydantic import BaseModel
+from datetime import datetime
+from typing import Optional, Any
+
+from app.models.job import JobStatus
+
+
+class JobResponse(BaseModel):
+    id: int
+    kind: str
+    status: JobStatus
+    progress: int
+    progress_message: Optional[str] = None
+    attempts: int
+    max_attempts: int
+    result: Optional[Any] = None
+    error: Optional[str] = None
+    company_id: Optional[int] = None
+    created_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+
+class JobAccepted(BaseModel):
+    job_id: int
+    status: JobStatus
+    status_url: str
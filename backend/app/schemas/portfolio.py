@@ -0,0 +1,34 @@
+"""
+Schemas del Portafolio (Despacho Contable)
+"""
+from pydantic import BaseModel
+from typing import List
+
+from app.schemas.company import CompanyWithStats
+
+
+class PortfolioCompany(CompanyWithStats):
+    alertas_rojas: int = 0
+    alertas_amarillas: int = 0
+    margen_bruto: float = 0
+    riesgo: int = 0  # 0-100, mayor = más riesgo
+
+
+class PortfolioTotals(BaseModel):
+    empresas: int
+    total_cfdis: int
+    ingresos_mes: float
+    egresos_mes: float
+    margen_bruto: float
+    health_score_promedio: float
+    alertas_activas: int
+    empresas_en_riesgo: int
+
+
+class PortfolioDashboard(BaseModel):
+    total: int
+    page: int
+    per_page: int
+    sort: str
+    totales: PortfolioTotals
+    empresas: List[PortfolioCompany]
@@ -1,6 +1,16 @@
 """
 Motor de Semillas - 3 Escenarios de Demo
 """
+from functools import lru_cache
+
+from app.compression import PrecompressedJSON
 from app.seeds.seed_data import seed_database, SCENARIOS
 
-__all__ = ["seed_database", "SCENARIOS"]
+
+@lru_cache(maxsize=1)
+def scenarios_payload() -> PrecompressedJSON:
+    """SCENARIOS serializado y comprimido una vez por proceso (GET /api/scenarios)."""
+    return PrecompressedJSON(SCENARIOS)
+
+
+__all__ = ["seed_database", "SCENARIOS", "scenarios_payload"]
@@ -6,14 +6,16 @@ from datetime import datetime, timedelta
 from decimal import Decimal
 import random
 import uuid
-import json
 from sqlalchemy.orm import Session
+from typing import Callable, Optional
 import hashlib
 
-from app.models import User, Company, CFDI, FiscalAlert, HealthScore
+from app.models import User, Company, CFDI, CFDIConcepto, FiscalAlert, HealthScore
 from app.models.user import UserRole
 from app.models.cfdi import TipoCFDI, EstadoCFDI
 from app.models.fiscal_alert import AlertType, AlertSeverity
+from app.services.counterparties import rebuild_counterparties, CLIENTE
+from app.services.receivables import rebuild_receivables
 
 
 def hash_password(password: str) -> str:
@@ -84,6 +86,92 @@ SCENARIOS = {
 }
 
 
+# ClaveProdServ que factura cada sector (la primera es la principal)
+CLAVES_POR_SECTOR = {
+    "Servicios profesionales": ["80101500", "80111600", "86101700", "84111500"],
+    "Tecnología": ["81111500", "43231500", "81112200", "43211500"],
+    "Servicios contables": ["84111500", "80101500", "84111600", "86101700"],
+    "Comercio": ["50192100", "44121600", "52141500", "78101800"],
+}
+
+
+def generate_conceptos(factura: CFDI, sector: str) -> list[CFDIConcepto]:
+    """De 1 a 3 conceptos de una factura de venta, con importes que suman su subtotal."""
+    claves = CLAVES_POR_SECTOR.get(sector, CLAVES_POR_SECTOR["Comercio"])
+    elegidas = random.sample(claves[1:], random.randint(0, 2))
+    pesos = [2.0] + [random.uniform(0.3, 1.0) for _ in elegidas]
+    conceptos, restante = [], factura.subtotal
+    for i, (clave, peso) in enumerate(zip([claves[0]] + elegidas, pesos)):
+        last = i == len(pesos) - 1
+        importe = restante if last else (factura.subtotal * Decimal(str(peso / sum(pesos)))).quantize(Decimal("0.01"))
+        restante -= importe
+        conceptos.append(CFDIConcepto(
+            cfdi_uuid=factura.uuid,
+            fecha_emision=factura.fecha_emision,
+            rol=CLIENTE,
+            clave_prod_serv=clave,
+            importe=importe,
+            company_id=factura.company_id,
+        ))
+    return conceptos
+
+
+# Fracción de facturas en PPD (se pagan después con un complemento de pago)
+PPD_RATIO = 0.2
+
+PAGO_XML = (
+    '<cfdi:Comprobante xmlns:cfdi="http://www.sat.gob.mx/cfd/4" '
+    'xmlns:pago20="http://www.sat.gob.mx/Pagos20" TipoDeComprobante="P" Version="4.0">'
+    '<cfdi:Complemento><pago20:Pagos Version="2.0">'
+    '<pago20:Pago FechaPago="{fecha}" FormaDePagoP="03" MonedaP="MXN" Monto="{monto}">'
+    '<pago20:DoctoRelacionado IdDocumento="{uuid}" MonedaDR="MXN" NumParcialidad="1" '
+    'ImpSaldoAnt="{monto}" ImpPagado="{monto}" ImpSaldoInsoluto="0.00" ObjetoImpDR="01"/>'
+    '</pago20:Pago></pago20:Pagos></cfdi:Complemento></cfdi:Comprobante>'
+)
+
+
+def generate_payment(factura: CFDI, today: datetime) -> Optional[CFDI]:
+    """
+    Complemento de pago (CFDI tipo PAGO) que liquida una factura PPD entre
+    10 y 60 días después de emitida, o None si ese día aún no llega.
+    Como en CFDI 4.0, el Total es 0 y el monto pagado va en el XML (Pago/@Monto).
+    """
+    fecha_pago = factura.fecha_emision + timedelta(days=random.randint(10, 60))
+    if fecha_pago > today:
+        return None
+    return CFDI(
+        uuid=str(uuid.uuid4()),
+        folio=f"P-{factura.folio}",
+        serie="P",
+        tipo_comprobante=TipoCFDI.PAGO,
+        estado=EstadoCFDI.VIGENTE,
+        emisor_rfc=factura.emisor_rfc,
+        emisor_nombre=factura.emisor_nombre,
+        receptor_rfc=factura.receptor_rfc,
+        receptor_nombre=factura.receptor_nombre,
+        subtotal=Decimal(0),
+        iva=Decimal(0),
+        total=Decimal(0),
+        moneda="MXN",
+        fecha_emision=fecha_pago,
+        fecha_timbrado=fecha_pago,
+        uso_cfdi="CP01",
+        uso_cfdi_descripcion="Pagos",
+        xml_content=PAGO_XML.format(fecha=fecha_pago.strftime("%Y-%m-%dT%H:%M:%S"), monto=factura.total, uuid=factura.uuid),
+        company_id=factura.company_id,
+    )
+
+
+def _with_payment_method(factura: CFDI, today: datetime) -> list[CFDI]:
+    """Asigna PUE o PPD a la factura; las PPD vigentes llevan su complemento de pago."""
+    if random.random() >= PPD_RATIO:
+        factura.metodo_pago, factura.forma_pago = "PUE", "03"
+        return [factura]
+    factura.metodo_pago, factura.forma_pago = "PPD", "99"
+    pago = generate_payment(factura, today) if factura.estado == EstadoCFDI.VIGENTE else None
+    return [factura, pago] if pago else [factura]
+
+
 def generate_cfdis_for_company(
     db: Session,
     company: Company,
@@ -91,8 +179,9 @@ def generate_cfdis_for_company(
     monthly_count: int = 60,
     revenue_range: tuple = (280000, 350000),
 ) -> list[CFDI]:
-    """Genera CFDIs realistas para una empresa"""
+    """Genera CFDIs realistas para una empresa (con complementos de pago de las facturas PPD)"""
     cfdis = []
+    conceptos = []
     today = datetime.now()
 
     for month_offset in range(months):
@@ -126,11 +215,11 @@ def generate_cfdis_for_company(
                 fecha_timbrado=month_date - timedelta(days=random.randint(0, 28)),
                 uso_cfdi="G03",
                 uso_cfdi_descripcion="Gastos en general",
-                metodo_pago="PUE",
-                forma_pago="03",
                 company_id=company.id,
             )
-            cfdis.append(cfdi)
+            cfdis.extend(_with_payment_method(cfdi, today))
+            if cfdi.estado == EstadoCFDI.VIGENTE:
+                conceptos.extend(generate_conceptos(cfdi, company.sector))
 
         # Generar CFDIs de egreso
         for i in range(num_egresos):
@@ -154,13 +243,12 @@ def generate_cfdis_for_company(
                 fecha_emision=month_date - timedelta(days=random.randint(0, 28)),
                 fecha_timbrado=month_date - timedelta(days=random.randint(0, 28)),
                 uso_cfdi="G03",
-                metodo_pago="PUE",
-                forma_pago="03",
                 company_id=company.id,
             )
-            cfdis.append(cfdi)
+            cfdis.extend(_with_payment_method(cfdi, today))
 
     db.add_all(cfdis)
+    db.add_all(conceptos)
     return cfdis
 
 
@@ -213,7 +301,7 @@ def generate_fiscal_alerts(db: Session, company: Company, scenario: str) -> list
             severity=severity,
             titulo=titulo,
             detalle=detalle,
-            metadata_json=json.dumps(meta, ensure_ascii=False),
+            metadata_json=meta,
         )
         alerts.append(alert)
 
@@ -226,10 +314,10 @@ def generate_fiscal_alerts(db: Session, company: Company, scenario: str) -> list
             severity=AlertSeverity.VERDE,
             titulo="Sin proveedores EFOS",
             detalle="0 proveedores en lista negra",
-            metadata_json=json.dumps({
+            metadata_json={
                 "ejemplo": "Ninguno de tus 8 proveedores activos aparece en la lista EFOS del SAT (Art. 69-B). Último check: 6 de febrero 2026.",
                 "accion_recomendada": "POA revisa automáticamente la lista EFOS cada semana. Sin acción requerida.",
-            }, ensure_ascii=False),
+            },
         ))
         alerts.append(FiscalAlert(
             company_id=company.id,
@@ -237,10 +325,10 @@ def generate_fiscal_alerts(db: Session, company: Company, scenario: str) -> list
             severity=AlertSeverity.VERDE,
             titulo="Diversificación de clientes",
             detalle="Top cliente = 18% ingresos",
-            metadata_json=json.dumps({
+            metadata_json={
                 "ejemplo": "Tu cliente principal (Grupo Elektra SA de CV) representa solo el 18% de tus ingresos. Tienes 10 clientes activos con distribución saludable.",
                 "accion_recomendada": "Mantén la diversificación. Ideal es que ningún cliente supere el 25% de tus ingresos.",
-            }, ensure_ascii=False),
+            },
         ))
 
     elif scenario == "B":
@@ -252,10 +340,10 @@ def generate_fiscal_alerts(db: Session, company: Company, scenario: str) -> list
             titulo="Proveedor en revisión EFOS",
             detalle="Logística Express MX (LEM120601MN7) en lista Art. 69-B",
             descripcion="El proveedor aparece en la lista de presuntos publicada el 15 de enero 2026. Tienes 16 CFDIs recibidos por un total de $520,000 MXN.",
-            metadata_json=json.dumps({
+            metadata_json={
                 "ejemplo": "Tu proveedor Logística Express MX (RFC: LEM120601MN7) aparece en la lista EFOS desde Enero 2026. Tienes 16 CFDIs por $520,000 con este proveedor en los últimos 6 meses.",
                 "accion_recomendada": "Solicita comprobantes alternativos y considera cambiar de proveedor antes del cierre fiscal Q1. Revisa si puedes deducir esos gastos con documentación soporte.",
-            }, ensure_ascii=False),
+            },
         ))
         alerts.append(FiscalAlert(
             company_id=company.id,
@@ -264,10 +352,10 @@ def generate_fiscal_alerts(db: Session, company: Company, scenario: str) -> list
             titulo="Alta concentración de clientes",
             detalle="Top cliente = 32% ingresos",
             descripcion="Se recomienda diversificar la cartera de clientes para reducir riesgo.",
-            metadata_json=json.dumps({
+            metadata_json={
                 "ejemplo": "CEMEX SAB de CV representa el 32% de tus ingresos mensuales ($576,000 de $1.8M). Si este cliente reduce sus pedidos, tu flujo se ve comprometido.",
                 "accion_recomendada": "Diversifica tu cartera de clientes. Objetivo: que ningún cliente supere el 25%. Contacta al menos 3 prospectos nuevos este mes.",
-            }, ensure_ascii=False),
+            },
         ))
 
     elif scenario == "C":
@@ -278,10 +366,10 @@ def generate_fiscal_alerts(db: Session, company: Company, scenario: str) -> list
             severity=AlertSeverity.VERDE,
             titulo="Sin proveedores EFOS",
             detalle="0 proveedores en lista negra",
-            metadata_json=json.dumps({
+            metadata_json={
                 "ejemplo": "Ninguno de los proveedores de tus 20 clientes aparece en la lista EFOS. Revisión automática semanal activa.",
                 "accion_recomendada": "Como despacho contable, revisa la lista EFOS para cada nuevo proveedor de tus clientes al onboardear.",
-            }, ensure_ascii=False),
+            },
         ))
         alerts.append(FiscalAlert(
             company_id=company.id,
@@ -289,23 +377,28 @@ def generate_fiscal_alerts(db: Session, company: Company, scenario: str) -> list
             severity=AlertSeverity.AMARILLO,
             titulo="Concentración moderada",
             detalle="Top cliente = 25% ingresos",
-            metadata_json=json.dumps({
+            metadata_json={
                 "ejemplo": "Tu cliente principal del despacho genera el 25% de tus honorarios mensuales ($50,000 de $200,000). Esto está en el límite recomendado.",
                 "accion_recomendada": "Busca atraer 2-3 clientes nuevos al despacho para bajar la concentración a menos del 20%.",
-            }, ensure_ascii=False),
+            },
         ))
 
     db.add_all(alerts)
     return alerts
 
 
-def seed_database(db: Session, scenario: str = None) -> dict:
+def seed_database(
+    db: Session,
+    scenario: str = None,
+    progress: Optional[Callable[[int, str], None]] = None,
+) -> dict:
     """
     Siembra la base de datos con datos de demo.
 
     Args:
         db: Sesión de SQLAlchemy
         scenario: "A", "B", "C" o None para todos
+        progress: Callback opcional (porcentaje, mensaje) para reportar avance
 
     Returns:
         Diccionario con estadísticas de seeding
@@ -314,8 +407,10 @@ def seed_database(db: Session, scenario: str = None) -> dict:
 
     scenarios_to_seed = [scenario] if scenario else ["A", "B", "C"]
 
-    for sc in scenarios_to_seed:
+    for n, sc in enumerate(scenarios_to_seed):
         config = SCENARIOS[sc]
+        if progress:
+            progress(n * 100 // len(scenarios_to_seed), f"Escenario {sc}: {config['name']}")
 
         # Crear usuario
         user = User(
@@ -357,10 +452,14 @@ def seed_database(db: Session, scenario: str = None) -> dict:
             revenue_range=config["monthly_revenue_range"],
         )
         stats["cfdis"] += len(cfdis)
+        db.flush()
+        rebuild_counterparties(db, company.id)
 
-        # Generar Score
+        # Generar Score (la antigüedad de CxC sale de los saldos PPD reales)
         generate_health_score(db, company, config["health_score"])
         stats["scores"] += 1
+        db.flush()
+        rebuild_receivables(db, company.id)
 
         # Generar Alertas
         alerts = generate_fiscal_alerts(db, company, sc)
@@ -394,10 +493,18 @@ def seed_database(db: Session, scenario: str = None) -> dict:
                     revenue_range=(50000, 500000),
                 )
                 stats["cfdis"] += len(client_cfdis)
+                db.flush()
+                rebuild_counterparties(db, client_company.id)
 
                 # Score aleatorio
                 generate_health_score(db, client_company, random.randint(45, 92))
                 stats["scores"] += 1
+                db.flush()
+                rebuild_receivables(db, client_company.id)
+
+                if progress:
+                    done = n + (i + 1) / config["num_clients"]
+                    progress(int(done * 100 / len(scenarios_to_seed)), f"Escenario {sc}: cliente {i + 1}/{config['num_clients']}")
 
     db.commit()
     return stats
@@ -0,0 +1,14 @@
+"""
+Servicios de dominio (consultas agregadas y motores de cálculo)
+"""
+from app.services.portfolio import company_stats_map, company_with_stats, build_portfolio
+from app.services.totals import monthly_totals
+from app.services.counterparties import top_counterparties, refresh_counterparties, rebuild_counterparties
+from app.services.export import iter_cfdi_csv, stream_cfdi_csv
+from app.services.reads import company_row, company_rows, latest_health, cfdi_count
+
+__all__ = [
+    "company_stats_map", "company_with_stats", "build_portfolio", "monthly_totals",
+    "company_row", "company_rows", "latest_health", "cfdi_count",
+    "top_counterparties", "refresh_counterparties", "rebuild_counterparties", "iter_cfdi_csv", "stream_cfdi_csv",
+]
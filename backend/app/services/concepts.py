@@ -0,0 +1,213 @@
+"""
+Conceptos de CFDI e ingresos por categoría
+
+La ingesta guarda en `cfdi_conceptos` la ClaveProdServ y el importe de cada
+Concepto de ventas y compras vigentes, tomados de `conceptos` en la fila o
+del XML del comprobante; si el CFDI llega cancelado sus conceptos se borran.
+El desglose del dashboard agrupa por clave las ventas del periodo (pocas
+decenas de claves por empresa) solo sobre `cfdi_conceptos` y las reparte en
+categorías del catálogo del SAT.
+"""
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from typing import Iterable, Optional
+from xml.etree import ElementTree
+import argparse
+import logging
+
+from sqlalchemy import select, func, delete, insert
+from sqlalchemy.orm import Session
+
+from app.cache import dashboard_cache, invalidate_company
+from app.models import Company, CFDI, CFDIConcepto
+from app.models.cfdi import TipoCFDI, EstadoCFDI
+from app.catalogs import OTROS, categoria, clave_prod_serv_catalog
+from app.services.counterparties import CLIENTE, PROVEEDOR
+
+# Concepto en CFDI 4.0 y 3.3
+_CONCEPTO_TAGS = ("{http://www.sat.gob.mx/cfd/4}Concepto", "{http://www.sat.gob.mx/cfd/3}Concepto")
+_DELETE_BATCH = 500
+
+# Paleta de la gráfica de pastel: las tres categorías principales y "Otros"
+COLORES = ("#10b981", "#06b6d4", "#8b5cf6", "#f59e0b")
+
+
+def parse_conceptos(xml: str) -> list[dict]:
+    """(clave_prod_serv, importe) de cada Concepto del XML; lista vacía si no se puede leer."""
+    try:
+        root = ElementTree.fromstring(xml)
+    except ElementTree.ParseError:
+        return []
+    conceptos = []
+    for tag in _CONCEPTO_TAGS:
+        for el in root.iter(tag):
+            clave, importe = el.get("ClaveProdServ"), el.get("Importe")
+            try:
+                conceptos.append({"clave_prod_serv": clave[:8], "importe": Decimal(importe)})
+            except (TypeError, InvalidOperation):
+                continue
+    return conceptos
+
+
+def as_enum(enum_cls, value):
+    """Acepta el miembro, su nombre ("INGRESO") o su valor ("I")."""
+    if value is None or isinstance(value, enum_cls):
+        return value
+    return enum_cls[value] if value in enum_cls.__members__ else enum_cls(value)
+
+
+def rol_of(tipo, estado, emisor_rfc: str, rfc: str) -> Optional[str]:
+    """CLIENTE para ventas, PROVEEDOR para compras; None si el CFDI no aporta conceptos."""
+    if as_enum(EstadoCFDI, estado) == EstadoCFDI.CANCELADO:
+        return None
+    tipo = as_enum(TipoCFDI, tipo)
+    if tipo == TipoCFDI.INGRESO and emisor_rfc == rfc:
+        return CLIENTE
+    if tipo == TipoCFDI.EGRESO:
+        return PROVEEDOR
+    return None
+
+
+def conceptos_of(row: dict) -> Optional[list[dict]]:
+    """Conceptos de una fila de ingesta, o None si la fila no trae de dónde sacarlos."""
+    if row.get("conceptos") is not None:
+        return [
+            {"clave_prod_serv": str(c["clave_prod_serv"])[:8], "importe": Decimal(str(c["importe"]))}
+            for c in row["conceptos"]
+        ]
+    if row.get("xml_content"):
+        return parse_conceptos(row["xml_content"])
+    return None
+
+
+def conceptos_for_rows(rows: Iterable[dict], rfc: str) -> dict[str, tuple[datetime, Optional[str], list[dict]]]:
+    """
+    Argumento de `replace_conceptos` para filas de ingesta. Un CFDI cancelado
+    o que no es venta ni compra se limpia; una venta o compra que no trae
+    conceptos ni XML conserva los guardados.
+    """
+    by_uuid = {}
+    for row in rows:
+        rol = rol_of(row["tipo_comprobante"], row.get("estado"), row["emisor_rfc"], rfc)
+        conceptos = conceptos_of(row) if rol else []
+        if conceptos is not None:
+            by_uuid[row["uuid"]] = (row["fecha_emision"], rol, conceptos)
+    return by_uuid
+
+
+def replace_conceptos(
+    db: Session, company_id: int, by_uuid: dict[str, tuple[datetime, Optional[str], list[dict]]],
+) -> int:
+    """
+    Reemplaza los conceptos de cada CFDI de `by_uuid` ({uuid: (fecha_emision,
+    rol, conceptos)}); con rol None solo borra. Funciona con Session o
+    Connection; no hace commit. Regresa cuántos conceptos escribió.
+    """
+    uuids = list(by_uuid)
+    if not uuids:
+        return 0
+    for i in range(0, len(uuids), _DELETE_BATCH):
+        db.execute(
+            delete(CFDIConcepto)
+            .where(CFDIConcepto.company_id == company_id, CFDIConcepto.cfdi_uuid.in_(uuids[i:i + _DELETE_BATCH]))
+            .execution_options(synchronize_session=False)
+        )
+    rows = [
+        {"company_id": company_id, "cfdi_uuid": uuid, "fecha_emision": fecha, "rol": rol, **c}
+        for uuid, (fecha, rol, conceptos) in by_uuid.items() if rol
+        for c in conceptos
+    ]
+    if rows:
+        db.execute(insert(CFDIConcepto), rows)
+    return len(rows)
+
+
+def rebuild_conceptos(db: Session, company_id: int, batch_size: int = 1000) -> int:
+    """Regenera los conceptos de la empresa desde el XML de sus CFDIs (datos previos a la tabla)."""
+    rfc = db.execute(select(Company.rfc).where(Company.id == company_id)).scalar_one()
+    written = 0
+    batch: dict = {}
+    rows = db.execute(
+        select(CFDI.uuid, CFDI.fecha_emision, CFDI.tipo_comprobante, CFDI.estado, CFDI.emisor_rfc, CFDI.xml_content)
+        .where(CFDI.company_id == company_id, CFDI.xml_content.is_not(None))
+        .execution_options(yield_per=batch_size)
+    )
+    for uuid, fecha, tipo, estado, emisor_rfc, xml in rows:
+        rol = rol_of(tipo, estado, emisor_rfc, rfc)
+        batch[uuid] = (fecha, rol, parse_conceptos(xml) if rol else [])
+        if len(batch) >= batch_size:
+            written += replace_conceptos(db, company_id, batch)
+            batch = {}
+    if batch:
+        written += replace_conceptos(db, company_id, batch)
+    return written
+
+
+def amounts_by_clave(db: Session, company_id: int, rol: str, desde: datetime, hasta: datetime) -> list:
+    """(clave_prod_serv, importe) de las ventas o compras de la empresa en [desde, hasta)."""
+    cc = CFDIConcepto
+    return db.execute(
+        select(cc.clave_prod_serv, func.sum(cc.importe).label("importe"))
+        .where(cc.company_id == company_id, cc.rol == rol, cc.fecha_emision >= desde, cc.fecha_emision < hasta)
+        .group_by(cc.clave_prod_serv)
+    ).all()
+
+
+def compute_revenue_by_category(db: Session, company_id: int, desde: datetime, hasta: datetime) -> list[dict]:
+    """Rebanadas (name, value en %, color): las tres categorías principales y "Otros"."""
+    catalog = clave_prod_serv_catalog()
+    totals: dict[str, Decimal] = {}
+    for clave, importe in amounts_by_clave(db, company_id, CLIENTE, desde, hasta):
+        # Con el catálogo cargado, una clave que no existe no se clasifica
+        nombre = categoria(clave) if not len(catalog) or clave in catalog else OTROS
+        totals[nombre] = totals.get(nombre, Decimal(0)) + (importe or Decimal(0))
+    grand_total = sum(totals.values())
+    if grand_total <= 0:
+        return []
+
+    ranked = sorted(((n, t) for n, t in totals.items() if n != OTROS), key=lambda x: -x[1])
+    top = len(COLORES) - 1
+    slices = ranked[:top]
+    otros = totals.get(OTROS, Decimal(0)) + sum(t for _, t in ranked[top:])
+    if otros > 0:
+        slices.append((OTROS, otros))
+    return [
+        {"name": nombre, "value": round(float(total / grand_total * 100), 1), "color": color}
+        for (nombre, total), color in zip(slices, COLORES)
+    ]
+
+
+def revenue_by_category(
+    db: Session, company_id: int, desde: datetime, hasta: datetime, version: int = 0,
+) -> list[dict]:
+    """`compute_revenue_by_category` con el cache del dashboard, por versión de los datos (ver app/cache.py)."""
+    return dashboard_cache.get_or_compute(
+        (company_id, "categorias", version, desde, hasta),
+        lambda: compute_revenue_by_category(db, company_id, desde, hasta),
+    )
+
+
+def main() -> None:
+    from app.database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Conceptos de CFDI (ClaveProdServ)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_rebuild = sub.add_parser("rebuild", help="Regenera cfdi_conceptos desde el XML guardado")
+    p_rebuild.add_argument("--company", type=int, action="append", dest="company_ids")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    db = SessionLocal()
+    try:
+        company_ids = args.company_ids or db.execute(select(Company.id).order_by(Company.id)).scalars().all()
+        for company_id in company_ids:
+            written = rebuild_conceptos(db, company_id)
+            db.commit()
+            invalidate_company(company_id)
+            print(f"empresa {company_id}: {written} conceptos")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""
+Principales clientes y proveedores de una empresa
+
+Los rankings salen de `counterparty_monthly`: un renglón por empresa, rol,
+mes y RFC con lo facturado en CFDIs vigentes. La ingesta recalcula solo los
+meses que tocó (`refresh_counterparties`). Cada mes se arma desde la tabla
+`cfdis` más los acumulados de los meses archivados (`cfdi_rollups`), así el
+ranking cubre toda la historia y se puede acotar por periodo sin recorrer
+`cfdis`.
+"""
+from datetime import date, datetime
+from typing import Iterable, Optional
+
+from sqlalchemy import select, func, desc, delete, insert, union_all, literal, case, cast, and_, or_, Integer, DateTime
+from sqlalchemy.engine import Row
+from sqlalchemy.orm import Session
+
+from app.models import Company, CFDI, CFDIRollup, CounterpartyMonthly
+from app.models.cfdi import TipoCFDI, EstadoCFDI
+from app.partitioning import add_months
+
+CLIENTE = "cliente"
+PROVEEDOR = "proveedor"
+ROLES = (CLIENTE, PROVEEDOR)
+
+
+def month_of(value) -> datetime:
+    """Inicio del mes de una fecha, como datetime sin zona."""
+    return datetime(value.year, value.month, 1)
+
+
+def _month_sources(company_id: int, start: datetime, end: datetime) -> list:
+    """Selects (rol, rfc, nombre, total, num_cfdis) del mes: tabla y archivo, clientes y proveedores."""
+    sources = []
+    for rol, tipo in ((CLIENTE, TipoCFDI.INGRESO), (PROVEEDOR, TipoCFDI.EGRESO)):
+        # Clientes: receptores de lo que emitió la empresa. Proveedores: emisores de egresos
+        for model, count, in_month in (
+            (CFDI, func.count(CFDI.id), (CFDI.fecha_emision >= start, CFDI.fecha_emision < end)),
+            (CFDIRollup, func.sum(CFDIRollup.num_cfdis), (CFDIRollup.periodo == start,)),
+        ):
+            rfc, nombre = (model.receptor_rfc, model.receptor_nombre) if rol == CLIENTE else (model.emisor_rfc, model.emisor_nombre)
+            where = [model.company_id == company_id, model.tipo_comprobante == tipo, *in_month,
+                     or_(model.estado.is_(None), model.estado == EstadoCFDI.VIGENTE)]
+            query = select(
+                literal(rol).label("rol"), rfc.label("rfc"), func.max(nombre).label("nombre"),
+                func.sum(model.total).label("total"), count.label("num_cfdis"),
+            )
+            if rol == CLIENTE:
+                query = query.join(Company, Company.id == model.company_id)
+                where.append(model.emisor_rfc == Company.rfc)
+            sources.append(query.where(*where).group_by(rfc))
+    return sources
+
+
+def refresh_counterparties(db: Session, company_id: int, months: Iterable) -> int:
+    """
+    Recalcula los acumulados de la empresa en cada mes de `months` (fechas
+    de cualquier día del mes). Funciona con Session o Connection; no hace
+    commit. Regresa cuántos meses recalculó.
+    """
+    starts = sorted({month_of(m) for m in months})
+    for start in starts:
+        end = month_of(add_months(start, 1))
+        both = union_all(*_month_sources(company_id, start, end)).subquery()
+        db.execute(
+            delete(CounterpartyMonthly)
+            .where(CounterpartyMonthly.company_id == company_id, CounterpartyMonthly.periodo == start)
+            .execution_options(synchronize_session=False)
+        )
+        db.execute(insert(CounterpartyMonthly).from_select(
+            ["company_id", "periodo", "rol", "rfc", "nombre", "total", "num_cfdis"],
+            select(
+                literal(company_id), literal(start, DateTime(timezone=True)),
+                both.c.rol, both.c.rfc, func.max(both.c.nombre), func.sum(both.c.total), func.sum(both.c.num_cfdis),
+            ).group_by(both.c.rol, both.c.rfc),
+        ))
+    return len(starts)
+
+
+def rebuild_counterparties(db: Session, company_id: int) -> int:
+    """Recalcula todos los meses con CFDIs (en tabla o archivados) de la empresa."""
+    first, last = db.execute(select(func.min(CFDI.fecha_emision), func.max(CFDI.fecha_emision))
+                             .where(CFDI.company_id == company_id)).one()
+    archived_first, archived_last = db.execute(select(func.min(CFDIRollup.periodo), func.max(CFDIRollup.periodo))
+                                               .where(CFDIRollup.company_id == company_id)).one()
+    bounds = [month_of(d) for d in (first, last, archived_first, archived_last) if d is not None]
+    if not bounds:
+        return 0
+    months, month = [], min(bounds)
+    while month <= max(bounds):
+        months.append(month)
+        month = month_of(add_months(month, 1))
+    return refresh_counterparties(db, company_id, months)
+
+
+def top_counterparties(
+    db: Session,
+    company_id: int,
+    rol: str,
+    limit: int = 5,
+    desde: Optional[datetime] = None,
+    hasta: Optional[datetime] = None,
+    today: Optional[date] = None,
+) -> list[Row]:
+    """
+    Filas (rfc, nombre, total, count, tendencia) ordenadas por monto en
+    [desde, hasta). `tendencia` compara el último mes completo contra el
+    anterior ("up" si no bajó), sin importar la ventana.
+    """
+    current = month_of(today or date.today())
+    last, previous = month_of(add_months(current, -1)), month_of(add_months(current, -2))
+    cm = CounterpartyMonthly
+    conditions = []
+    if desde:
+        conditions.append(cm.periodo >= desde)
+    if hasta:
+        conditions.append(cm.periodo < hasta)
+    # La ventana va en el CASE y no en el WHERE: la tendencia necesita los últimos meses
+    in_window = and_(*conditions) if conditions else None
+
+    def windowed(column):
+        return func.sum(case((in_window, column), else_=0)) if in_window is not None else func.sum(column)
+
+    total = windowed(cm.total).label("total")
+    ultimo = func.sum(case((cm.periodo == last, cm.total), else_=0))
+    anterior = func.sum(case((cm.periodo == previous, cm.total), else_=0))
+    return db.execute(
+        select(
+            cm.rfc,
+            func.max(cm.nombre).label("nombre"),
+            total,
+            cast(windowed(cm.num_cfdis), Integer).label("count"),
+            case((ultimo >= anterior, "up"), else_="down").label("tendencia"),
+        )
+        .where(cm.company_id == company_id, cm.rol == rol)
+        .group_by(cm.rfc)
+        .having(total > 0)
+        .order_by(desc(total), cm.rfc)
+        .limit(limit)
+    ).all()
+
+
+def ranking_item(row: Row) -> dict:
+    """Fila de `top_counterparties` con la forma de TopClient / TopProvider."""
+    return {
+        "nombre": row.nombre or row.rfc,
+        "rfc": row.rfc,
+        "monto": float(row.total),
+        "facturas": row.count,
+        "tendencia": row.tendencia,
+    }
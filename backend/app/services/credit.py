@@ -0,0 +1,198 @@
+"""
+Información de crédito, programa POA Partners y planes de suscripción
+
+Los catálogos (opciones de financiamiento, niveles de partners, planes y
+pasos de onboarding) son constantes de módulo: se construyen una vez al
+importar y, con gunicorn --preload, las comparten todos los workers en
+lugar de rearmarlas en cada request. Por request solo se calculan los
+campos que dependen de la empresa (estado, nivel y plan actual).
+
+Los catálogos sin esos campos también se sirven solos, ya comprimidos
+(`catalog_payload`, GET /api/credit/catalog).
+"""
+from functools import lru_cache
+
+from app.compression import PrecompressedJSON
+
+# (opción, score mínimo, estado si lo cumple, beneficio para el partner)
+FINANCING_OPTIONS = (
+    ({
+        "nombre": "Crédito Simple PyME",
+        "proveedor": "Konfío",
+        "monto_min": 50000,
+        "monto_max": 3000000,
+        "tasa": "1.8% mensual",
+        "plazo": "6-36 meses",
+        "requisitos": ("Score POA >= 65", "6+ meses operando", "Sin alertas EFOS"),
+    }, 65, "pre-aprobado", "15% comisión sobre monto otorgado"),
+    ({
+        "nombre": "Factoraje Digital",
+        "proveedor": "Kapital",
+        "monto_min": 10000,
+        "monto_max": 500000,
+        "tasa": "2.2% por operación",
+        "plazo": "30-90 días",
+        "requisitos": ("Score POA >= 50", "CFDIs vigentes", "Clientes verificados"),
+    }, 50, "disponible", "10% comisión"),
+    ({
+        "nombre": "Línea de Crédito Revolvente",
+        "proveedor": "Credijusto",
+        "monto_min": 100000,
+        "monto_max": 5000000,
+        "tasa": "1.5% mensual",
+        "plazo": "12 meses renovable",
+        "requisitos": ("Score POA >= 75", "12+ meses operando", "Ingresos > $200K/mes"),
+    }, 75, "pre-aprobado", "20% comisión"),
+)
+
+PARTNER_LEVELS = (
+    {
+        "nombre": "Bronce",
+        "requisito": "5+ clientes en POA",
+        "descuento": "10%",
+        "comision_referidos": "5%",
+        "beneficios": (
+            "Dashboard básico para todos los clientes",
+            "Reportes mensuales consolidados",
+            "Soporte por email",
+        ),
+    },
+    {
+        "nombre": "Plata",
+        "requisito": "15+ clientes en POA",
+        "descuento": "20%",
+        "comision_referidos": "10%",
+        "beneficios": (
+            "Todo lo de Bronce",
+            "CFO Virtual para cada cliente",
+            "Alertas proactivas",
+            "Soporte prioritario",
+        ),
+    },
+    {
+        "nombre": "Oro",
+        "requisito": "25+ clientes en POA",
+        "descuento": "30%",
+        "comision_referidos": "15%",
+        "beneficios": (
+            "Todo lo de Plata",
+            "Predicciones de flujo avanzadas",
+            "Acceso a API completa",
+            "Soporte dedicado 24/7",
+            "Comisión por referidos de crédito: $5,000 MXN/mes promedio",
+        ),
+        "ejemplo": "El 'Despacho Contable Ágil' (25+ clientes) obtiene 30% descuento + $5,000 MXN/mes de comisiones por referidos de crédito.",
+    },
+)
+
+PLANS = (
+    {
+        "nombre": "Starter",
+        "precio": 0,
+        "precio_label": "Gratis",
+        "features": (
+            "Dashboard básico",
+            "Hasta 100 CFDIs/mes",
+            "Score de salud",
+            "1 usuario",
+        ),
+    },
+    {
+        "nombre": "Profesional",
+        "precio": 499,
+        "precio_label": "$499/mes",
+        "features": (
+            "Todo lo del Starter",
+            "CFO Virtual ilimitado",
+            "Semáforo fiscal completo",
+            "Alertas proactivas",
+            "5 usuarios",
+            "Hasta 1,000 CFDIs/mes",
+        ),
+        "popular": True,
+    },
+    {
+        "nombre": "Avanzado",
+        "precio": 1499,
+        "precio_label": "$1,499/mes",
+        "features": (
+            "Todo lo del Profesional",
+            "Integración bancaria",
+            "Predicciones de flujo",
+            "API completa",
+            "Usuarios ilimitados",
+            "CFDIs ilimitados",
+            "Soporte prioritario",
+        ),
+    },
+)
+
+# (paso, título, descripción); la del paso 3 lleva el score
+ONBOARDING_STEPS = (
+    (1, "Registro", "Ingresa email y RFC"),
+    (2, "Primer Valor", "Sube tus XMLs y ve tu primer score en 30 segundos"),
+    (3, "Dashboard Básico", "Ves tus ingresos/egresos y Score de {score}/100"),
+    (4, "Conectar SAT", "Conecta tu e.firma para predicciones y alertas proactivas"),
+)
+
+
+@lru_cache(maxsize=1)
+def catalog_payload() -> PrecompressedJSON:
+    """Catálogos de crédito sin los campos por empresa, serializados y comprimidos una vez."""
+    return PrecompressedJSON({
+        "financing_options": [
+            {**option, "beneficio_partner": beneficio, "score_minimo": min_score}
+            for option, min_score, _, beneficio in FINANCING_OPTIONS
+        ],
+        "partners_program": {"niveles": PARTNER_LEVELS},
+        "plans": PLANS,
+    })
+
+
+def _readiness(score: int) -> tuple[str, int, str]:
+    if score >= 80:
+        return "alta", 92, "Excelente perfil crediticio. Pre-aprobado para líneas de crédito."
+    if score >= 65:
+        return "media", 68, "Buen perfil. Mejora tu diversificación de clientes para acceder a mejores tasas."
+    return "baja", 45, "Necesitas mejorar tu salud financiera antes de solicitar crédito."
+
+
+def _current_plan(demo_scenario: str, score: int) -> str:
+    if demo_scenario == "B":
+        return "Avanzado"
+    if demo_scenario == "A":
+        return "Profesional" if score >= 70 else "Starter"
+    return ""
+
+
+def credit_info(company, score: int, total_cfdis: int) -> dict:
+    """Respuesta de /api/credit a partir de la empresa, su score y su número de CFDIs."""
+    nivel, readiness_score, recommendation = _readiness(score)
+    plan_actual = _current_plan(company.demo_scenario, score)
+    if company.demo_scenario == "C" and total_cfdis > 1000:
+        nivel_partner = "Oro"
+    else:
+        nivel_partner = "Plata" if total_cfdis > 500 else "Bronce"
+
+    return {
+        "readiness": {
+            "nivel": nivel,
+            "score": readiness_score,
+            "recommendation": recommendation,
+            "health_score": score,
+        },
+        "financing_options": [
+            {**option, "estado": estado if score >= min_score else "no disponible", "beneficio_partner": beneficio}
+            for option, min_score, estado, beneficio in FINANCING_OPTIONS
+        ],
+        "partners_program": {"niveles": PARTNER_LEVELS, "nivel_actual": nivel_partner},
+        "plans": [
+            {**plan, "es_actual": plan["nombre"] == plan_actual} for plan in PLANS
+        ],
+        "company_name": company.razon_social,
+        "onboarding_steps": [
+            {"paso": paso, "titulo": titulo, "descripcion": descripcion.format(score=score),
+             "completado": company.sat_connected if paso == 4 else True}
+            for paso, titulo, descripcion in ONBOARDING_STEPS
+        ],
+    }
@@ -0,0 +1,158 @@
+"""
+Ingesta de CFDIs con upserts por lote
+
+Toda fuente de CFDIs (sincronización SAT, carga de XMLs) debe pasar por
+`upsert_cfdis` para que la escritura sea idempotente por UUID. Las
+cancelaciones detectadas al verificar el estado con el SAT pasan por
+`apply_cancellations`, que además actualiza los mismos datos derivados.
+"""
+from datetime import date, datetime
+from typing import Iterable
+
+from sqlalchemy import select, update, or_
+from sqlalchemy.orm import Session
+
+from app.cache import invalidate_company
+from app.changes import bump_version
+from app.config import settings
+from app.models import Company, CFDI
+from app.models.cfdi import TipoCFDI, EstadoCFDI
+from app.services.concepts import as_enum, conceptos_for_rows, replace_conceptos
+from app.services.counterparties import refresh_counterparties
+from app.services.receivables import applications_for_rows, replace_applications, refresh_balances, update_cxc_score
+
+_BATCH = 500
+
+# Columnas que una fuente externa puede actualizar al re-enviar un CFDI
+UPSERT_COLUMNS = (
+    "folio", "serie", "tipo_comprobante", "estado",
+    "emisor_rfc", "emisor_nombre", "receptor_rfc", "receptor_nombre",
+    "subtotal", "descuento", "iva", "isr_retenido", "iva_retenido", "total",
+    "moneda", "tipo_cambio",
+    "fecha_emision", "fecha_timbrado", "fecha_cancelacion",
+    "uso_cfdi", "uso_cfdi_descripcion", "metodo_pago", "forma_pago",
+    "xml_content",
+)
+
+
+def _insert_for(db: Session):
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise NotImplementedError(f"Upsert no soportado para {dialect}")
+    return insert
+
+
+def conflict_target() -> list:
+    """
+    Columnas únicas del ON CONFLICT. En la tabla particionada la unicidad
+    incluye la llave de partición; `fecha_emision` de un UUID no cambia.
+    """
+    return [CFDI.uuid, CFDI.fecha_emision] if settings.CFDI_PARTITIONED else [CFDI.uuid]
+
+
+def upsert_cfdis(db: Session, company_id: int, rows: Iterable[dict], batch_size: int = 500) -> int:
+    """
+    Inserta o actualiza CFDIs por UUID en lotes de `batch_size`.
+
+    Cada fila es un dict con columnas de `CFDI` (ver `UPSERT_COLUMNS` más `uuid`)
+    y opcionalmente `conceptos` ([{clave_prod_serv, importe}]) o, en un PAGO,
+    `pagos` ([{factura_uuid, importe, fecha_pago}]); sin ellos se leen de
+    `xml_content`. Al final recalcula los acumulados por contraparte de los
+    meses tocados y los saldos de las facturas PPD tocadas, sube la versión
+    de datos de la empresa (aviso al feed de cambios) e invalida sus caches.
+    No hace commit: el llamador decide la transacción. Regresa filas escritas.
+    """
+    insert = _insert_for(db)
+    target = conflict_target()
+    # Las columnas del objetivo del conflicto no se pueden actualizar en sitio
+    updatable = set(UPSERT_COLUMNS) - {c.key for c in target}
+    rfc = db.execute(select(Company.rfc).where(Company.id == company_id)).scalar()
+    written = 0
+    batch: list[dict] = []
+    months = set()
+    invoices: set[str] = set()
+
+    def flush(batch: list[dict]) -> int:
+        values = [
+            {"uuid": r["uuid"], "company_id": company_id, **{k: r[k] for k in UPSERT_COLUMNS if k in r}}
+            for r in batch
+        ]
+        # Todas las filas del lote deben tener las mismas llaves para el VALUES multi-fila
+        keys = set().union(*(v.keys() for v in values))
+        for v in values:
+            for k in keys:
+                v.setdefault(k, None)
+        stmt = insert(CFDI).values(values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=target,
+            set_={k: stmt.excluded[k] for k in keys if k in updatable},
+        )
+        db.execute(stmt)
+        replace_conceptos(db, company_id, conceptos_for_rows(batch, rfc))
+        # Facturas cuyo saldo puede cambiar: las del lote y las que citan sus pagos
+        invoices.update(replace_applications(db, company_id, applications_for_rows(batch)))
+        invoices.update(r["uuid"] for r in batch if as_enum(TipoCFDI, r["tipo_comprobante"]) == TipoCFDI.INGRESO)
+        return len(values)
+
+    for row in rows:
+        batch.append(row)
+        if row.get("fecha_emision"):
+            months.add((row["fecha_emision"].year, row["fecha_emision"].month))
+        if len(batch) >= batch_size:
+            written += flush(batch)
+            batch = []
+    if batch:
+        written += flush(batch)
+    refresh_counterparties(db, company_id, (date(y, m, 1) for y, m in months))
+    if invoices:
+        refresh_balances(db, company_id, invoices, rfc)
+        update_cxc_score(db, company_id)
+    bump_version(db, company_id, (date(y, m, 1) for y, m in months))
+    invalidate_company(company_id)
+    return written
+
+
+def apply_cancellations(db: Session, company_id: int, uuids: Iterable[str], fecha_cancelacion: datetime) -> int:
+    """
+    Marca como cancelados los CFDIs `uuids` de la empresa que sigan vigentes,
+    con UPDATEs por bloque, y recalcula lo que dependía de ellos: acumulados
+    por contraparte de sus meses, conceptos, aplicaciones de sus pagos y
+    saldos de las facturas PPD afectadas. Sube la versión de datos e invalida
+    los caches de la empresa.
+    No hace commit; regresa cuántos CFDIs canceló.
+    """
+    uuids = sorted(set(uuids))
+    rows = []
+    for i in range(0, len(uuids), _BATCH):
+        vigentes = (
+            CFDI.company_id == company_id,
+            CFDI.uuid.in_(uuids[i:i + _BATCH]),
+            or_(CFDI.estado.is_(None), CFDI.estado == EstadoCFDI.VIGENTE),
+        )
+        chunk = db.execute(select(CFDI.uuid, CFDI.tipo_comprobante, CFDI.fecha_emision).where(*vigentes)).all()
+        if chunk:
+            db.execute(
+                update(CFDI).where(*vigentes)
+                .values(estado=EstadoCFDI.CANCELADO, fecha_cancelacion=fecha_cancelacion)
+                .execution_options(synchronize_session=False)
+            )
+            rows.extend(chunk)
+    if not rows:
+        return 0
+
+    refresh_counterparties(db, company_id, (fecha for _, _, fecha in rows))
+    replace_conceptos(db, company_id, {uuid: (fecha, None, []) for uuid, _, fecha in rows})
+    invoices = replace_applications(
+        db, company_id, {uuid: (fecha, []) for uuid, tipo, fecha in rows if tipo == TipoCFDI.PAGO},
+    )
+    invoices.update(uuid for uuid, tipo, _ in rows if tipo == TipoCFDI.INGRESO)
+    if invoices:
+        refresh_balances(db, company_id, invoices)
+        update_cxc_score(db, company_id)
+    bump_version(db, company_id, (fecha for _, _, fecha in rows))
+    invalidate_company(company_id)
+    return len(rows)
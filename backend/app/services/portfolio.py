@@ -0,0 +1,204 @@
+"""
+Portafolio consolidado para despachos contables
+
+Las estadísticas de todas las empresas se calculan con consultas agrupadas
+sobre `company_id IN (...)`, de modo que el número de consultas es constante
+sin importar cuántas empresas tenga el portafolio.
+"""
+from datetime import datetime
+from typing import Iterable
+
+from sqlalchemy import func, case, and_, select, literal, union_all
+from sqlalchemy.orm import Session
+
+from app.models import Company, CFDI, CFDIRollup, FiscalAlert, HealthScore
+from app.models.cfdi import TipoCFDI
+from app.models.fiscal_alert import AlertSeverity
+from app.schemas.company import CompanyWithStats
+from app.schemas.portfolio import PortfolioCompany, PortfolioTotals, PortfolioDashboard
+from app.services.reads import company_rows
+
+SORT_OPTIONS = ("riesgo", "health_score", "ingresos", "razon_social")
+
+
+def company_stats_map(db: Session, companies: Iterable) -> dict[int, dict]:
+    """
+    Calcula KPIs del mes, total de CFDIs, último score y alertas pendientes
+    para un conjunto de empresas en 3 consultas agrupadas.
+    """
+    companies = list(companies)
+    ids = [c.id for c in companies]
+    stats = {
+        cid: {
+            "total_cfdis": 0,
+            "ingresos_mes": 0.0,
+            "egresos_mes": 0.0,
+            "health_score": 0,
+            "alertas_activas": 0,
+            "alertas_rojas": 0,
+            "alertas_amarillas": 0,
+        }
+        for cid in ids
+    }
+    if not ids:
+        return stats
+
+    month_start = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+    # Ingresos/egresos del mes y total de CFDIs por empresa (más los archivados)
+    en_mes = CFDI.fecha_emision >= month_start
+    hot = (
+        select(
+            CFDI.company_id.label("company_id"),
+            func.sum(case(
+                (and_(CFDI.tipo_comprobante == TipoCFDI.INGRESO, CFDI.emisor_rfc == Company.rfc, en_mes), CFDI.total),
+                else_=0,
+            )).label("ingresos"),
+            func.sum(case(
+                (and_(CFDI.tipo_comprobante == TipoCFDI.EGRESO, en_mes), CFDI.total),
+                else_=0,
+            )).label("egresos"),
+            func.count(CFDI.id).label("cfdis"),
+        )
+        .join(Company, Company.id == CFDI.company_id)
+        .where(CFDI.company_id.in_(ids))
+        .group_by(CFDI.company_id)
+    )
+    archived = (
+        select(CFDIRollup.company_id, literal(0), literal(0), func.sum(CFDIRollup.num_cfdis))
+        .where(CFDIRollup.company_id.in_(ids))
+        .group_by(CFDIRollup.company_id)
+    )
+    both = union_all(hot, archived).subquery()
+    cfdi_rows = db.execute(
+        select(both.c.company_id, func.sum(both.c.ingresos), func.sum(both.c.egresos), func.sum(both.c.cfdis))
+        .group_by(both.c.company_id)
+    ).all()
+    for company_id, ingresos, egresos, total in cfdi_rows:
+        s = stats[company_id]
+        s["ingresos_mes"] = float(ingresos or 0)
+        s["egresos_mes"] = float(egresos or 0)
+        s["total_cfdis"] = int(total or 0)
+
+    # Último Health Score por empresa
+    ranked = (
+        select(
+            HealthScore.company_id,
+            HealthScore.score_total,
+            func.row_number().over(
+                partition_by=HealthScore.company_id,
+                order_by=(HealthScore.created_at.desc(), HealthScore.id.desc()),
+            ).label("rn"),
+        )
+        .where(HealthScore.company_id.in_(ids))
+        .subquery()
+    )
+    for company_id, score in db.execute(
+        select(ranked.c.company_id, ranked.c.score_total).where(ranked.c.rn == 1)
+    ).all():
+        stats[company_id]["health_score"] = score
+
+    # Alertas pendientes por severidad
+    for company_id, severity, count in db.execute(
+        select(FiscalAlert.company_id, FiscalAlert.severity, func.count(FiscalAlert.id))
+        .where(FiscalAlert.company_id.in_(ids), FiscalAlert.is_resolved == "pending")
+        .group_by(FiscalAlert.company_id, FiscalAlert.severity)
+    ).all():
+        s = stats[company_id]
+        s["alertas_activas"] += count
+        if severity == AlertSeverity.ROJO:
+            s["alertas_rojas"] += count
+        elif severity == AlertSeverity.AMARILLO:
+            s["alertas_amarillas"] += count
+
+    return stats
+
+
+def company_with_stats(company, stats: dict) -> CompanyWithStats:
+    """Arma la respuesta de `/api/companies` a partir de `company_stats_map`."""
+    return CompanyWithStats(
+        id=company.id,
+        rfc=company.rfc,
+        razon_social=company.razon_social,
+        regimen_fiscal=company.regimen_fiscal,
+        codigo_postal=company.codigo_postal,
+        sector=company.sector,
+        sat_connected=company.sat_connected,
+        sat_last_sync=company.sat_last_sync,
+        demo_scenario=company.demo_scenario,
+        created_at=company.created_at,
+        total_cfdis=stats["total_cfdis"],
+        ingresos_mes=stats["ingresos_mes"],
+        egresos_mes=stats["egresos_mes"],
+        health_score=stats["health_score"],
+        alertas_activas=stats["alertas_activas"],
+    )
+
+
+def risk_score(health_score: int, alertas_rojas: int, alertas_amarillas: int) -> int:
+    """Riesgo 0-100: inverso del score de salud, penalizado por alertas abiertas."""
+    return max(0, min(100, 100 - health_score + 15 * alertas_rojas + 5 * alertas_amarillas))
+
+
+def build_portfolio(
+    db: Session,
+    owner_id: int,
+    page: int = 1,
+    per_page: int = 20,
+    sort: str = "riesgo",
+) -> PortfolioDashboard:
+    """Dashboard consolidado de todas las empresas de un usuario."""
+    companies = company_rows(db, Company.owner_id == owner_id)
+    stats = company_stats_map(db, companies)
+
+    items = []
+    for c in companies:
+        s = stats[c.id]
+        ingresos, egresos = s["ingresos_mes"], s["egresos_mes"]
+        items.append(PortfolioCompany(
+            id=c.id,
+            rfc=c.rfc,
+            razon_social=c.razon_social,
+            regimen_fiscal=c.regimen_fiscal,
+            codigo_postal=c.codigo_postal,
+            sector=c.sector,
+            sat_connected=c.sat_connected,
+            sat_last_sync=c.sat_last_sync,
+            demo_scenario=c.demo_scenario,
+            created_at=c.created_at,
+            margen_bruto=round((ingresos - egresos) / ingresos * 100, 1) if ingresos > 0 else 0,
+            riesgo=risk_score(s["health_score"], s["alertas_rojas"], s["alertas_amarillas"]),
+            **s,
+        ))
+
+    if sort == "health_score":
+        items.sort(key=lambda i: (i.health_score, i.id))
+    elif sort == "ingresos":
+        items.sort(key=lambda i: (-i.ingresos_mes, i.id))
+    elif sort == "razon_social":
+        items.sort(key=lambda i: (i.razon_social, i.id))
+    else:
+        items.sort(key=lambda i: (-i.riesgo, i.health_score, i.id))
+
+    total_ingresos = sum(i.ingresos_mes for i in items)
+    total_egresos = sum(i.egresos_mes for i in items)
+    totales = PortfolioTotals(
+        empresas=len(items),
+        total_cfdis=sum(i.total_cfdis for i in items),
+        ingresos_mes=total_ingresos,
+        egresos_mes=total_egresos,
+        margen_bruto=round((total_ingresos - total_egresos) / total_ingresos * 100, 1) if total_ingresos > 0 else 0,
+        health_score_promedio=round(sum(i.health_score for i in items) / len(items), 1) if items else 0,
+        alertas_activas=sum(i.alertas_activas for i in items),
+        empresas_en_riesgo=sum(1 for i in items if i.health_score < 65 or i.alertas_rojas > 0),
+    )
+
+    offset = (page - 1) * per_page
+    return PortfolioDashboard(
+        total=len(items),
+        page=page,
+        per_page=per_page,
+        sort=sort,
+        totales=totales,
+        empresas=items[offset:offset + per_page],
+    )
@@ -0,0 +1,56 @@
+"""
+Lecturas con proyección de columnas
+
+Los endpoints de lectura piden solo las columnas que van a emitir y trabajan
+con las filas (`Row`, tuplas con acceso por nombre) en lugar de entidades ORM:
+sin identity map, sin estado de cambios y sin cargar columnas grandes.
+"""
+from typing import Optional
+
+from sqlalchemy import select, desc, func
+from sqlalchemy.engine import Row
+from sqlalchemy.orm import Session
+
+from app.models import Company, CFDI, CFDIRollup, HealthScore
+
+# Columnas de CompanyWithStats / PortfolioCompany
+COMPANY_COLUMNS = (
+    Company.id, Company.rfc, Company.razon_social, Company.regimen_fiscal, Company.codigo_postal,
+    Company.sector, Company.sat_connected, Company.sat_last_sync, Company.demo_scenario, Company.created_at,
+    Company.data_version,
+)
+
+# Componentes del Health Score, en el orden en que se muestran
+HEALTH_COLUMNS = (
+    HealthScore.score_total, HealthScore.liquidez, HealthScore.cumplimiento_fiscal,
+    HealthScore.diversificacion_clientes, HealthScore.tendencia_ingresos, HealthScore.margen_operativo,
+    HealthScore.estacionalidad, HealthScore.antiguedad_cxc, HealthScore.riesgo_proveedores,
+)
+
+
+def company_rows(db: Session, *where) -> list[Row]:
+    """Empresas que cumplen `where`, ordenadas por ID."""
+    return db.execute(select(*COMPANY_COLUMNS).where(*where).order_by(Company.id)).all()
+
+
+def company_row(db: Session, company_id: int) -> Optional[Row]:
+    return db.execute(select(*COMPANY_COLUMNS).where(Company.id == company_id)).first()
+
+
+def latest_health(db: Session, company_id: int, columns=HEALTH_COLUMNS) -> Optional[Row]:
+    """Último Health Score de la empresa, solo con `columns`."""
+    return db.execute(
+        select(*columns)
+        .where(HealthScore.company_id == company_id)
+        .order_by(desc(HealthScore.created_at))
+        .limit(1)
+    ).first()
+
+
+def cfdi_count(db: Session, company_id: int) -> int:
+    """CFDIs de la empresa: los de la tabla más los archivados (ver app/archive.py), en una consulta."""
+    hot = select(func.count(CFDI.id)).where(CFDI.company_id == company_id).scalar_subquery()
+    archived = select(func.coalesce(func.sum(CFDIRollup.num_cfdis), 0)).where(
+        CFDIRollup.company_id == company_id
+    ).scalar_subquery()
+    return int(db.execute(select(hot + archived)).scalar() or 0)
@@ -0,0 +1,328 @@
+"""
+Cuentas por cobrar: facturas PPD contra complementos de pago
+
+Una venta PPD (pago en parcialidades o diferido) queda abierta hasta que
+llegan complementos de pago (CFDI tipo PAGO) cuyos DoctoRelacionado la
+citan por UUID (IdDocumento) con el importe pagado (ImpPagado).
+
+- `payment_applications` guarda esas citas. La ingesta las reemplaza por
+  complemento de pago, así re-enviar un PAGO es idempotente y uno cancelado
+  deja de contar.
+- `receivable_balances` guarda el saldo de cada factura: total menos lo
+  aplicado. La ingesta recalcula solo las facturas tocadas por el lote (la
+  factura o alguno de sus pagos), en bloques por UUID; el orden de llegada
+  no importa.
+- El rematch completo es un solo INSERT ... SELECT de las facturas con sus
+  aplicaciones agrupadas, sin traer filas a Python.
+
+El saldo se calcula sobre las facturas que siguen en `cfdis`; las que salen
+al archivo (más viejas que ARCHIVE_HORIZON_MONTHS) dejan de contar.
+
+Uso:
+    python -m app.services.receivables rematch              # todas las empresas
+    python -m app.services.receivables rematch --reparse    # relee también el XML de los PAGO
+    python -m app.services.receivables aging --company 7
+"""
+from datetime import date, datetime, timedelta
+from decimal import Decimal, InvalidOperation
+from typing import Iterable, Optional
+from xml.etree import ElementTree
+import argparse
+
+from sqlalchemy import select, func, delete, insert, update, case, literal, or_, DateTime
+from sqlalchemy.orm import Session
+
+from app.models import Company, CFDI, HealthScore, PaymentApplication, ReceivableBalance
+from app.models.cfdi import TipoCFDI, EstadoCFDI
+from app.services.concepts import as_enum
+
+# Complemento de pagos 2.0 (CFDI 4.0) y 1.0 (CFDI 3.3)
+_PAGO_NAMESPACES = ("http://www.sat.gob.mx/Pagos20", "http://www.sat.gob.mx/Pagos")
+_BATCH = 500
+
+# (etiqueta, días mínimos de antigüedad); el último tramo no tiene tope
+AGING_BUCKETS = (("0-30", 0), ("31-60", 31), ("61-90", 61), ("90+", 91))
+# Peso de cada tramo en la calificación de CxC (100 = todo al corriente)
+_BUCKET_WEIGHTS = {"0-30": 1.0, "31-60": 0.6, "61-90": 0.3, "90+": 0.0}
+
+
+def _fecha(value: Optional[str]) -> Optional[datetime]:
+    try:
+        return datetime.fromisoformat(value) if value else None
+    except ValueError:
+        return None
+
+
+def parse_pagos(xml: str) -> list[dict]:
+    """
+    (factura_uuid, fecha_pago, importe) de cada DoctoRelacionado del XML.
+    Si un DoctoRelacionado no trae ImpPagado y es el único del Pago, se usa
+    el Monto del Pago. Lista vacía si el XML no se puede leer.
+    """
+    try:
+        root = ElementTree.fromstring(xml)
+    except ElementTree.ParseError:
+        return []
+    aplicaciones = []
+    for ns in _PAGO_NAMESPACES:
+        for pago in root.iter(f"{{{ns}}}Pago"):
+            doctos = list(pago.iter(f"{{{ns}}}DoctoRelacionado"))
+            for docto in doctos:
+                importe = docto.get("ImpPagado") or (pago.get("Monto") if len(doctos) == 1 else None)
+                try:
+                    importe = Decimal(importe)
+                except (TypeError, InvalidOperation):
+                    continue
+                if docto.get("IdDocumento"):
+                    aplicaciones.append({
+                        "factura_uuid": docto.get("IdDocumento").strip(),
+                        "fecha_pago": _fecha(pago.get("FechaPago")),
+                        "importe": importe,
+                    })
+    return aplicaciones
+
+
+def aplicaciones_of(row: dict) -> Optional[list[dict]]:
+    """Aplicaciones de un PAGO de ingesta (`pagos` en la fila o su XML); None si no trae de dónde sacarlas."""
+    if row.get("pagos") is not None:
+        return [
+            {"factura_uuid": p["factura_uuid"], "fecha_pago": p.get("fecha_pago"), "importe": Decimal(str(p["importe"]))}
+            for p in row["pagos"]
+        ]
+    if row.get("xml_content"):
+        return parse_pagos(row["xml_content"])
+    return None
+
+
+def applications_for_rows(rows: Iterable[dict]) -> dict[str, tuple[datetime, list[dict]]]:
+    """
+    Argumento de `replace_applications` para filas de ingesta: {uuid del
+    PAGO: (fecha_emision, aplicaciones)}. Un PAGO cancelado queda sin
+    aplicaciones; uno sin `pagos` ni XML conserva las guardadas.
+    """
+    by_pago = {}
+    for row in rows:
+        if as_enum(TipoCFDI, row["tipo_comprobante"]) != TipoCFDI.PAGO:
+            continue
+        cancelado = as_enum(EstadoCFDI, row.get("estado")) == EstadoCFDI.CANCELADO
+        aplicaciones = [] if cancelado else aplicaciones_of(row)
+        if aplicaciones is not None:
+            by_pago[row["uuid"]] = (row["fecha_emision"], aplicaciones)
+    return by_pago
+
+
+def replace_applications(db: Session, company_id: int, by_pago: dict[str, tuple[datetime, list[dict]]]) -> set[str]:
+    """
+    Reemplaza las aplicaciones de cada PAGO de `by_pago`. Funciona con
+    Session o Connection; no hace commit. Regresa los UUIDs de las facturas
+    afectadas (las que citaba antes y las que cita ahora).
+    """
+    pagos = list(by_pago)
+    affected: set[str] = set()
+    for i in range(0, len(pagos), _BATCH):
+        chunk = pagos[i:i + _BATCH]
+        in_chunk = (PaymentApplication.company_id == company_id, PaymentApplication.pago_uuid.in_(chunk))
+        affected.update(db.execute(select(PaymentApplication.factura_uuid).where(*in_chunk)).scalars())
+        db.execute(delete(PaymentApplication).where(*in_chunk).execution_options(synchronize_session=False))
+    rows = [
+        {
+            "company_id": company_id, "pago_uuid": pago_uuid, "factura_uuid": a["factura_uuid"],
+            "fecha_pago": a["fecha_pago"] or fecha, "importe": a["importe"],
+        }
+        for pago_uuid, (fecha, aplicaciones) in by_pago.items()
+        for a in aplicaciones
+    ]
+    if rows:
+        db.execute(insert(PaymentApplication), rows)
+    affected.update(r["factura_uuid"] for r in rows)
+    return affected
+
+
+def _balances_select(company_id: int, rfc: str, uuids: Optional[list[str]] = None):
+    """Saldo de las ventas PPD vigentes de la empresa (todas o las de `uuids`) con sus aplicaciones agrupadas."""
+    pa = PaymentApplication
+    applied = select(
+        pa.factura_uuid, func.sum(pa.importe).label("pagado"), func.max(pa.fecha_pago).label("ultimo_pago"),
+    ).where(pa.company_id == company_id)
+    invoices = [
+        CFDI.company_id == company_id,
+        CFDI.tipo_comprobante == TipoCFDI.INGRESO,
+        CFDI.metodo_pago == "PPD",
+        CFDI.emisor_rfc == rfc,
+        or_(CFDI.estado.is_(None), CFDI.estado == EstadoCFDI.VIGENTE),
+    ]
+    if uuids is not None:
+        applied = applied.where(pa.factura_uuid.in_(uuids))
+        invoices.append(CFDI.uuid.in_(uuids))
+    applied = applied.group_by(pa.factura_uuid).subquery()
+    pagado = func.coalesce(applied.c.pagado, 0)
+    return (
+        select(
+            literal(company_id), CFDI.uuid, CFDI.fecha_emision, CFDI.receptor_rfc,
+            CFDI.total, pagado, CFDI.total - pagado, applied.c.ultimo_pago,
+        )
+        .select_from(CFDI)
+        .outerjoin(applied, applied.c.factura_uuid == CFDI.uuid)
+        .where(*invoices)
+    )
+
+
+_BALANCE_COLUMNS = ["company_id", "cfdi_uuid", "fecha_emision", "receptor_rfc", "total", "pagado", "saldo", "ultimo_pago"]
+
+
+def _company_rfc(db: Session, company_id: int) -> str:
+    return db.execute(select(Company.rfc).where(Company.id == company_id)).scalar_one()
+
+
+def refresh_balances(db: Session, company_id: int, uuids: Iterable[str], rfc: Optional[str] = None) -> int:
+    """Recalcula el saldo de las facturas `uuids` en bloques. No hace commit; regresa cuántas recalculó."""
+    uuids = sorted(set(uuids))
+    if not uuids:
+        return 0
+    rfc = rfc or _company_rfc(db, company_id)
+    for i in range(0, len(uuids), _BATCH):
+        chunk = uuids[i:i + _BATCH]
+        db.execute(
+            delete(ReceivableBalance)
+            .where(ReceivableBalance.company_id == company_id, ReceivableBalance.cfdi_uuid.in_(chunk))
+            .execution_options(synchronize_session=False)
+        )
+        db.execute(insert(ReceivableBalance).from_select(_BALANCE_COLUMNS, _balances_select(company_id, rfc, chunk)))
+    return len(uuids)
+
+
+def rematch_receivables(db: Session, company_id: int) -> int:
+    """Recalcula todos los saldos de la empresa con una sola sentencia. No hace commit."""
+    db.execute(
+        delete(ReceivableBalance).where(ReceivableBalance.company_id == company_id)
+        .execution_options(synchronize_session=False)
+    )
+    result = db.execute(
+        insert(ReceivableBalance).from_select(_BALANCE_COLUMNS, _balances_select(company_id, _company_rfc(db, company_id)))
+    )
+    return result.rowcount
+
+
+def reparse_payments(db: Session, company_id: int, batch_size: int = 2000) -> int:
+    """
+    Regenera `payment_applications` de la empresa leyendo en streaming el XML
+    de sus PAGO vigentes. No hace commit; regresa cuántas aplicaciones escribió.
+    """
+    db.execute(
+        delete(PaymentApplication).where(PaymentApplication.company_id == company_id)
+        .execution_options(synchronize_session=False)
+    )
+    rows = db.execute(
+        select(CFDI.uuid, CFDI.fecha_emision, CFDI.xml_content)
+        .where(
+            CFDI.company_id == company_id,
+            CFDI.tipo_comprobante == TipoCFDI.PAGO,
+            or_(CFDI.estado.is_(None), CFDI.estado == EstadoCFDI.VIGENTE),
+            CFDI.xml_content.is_not(None),
+        )
+        .execution_options(yield_per=batch_size)
+    )
+    written, batch = 0, []
+    for pago_uuid, fecha, xml in rows:
+        batch.extend(
+            {"company_id": company_id, "pago_uuid": pago_uuid, "factura_uuid": a["factura_uuid"],
+             "fecha_pago": a["fecha_pago"] or fecha, "importe": a["importe"]}
+            for a in parse_pagos(xml)
+        )
+        if len(batch) >= batch_size:
+            db.execute(insert(PaymentApplication), batch)
+            written += len(batch)
+            batch = []
+    if batch:
+        db.execute(insert(PaymentApplication), batch)
+        written += len(batch)
+    return written
+
+
+def aging_buckets(db: Session, company_id: int, today: Optional[date] = None) -> dict:
+    """
+    Saldo abierto por antigüedad desde la emisión, con una consulta agrupada:
+    {"0-30": {"saldo", "facturas"}, ..., "90+": {...}}.
+    """
+    today = today or date.today()
+    midnight = datetime(today.year, today.month, today.day)
+    rb = ReceivableBalance
+    # Un día de antigüedad empieza a medianoche: emitida hoy = 0 días
+    bucket = case(
+        *(
+            (rb.fecha_emision >= literal(midnight - timedelta(days=siguiente - 1), DateTime(timezone=True)), label)
+            for (label, _), (_, siguiente) in zip(AGING_BUCKETS, AGING_BUCKETS[1:])
+        ),
+        else_=AGING_BUCKETS[-1][0],
+    ).label("bucket")
+    rows = db.execute(
+        select(bucket, func.sum(rb.saldo).label("saldo"), func.count().label("facturas"))
+        .where(rb.company_id == company_id, rb.saldo > 0)
+        .group_by(bucket)
+    ).all()
+    found = {r.bucket: r for r in rows}
+    return {
+        label: {"saldo": float(found[label].saldo) if label in found else 0.0,
+                "facturas": found[label].facturas if label in found else 0}
+        for label, _ in AGING_BUCKETS
+    }
+
+
+def cxc_score(buckets: dict) -> int:
+    """Calificación 0-100 de la antigüedad de CxC: saldo ponderado por tramo (sin saldo = 100)."""
+    total = sum(b["saldo"] for b in buckets.values())
+    if total <= 0:
+        return 100
+    return round(100 * sum(_BUCKET_WEIGHTS[label] * b["saldo"] for label, b in buckets.items()) / total)
+
+
+def update_cxc_score(db: Session, company_id: int, today: Optional[date] = None) -> Optional[int]:
+    """Escribe la calificación de CxC en el HealthScore más reciente de la empresa. No hace commit."""
+    latest = select(func.max(HealthScore.id)).where(HealthScore.company_id == company_id).scalar_subquery()
+    score = cxc_score(aging_buckets(db, company_id, today))
+    result = db.execute(
+        update(HealthScore).where(HealthScore.id == latest).values(antiguedad_cxc=score)
+        .execution_options(synchronize_session=False)
+    )
+    return score if result.rowcount else None
+
+
+def rebuild_receivables(db: Session, company_id: int, reparse: bool = True) -> int:
+    """Aplicaciones desde el XML (opcional), saldos y calificación de CxC de la empresa. No hace commit."""
+    if reparse:
+        reparse_payments(db, company_id)
+    balances = rematch_receivables(db, company_id)
+    update_cxc_score(db, company_id)
+    return balances
+
+
+def main() -> None:
+    from app.database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Cuentas por cobrar (PPD contra complementos de pago)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_rematch = sub.add_parser("rematch", help="Recalcula los saldos de todas las facturas PPD")
+    p_rematch.add_argument("--company", type=int, action="append", dest="company_ids")
+    p_rematch.add_argument("--reparse", action="store_true", help="Regenera antes las aplicaciones desde el XML")
+    p_aging = sub.add_parser("aging", help="Saldo abierto por antigüedad")
+    p_aging.add_argument("--company", type=int, action="append", dest="company_ids")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        company_ids = args.company_ids or db.execute(select(Company.id).order_by(Company.id)).scalars().all()
+        for company_id in company_ids:
+            if args.command == "rematch":
+                started = datetime.now()
+                balances = rebuild_receivables(db, company_id, reparse=args.reparse)
+                db.commit()
+                print(f"empresa {company_id}: {balances} facturas PPD en {(datetime.now() - started).total_seconds():.1f}s")
+            else:
+                for label, b in aging_buckets(db, company_id).items():
+                    print(f"empresa {company_id} {label:>6}: {b['facturas']:>7} facturas  ${b['saldo']:,.2f}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+"""
+Búsqueda de CFDIs con filtros combinados y paginación por llave
+
+Filtros (todos opcionales y combinables): nombre de contraparte (`q`,
+subcadena), prefijo de RFC de emisor o receptor, folio, serie, fragmento de
+UUID, rango de fechas de emisión, rango de monto, estado y tipo. Los
+resultados van del más reciente al más viejo y se paginan con un cursor
+opaco de (fecha_emision, id): cada página cuesta lo mismo sin importar qué
+tan lejos se esté, a diferencia del OFFSET de la lista.
+
+Índices (ver app/models/cfdi.py y la migración 0009):
+  - btree por empresa para fecha, RFC (el prefijo se busca como rango, así
+    sirve en cualquier motor), monto y folio.
+  - Texto: pg_trgm (GIN) en PostgreSQL, donde `ILIKE '%...%'` usa el índice;
+    en SQLite una tabla FTS5 con tokenizer trigram (`cfdis_fts`).
+
+En SQLite el planificador no sabe qué tan selectivo es un filtro, así que
+la búsqueda lo mide con conteos cortados en SPARSE_LIMIT: si algún filtro
+deja pocos CFDIs se parte de su índice y se ordena ese puñado; si todos
+dejan muchos se recorre el índice (company_id, fecha_emision) en orden y
+se filtra, que encuentra una página completa en pocas filas. Los demás
+índices se descartan con `+columna` para que el planificador no elija
+otro. PostgreSQL hace esa elección con sus estadísticas.
+
+Solo busca en la tabla `cfdis`; los meses archivados en Parquet no entran.
+"""
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from dataclasses import dataclass
+from datetime import date, datetime
+from decimal import Decimal
+from functools import lru_cache
+from typing import Optional
+import binascii
+import json
+
+from sqlalchemy import and_, desc, func, or_, select, table, column, text, tuple_
+from sqlalchemy.sql import operators
+from sqlalchemy.sql.elements import UnaryExpression
+from sqlalchemy.engine import Engine, Row
+from sqlalchemy.orm import Session
+
+from app.models import CFDI
+from app.models.cfdi import TipoCFDI, EstadoCFDI
+
+# Coincidencias de los filtros selectivos por debajo de las cuales conviene partir de ellos
+SPARSE_LIMIT = 2000
+MIN_TEXT_LENGTH = 3  # Un trigrama
+
+_fts = table("cfdis_fts", column("rowid"))
+
+
+class InvalidCursor(ValueError):
+    """El cursor no es uno emitido por esta búsqueda."""
+
+
+@dataclass
+class CFDISearch:
+    q: Optional[str] = None
+    rfc: Optional[str] = None
+    folio: Optional[str] = None
+    serie: Optional[str] = None
+    uuid: Optional[str] = None
+    desde: Optional[date] = None
+    hasta: Optional[date] = None  # Excluida, como en la exportación
+    monto_min: Optional[Decimal] = None
+    monto_max: Optional[Decimal] = None
+    estado: Optional[EstadoCFDI] = None
+    tipo: Optional[TipoCFDI] = None
+
+    @property
+    def selective(self) -> bool:
+        """Trae algún filtro que puede reducir mucho los resultados."""
+        return any(v is not None for v in (self.q, self.rfc, self.folio, self.uuid, self.monto_min, self.monto_max))
+
+
+def encode_cursor(fecha_emision: datetime, cfdi_id: int) -> str:
+    raw = json.dumps([fecha_emision.isoformat(), cfdi_id]).encode()
+    return urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        fecha, cfdi_id = json.loads(urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return datetime.fromisoformat(fecha), int(cfdi_id)
+    except (ValueError, TypeError, binascii.Error) as exc:
+        raise InvalidCursor("Cursor inválido") from exc
+
+
+@lru_cache(maxsize=8)
+def _has_fts(engine: Engine) -> bool:
+    # Una base creada antes de la migración 0009 no tiene la tabla: se busca con LIKE
+    with engine.connect() as conn:
+        return conn.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'cfdis_fts'")).first() is not None
+
+
+def _contains(col, value: str):
+    escaped = value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return col.ilike(f"%{escaped}%", escape="\\")
+
+
+def _fts_phrase(value: str) -> str:
+    return '"' + value.replace('"', '""') + '"'
+
+
+def _fts_match(params: CFDISearch) -> str:
+    terms = []
+    if params.q:
+        terms.append("{emisor_nombre receptor_nombre} : " + _fts_phrase(params.q))
+    if params.uuid:
+        terms.append("uuid : " + _fts_phrase(params.uuid))
+    return " AND ".join(terms)
+
+
+def _text_filters(params: CFDISearch) -> list:
+    filters = []
+    if params.q:
+        filters.append(or_(_contains(CFDI.emisor_nombre, params.q), _contains(CFDI.receptor_nombre, params.q)))
+    if params.uuid:
+        filters.append(_contains(CFDI.uuid, params.uuid))
+    return filters
+
+
+def _rfc_prefix(col, prefix: str):
+    # Rango [prefijo, siguiente prefijo): usa el btree sin operadores de patrón ni collation
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    return and_(col >= prefix, col < upper)
+
+
+def _unindexed(col):
+    # `+columna`: SQLite ya no puede usar un índice de esa columna (la forma documentada de
+    # descartarlo; el dialecto de SQLAlchemy no emite INDEXED BY)
+    return UnaryExpression(col, operator=operators.custom_op("+"), type_=col.type)
+
+
+def _indexed_only(keys: frozenset):
+    """Envoltura para _filters: solo las columnas en `keys` conservan sus índices."""
+    return lambda col: col if col.key in keys else _unindexed(col)
+
+
+def _rfc_branches(params: CFDISearch, col=lambda c: c) -> list:
+    if not params.rfc:
+        return []
+    rfc = params.rfc.upper()
+    return [_rfc_prefix(col(CFDI.emisor_rfc), rfc), _rfc_prefix(col(CFDI.receptor_rfc), rfc)]
+
+
+def _filters(params: CFDISearch, company_id: int, col=lambda c: c) -> list:
+    """
+    Filtros sin los de texto ni el de RFC. `col` envuelve las columnas que no
+    son empresa ni fecha (ver _unindexed).
+    """
+    filters = [CFDI.company_id == company_id]
+    if params.desde:
+        filters.append(CFDI.fecha_emision >= datetime.combine(params.desde, datetime.min.time()))
+    if params.hasta:
+        filters.append(CFDI.fecha_emision < datetime.combine(params.hasta, datetime.min.time()))
+    if params.estado:
+        filters.append(col(CFDI.estado) == params.estado)
+    if params.tipo:
+        filters.append(col(CFDI.tipo_comprobante) == params.tipo)
+    if params.monto_min is not None:
+        filters.append(col(CFDI.total) >= params.monto_min)
+    if params.monto_max is not None:
+        filters.append(col(CFDI.total) <= params.monto_max)
+    if params.folio:
+        filters.append(col(CFDI.folio) == params.folio)
+    if params.serie:
+        filters.append(col(CFDI.serie) == params.serie)
+    return filters
+
+
+def _drivers(params: CFDISearch, company_id: int, match) -> list[tuple[str, list, frozenset]]:
+    """
+    Filtros que pueden guiar la consulta desde su propio índice: (nombre,
+    sondeos, columnas que conservan índice). Cada sondeo usa solo ese filtro
+    y la empresa, así cuesta lo mismo con 10 mil o con un millón de CFDIs.
+    """
+    own = CFDI.company_id == company_id
+    drivers = []
+    if params.folio:
+        drivers.append(("folio", [select(CFDI.id).where(own, CFDI.folio == params.folio)], frozenset({"folio"})))
+    if match is not None:
+        # El join recorre los rowid del índice de texto y se detiene en el límite;
+        # `id IN (MATCH)` juntaría todas las coincidencias antes de contar
+        probe = select(CFDI.id).select_from(_fts.join(CFDI, CFDI.id == _fts.c.rowid)).where(match, own)
+        drivers.append(("texto", [probe], frozenset()))
+    if params.rfc:
+        # Una rama por columna: el OR juntaría las filas de ambos índices antes de contar
+        probes = [select(CFDI.id).where(own, branch) for branch in _rfc_branches(params)]
+        drivers.append(("rfc", probes, frozenset({"emisor_rfc", "receptor_rfc"})))
+    if params.monto_min is not None or params.monto_max is not None:
+        amount = CFDISearch(monto_min=params.monto_min, monto_max=params.monto_max)
+        drivers.append(("monto", [select(CFDI.id).where(*_filters(amount, company_id))], frozenset({"total"})))
+    return drivers
+
+
+def _count_upto(db: Session, probes: list, limit: int) -> int:
+    """Suma de coincidencias de `probes`, cada una cortada en `limit` + 1 filas."""
+    total = 0
+    for probe in probes:
+        total += db.execute(select(func.count()).select_from(probe.limit(limit + 1).subquery())).scalar()
+        if total > limit:
+            break
+    return total
+
+
+def search_cfdis(
+    db: Session,
+    company_id: int,
+    params: CFDISearch,
+    columns: tuple,
+    limit: int = 50,
+    cursor: Optional[str] = None,
+) -> tuple[list[Row], Optional[str]]:
+    """
+    Una página de CFDIs de la empresa que cumplen `params`, del más reciente
+    al más viejo, con `columns` (debe incluir fecha_emision e id). Regresa
+    las filas y el cursor de la página siguiente (None si es la última).
+    """
+    filters = _filters(params, company_id)
+    branches = _rfc_branches(params)
+    text_filters = _text_filters(params)
+    if db.get_bind().dialect.name == "sqlite" and params.selective:
+        match = None
+        if _fts_match(params) and _has_fts(db.get_bind().engine):
+            match = text("cfdis_fts MATCH :match").bindparams(match=_fts_match(params))
+            # Siempre por el índice de texto: el LIKE de SQLite solo ignora mayúsculas en ASCII
+            # ("móvil" no encuentra "MÓVIL") y el tokenizer trigram sí las pliega
+            text_filters = [CFDI.id.in_(select(_fts.c.rowid).where(match))]
+        # Sin un filtro escaso, el índice (company_id, fecha_emision) en orden llena la página
+        # en pocas filas; cualquier otro obligaría a juntar y ordenar todas las coincidencias
+        keys = frozenset()
+        for _, probes, indexed in _drivers(params, company_id, match):
+            if _count_upto(db, probes, SPARSE_LIMIT) <= SPARSE_LIMIT:
+                keys = indexed
+                break
+        filters = _filters(params, company_id, _indexed_only(keys))
+        branches = _rfc_branches(params, _indexed_only(keys))
+
+    filters += text_filters
+    if branches:
+        filters.append(or_(*branches))
+    if cursor:
+        fecha, cfdi_id = decode_cursor(cursor)
+        filters.append(tuple_(CFDI.fecha_emision, CFDI.id) < tuple_(fecha, cfdi_id))
+
+    query = select(*columns).where(*filters).order_by(desc(CFDI.fecha_emision), desc(CFDI.id)).limit(limit + 1)
+    rows = db.execute(query).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].fecha_emision, rows[-1].id)
+    return rows, next_cursor
@@ -0,0 +1,343 @@
+"""
+Secciones de la vista de una empresa: dashboard, health score, predicciones y crédito
+
+Cada sección se arma en dos pasos: sus consultas y el ensamblado del
+payload. Los endpoints individuales y el bundle
+(GET /api/companies/{id}/bundle) usan las mismas funciones de ensamblado,
+así que el payload de cada sección es idéntico en ambos.
+
+El bundle comparte entre secciones un `CompanySnapshot`: el último
+HealthScore, el total de CFDIs y los totales mensuales (una sola consulta
+para los meses del dashboard y de las predicciones), en lugar de que cada
+endpoint los vuelva a consultar.
+"""
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Optional
+
+from sqlalchemy import select, func
+from sqlalchemy.engine import Row
+from sqlalchemy.orm import Session
+
+from app.models import CFDI, FiscalAlert
+from app.models.cfdi import TipoCFDI, EstadoCFDI
+from app.partitioning import add_months
+from app.services.cashflow import daily_cash_flow
+from app.services.concepts import revenue_by_category
+from app.services.counterparties import top_counterparties, ranking_item, month_of, CLIENTE, PROVEEDOR
+from app.services.credit import credit_info
+from app.services.reads import latest_health, cfdi_count
+from app.services.totals import monthly_totals
+
+SECTIONS = ("dashboard", "health", "predictions", "credit")
+
+# (nombre, columna de HealthScore, peso) en el orden en que se muestran
+HEALTH_COMPONENTS = (
+    ("Liquidez estimada", "liquidez", "20%"),
+    ("Cumplimiento fiscal", "cumplimiento_fiscal", "20%"),
+    ("Diversificación clientes", "diversificacion_clientes", "15%"),
+    ("Tendencia de ingresos", "tendencia_ingresos", "15%"),
+    ("Margen operativo", "margen_operativo", "10%"),
+    ("Estacionalidad controlada", "estacionalidad", "10%"),
+    ("Antigüedad de CxC", "antiguedad_cxc", "5%"),
+    ("Riesgo proveedores", "riesgo_proveedores", "5%"),
+)
+
+# Estacionalidad
+SEASONAL_MONTHS = (
+    {"mes": "Ene", "factor": 0.85, "nota": "Inicio lento post-fiestas"},
+    {"mes": "Feb", "factor": 0.92, "nota": "Recuperación gradual"},
+    {"mes": "Mar", "factor": 1.05, "nota": "Cierre Q1 - pico estacional"},
+    {"mes": "Abr", "factor": 0.95, "nota": "Declaración anual - gastos extras"},
+    {"mes": "May", "factor": 1.02, "nota": "Estabilización"},
+    {"mes": "Jun", "factor": 1.08, "nota": "Cierre Q2 - buen momento"},
+    {"mes": "Jul", "factor": 0.90, "nota": "Vacaciones - caída temporal"},
+    {"mes": "Ago", "factor": 0.95, "nota": "Recuperación lenta"},
+    {"mes": "Sep", "factor": 1.10, "nota": "Cierre Q3 - fuerte"},
+    {"mes": "Oct", "factor": 1.05, "nota": "Pre-cierre fiscal"},
+    {"mes": "Nov", "factor": 1.15, "nota": "Buen Fin - pico ventas"},
+    {"mes": "Dic", "factor": 1.20, "nota": "Cierre fiscal - máximo"},
+)
+
+
+def _month_range(today: datetime, i: int) -> tuple[datetime, datetime]:
+    month_start = (today - timedelta(days=30 * i)).replace(day=1)
+    return month_start, (month_start + timedelta(days=32)).replace(day=1)
+
+
+def dashboard_months(today: datetime) -> list[tuple[datetime, datetime]]:
+    """Revenue data: últimos 8 meses, del más viejo al actual."""
+    return [_month_range(today, i) for i in range(7, -1, -1)]
+
+
+def prediction_months(today: datetime) -> list[tuple[datetime, datetime]]:
+    """Base de las proyecciones: últimos 6 meses, del actual al más viejo."""
+    return [_month_range(today, i) for i in range(6)]
+
+
+@dataclass
+class CompanySnapshot:
+    """Lo que comparten las secciones de una empresa, consultado una vez."""
+    company: Row
+    today: datetime
+    health: Optional[Row] = None
+    total_cfdis: int = 0
+    totals: dict[tuple[datetime, datetime], tuple[float, float]] = field(default_factory=dict)
+
+    def monthly(self, months: list[tuple[datetime, datetime]]) -> list[tuple[float, float]]:
+        return [self.totals[m] for m in months]
+
+
+def load_snapshot(db: Session, company: Row, today: datetime, sections) -> CompanySnapshot:
+    """Health score, conteo de CFDIs y totales mensuales, solo si alguna de `sections` los usa."""
+    snapshot = CompanySnapshot(company=company, today=today)
+    if {"dashboard", "health", "credit"} & set(sections):
+        snapshot.health = latest_health(db, company.id)
+    if {"dashboard", "credit"} & set(sections):
+        snapshot.total_cfdis = cfdi_count(db, company.id)
+    months = []
+    if "dashboard" in sections:
+        months += dashboard_months(today)
+    if "predictions" in sections:
+        months += prediction_months(today)
+    months = sorted(set(months))
+    snapshot.totals = dict(zip(months, monthly_totals(db, company, months)))
+    return snapshot
+
+
+# ── Dashboard ──
+
+@dataclass
+class DashboardData:
+    """Consultas propias del dashboard (no compartidas con otras secciones)."""
+    ingresos_mes: Decimal
+    egresos_mes: Decimal
+    ingresos_anterior: Decimal
+    top_clientes: list[dict]
+    top_proveedores: list[dict]
+    semaforo: list[dict]
+    cash_flow_data: list[dict]
+    categorias: list[dict]
+
+
+def semaforo_items(db: Session, company_id: int) -> list[dict]:
+    """Semáforo fiscal: alertas de la empresa con la forma de SemaforoItem."""
+    # ejemplo/accion_recomendada se extraen del JSON en la base (->> / json_extract)
+    alerts = db.execute(
+        select(
+            FiscalAlert.titulo,
+            FiscalAlert.severity,
+            FiscalAlert.detalle,
+            FiscalAlert.metadata_json["ejemplo"].as_string().label("ejemplo"),
+            FiscalAlert.metadata_json["accion_recomendada"].as_string().label("accion_recomendada"),
+        )
+        .where(FiscalAlert.company_id == company_id)
+        .order_by(FiscalAlert.id)
+    ).all()
+    return [
+        {
+            "nombre": a.titulo,
+            "estado": a.severity.value,
+            "detalle": a.detalle or "",
+            "ejemplo": a.ejemplo,
+            "accion_recomendada": a.accion_recomendada,
+        }
+        for a in alerts
+    ]
+
+
+def dashboard_data(db: Session, company: Row, today: datetime) -> DashboardData:
+    company_id = company.id
+    current_month_start = today.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    last_month_start = (current_month_start - timedelta(days=1)).replace(day=1)
+
+    # Calcular ingresos del mes actual
+    ingresos_mes = db.query(func.sum(CFDI.total)).filter(
+        CFDI.company_id == company_id,
+        CFDI.tipo_comprobante == TipoCFDI.INGRESO,
+        CFDI.emisor_rfc == company.rfc,
+        CFDI.fecha_emision >= current_month_start,
+        CFDI.estado == EstadoCFDI.VIGENTE,
+    ).scalar() or Decimal(0)
+
+    # Calcular egresos del mes actual
+    egresos_mes = db.query(func.sum(CFDI.total)).filter(
+        CFDI.company_id == company_id,
+        CFDI.tipo_comprobante == TipoCFDI.EGRESO,
+        CFDI.fecha_emision >= current_month_start,
+        CFDI.estado == EstadoCFDI.VIGENTE,
+    ).scalar() or Decimal(0)
+
+    # Ingresos mes anterior para variación
+    ingresos_anterior = db.query(func.sum(CFDI.total)).filter(
+        CFDI.company_id == company_id,
+        CFDI.tipo_comprobante == TipoCFDI.INGRESO,
+        CFDI.emisor_rfc == company.rfc,
+        CFDI.fecha_emision >= last_month_start,
+        CFDI.fecha_emision < current_month_start,
+        CFDI.estado == EstadoCFDI.VIGENTE,
+    ).scalar() or Decimal(1)
+
+    # Top clientes y proveedores (acumulados por contraparte, incluye meses archivados)
+    top_clientes = [ranking_item(c) for c in top_counterparties(db, company_id, CLIENTE)]
+    top_proveedores = [ranking_item(p) for p in top_counterparties(db, company_id, PROVEEDOR)]
+
+    semaforo = semaforo_items(db, company_id)
+
+    # Flujo de efectivo: saldo acumulado diario de PUE y complementos de pago (cacheado por día)
+    cash_flow_data = daily_cash_flow(db, company_id, company.rfc, today.date(), version=company.data_version)
+
+    # Ingresos por categoría: conceptos por segmento de ClaveProdServ en el periodo de revenue_data (cacheado)
+    categorias = revenue_by_category(
+        db, company_id, month_of(dashboard_months(today)[0][0]), month_of(add_months(current_month_start, 1)),
+        version=company.data_version,
+    )
+
+    return DashboardData(
+        ingresos_mes=ingresos_mes,
+        egresos_mes=egresos_mes,
+        ingresos_anterior=ingresos_anterior,
+        top_clientes=top_clientes,
+        top_proveedores=top_proveedores,
+        semaforo=semaforo,
+        cash_flow_data=cash_flow_data,
+        categorias=categorias,
+    )
+
+
+def dashboard_section(snapshot: CompanySnapshot, data: DashboardData) -> dict:
+    """Dicts con la forma de DashboardStats, listos para orjson."""
+    company, health = snapshot.company, snapshot.health
+    ingresos_mes, egresos_mes, ingresos_anterior = data.ingresos_mes, data.egresos_mes, data.ingresos_anterior
+
+    # Margen bruto
+    margen = float((ingresos_mes - egresos_mes) / ingresos_mes * 100) if ingresos_mes > 0 else 0.0
+
+    months = dashboard_months(snapshot.today)
+    revenue_data = [
+        {"periodo": month_start.strftime("%Y-%m"), "mes": month_start.strftime("%b"),
+         "ingresos": float(ing), "egresos": float(egr)}
+        for (month_start, _), (ing, egr) in zip(months, snapshot.monthly(months))
+    ]
+
+    return {
+        "ingresos_mes": float(ingresos_mes),
+        "egresos_mes": float(egresos_mes),
+        "margen_bruto": round(margen, 1),
+        "health_score": health.score_total if health else 0,
+        "ingresos_variacion": round(float((ingresos_mes - ingresos_anterior) / ingresos_anterior * 100), 1) if ingresos_anterior else 0.0,
+        "egresos_variacion": -3.1,  # Simplificado para demo
+        "margen_variacion": 2.4,
+        "score_variacion": 3,
+        "revenue_data": revenue_data,
+        "cash_flow_data": data.cash_flow_data,
+        "top_clientes": data.top_clientes,
+        "top_proveedores": data.top_proveedores,
+        "ingresos_por_categoria": data.categorias,
+        "semaforo": data.semaforo,
+        "total_cfdis": snapshot.total_cfdis,
+        "last_sync": company.sat_last_sync,
+    }
+
+
+# ── Health score ──
+
+def health_section(health: Optional[Row]) -> Optional[dict]:
+    """Forma de HealthScoreResponse; None si la empresa no tiene score."""
+    if health is None:
+        return None
+    return {
+        "score_total": health.score_total,
+        "componentes": [
+            {"nombre": nombre, "valor": getattr(health, column), "peso": peso}
+            for nombre, column, peso in HEALTH_COMPONENTS
+        ],
+        "periodo": "Jul 2025 – Feb 2026",
+    }
+
+
+# ── Predicciones ──
+
+def predictions_section(snapshot: CompanySnapshot) -> dict:
+    """Predicciones de flujo de efectivo y tendencias."""
+    company = snapshot.company
+
+    # Ingresos y egresos de los últimos 6 meses para proyectar
+    monthly_data = [
+        {"ingresos": ing, "egresos": egr, "neto": ing - egr}
+        for ing, egr in snapshot.monthly(prediction_months(snapshot.today))
+    ]
+
+    # Promedio para proyecciones
+    avg_ing = sum(m["ingresos"] for m in monthly_data) / max(len(monthly_data), 1)
+    avg_egr = sum(m["egresos"] for m in monthly_data) / max(len(monthly_data), 1)
+
+    # Factores de escenario
+    if company.demo_scenario == "A":
+        factors = [1.02, 1.05, 1.08]
+        egr_factors = [0.98, 1.01, 0.99]
+    elif company.demo_scenario == "B":
+        factors = [0.95, 0.88, 1.15]
+        egr_factors = [1.08, 1.15, 1.02]
+    else:
+        factors = [1.01, 1.03, 1.02]
+        egr_factors = [1.0, 1.02, 0.98]
+
+    meses = ["Mar 2026", "Abr 2026", "May 2026"]
+    projections = []
+    for i, mes in enumerate(meses):
+        ing_proj = avg_ing * factors[i]
+        egr_proj = avg_egr * egr_factors[i]
+        neto = ing_proj - egr_proj
+        alert = None
+        if neto < 0:
+            alert = "Riesgo de Iliquidez"
+        elif neto < avg_ing * 0.1:
+            alert = "Margen Ajustado"
+
+        projections.append({
+            "mes": mes,
+            "ingresos_proyectados": round(ing_proj, 0),
+            "egresos_proyectados": round(egr_proj, 0),
+            "flujo_neto": round(neto, 0),
+            "alerta": alert,
+            "confianza": 85 - (i * 8),
+        })
+
+    # Tendencias
+    revenue_trend = "creciente" if factors[2] > 1.0 else "decreciente"
+    expense_trend = "creciente" if egr_factors[1] > 1.0 else "decreciente"
+
+    # KPIs de predicción
+    total_ing_proj = sum(p["ingresos_proyectados"] for p in projections)
+    total_egr_proj = sum(p["egresos_proyectados"] for p in projections)
+
+    return {
+        "projections": projections,
+        "kpis": {
+            "ingresos_3m": round(total_ing_proj, 0),
+            "egresos_3m": round(total_egr_proj, 0),
+            "flujo_neto_3m": round(total_ing_proj - total_egr_proj, 0),
+            "meses_riesgo": sum(1 for p in projections if p["alerta"]),
+            "revenue_trend": revenue_trend,
+            "expense_trend": expense_trend,
+        },
+        "seasonality": SEASONAL_MONTHS,
+        "risk_assessment": {
+            "nivel": "bajo" if company.demo_scenario == "A" else "medio" if company.demo_scenario == "C" else "alto",
+            "factores": [
+                f"Tendencia de ingresos: {revenue_trend}",
+                f"Tendencia de egresos: {expense_trend}",
+                f"{'Sin alertas de liquidez' if company.demo_scenario == 'A' else 'Posible iliquidez en Mes +2' if company.demo_scenario == 'B' else 'Monitorear concentración'}",
+            ],
+        },
+        "company_name": company.razon_social,
+    }
+
+
+# ── Crédito ──
+
+def credit_section(snapshot: CompanySnapshot) -> dict:
+    score = snapshot.health.score_total if snapshot.health else 0
+    return credit_info(snapshot.company, score, snapshot.total_cfdis)
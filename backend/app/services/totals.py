@@ -0,0 +1,40 @@
+"""
+Totales mensuales de ingresos y egresos en una sola consulta
+"""
+from datetime import datetime
+
+from sqlalchemy import func, case, and_, select
+from sqlalchemy.orm import Session
+
+from app.models import Company, CFDI
+from app.models.cfdi import TipoCFDI
+
+
+def monthly_totals(db: Session, company: Company, months: list[tuple[datetime, datetime]]) -> list[tuple[float, float]]:
+    """
+    (ingresos, egresos) por cada rango [inicio, fin) de `months`.
+
+    Una columna SUM(CASE ...) por mes y tipo en lugar de una consulta por mes.
+    """
+    if not months:
+        return []
+    columns = []
+    for start, end in months:
+        en_rango = and_(CFDI.fecha_emision >= start, CFDI.fecha_emision < end)
+        columns.append(func.sum(case(
+            (and_(CFDI.tipo_comprobante == TipoCFDI.INGRESO, CFDI.emisor_rfc == company.rfc, en_rango), CFDI.total),
+            else_=0,
+        )))
+        columns.append(func.sum(case(
+            (and_(CFDI.tipo_comprobante == TipoCFDI.EGRESO, en_rango), CFDI.total),
+            else_=0,
+        )))
+
+    row = db.execute(
+        select(*columns).where(
+            CFDI.company_id == company.id,
+            CFDI.fecha_emision >= min(s for s, _ in months),
+            CFDI.fecha_emision < max(e for _, e in months),
+        )
+    ).one()
+    return [(float(row[2 * i] or 0), float(row[2 * i + 1] or 0)) for i in range(len(months))]
@@ -0,0 +1,8 @@
+"""
+Benchmarks del backend (ver benchmarks/README.md)
+"""
+import os
+
+# La app crea su engine al importarse; los benchmarks usan sus propias bases,
+# así que el engine por defecto apunta a memoria para no tocar poa_dev.db
+os.environ.setdefault("DATABASE_URL", "sqlite://")
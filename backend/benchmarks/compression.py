@@ -0,0 +1,108 @@
+"""
+Bytes en el cable y costo de CPU de la compresión de respuestas
+
+Para cada endpoint grande (dashboard, crédito, página de 100 CFDIs,
+exportación CSV en streaming y los catálogos precomprimidos) pide la misma
+respuesta sin compresión, con gzip y, si brotli está instalado, con br.
+Reporta bytes recibidos (antes de descomprimir), proporción contra
+identity, latencia mediana y CPU del proceso por request (incluye
+serialización y compresión), más el CPU de comprimir el cuerpo solo, con
+los niveles configurados.
+
+Uso:
+    python -m benchmarks.compression --scale tenant-10k
+    python -m benchmarks.compression --scale tenant-100k --runs 50 --out compresion.json
+"""
+import argparse
+import statistics
+import time
+
+from sqlalchemy import select, func
+from sqlalchemy.orm import Session
+
+from benchmarks.dataset import SCALES, get_engine
+from benchmarks.harness import client_for, environment, write_json, results_path
+from app.compression import brotli, compress
+from app.config import settings
+from app.models import Company
+
+
+def _encodings() -> list[str]:
+    return ["identity", "gzip"] + (["br"] if brotli is not None else [])
+
+
+def measure_encoding(client, url: str, encoding: str, runs: int) -> dict:
+    headers = {"Accept-Encoding": encoding}
+    for _ in range(2):
+        res = client.get(url, headers=headers)
+        if res.status_code >= 400:
+            raise RuntimeError(f"{url}: HTTP {res.status_code}")
+    wall, cpu = [], []
+    for _ in range(runs):
+        started, cpu_started = time.perf_counter(), time.process_time()
+        res = client.get(url, headers=headers)
+        cpu.append((time.process_time() - cpu_started) * 1000)
+        wall.append((time.perf_counter() - started) * 1000)
+    return {
+        "bytes": res.num_bytes_downloaded,
+        "content_encoding": res.headers.get("content-encoding"),
+        "median_ms": round(statistics.median(wall), 3),
+        "cpu_ms": round(statistics.median(cpu), 3),
+    }
+
+
+def compress_only_ms(body: bytes, encoding: str, runs: int) -> float:
+    """CPU de comprimir `body` con los niveles del middleware, sin el resto del request."""
+    started = time.process_time()
+    for _ in range(runs):
+        compress(body, encoding, settings.COMPRESSION_GZIP_LEVEL, settings.COMPRESSION_BROTLI_QUALITY)
+    return round((time.process_time() - started) * 1000 / runs, 3)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Tamaño y CPU de la compresión de respuestas")
+    parser.add_argument("--scale", default="tenant-10k", choices=sorted(SCALES))
+    parser.add_argument("--database-url", help="Base a usar en lugar de SQLite en benchmarks/.data")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--out", default=results_path("compression_results.json"))
+    args = parser.parse_args()
+
+    engine = get_engine(SCALES[args.scale], args.seed, args.database_url)
+    with Session(engine) as db:
+        company_id = db.execute(select(func.min(Company.id))).scalar()
+    client = client_for(engine)
+
+    endpoints = {
+        "dashboard": f"/api/dashboard/{company_id}",
+        "credit": f"/api/credit/{company_id}",
+        "cfdis_page_100": f"/api/companies/{company_id}/cfdis?per_page=100",
+        "cfdis_export": f"/api/companies/{company_id}/cfdis/export",
+        "credit_catalog (precomprimido)": "/api/credit/catalog",
+        "scenarios (precomprimido)": "/api/scenarios",
+    }
+    results = {}
+    print(f"{'endpoint':<32} {'enc':<9} {'bytes':>9} {'ratio':>6} {'p50 ms':>8} {'cpu ms':>8} {'solo comp':>10}")
+    for name, url in endpoints.items():
+        body = client.get(url, headers={"Accept-Encoding": "identity"}).content
+        rows = {}
+        for encoding in _encodings():
+            row = measure_encoding(client, url, encoding, args.runs)
+            row["ratio"] = round(row["bytes"] / len(body), 3) if body else 1.0
+            row["compress_only_ms"] = None if encoding == "identity" else compress_only_ms(body, encoding, args.runs)
+            rows[encoding] = row
+            only = "" if row["compress_only_ms"] is None else row["compress_only_ms"]
+            print(f"{name:<32} {encoding:<9} {row['bytes']:>9} {row['ratio']:>6} {row['median_ms']:>8} "
+                  f"{row['cpu_ms']:>8} {only:>10}")
+        results[name] = {"url": url, "identity_bytes": len(body), "encodings": rows}
+
+    write_json(args.out, {
+        "meta": {**environment(), "scale": args.scale, "runs": args.runs,
+                 "gzip_level": settings.COMPRESSION_GZIP_LEVEL, "brotli_quality": settings.COMPRESSION_BROTLI_QUALITY,
+                 "min_size": settings.COMPRESSION_MIN_SIZE, "brotli": brotli is not None},
+        "endpoints": results,
+    })
+
+
+if __name__ == "__main__":
+    main()
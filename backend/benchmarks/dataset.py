@@ -0,0 +1,269 @@
+"""
+Bases de datos sintéticas reproducibles para benchmarks
+
+Cada escala genera, con una semilla fija, un usuario dueño, sus empresas y
+los CFDIs de cada empresa repartidos en los últimos 24 meses. Las bases de
+SQLite se guardan en `benchmarks/.data/` y se reutilizan mientras no cambie
+la escala, la semilla o el mes (las ventanas del dashboard son relativas a hoy).
+"""
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from decimal import Decimal
+from pathlib import Path
+from typing import Optional
+import random
+import time
+import uuid
+
+from sqlalchemy import create_engine, insert, text
+from sqlalchemy.engine import Engine
+
+from app.database import Base
+from app.models import User, Company, CFDI, CFDIConcepto, FiscalAlert, HealthScore, PaymentApplication
+from app.models.cfdi import TipoCFDI, EstadoCFDI
+from app.models.fiscal_alert import AlertType, AlertSeverity
+from app.models.user import UserRole
+from app.seeds.seed_data import CLIENTES_FICTICIOS, PROVEEDORES_FICTICIOS, CLAVES_POR_SECTOR, PAGO_XML, PPD_RATIO
+from app.services.counterparties import rebuild_counterparties, CLIENTE, PROVEEDOR
+from app.services.receivables import rematch_receivables
+
+DATA_DIR = Path(__file__).parent / ".data"
+CHUNK = 10_000
+# Subir al cambiar lo que genera `populate` para no reutilizar bases viejas
+DATASET_VERSION = 8
+# Ventas PPD que nunca se pagan (alimentan los tramos viejos de CxC)
+UNPAID_RATIO = 0.1
+
+
+@dataclass(frozen=True)
+class Scale:
+    name: str
+    companies: int
+    cfdis_per_company: int
+    description: str
+
+
+SCALES = {
+    "tenant-10k": Scale("tenant-10k", 1, 10_000, "Una empresa con 10k CFDIs"),
+    "tenant-100k": Scale("tenant-100k", 1, 100_000, "Una empresa con 100k CFDIs"),
+    "tenant-1m": Scale("tenant-1m", 1, 1_000_000, "Una empresa con 1M CFDIs"),
+    "despacho-20": Scale("despacho-20", 20, 2_000, "Contador con 20 empresas de 2k CFDIs"),
+    "despacho-500": Scale("despacho-500", 500, 500, "Contador con 500 empresas de 500 CFDIs"),
+}
+
+
+def database_path(scale: Scale, seed: int) -> Path:
+    return DATA_DIR / f"{scale.name}-v{DATASET_VERSION}-s{seed}-{datetime.now():%Y%m}.db"
+
+
+def _xml(row: dict, clave: str) -> str:
+    """XML de CFDI 4.0 de tamaño realista para que `xml_content` pese como en producción."""
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<cfdi:Comprobante xmlns:cfdi="http://www.sat.gob.mx/cfd/4" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" '
+        'xsi:schemaLocation="http://www.sat.gob.mx/cfd/4 http://www.sat.gob.mx/sitio_internet/cfd/4/cfdv40.xsd" '
+        f'Version="4.0" Serie="{row["serie"]}" Folio="{row["folio"]}" Fecha="{row["fecha_emision"]:%Y-%m-%dT%H:%M:%S}" '
+        f'SubTotal="{row["subtotal"]}" Moneda="MXN" Total="{row["total"]}" TipoDeComprobante="{row["tipo_comprobante"].value}" '
+        f'Exportacion="01" MetodoPago="{row["metodo_pago"]}" FormaPago="{row["forma_pago"]}" LugarExpedicion="06600" NoCertificado="{"3" * 20}" '
+        f'Sello="{"A" * 344}" Certificado="{"M" * 600}">'
+        f'<cfdi:Emisor Rfc="{row["emisor_rfc"]}" Nombre="{row["emisor_nombre"]}" RegimenFiscal="601"/>'
+        f'<cfdi:Receptor Rfc="{row["receptor_rfc"]}" Nombre="{row["receptor_nombre"]}" DomicilioFiscalReceptor="06600" '
+        'RegimenFiscalReceptor="601" UsoCFDI="G03"/>'
+        f'<cfdi:Conceptos><cfdi:Concepto ClaveProdServ="{clave}" Cantidad="1" ClaveUnidad="E48" Descripcion="Servicio" '
+        f'ValorUnitario="{row["subtotal"]}" Importe="{row["subtotal"]}" ObjetoImp="02"><cfdi:Impuestos><cfdi:Traslados>'
+        f'<cfdi:Traslado Base="{row["subtotal"]}" Impuesto="002" TipoFactor="Tasa" TasaOCuota="0.160000" Importe="{row["iva"]}"/>'
+        '</cfdi:Traslados></cfdi:Impuestos></cfdi:Concepto></cfdi:Conceptos>'
+        f'<cfdi:Impuestos TotalImpuestosTrasladados="{row["iva"]}"/>'
+        f'<cfdi:Complemento><tfd:TimbreFiscalDigital xmlns:tfd="http://www.sat.gob.mx/TimbreFiscalDigital" UUID="{row["uuid"]}" SelloSAT="{"S" * 344}"/></cfdi:Complemento>'
+        '</cfdi:Comprobante>'
+    )
+
+
+def _payment(rng: random.Random, factura: dict, now: datetime) -> tuple[Optional[dict], Optional[dict]]:
+    """Complemento de pago de una venta PPD y su aplicación, o (None, None) si no se ha pagado."""
+    fecha_pago = factura["fecha_emision"] + timedelta(days=rng.uniform(10, 60))
+    if fecha_pago > now or rng.random() < UNPAID_RATIO:
+        return None, None
+    pago = {
+        **factura,
+        "uuid": str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+        "folio": f"P-{factura['folio']}",
+        "serie": "P",
+        "tipo_comprobante": TipoCFDI.PAGO,
+        "subtotal": Decimal(0),
+        "iva": Decimal(0),
+        "total": Decimal(0),
+        "fecha_emision": fecha_pago,
+        "fecha_timbrado": fecha_pago + timedelta(minutes=5),
+        "uso_cfdi": "CP01",
+        "metodo_pago": None,
+        "forma_pago": "03",
+        "xml_content": PAGO_XML.format(
+            fecha=f"{fecha_pago:%Y-%m-%dT%H:%M:%S}", monto=factura["total"], uuid=factura["uuid"],
+        ),
+    }
+    aplicacion = {"company_id": factura["company_id"], "pago_uuid": pago["uuid"], "factura_uuid": factura["uuid"],
+                  "fecha_pago": fecha_pago, "importe": factura["total"]}
+    return pago, aplicacion
+
+
+def _cfdi_rows(rng: random.Random, company_id: int, rfc: str, nombre: str, count: int, now: datetime):
+    """
+    Filas de CFDI con su único concepto (None si el CFDI está cancelado). Las
+    ventas PPD vigentes traen además su complemento de pago y la aplicación
+    correspondiente (None si no se ha pagado).
+    """
+    claves = CLAVES_POR_SECTOR["Comercio"]
+    for i in range(count):
+        ingreso = rng.random() < 0.7
+        contraparte = rng.choice(CLIENTES_FICTICIOS if ingreso else PROVEEDORES_FICTICIOS)
+        total = round(rng.uniform(2_000, 80_000), 2)
+        fecha = now - timedelta(days=rng.uniform(0, 730))
+        ppd = ingreso and rng.random() < PPD_RATIO
+        row = {
+            "uuid": str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+            "folio": f"{'A' if ingreso else 'B'}-{i}",
+            "serie": "A" if ingreso else "B",
+            "tipo_comprobante": TipoCFDI.INGRESO if ingreso else TipoCFDI.EGRESO,
+            "estado": EstadoCFDI.CANCELADO if rng.random() < 0.02 else EstadoCFDI.VIGENTE,
+            "emisor_rfc": rfc if ingreso else contraparte[1],
+            "emisor_nombre": nombre if ingreso else contraparte[0],
+            "receptor_rfc": contraparte[1] if ingreso else rfc,
+            "receptor_nombre": contraparte[0] if ingreso else nombre,
+            "subtotal": Decimal(str(round(total / 1.16, 2))),
+            "descuento": Decimal(0),
+            "iva": Decimal(str(round(total / 1.16 * 0.16, 2))),
+            "isr_retenido": Decimal(0),
+            "iva_retenido": Decimal(0),
+            "total": Decimal(str(total)),
+            "moneda": "MXN",
+            "tipo_cambio": Decimal(1),
+            "fecha_emision": fecha,
+            "fecha_timbrado": fecha + timedelta(minutes=5),
+            "uso_cfdi": "G03",
+            "metodo_pago": "PPD" if ppd else "PUE",
+            "forma_pago": "99" if ppd else "03",
+            "company_id": company_id,
+        }
+        clave = rng.choice(claves)
+        row["xml_content"] = _xml(row, clave)
+        concepto = pago = aplicacion = None
+        if row["estado"] == EstadoCFDI.VIGENTE:
+            concepto = {"company_id": company_id, "cfdi_uuid": row["uuid"], "fecha_emision": fecha,
+                        "rol": CLIENTE if ingreso else PROVEEDOR, "clave_prod_serv": clave, "importe": row["subtotal"]}
+            if ppd:
+                pago, aplicacion = _payment(rng, row, now)
+        yield row, concepto, pago, aplicacion
+
+
+def _insert_chunk(conn, cfdis: list, conceptos: list, aplicaciones: list) -> None:
+    conn.execute(insert(CFDI), cfdis)
+    for model, rows in ((CFDIConcepto, conceptos), (PaymentApplication, aplicaciones)):
+        if rows:
+            conn.execute(insert(model), rows)
+
+
+def populate(engine: Engine, scale: Scale, seed: int = 42) -> None:
+    """Crea el esquema y carga la escala con inserts masivos por bloques."""
+    Base.metadata.create_all(bind=engine)
+    rng = random.Random(seed)
+    now = datetime.now()
+
+    with engine.begin() as conn:
+        user_id = conn.execute(insert(User).values(
+            email=f"bench_{scale.name}@poa.mx",
+            hashed_password="x",
+            full_name=f"Benchmark {scale.name}",
+            role=UserRole.ACCOUNTANT if scale.companies > 1 else UserRole.OWNER,
+            is_active=True,
+            is_verified=True,
+        )).inserted_primary_key[0]
+
+    for n in range(scale.companies):
+        rfc = f"BEN{n:06d}AB{n % 10}"
+        nombre = f"Empresa Benchmark {n + 1}"
+        with engine.begin() as conn:
+            company_id = conn.execute(insert(Company).values(
+                rfc=rfc,
+                razon_social=nombre,
+                regimen_fiscal="601",
+                codigo_postal="06600",
+                sector="Comercio",
+                sat_connected=True,
+                sat_last_sync=now,
+                demo_scenario="C" if scale.companies > 1 else "A",
+                owner_id=user_id,
+            )).inserted_primary_key[0]
+            conn.execute(insert(HealthScore).values(
+                company_id=company_id,
+                score_total=rng.randint(40, 95),
+                liquidez=rng.randint(40, 95),
+                cumplimiento_fiscal=rng.randint(40, 95),
+                diversificacion_clientes=rng.randint(40, 95),
+                tendencia_ingresos=rng.randint(40, 95),
+                margen_operativo=rng.randint(40, 95),
+                estacionalidad=rng.randint(40, 95),
+                antiguedad_cxc=rng.randint(40, 95),
+                riesgo_proveedores=rng.randint(40, 95),
+            ))
+            conn.execute(insert(FiscalAlert), [
+                {
+                    "company_id": company_id,
+                    "alert_type": alert_type,
+                    "severity": rng.choice(list(AlertSeverity)),
+                    "titulo": f"Alerta {alert_type.value}",
+                    "detalle": "Generada para benchmark",
+                    "metadata_json": {"ejemplo": "Ejemplo", "accion_recomendada": "Revisar"},
+                }
+                for alert_type in AlertType
+            ])
+
+            chunk, conceptos, aplicaciones = [], [], []
+            for row, concepto, pago, aplicacion in _cfdi_rows(rng, company_id, rfc, nombre, scale.cfdis_per_company, now):
+                chunk.append(row)
+                if concepto:
+                    conceptos.append(concepto)
+                if pago:
+                    chunk.append(pago)
+                    aplicaciones.append(aplicacion)
+                if len(chunk) >= CHUNK:
+                    _insert_chunk(conn, chunk, conceptos, aplicaciones)
+                    chunk, conceptos, aplicaciones = [], [], []
+            if chunk:
+                _insert_chunk(conn, chunk, conceptos, aplicaciones)
+            rebuild_counterparties(conn, company_id)
+            rematch_receivables(conn, company_id)
+
+    with engine.begin() as conn:
+        if engine.dialect.name == "sqlite":
+            conn.execute(text("ANALYZE"))
+
+
+def get_engine(scale: Scale, seed: int = 42, database_url: Optional[str] = None, rebuild: bool = False) -> Engine:
+    """Engine para la escala; crea y puebla la base si no existe."""
+    if database_url:
+        engine = create_engine(database_url)
+        if rebuild:
+            Base.metadata.drop_all(bind=engine)
+        with engine.connect() as conn:
+            populated = engine.dialect.has_table(conn, "cfdis") and conn.execute(text("SELECT 1 FROM cfdis LIMIT 1")).first()
+        if not populated:
+            populate(engine, scale, seed)
+        return engine
+
+    DATA_DIR.mkdir(exist_ok=True)
+    path = database_path(scale, seed)
+    if rebuild and path.exists():
+        path.unlink()
+    fresh = not path.exists()
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    if fresh:
+        started = time.perf_counter()
+        try:
+            populate(engine, scale, seed)
+        except BaseException:
+            engine.dispose()
+            path.unlink(missing_ok=True)
+            raise
+        print(f"  {scale.name}: base generada en {time.perf_counter() - started:.1f}s ({path.name})")
+    return engine
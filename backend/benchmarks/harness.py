@@ -0,0 +1,154 @@
+"""
+Utilidades compartidas por los benchmarks: app en proceso, cronómetro y reporte
+"""
+from dataclasses import dataclass, asdict
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Optional
+import json
+import platform
+import statistics
+import subprocess
+import time
+import tracemalloc
+
+from fastapi.testclient import TestClient
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import sessionmaker
+
+from app.database import get_db
+from app.main import app
+from app.observability.querybudget import count_queries
+
+RESULTS_DIR = Path(__file__).parent / ".results"
+
+
+def client_for(engine: Engine) -> TestClient:
+    """TestClient cuyo `get_db` usa el engine del benchmark."""
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    def override_get_db():
+        db = Session()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = override_get_db
+    return TestClient(app)
+
+
+@dataclass
+class Timing:
+    runs: int
+    min_ms: float
+    median_ms: float
+    p95_ms: float
+    mean_ms: float
+    queries: int
+    bytes: int
+    peak_kib: float
+
+
+def peak_kib(fn: Callable[[], object]) -> float:
+    """Pico de memoria asignada (KiB) durante una llamada a `fn`."""
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return round(peak / 1024, 1)
+
+
+def measure(fn: Callable[[], object], engine: Engine, runs: int = 20, warmup: int = 3) -> Timing:
+    """Ejecuta `fn` varias veces; `fn` regresa la respuesta HTTP."""
+    for _ in range(warmup):
+        res = fn()
+        if res.status_code >= 400:
+            raise RuntimeError(f"HTTP {res.status_code}: {res.text[:200]}")
+
+    with count_queries(engine) as q:
+        res = fn()
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return Timing(
+        runs=runs,
+        min_ms=round(samples[0], 3),
+        median_ms=round(statistics.median(samples), 3),
+        p95_ms=round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 3),
+        mean_ms=round(statistics.fmean(samples), 3),
+        queries=q.count,
+        bytes=len(res.content),
+        peak_kib=peak_kib(fn),
+    )
+
+
+def environment() -> dict:
+    """Metadatos para comparar resultados entre commits."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    import sqlalchemy
+    import fastapi
+    import pydantic
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "fastapi": fastapi.__version__,
+        "pydantic": pydantic.VERSION,
+        "sqlalchemy": sqlalchemy.__version__,
+    }
+
+
+def compare(baseline: dict, current: dict, threshold_pct: float, min_delta_ms: float = 0.5) -> list[dict]:
+    """
+    Casos cuya mediana empeoró más de `threshold_pct` respecto a la base.
+    Diferencias menores a `min_delta_ms` se consideran ruido.
+    """
+    regressions = []
+    for scale, cases in current.get("results", {}).items():
+        for case, timing in cases.items():
+            base = baseline.get("results", {}).get(scale, {}).get(case)
+            if not base or not base.get("median_ms"):
+                continue
+            delta = timing["median_ms"] - base["median_ms"]
+            pct = delta / base["median_ms"] * 100
+            if pct > threshold_pct and delta > min_delta_ms:
+                regressions.append({
+                    "scale": scale,
+                    "case": case,
+                    "baseline_ms": base["median_ms"],
+                    "current_ms": timing["median_ms"],
+                    "change_pct": round(pct, 1),
+                })
+    return regressions
+
+
+def results_path(name: str) -> str:
+    """Ruta por omisión de un archivo de resultados: dentro de RESULTS_DIR (ignorado por git)."""
+    return str(RESULTS_DIR / name)
+
+
+def write_json(path: str, data: dict) -> None:
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False, default=str)
+
+
+def load_json(path: str) -> Optional[dict]:
+    with open(path) as f:
+        return json.load(f)
+
+
+def as_dict(timing: Timing) -> dict:
+    return asdict(timing)
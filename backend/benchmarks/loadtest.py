@@ -0,0 +1,323 @@
+"""
+Prueba de carga con usuarios virtuales concurrentes
+
+Cada usuario virtual repite sesiones realistas: login, lista de empresas,
+dashboard, páginas de CFDIs, predicciones y algunos turnos del CFO Virtual,
+con tiempos de espera entre pasos. Se reportan p50/p95/p99, throughput y
+tasa de error por endpoint para cada nivel de concurrencia.
+
+Uso:
+    # contra un servidor ya levantado (p. ej. docker-compose.prod.yml)
+    python -m benchmarks.loadtest --base-url http://localhost:8001 --users 10 --users 50
+
+    # levanta uvicorn localmente sobre una base sembrada
+    python -m benchmarks.loadtest --start-server --workers 2 --users 20 --duration 30
+
+    # escalamiento: gunicorn --preload con 1, 2 y 4 workers al mismo nivel de usuarios
+    python -m benchmarks.loadtest --start-server --server gunicorn --workers 1 --workers 2 --workers 4 \
+        --users 50 --think-min 0 --think-max 0
+
+    python -m benchmarks.loadtest ... --out carga.json --compare carga_base.json
+"""
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Optional
+import argparse
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import time
+import uuid
+
+import httpx
+
+from benchmarks.harness import environment, write_json, load_json, results_path
+
+CHAT_MESSAGES = ["flujo", "liquidez", "score", "concentración de clientes", "efos", "gasto"]
+
+
+def percentile(sorted_values: list[float], pct: float) -> float:
+    """Percentil por rango más cercano sobre una lista ordenada."""
+    if not sorted_values:
+        return 0.0
+    k = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[k]
+
+
+@dataclass
+class EndpointStats:
+    latencies: list[float] = field(default_factory=list)
+    errors: int = 0
+    statuses: dict[int, int] = field(default_factory=lambda: defaultdict(int))
+
+
+class Recorder:
+    def __init__(self):
+        self.endpoints: dict[str, EndpointStats] = defaultdict(EndpointStats)
+
+    async def call(self, client: httpx.AsyncClient, name: str, method: str, url: str, **kwargs) -> Optional[httpx.Response]:
+        stats = self.endpoints[name]
+        started = time.perf_counter()
+        try:
+            res = await client.request(method, url, **kwargs)
+        except httpx.HTTPError:
+            stats.latencies.append((time.perf_counter() - started) * 1000)
+            stats.errors += 1
+            stats.statuses[0] += 1
+            return None
+        stats.latencies.append((time.perf_counter() - started) * 1000)
+        stats.statuses[res.status_code] += 1
+        if res.status_code >= 400:
+            stats.errors += 1
+        return res
+
+    def summary(self, seconds: float) -> dict:
+        result = {}
+        total = errors = 0
+        for name, stats in sorted(self.endpoints.items()):
+            lat = sorted(stats.latencies)
+            total += len(lat)
+            errors += stats.errors
+            result[name] = {
+                "requests": len(lat),
+                "errors": stats.errors,
+                "error_rate": round(stats.errors / len(lat), 4) if lat else 0.0,
+                "throughput_rps": round(len(lat) / seconds, 2) if seconds else 0.0,
+                "p50_ms": round(percentile(lat, 50), 2),
+                "p95_ms": round(percentile(lat, 95), 2),
+                "p99_ms": round(percentile(lat, 99), 2),
+                "max_ms": round(lat[-1], 2) if lat else 0.0,
+                "statuses": dict(stats.statuses),
+            }
+        result["_total"] = {
+            "requests": total,
+            "errors": errors,
+            "error_rate": round(errors / total, 4) if total else 0.0,
+            "throughput_rps": round(total / seconds, 2) if seconds else 0.0,
+        }
+        return result
+
+
+async def think(think_ms: tuple[int, int]) -> None:
+    await asyncio.sleep(random.uniform(*think_ms) / 1000)
+
+
+async def virtual_user(
+    n: int,
+    client: httpx.AsyncClient,
+    recorder: Recorder,
+    deadline: float,
+    think_ms: tuple[int, int],
+    chat_turns: int,
+) -> None:
+    email = f"loadtest_{uuid.uuid4().hex[:12]}@poa.mx"
+    password = "loadtest123"
+    res = await recorder.call(client, "POST /api/auth/register", "POST", "/api/auth/register",
+                              params={"email": email, "password": password, "full_name": f"VU {n}"})
+    if res is None or res.status_code != 200:
+        return
+
+    while time.monotonic() < deadline:
+        res = await recorder.call(client, "POST /api/auth/login", "POST", "/api/auth/login",
+                                  params={"email": email, "password": password})
+        if res is None or res.status_code != 200:
+            await think(think_ms)
+            continue
+        headers = {"Authorization": f"Bearer {res.json()['access_token']}"}
+
+        res = await recorder.call(client, "GET /api/companies", "GET", "/api/companies", headers=headers)
+        companies = res.json() if res is not None and res.status_code == 200 else []
+        if not companies:
+            await think(think_ms)
+            continue
+        company_id = random.choice(companies)["id"]
+        await think(think_ms)
+
+        await recorder.call(client, "GET /api/dashboard/{id}", "GET", f"/api/dashboard/{company_id}", headers=headers)
+        await think(think_ms)
+
+        for page in range(1, random.randint(1, 3) + 1):
+            await recorder.call(client, "GET /api/companies/{id}/cfdis", "GET", f"/api/companies/{company_id}/cfdis",
+                                params={"page": page, "per_page": 20}, headers=headers)
+            await think(think_ms)
+
+        await recorder.call(client, "GET /api/predictions/{id}", "GET", f"/api/predictions/{company_id}", headers=headers)
+        await think(think_ms)
+
+        for _ in range(random.randint(1, chat_turns)):
+            await recorder.call(client, "POST /api/cfo/chat", "POST", "/api/cfo/chat",
+                                params={"message": random.choice(CHAT_MESSAGES), "company_id": company_id},
+                                headers=headers)
+            await think(think_ms)
+
+
+async def run_level(base_url: str, users: int, duration: float, ramp_up: float, think_ms, chat_turns: int) -> dict:
+    recorder = Recorder()
+    limits = httpx.Limits(max_connections=users, max_keepalive_connections=users)
+    async with httpx.AsyncClient(base_url=base_url, timeout=60.0, limits=limits) as client:
+        started = time.monotonic()
+        deadline = started + ramp_up + duration
+        tasks = []
+        for n in range(users):
+            tasks.append(asyncio.create_task(virtual_user(n, client, recorder, deadline, think_ms, chat_turns)))
+            if ramp_up:
+                await asyncio.sleep(ramp_up / users)
+        await asyncio.gather(*tasks)
+        elapsed = time.monotonic() - started
+    return {"users": users, "seconds": round(elapsed, 2), "endpoints": recorder.summary(elapsed)}
+
+
+def print_level(level: dict) -> None:
+    workers = f", {level['workers']} workers" if level.get("workers") else ""
+    print(f"\n== {level['users']} usuarios{workers}, {level['seconds']}s ==")
+    print(f"{'endpoint':<34} {'reqs':>6} {'rps':>7} {'p50':>8} {'p95':>8} {'p99':>8} {'err%':>6}")
+    for name, s in level["endpoints"].items():
+        if name == "_total":
+            continue
+        print(f"{name:<34} {s['requests']:>6} {s['throughput_rps']:>7} {s['p50_ms']:>8} {s['p95_ms']:>8} "
+              f"{s['p99_ms']:>8} {s['error_rate'] * 100:>5.1f}")
+    t = level["endpoints"]["_total"]
+    print(f"{'TOTAL':<34} {t['requests']:>6} {t['throughput_rps']:>7} {'':>8} {'':>8} {'':>8} {t['error_rate'] * 100:>5.1f}")
+
+
+def scaling(levels: list[dict]) -> list[dict]:
+    """Throughput total por número de workers, relativo al menor número medido, por nivel de usuarios."""
+    by_users = defaultdict(dict)
+    for level in levels:
+        if level.get("workers"):
+            by_users[level["users"]][level["workers"]] = level["endpoints"]["_total"]["throughput_rps"]
+    rows = []
+    for users, rps in sorted(by_users.items()):
+        base_workers = min(rps)
+        for workers, value in sorted(rps.items()):
+            speedup = value / rps[base_workers] if rps[base_workers] else 0.0
+            rows.append({"users": users, "workers": workers, "throughput_rps": value,
+                         "speedup": round(speedup, 2),
+                         "efficiency": round(speedup * base_workers / workers, 2)})
+    return rows
+
+
+def print_scaling(rows: list[dict]) -> None:
+    print("\n== Escalamiento por workers ==")
+    print(f"{'usuarios':>8} {'workers':>8} {'rps':>9} {'speedup':>8} {'eficiencia':>11}")
+    for r in rows:
+        print(f"{r['users']:>8} {r['workers']:>8} {r['throughput_rps']:>9} {r['speedup']:>7}x {r['efficiency']:>11}")
+
+
+def compare_levels(baseline: dict, current: dict, threshold_pct: float) -> list[dict]:
+    """Endpoints cuyo p95 empeoró más de `threshold_pct` al mismo nivel de usuarios (y workers)."""
+    base_levels = {(lvl.get("workers"), lvl["users"]): lvl for lvl in baseline.get("levels", [])}
+    regressions = []
+    for level in current.get("levels", []):
+        base = base_levels.get((level.get("workers"), level["users"]))
+        if not base:
+            continue
+        for name, s in level["endpoints"].items():
+            b = base["endpoints"].get(name)
+            if name == "_total" or not b or not b.get("p95_ms"):
+                continue
+            pct = (s["p95_ms"] - b["p95_ms"]) / b["p95_ms"] * 100
+            if pct > threshold_pct:
+                regressions.append({"users": level["users"], "workers": level.get("workers"), "endpoint": name, "baseline_p95_ms": b["p95_ms"],
+                                    "current_p95_ms": s["p95_ms"], "change_pct": round(pct, 1)})
+    return regressions
+
+
+def start_server(port: int, workers: int, database_url: str, seed: bool, server: str = "uvicorn") -> subprocess.Popen:
+    """Levanta uvicorn o gunicorn (gunicorn.conf.py) en segundo plano y espera a /health."""
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = {**os.environ, "DATABASE_URL": database_url}
+    # El esquema se migra antes: varios workers arrancando contra SQLite no tienen advisory lock
+    subprocess.run([sys.executable, "-c", "from app.database import init_db; init_db()"],
+                   cwd=backend_dir, env=env, check=True)
+    if server == "gunicorn":
+        command = [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "app.main:app",
+                   "--bind", f"127.0.0.1:{port}", "--workers", str(workers), "--log-level", "warning"]
+    else:
+        command = [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port),
+                   "--workers", str(workers), "--log-level", "warning"]
+    proc = subprocess.Popen(command, cwd=backend_dir, env=env)
+    base_url = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        try:
+            if httpx.get(f"{base_url}/health", timeout=1.0).status_code == 200:
+                break
+        except httpx.HTTPError:
+            pass
+        if proc.poll() is not None:
+            raise RuntimeError(f"{server} terminó antes de estar listo")
+        time.sleep(0.2)
+    else:
+        proc.terminate()
+        raise RuntimeError(f"{server} no respondió /health a tiempo")
+    if seed and not httpx.get(f"{base_url}/api/companies", timeout=30).json():
+        httpx.post(f"{base_url}/api/seed", timeout=300).raise_for_status()
+    return proc
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Prueba de carga de la API POA")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8001")
+    parser.add_argument("--users", type=int, action="append", help="Usuarios concurrentes (repetible)")
+    parser.add_argument("--duration", type=float, default=20.0, help="Segundos por nivel, sin contar rampa")
+    parser.add_argument("--ramp-up", type=float, default=2.0)
+    parser.add_argument("--think-min", type=int, default=50, help="Espera mínima entre pasos (ms)")
+    parser.add_argument("--think-max", type=int, default=300, help="Espera máxima entre pasos (ms)")
+    parser.add_argument("--chat-turns", type=int, default=3)
+    parser.add_argument("--start-server", action="store_true", help="Levantar un servidor local")
+    parser.add_argument("--server", choices=("uvicorn", "gunicorn"), default="uvicorn",
+                        help="Servidor de --start-server; gunicorn usa gunicorn.conf.py (--preload)")
+    parser.add_argument("--workers", type=int, action="append",
+                        help="Workers con --start-server (repetible: un servidor por valor, tabla de escalamiento)")
+    parser.add_argument("--port", type=int, default=8011)
+    parser.add_argument("--database-url", default="sqlite:///./loadtest.db", help="Base para --start-server")
+    parser.add_argument("--out", default=results_path("loadtest_results.json"))
+    parser.add_argument("--compare", help="JSON de una corrida anterior")
+    parser.add_argument("--threshold", type=float, default=20.0, help="%% de empeoramiento de p95 tolerado")
+    args = parser.parse_args()
+
+    base_url = f"http://127.0.0.1:{args.port}" if args.start_server else args.base_url
+    worker_counts = (args.workers or [1]) if args.start_server else [None]
+    levels = []
+    for workers in worker_counts:
+        proc = start_server(args.port, workers, args.database_url, seed=True, server=args.server) if workers else None
+        try:
+            for users in args.users or [10]:
+                level = asyncio.run(run_level(base_url, users, args.duration, args.ramp_up,
+                                              (args.think_min, args.think_max), args.chat_turns))
+                level["workers"] = workers
+                print_level(level)
+                levels.append(level)
+        finally:
+            if proc:
+                proc.terminate()
+                proc.wait(timeout=30)
+
+    rows = scaling(levels)
+    if len(worker_counts) > 1:
+        print_scaling(rows)
+
+    data = {
+        "meta": {**environment(), "base_url": base_url, "server": args.server if args.start_server else None,
+                 "workers": worker_counts if args.start_server else None,
+                 "duration": args.duration, "think_ms": [args.think_min, args.think_max]},
+        "levels": levels,
+        "scaling": rows,
+    }
+    write_json(args.out, data)
+    print(f"\nResultados en {args.out}")
+
+    if args.compare:
+        regressions = compare_levels(load_json(args.compare), data, args.threshold)
+        for r in regressions:
+            workers = f" {r['workers']} workers" if r["workers"] else ""
+            print(f"REGRESIÓN {r['users']} usuarios{workers} {r['endpoint']}: p95 {r['baseline_p95_ms']} -> "
+                  f"{r['current_p95_ms']} ms (+{r['change_pct']}%)")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,125 @@
+"""
+Evidencia de poda de particiones en PostgreSQL
+
+Puebla una escala en PostgreSQL, mide el dashboard y las predicciones con la
+tabla `cfdis` normal, la convierte a particiones mensuales y vuelve a medir.
+Además de la latencia por endpoint, corre `EXPLAIN (ANALYZE, FORMAT JSON)`
+sobre cada sentencia que ejecutó el endpoint y reporta cuántas particiones
+escaneó y el tiempo de ejecución del plan.
+
+Uso (la base se recrea):
+    python -m benchmarks.partitioning --database-url postgresql://localhost/poa_bench --scale tenant-1m
+"""
+from contextlib import contextmanager
+import argparse
+import json
+
+from sqlalchemy import event, text
+from sqlalchemy.engine import Engine
+
+from benchmarks.dataset import SCALES, get_engine
+from benchmarks.harness import client_for, measure, environment, write_json, as_dict, results_path
+from app.observability.querybudget import statement_shape
+from app.partitioning import convert_to_partitioned, list_partitions
+
+
+@contextmanager
+def capture_statements(engine: Engine):
+    """Sentencias y parámetros ejecutados dentro del bloque."""
+    captured: list[tuple[str, object]] = []
+
+    def _listener(conn, cursor, statement, parameters, context, executemany):
+        if not executemany:
+            captured.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", _listener)
+    try:
+        yield captured
+    finally:
+        event.remove(engine, "before_cursor_execute", _listener)
+
+
+def _scanned_relations(node: dict, found: set) -> None:
+    relation = node.get("Relation Name")
+    if relation and relation.startswith("cfdis"):
+        found.add(relation)
+    for child in node.get("Plans", []):
+        _scanned_relations(child, found)
+
+
+def explain(engine: Engine, statements: list[tuple[str, object]]) -> list[dict]:
+    plans = []
+    with engine.connect() as conn:
+        for sql, params in statements:
+            if "cfdis" not in sql:
+                continue
+            raw = conn.exec_driver_sql(f"EXPLAIN (ANALYZE, FORMAT JSON) {sql}", params).scalar()
+            plan = (raw if isinstance(raw, list) else json.loads(raw))[0]
+            relations: set = set()
+            _scanned_relations(plan["Plan"], relations)
+            plans.append({
+                "statement": statement_shape(sql)[:160],
+                "execution_ms": round(plan["Execution Time"], 3),
+                "relations_scanned": len(relations),
+            })
+    return plans
+
+
+def measure_cases(engine: Engine, company_id: int, runs: int) -> dict:
+    client = client_for(engine)
+    cases = {
+        "get_dashboard_stats": lambda: client.get(f"/api/dashboard/{company_id}"),
+        "get_predictions": lambda: client.get(f"/api/predictions/{company_id}"),
+    }
+    results = {}
+    for name, fn in cases.items():
+        timing = measure(fn, engine, runs=runs)
+        with capture_statements(engine) as statements:
+            fn()
+        results[name] = {"timing": as_dict(timing), "plans": explain(engine, statements)}
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Poda de particiones de cfdis en PostgreSQL")
+    parser.add_argument("--database-url", required=True, help="PostgreSQL; la base se recrea")
+    parser.add_argument("--scale", default="tenant-100k", choices=sorted(SCALES))
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", default=results_path("partitioning_results.json"))
+    args = parser.parse_args()
+
+    if not args.database_url.startswith("postgresql"):
+        parser.error("El particionamiento solo aplica a PostgreSQL")
+
+    engine = get_engine(SCALES[args.scale], args.seed, args.database_url, rebuild=True)
+    with engine.begin() as conn:
+        conn.execute(text("ANALYZE"))
+        company_id = conn.execute(text("SELECT min(id) FROM companies")).scalar()
+
+    before = measure_cases(engine, company_id, args.runs)
+    with engine.begin() as conn:
+        convert_to_partitioned(conn)
+        partitions = len(list_partitions(conn))
+    after = measure_cases(engine, company_id, args.runs)
+    engine.dispose()
+
+    print(f"{args.scale}: {partitions} particiones")
+    for case in before:
+        b, a = before[case], after[case]
+        print(f"\n{case}: mediana {b['timing']['median_ms']:.2f} ms -> {a['timing']['median_ms']:.2f} ms")
+        print(f"  {'plan (ms)':>20} {'relaciones':>12}  sentencia")
+        for pb, pa in zip(b["plans"], a["plans"]):
+            print(f"  {pb['execution_ms']:>8.2f} -> {pa['execution_ms']:>8.2f} "
+                  f"{pb['relations_scanned']:>4} -> {pa['relations_scanned']:<4}  {pa['statement'][:90]}")
+
+    write_json(args.out, {
+        "meta": {**environment(), "scale": args.scale, "partitions": partitions},
+        "before": before,
+        "after": after,
+    })
+    print(f"\nResultados en {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Tiempos del motor de cuentas por cobrar
+
+Sobre una escala ya poblada mide el rematch completo (un INSERT ... SELECT de
+todas las facturas PPD), la regeneración de aplicaciones leyendo en streaming
+el XML de los complementos de pago, la actualización incremental de un lote
+de ingesta y la consulta de antigüedad de saldos.
+
+Uso:
+    python -m benchmarks.receivables --scale tenant-1m
+    python -m benchmarks.receivables --database-url postgresql://localhost/poa_bench --scale tenant-1m
+"""
+import argparse
+import time
+
+from sqlalchemy import select, func
+from sqlalchemy.orm import Session
+
+from benchmarks.dataset import SCALES, get_engine
+from benchmarks.harness import environment, write_json, results_path
+from app.models import CFDI, Company, PaymentApplication, ReceivableBalance
+from app.models.cfdi import TipoCFDI
+from app.services.receivables import aging_buckets, refresh_balances, rematch_receivables, reparse_payments
+
+
+def _timed(fn) -> tuple[float, object]:
+    started = time.perf_counter()
+    result = fn()
+    return round((time.perf_counter() - started) * 1000, 2), result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Rematch y antigüedad de cuentas por cobrar")
+    parser.add_argument("--scale", default="tenant-100k", choices=sorted(SCALES))
+    parser.add_argument("--database-url", help="Base a usar en lugar de SQLite en benchmarks/.data")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--batch", type=int, default=1000, help="Facturas del lote incremental")
+    parser.add_argument("--out", default=results_path("receivables_results.json"))
+    args = parser.parse_args()
+
+    engine = get_engine(SCALES[args.scale], args.seed, args.database_url)
+    results = {}
+    with Session(engine) as db:
+        company_id = db.execute(select(func.min(Company.id))).scalar()
+        pagos = db.execute(
+            select(func.count()).where(CFDI.company_id == company_id, CFDI.tipo_comprobante == TipoCFDI.PAGO)
+        ).scalar()
+
+        results["reparse_ms"], aplicaciones = _timed(lambda: reparse_payments(db, company_id))
+        results["rematch_ms"], facturas = _timed(lambda: rematch_receivables(db, company_id))
+        sample = db.execute(
+            select(ReceivableBalance.cfdi_uuid).where(ReceivableBalance.company_id == company_id).limit(args.batch)
+        ).scalars().all()
+        results["refresh_batch_ms"], _ = _timed(lambda: refresh_balances(db, company_id, sample))
+        results["aging_ms"], buckets = _timed(lambda: aging_buckets(db, company_id))
+        db.commit()
+
+        assert aplicaciones == db.execute(
+            select(func.count()).where(PaymentApplication.company_id == company_id)
+        ).scalar()
+    engine.dispose()
+
+    print(f"{args.scale}: {pagos} complementos de pago, {aplicaciones} aplicaciones, {facturas} facturas PPD")
+    print(f"  reparse XML de pagos      {results['reparse_ms']:>10.1f} ms")
+    print(f"  rematch completo          {results['rematch_ms']:>10.1f} ms")
+    print(f"  lote incremental ({len(sample):>5})  {results['refresh_batch_ms']:>10.1f} ms")
+    print(f"  antigüedad de saldos      {results['aging_ms']:>10.1f} ms")
+    for label, b in buckets.items():
+        print(f"    {label:>6}: {b['facturas']:>7} facturas  ${b['saldo']:,.2f}")
+
+    write_json(args.out, {
+        "meta": {**environment(), "scale": args.scale, "pagos": pagos, "aplicaciones": aplicaciones, "facturas": facturas},
+        "results": results,
+        "aging": buckets,
+    })
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Benchmarks de los endpoints críticos sobre tenants sintéticos
+
+Uso:
+    python -m benchmarks.run                                  # tenant-10k y despacho-20
+    python -m benchmarks.run --scale tenant-100k --scale despacho-500
+    python -m benchmarks.run --out results.json --compare baseline.json --threshold 15
+"""
+from datetime import date, datetime
+import argparse
+import sys
+
+from benchmarks.dataset import SCALES, get_engine
+from benchmarks.harness import client_for, measure, environment, compare, write_json, load_json, as_dict, results_path
+from app.main import create_access_token
+from app.partitioning import add_months
+from app.cache import CACHES
+
+DEFAULT_SCALES = ["tenant-10k", "despacho-20"]
+
+
+def clear_caches() -> None:
+    for cache in CACHES.values():
+        cache.invalidate()
+
+
+def run_scale(scale_name: str, runs: int, seed: int, database_url=None, rebuild=False) -> dict:
+    scale = SCALES[scale_name]
+    engine = get_engine(scale, seed, database_url, rebuild)
+    client = client_for(engine)
+
+    with engine.connect() as conn:
+        from sqlalchemy import select, func
+        from app.models import Company, CFDI, User
+        company_id = conn.execute(select(func.min(Company.id))).scalar()
+        user_id = conn.execute(select(func.min(User.id))).scalar()
+        total = conn.execute(select(func.count(CFDI.id)).where(CFDI.company_id == company_id)).scalar()
+
+    per_page = 100
+    last_page = max(1, -(-total // per_page))
+    this_month = datetime.now().strftime("%Y-%m")
+    six_months_ago = add_months(date.today(), -5).strftime("%Y-%m")
+    auth = {"Authorization": f"Bearer {create_access_token({'sub': str(user_id)})}"}
+
+    cases = {
+        "get_dashboard_stats": lambda: client.get(f"/api/dashboard/{company_id}"),
+        # Sin caches en memoria: el costo de la primera carga del día
+        "get_dashboard_stats_cold": lambda: (clear_caches(), client.get(f"/api/dashboard/{company_id}"))[1],
+        "list_companies": lambda: client.get("/api/companies"),
+        "portfolio_dashboard": lambda: client.get("/api/portfolio/dashboard?per_page=50", headers=auth),
+        "get_cfdis_first_page": lambda: client.get(f"/api/companies/{company_id}/cfdis?page=1&per_page={per_page}"),
+        "get_cfdis_deep_page": lambda: client.get(f"/api/companies/{company_id}/cfdis?page={last_page}&per_page={per_page}"),
+        "counterparty_ranking_6m": lambda: client.get(
+            f"/api/companies/{company_id}/counterparties?desde={six_months_ago}&hasta={this_month}"),
+        "receivables_aging": lambda: client.get(f"/api/companies/{company_id}/receivables/aging"),
+        "get_predictions": lambda: client.get(f"/api/predictions/{company_id}"),
+        "cfo_chat": lambda: client.post(f"/api/cfo/chat?message=flujo&company_id={company_id}"),
+    }
+
+    results = {}
+    for name, fn in cases.items():
+        timing = measure(fn, engine, runs=runs)
+        results[name] = as_dict(timing)
+        print(f"  {scale_name:<14} {name:<24} mediana {timing.median_ms:>9.2f} ms  p95 {timing.p95_ms:>9.2f} ms  "
+              f"{timing.queries:>3} SQL  {timing.bytes:>8} B  {timing.peak_kib:>8.1f} KiB")
+    engine.dispose()
+    return results
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmarks de la API POA")
+    parser.add_argument("--scale", action="append", choices=sorted(SCALES), help="Escalas a correr (repetible)")
+    parser.add_argument("--runs", type=int, default=20, help="Repeticiones cronometradas por caso")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--database-url", help="Usar esta base (p. ej. PostgreSQL) en lugar de SQLite")
+    parser.add_argument("--rebuild", action="store_true", help="Regenerar las bases sintéticas")
+    parser.add_argument("--out", default=results_path("benchmark_results.json"), help="Archivo JSON de resultados")
+    parser.add_argument("--compare", help="JSON de una corrida anterior para detectar regresiones")
+    parser.add_argument("--threshold", type=float, default=15.0, help="%% de empeoramiento que cuenta como regresión")
+    args = parser.parse_args()
+
+    data = {"meta": {**environment(), "runs": args.runs, "seed": args.seed}, "results": {}}
+    for scale_name in args.scale or DEFAULT_SCALES:
+        data["results"][scale_name] = run_scale(scale_name, args.runs, args.seed, args.database_url, args.rebuild)
+    write_json(args.out, data)
+    print(f"Resultados en {args.out}")
+
+    if args.compare:
+        regressions = compare(load_json(args.compare), data, args.threshold)
+        for r in regressions:
+            print(f"REGRESIÓN {r['scale']}/{r['case']}: {r['baseline_ms']} -> {r['current_ms']} ms (+{r['change_pct']}%)")
+        if regressions:
+            return 1
+        print(f"Sin regresiones mayores a {args.threshold}%")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
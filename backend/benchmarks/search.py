@@ -0,0 +1,96 @@
+"""
+Latencia de la búsqueda de CFDIs (GET /api/companies/{id}/cfdis/search)
+
+Corre combinaciones de filtros con coincidencias abundantes (un cliente
+frecuente, un prefijo de RFC) y escasas (fragmento de UUID, folio, un
+nombre inexistente), más una página profunda por cursor, y marca los casos
+cuya p95 pasa el objetivo (50 ms por omisión, pensado para tenant-1m).
+
+Uso:
+    python -m benchmarks.search --scale tenant-1m
+    python -m benchmarks.search --scale tenant-100k --runs 50 --out busqueda.json
+"""
+from datetime import date, timedelta
+import argparse
+import sys
+
+from sqlalchemy import select, func
+from sqlalchemy.orm import Session
+
+from benchmarks.dataset import SCALES, get_engine
+from benchmarks.harness import client_for, measure, environment, write_json, as_dict, results_path
+from app.models import Company, CFDI
+from app.seeds.seed_data import CLIENTES_FICTICIOS, PROVEEDORES_FICTICIOS
+
+
+def walk(client, url: str, pages: int) -> str:
+    """Cursor de la página `pages` + 1 siguiendo next_cursor desde la primera."""
+    cursor = None
+    for _ in range(pages):
+        res = client.get(url + (f"&cursor={cursor}" if cursor else "")).json()
+        cursor = res["next_cursor"]
+    return cursor
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Latencia de la búsqueda de CFDIs")
+    parser.add_argument("--scale", default="tenant-1m", choices=sorted(SCALES))
+    parser.add_argument("--database-url", help="Base a usar en lugar de SQLite en benchmarks/.data")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--target-ms", type=float, default=50.0, help="Objetivo de p95 por caso")
+    parser.add_argument("--out", default=results_path("search_results.json"))
+    args = parser.parse_args()
+
+    engine = get_engine(SCALES[args.scale], args.seed, args.database_url)
+    with Session(engine) as db:
+        company_id = db.execute(select(func.min(Company.id))).scalar()
+        sample = db.execute(
+            select(CFDI.uuid, CFDI.folio).where(CFDI.company_id == company_id).order_by(CFDI.id).limit(1)
+            .offset(db.execute(select(func.count(CFDI.id)).where(CFDI.company_id == company_id)).scalar() // 2)
+        ).one()
+    client = client_for(engine)
+
+    base = f"/api/companies/{company_id}/cfdis/search?per_page=50"
+    cliente, rfc_cliente = CLIENTES_FICTICIOS[0]
+    proveedor = PROVEEDORES_FICTICIOS[0][0]
+    hace_90 = (date.today() - timedelta(days=90)).isoformat()
+    cases = {
+        "nombre_frecuente": f"{base}&q={cliente.split()[1]}",
+        "nombre_inexistente": f"{base}&q=Inexistente",
+        "rfc_prefijo": f"{base}&rfc={rfc_cliente[:3]}",
+        "rfc_completo": f"{base}&rfc={rfc_cliente}",
+        "uuid_fragmento": f"{base}&uuid={sample.uuid[9:18]}",
+        "folio": f"{base}&folio={sample.folio}",
+        "monto_rango": f"{base}&monto_min=50000&monto_max=50100",
+        "fechas_90d": f"{base}&desde={hace_90}",
+        "cancelados": f"{base}&estado=cancelado",
+        "combinado": f"{base}&q={proveedor.split()[0]}&desde={hace_90}&monto_min=40000&tipo=egreso",
+    }
+    deep = walk(client, cases["nombre_frecuente"], 20)
+    cases["nombre_frecuente_pagina_21"] = f"{cases['nombre_frecuente']}&cursor={deep}"
+
+    results, over = {}, []
+    for name, url in cases.items():
+        timing = measure(lambda: client.get(url), engine, runs=args.runs)
+        found = len(client.get(url).json()["cfdis"])
+        results[name] = {"url": url, "resultados": found, **as_dict(timing)}
+        flag = "" if timing.p95_ms <= args.target_ms else "  > objetivo"
+        if flag:
+            over.append(name)
+        print(f"  {args.scale:<12} {name:<28} mediana {timing.median_ms:>8.2f} ms  p95 {timing.p95_ms:>8.2f} ms  "
+              f"{timing.queries:>2} SQL  {found:>3} filas{flag}")
+
+    write_json(args.out, {
+        "meta": {**environment(), "scale": args.scale, "runs": args.runs, "target_ms": args.target_ms},
+        "cases": results,
+    })
+    if over:
+        print(f"{len(over)} casos arriba de {args.target_ms} ms: {', '.join(over)}")
+        return 1
+    print(f"Todos los casos con p95 <= {args.target_ms} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
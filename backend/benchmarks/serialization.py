@@ -0,0 +1,130 @@
+"""
+Costo de serialización por fila de la lista de CFDIs
+
+Compara, para una página de `per_page` CFDIs, el camino anterior (entidades
+ORM completas, incluido `xml_content` -> `CFDIResponse.model_validate` ->
+revalidación contra `response_model` -> `json.dumps`) contra el actual
+(proyección de columnas -> tuplas -> dicts -> orjson). Se mide la
+serialización sola (datos ya cargados), la carga + serialización y el pico
+de memoria por página.
+
+Uso:
+    python -m benchmarks.serialization
+    python -m benchmarks.serialization --scale tenant-100k --per-page 100 --runs 200
+"""
+from typing import Callable
+import argparse
+import json
+import statistics
+import time
+
+from pydantic import TypeAdapter
+from sqlalchemy import select, desc, func
+from sqlalchemy.orm import Session
+
+from benchmarks.dataset import SCALES, get_engine
+from benchmarks.harness import peak_kib
+from app.main import CFDI_LIST_COLUMNS, CFDI_LIST_KEYS
+from app.models import CFDI
+from app.responses import dumps
+from app.schemas.cfdi import CFDIResponse, CFDIListResponse
+
+_LIST_ADAPTER = TypeAdapter(CFDIListResponse)
+
+
+def _median_us(fn: Callable[[], object], runs: int) -> float:
+    for _ in range(5):
+        fn()
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1_000_000)
+    return statistics.median(samples)
+
+
+def pydantic_body(entities: list, total: int, per_page: int) -> bytes:
+    """Lo que hacía FastAPI con el modelo regresado por el endpoint."""
+    model = CFDIListResponse(
+        total=total, page=1, per_page=per_page,
+        cfdis=[CFDIResponse.model_validate(c) for c in entities],
+    )
+    value = _LIST_ADAPTER.validate_python(model.model_dump())
+    content = _LIST_ADAPTER.dump_python(value, mode="json")
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def orjson_body(rows: list, total: int, per_page: int) -> bytes:
+    return dumps({
+        "total": total, "page": 1, "per_page": per_page,
+        "cfdis": [dict(zip(CFDI_LIST_KEYS, row)) for row in rows],
+    })
+
+
+def run(scale_name: str, per_page: int, runs: int, seed: int) -> dict:
+    engine = get_engine(SCALES[scale_name], seed)
+    db = Session(engine)
+    try:
+        company_id = db.execute(select(func.min(CFDI.company_id))).scalar()
+        total = db.execute(select(func.count(CFDI.id)).where(CFDI.company_id == company_id)).scalar()
+
+        def load_entities():
+            return db.query(CFDI).filter(CFDI.company_id == company_id).order_by(
+                desc(CFDI.fecha_emision)).limit(per_page).all()
+
+        def load_rows():
+            return db.execute(
+                select(*CFDI_LIST_COLUMNS).where(CFDI.company_id == company_id)
+                .order_by(desc(CFDI.fecha_emision)).limit(per_page)
+            ).all()
+
+        entities, rows = load_entities(), load_rows()
+        assert json.loads(pydantic_body(entities, total, per_page)) == json.loads(orjson_body(rows, total, per_page))
+
+        def load_and_pydantic():
+            db.expunge_all()
+            return pydantic_body(load_entities(), total, per_page)
+
+        db.expunge_all()
+        memory = {
+            "page_peak_kib_entities": peak_kib(load_and_pydantic),
+            "page_peak_kib_rows": peak_kib(lambda: orjson_body(load_rows(), total, per_page)),
+        }
+        results = {
+            "serialize_pydantic_us": _median_us(lambda: pydantic_body(entities, total, per_page), runs),
+            "serialize_orjson_us": _median_us(lambda: orjson_body(rows, total, per_page), runs),
+            "load_serialize_pydantic_us": _median_us(load_and_pydantic, runs),
+            "load_serialize_orjson_us": _median_us(lambda: orjson_body(load_rows(), total, per_page), runs),
+        }
+    finally:
+        db.close()
+        engine.dispose()
+    return {k: round(v, 1) for k, v in results.items()} | {
+        f"{k[:-3]}_per_row_us": round(v / per_page, 2) for k, v in results.items()
+    } | memory
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Costo de serialización por fila de /cfdis")
+    parser.add_argument("--scale", default="tenant-10k", choices=sorted(SCALES))
+    parser.add_argument("--per-page", type=int, default=100)
+    parser.add_argument("--runs", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    r = run(args.scale, args.per_page, args.runs, args.seed)
+    print(f"{args.scale}, per_page={args.per_page} (mediana de {args.runs} corridas)")
+    print(f"{'camino':<28} {'página (µs)':>12} {'por fila (µs)':>14}")
+    for label, key in (
+        ("serializar: pydantic", "serialize_pydantic"),
+        ("serializar: orjson", "serialize_orjson"),
+        ("cargar+serializar: pydantic", "load_serialize_pydantic"),
+        ("cargar+serializar: orjson", "load_serialize_orjson"),
+    ):
+        print(f"{label:<28} {r[key + '_us']:>12} {r[key + '_per_row_us']:>14}")
+    print(f"memoria pico por página: entidades ORM {r['page_peak_kib_entities']} KiB, "
+          f"proyección {r['page_peak_kib_rows']} KiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Presupuesto de arranque de un worker
+
+Mide dos cosas en procesos nuevos, como los de un pod recién escalado:
+  - `python -X importtime -c "import app.main"`: tiempo total de import, los
+    módulos más caros y que no se carguen módulos que deben ser perezosos
+    (jose, bcrypt, semillas, CFO, alembic, pyarrow).
+  - Tiempo hasta que `uvicorn app.main:app` responde `/health` con la base
+    ya migrada (el lifespan corre `init_db`).
+Termina con código 1 si algo excede el presupuesto. CI corre la parte del
+import como prueba (tests/test_startup.py); el resultado completo queda en
+benchmarks/.results/.
+
+Uso:
+    python -m benchmarks.startup
+    python -m benchmarks.startup --import-budget-ms 800 --ready-budget-ms 1000 --runs 5
+"""
+from pathlib import Path
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.harness import environment, write_json, results_path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+# Módulos que el import de app.main no debe cargar
+LAZY_MODULES = ("jose", "bcrypt", "app.seeds", "app.services.cfo", "alembic", "pyarrow")
+IMPORT_BUDGET_MS = 1000
+READY_BUDGET_MS = 1000
+
+
+def _env(database_url: str) -> dict:
+    return {**os.environ, "DATABASE_URL": database_url, "PYTHONPATH": str(BACKEND_DIR)}
+
+
+def import_profile(database_url: str) -> dict:
+    """Tiempo de import de app.main y los módulos más caros según -X importtime."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        cwd=BACKEND_DIR, env=_env(database_url), capture_output=True, text=True, check=True,
+    )
+    modules = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if cumulative.strip().isdigit():
+            modules[name.strip()] = int(cumulative) / 1000
+    top_level = {name: ms for name, ms in modules.items() if "." not in name}
+    return {
+        "total_ms": round(modules.get("app.main", 0.0), 1),
+        "top": sorted(top_level.items(), key=lambda x: -x[1])[:10],
+        "eager": [m for m in LAZY_MODULES if m in modules],
+    }
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def time_to_ready(database_url: str, timeout: float = 20.0) -> float:
+    """Milisegundos desde lanzar uvicorn hasta el primer 200 de /health."""
+    port = _free_port()
+    started = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=_env(database_url), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            try:
+                if httpx.get(f"http://127.0.0.1:{port}/health", timeout=0.5).status_code == 200:
+                    return (time.perf_counter() - started) * 1000
+            except httpx.HTTPError:
+                pass
+            if proc.poll() is not None:
+                raise RuntimeError(f"uvicorn terminó con código {proc.returncode}")
+            time.sleep(0.01)
+        raise TimeoutError(f"/health no respondió en {timeout}s")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Presupuesto de arranque (import y /health)")
+    parser.add_argument("--database-url", help="Base ya migrada; por omisión una SQLite temporal")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--import-budget-ms", type=float, default=IMPORT_BUDGET_MS)
+    parser.add_argument("--ready-budget-ms", type=float, default=READY_BUDGET_MS)
+    parser.add_argument("--out", default=results_path("startup_results.json"))
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database_url = args.database_url or f"sqlite:///{tmp}/startup.db"
+        # Migrar antes: el presupuesto es el de un pod nuevo contra una base al día
+        subprocess.run(
+            [sys.executable, "-c", "from app.database import init_db; init_db()"],
+            cwd=BACKEND_DIR, env=_env(database_url), check=True,
+        )
+        imports = [import_profile(database_url) for _ in range(args.runs)]
+        ready = [time_to_ready(database_url) for _ in range(args.runs)]
+
+    import_ms = statistics.median(p["total_ms"] for p in imports)
+    ready_ms = statistics.median(ready)
+    eager = imports[-1]["eager"]
+    print(f"import app.main  mediana {import_ms:>7.1f} ms  (presupuesto {args.import_budget_ms:.0f})")
+    for name, ms in imports[-1]["top"]:
+        print(f"    {name:<28} {ms:>7.1f} ms")
+    print(f"listo (/health)  mediana {ready_ms:>7.1f} ms  (presupuesto {args.ready_budget_ms:.0f})")
+    if eager:
+        print(f"módulos que deberían ser perezosos: {', '.join(eager)}")
+
+    write_json(args.out, {
+        "meta": {**environment(), "runs": args.runs},
+        "import_ms": import_ms,
+        "ready_ms": ready_ms,
+        "top_imports": imports[-1]["top"],
+        "eager_modules": eager,
+    })
+    if import_ms > args.import_budget_ms or ready_ms > args.ready_budget_ms or eager:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
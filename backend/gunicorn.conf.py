@@ -0,0 +1,34 @@
+"""
+Configuración de gunicorn para producción
+
+    gunicorn -c gunicorn.conf.py app.main:app
+
+Workers de uvicorn sobre un maestro con la app precargada (ver
+app/prefork.py). Las variables salen de app.config (entorno o .env).
+"""
+from app.config import settings
+from app import prefork
+
+bind = "0.0.0.0:8000"
+workers = settings.WEB_CONCURRENCY
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+timeout = 60
+graceful_timeout = 30
+keepalive = 5
+max_requests = settings.WORKER_MAX_REQUESTS
+max_requests_jitter = settings.WORKER_MAX_REQUESTS // 10
+
+
+def when_ready(server):
+    # La app ya se importó (preload_app); falta lo que se carga perezosamente
+    prefork.warm_shared_state()
+    prefork.freeze_heap()
+
+
+def post_fork(server, worker):
+    prefork.after_fork()
+
+
+def post_worker_init(worker):
+    prefork.start_rss_watchdog()
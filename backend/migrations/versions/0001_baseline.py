@@ -0,0 +1,148 @@
+"""
+Esquema base (el que creaba `Base.metadata.create_all`)
+
+Bases existentes creadas antes de usar Alembic: `alembic stamp 0001` y
+después `alembic upgrade head`.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+user_role = sa.Enum("ADMIN", "OWNER", "ACCOUNTANT", "VIEWER", name="userrole")
+tipo_cfdi = sa.Enum("INGRESO", "EGRESO", "TRASLADO", "NOMINA", "PAGO", name="tipocfdi")
+estado_cfdi = sa.Enum("VIGENTE", "CANCELADO", name="estadocfdi")
+alert_type = sa.Enum("DECLARACION", "EFOS", "CANCELACION", "CONCENTRACION", "CONCILIACION", "LIQUIDEZ", name="alerttype")
+alert_severity = sa.Enum("VERDE", "AMARILLO", "ROJO", name="alertseverity")
+
+
+def _timestamps(updated: bool = True) -> list[sa.Column]:
+    columns = [sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now())]
+    if updated:
+        columns.append(sa.Column("updated_at", sa.DateTime(timezone=True)))
+    return columns
+
+
+def upgrade() -> None:
+    op.create_table(
+        "users",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("email", sa.String(255), nullable=False),
+        sa.Column("hashed_password", sa.String(255), nullable=False),
+        sa.Column("full_name", sa.String(255), nullable=False),
+        sa.Column("role", user_role),
+        sa.Column("is_active", sa.Boolean()),
+        sa.Column("is_verified", sa.Boolean()),
+        *_timestamps(),
+    )
+    op.create_index("ix_users_id", "users", ["id"])
+    op.create_index("ix_users_email", "users", ["email"], unique=True)
+
+    op.create_table(
+        "companies",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("rfc", sa.String(13), nullable=False),
+        sa.Column("razon_social", sa.String(255), nullable=False),
+        sa.Column("regimen_fiscal", sa.String(10)),
+        sa.Column("regimen_fiscal_nombre", sa.String(255)),
+        sa.Column("codigo_postal", sa.String(5)),
+        sa.Column("email", sa.String(255)),
+        sa.Column("telefono", sa.String(20)),
+        sa.Column("sat_connected", sa.Boolean()),
+        sa.Column("sat_last_sync", sa.DateTime(timezone=True)),
+        sa.Column("sector", sa.String(100)),
+        sa.Column("tamano", sa.String(50)),
+        sa.Column("demo_scenario", sa.String(1)),
+        *_timestamps(),
+        sa.Column("owner_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+    )
+    op.create_index("ix_companies_id", "companies", ["id"])
+    op.create_index("ix_companies_rfc", "companies", ["rfc"], unique=True)
+
+    op.create_table(
+        "cfdis",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("uuid", sa.String(36), nullable=False),
+        sa.Column("folio", sa.String(50)),
+        sa.Column("serie", sa.String(25)),
+        sa.Column("tipo_comprobante", tipo_cfdi, nullable=False),
+        sa.Column("estado", estado_cfdi),
+        sa.Column("emisor_rfc", sa.String(13), nullable=False),
+        sa.Column("emisor_nombre", sa.String(255)),
+        sa.Column("receptor_rfc", sa.String(13), nullable=False),
+        sa.Column("receptor_nombre", sa.String(255)),
+        sa.Column("subtotal", sa.Numeric(18, 2), nullable=False),
+        sa.Column("descuento", sa.Numeric(18, 2)),
+        sa.Column("iva", sa.Numeric(18, 2)),
+        sa.Column("isr_retenido", sa.Numeric(18, 2)),
+        sa.Column("iva_retenido", sa.Numeric(18, 2)),
+        sa.Column("total", sa.Numeric(18, 2), nullable=False),
+        sa.Column("moneda", sa.String(3)),
+        sa.Column("tipo_cambio", sa.Numeric(10, 4)),
+        sa.Column("fecha_emision", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("fecha_timbrado", sa.DateTime(timezone=True)),
+        sa.Column("fecha_cancelacion", sa.DateTime(timezone=True)),
+        sa.Column("uso_cfdi", sa.String(5)),
+        sa.Column("uso_cfdi_descripcion", sa.String(255)),
+        sa.Column("metodo_pago", sa.String(3)),
+        sa.Column("forma_pago", sa.String(2)),
+        sa.Column("xml_content", sa.Text()),
+        *_timestamps(),
+        sa.Column("company_id", sa.Integer(), sa.ForeignKey("companies.id"), nullable=False),
+    )
+    op.create_index("ix_cfdis_id", "cfdis", ["id"])
+    op.create_index("ix_cfdis_uuid", "cfdis", ["uuid"], unique=True)
+    op.create_index("ix_cfdis_emisor_rfc", "cfdis", ["emisor_rfc"])
+    op.create_index("ix_cfdis_receptor_rfc", "cfdis", ["receptor_rfc"])
+
+    op.create_table(
+        "fiscal_alerts",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("alert_type", alert_type, nullable=False),
+        sa.Column("severity", alert_severity, nullable=False),
+        sa.Column("titulo", sa.String(255), nullable=False),
+        sa.Column("descripcion", sa.Text()),
+        sa.Column("detalle", sa.String(255)),
+        sa.Column("metadata_json", sa.Text()),
+        sa.Column("is_resolved", sa.String(20)),
+        sa.Column("resolved_at", sa.DateTime(timezone=True)),
+        *_timestamps(),
+        sa.Column("company_id", sa.Integer(), sa.ForeignKey("companies.id"), nullable=False),
+    )
+    op.create_index("ix_fiscal_alerts_id", "fiscal_alerts", ["id"])
+
+    op.create_table(
+        "health_scores",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("score_total", sa.Integer(), nullable=False),
+        *[
+            sa.Column(name, sa.Integer())
+            for name in (
+                "liquidez", "cumplimiento_fiscal", "diversificacion_clientes", "tendencia_ingresos",
+                "margen_operativo", "estacionalidad", "antiguedad_cxc", "riesgo_proveedores",
+                "peso_liquidez", "peso_cumplimiento", "peso_diversificacion", "peso_tendencia",
+                "peso_margen", "peso_estacionalidad", "peso_cxc", "peso_proveedores",
+            )
+        ],
+        sa.Column("periodo_inicio", sa.DateTime(timezone=True)),
+        sa.Column("periodo_fin", sa.DateTime(timezone=True)),
+        sa.Column("notas", sa.Text()),
+        *_timestamps(updated=False),
+        sa.Column("company_id", sa.Integer(), sa.ForeignKey("companies.id"), nullable=False),
+    )
+    op.create_index("ix_health_scores_id", "health_scores", ["id"])
+
+
+def downgrade() -> None:
+    for table in ("health_scores", "fiscal_alerts", "cfdis", "companies", "users"):
+        op.drop_table(table)
+    bind = op.get_bind()
+    for enum in (alert_severity, alert_type, estado_cfdi, tipo_cfdi, user_role):
+        enum.drop(bind, checkfirst=True)
@@ -0,0 +1,77 @@
+"""
+fiscal_alerts.metadata_json: Text -> JSON (JSONB en PostgreSQL)
+
+Antes de cambiar el tipo se recorre la columna en Python: el texto que no es
+JSON válido se envuelve como `{"texto": ...}`, los valores JSON que no son
+objeto como `{"valor": ...}` y las cadenas vacías quedan en NULL. Así el
+`USING metadata_json::jsonb` de PostgreSQL no falla y en SQLite
+`json_extract` no encuentra JSON mal formado.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19
+"""
+import json
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import JSONB
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+BATCH = 1000
+
+
+def _normalized(raw: str):
+    """Texto listo para el tipo JSON, o None si no hay nada que guardar."""
+    if raw is None or not raw.strip():
+        return None
+    try:
+        value = json.loads(raw)
+    except (ValueError, TypeError):
+        return json.dumps({"texto": raw}, ensure_ascii=False)
+    if not isinstance(value, dict):
+        return json.dumps({"valor": value}, ensure_ascii=False)
+    return raw
+
+
+def _normalize_rows(bind) -> None:
+    rows = bind.execute(sa.text("SELECT id, metadata_json FROM fiscal_alerts WHERE metadata_json IS NOT NULL")).all()
+    fixes = []
+    for alert_id, raw in rows:
+        value = _normalized(raw)
+        if value != raw:
+            fixes.append({"id": alert_id, "value": value})
+    update = sa.text("UPDATE fiscal_alerts SET metadata_json = :value WHERE id = :id")
+    for start in range(0, len(fixes), BATCH):
+        bind.execute(update, fixes[start:start + BATCH])
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    # Con --sql (modo offline) no hay filas que leer; revisar los datos antes de aplicar
+    if not op.get_context().as_sql:
+        _normalize_rows(bind)
+    if bind.dialect.name == "postgresql":
+        op.alter_column(
+            "fiscal_alerts", "metadata_json",
+            type_=JSONB(), existing_type=sa.Text(), postgresql_using="metadata_json::jsonb",
+        )
+    else:
+        with op.batch_alter_table("fiscal_alerts") as batch:
+            batch.alter_column("metadata_json", type_=sa.JSON(), existing_type=sa.Text())
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    if bind.dialect.name == "postgresql":
+        op.alter_column(
+            "fiscal_alerts", "metadata_json",
+            type_=sa.Text(), existing_type=JSONB(), postgresql_using="metadata_json::text",
+        )
+    else:
+        with op.batch_alter_table("fiscal_alerts") as batch:
+            batch.alter_column("metadata_json", type_=sa.Text(), existing_type=sa.JSON())
@@ -0,0 +1,44 @@
+"""
+cfdi_rollups: acumulados mensuales de los CFDIs archivados en Parquet
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+# Los tipos enum ya existen desde 0001 (PostgreSQL)
+tipo_cfdi = sa.Enum("INGRESO", "EGRESO", "TRASLADO", "NOMINA", "PAGO", name="tipocfdi", create_type=False)
+estado_cfdi = sa.Enum("VIGENTE", "CANCELADO", name="estadocfdi", create_type=False)
+
+
+def upgrade() -> None:
+    op.create_table(
+        "cfdi_rollups",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("periodo", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("tipo_comprobante", tipo_cfdi, nullable=False),
+        sa.Column("estado", estado_cfdi),
+        sa.Column("emisor_rfc", sa.String(13), nullable=False),
+        sa.Column("emisor_nombre", sa.String(255)),
+        sa.Column("receptor_rfc", sa.String(13), nullable=False),
+        sa.Column("receptor_nombre", sa.String(255)),
+        sa.Column("num_cfdis", sa.Integer(), nullable=False),
+        sa.Column("subtotal", sa.Numeric(18, 2), nullable=False),
+        sa.Column("iva", sa.Numeric(18, 2), nullable=False),
+        sa.Column("total", sa.Numeric(18, 2), nullable=False),
+        sa.Column("archived_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column("company_id", sa.Integer(), sa.ForeignKey("companies.id"), nullable=False),
+    )
+    op.create_index("ix_cfdi_rollups_id", "cfdi_rollups", ["id"])
+    op.create_index("ix_cfdi_rollups_company_periodo", "cfdi_rollups", ["company_id", "periodo"])
+
+
+def downgrade() -> None:
+    op.drop_table("cfdi_rollups")
@@ -0,0 +1,77 @@
+"""
+counterparty_monthly: acumulados mensuales por cliente/proveedor
+
+Crea la tabla y la llena con lo que ya hay en `cfdis` y `cfdi_rollups`
+(solo CFDIs vigentes). Después la mantiene la ingesta.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+# Inicio de mes en el formato en que cada dialecto guarda DateTime
+MONTH_EXPR = {
+    "postgresql": "date_trunc('month', {col})",
+    "sqlite": "strftime('%Y-%m-01 00:00:00.000000', {col})",
+}
+
+BACKFILL = """
+INSERT INTO counterparty_monthly (company_id, periodo, rol, rfc, nombre, total, num_cfdis)
+SELECT company_id, periodo, rol, rfc, max(nombre), sum(total), sum(n)
+FROM (
+    SELECT c.company_id, {cfdi_month} AS periodo, 'cliente' AS rol, c.receptor_rfc AS rfc,
+           c.receptor_nombre AS nombre, c.total, 1 AS n
+    FROM cfdis c JOIN companies co ON co.id = c.company_id
+    WHERE c.tipo_comprobante = 'INGRESO' AND c.emisor_rfc = co.rfc
+      AND (c.estado IS NULL OR c.estado = 'VIGENTE')
+    UNION ALL
+    SELECT c.company_id, {cfdi_month}, 'proveedor', c.emisor_rfc, c.emisor_nombre, c.total, 1
+    FROM cfdis c
+    WHERE c.tipo_comprobante = 'EGRESO' AND (c.estado IS NULL OR c.estado = 'VIGENTE')
+    UNION ALL
+    SELECT r.company_id, r.periodo, 'cliente', r.receptor_rfc, r.receptor_nombre, r.total, r.num_cfdis
+    FROM cfdi_rollups r JOIN companies co ON co.id = r.company_id
+    WHERE r.tipo_comprobante = 'INGRESO' AND r.emisor_rfc = co.rfc
+      AND (r.estado IS NULL OR r.estado = 'VIGENTE')
+    UNION ALL
+    SELECT r.company_id, r.periodo, 'proveedor', r.emisor_rfc, r.emisor_nombre, r.total, r.num_cfdis
+    FROM cfdi_rollups r
+    WHERE r.tipo_comprobante = 'EGRESO' AND (r.estado IS NULL OR r.estado = 'VIGENTE')
+) fuentes
+GROUP BY company_id, periodo, rol, rfc
+"""
+
+
+def upgrade() -> None:
+    op.create_table(
+        "counterparty_monthly",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("periodo", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("rol", sa.String(10), nullable=False),
+        sa.Column("rfc", sa.String(13), nullable=False),
+        sa.Column("nombre", sa.String(255)),
+        sa.Column("total", sa.Numeric(18, 2), nullable=False),
+        sa.Column("num_cfdis", sa.Integer(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column("company_id", sa.Integer(), sa.ForeignKey("companies.id"), nullable=False),
+        sa.UniqueConstraint("company_id", "rol", "periodo", "rfc", name="uq_counterparty_monthly"),
+    )
+    op.create_index("ix_counterparty_monthly_id", "counterparty_monthly", ["id"])
+    op.create_index(
+        "ix_counterparty_monthly_company_rol_periodo", "counterparty_monthly", ["company_id", "rol", "periodo"],
+    )
+
+    dialect = op.get_bind().dialect.name
+    if dialect in MONTH_EXPR:
+        op.execute(BACKFILL.format(cfdi_month=MONTH_EXPR[dialect].format(col="c.fecha_emision")))
+
+
+def downgrade() -> None:
+    op.drop_table("counterparty_monthly")
@@ -0,0 +1,36 @@
+"""
+cfdi_conceptos: ClaveProdServ e importe de cada Concepto
+
+Los CFDIs que ya estaban en la base se llenan desde su XML con
+`python -m app.services.concepts rebuild`; después los mantiene la ingesta.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "cfdi_conceptos",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("cfdi_uuid", sa.String(36), nullable=False),
+        sa.Column("fecha_emision", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("rol", sa.String(10), nullable=False),
+        sa.Column("clave_prod_serv", sa.String(8), nullable=False),
+        sa.Column("importe", sa.Numeric(18, 2), nullable=False),
+        sa.Column("company_id", sa.Integer(), sa.ForeignKey("companies.id"), nullable=False),
+    )
+    op.create_index("ix_cfdi_conceptos_cfdi_uuid", "cfdi_conceptos", ["cfdi_uuid"])
+    op.create_index("ix_cfdi_conceptos_company_rol_fecha", "cfdi_conceptos", ["company_id", "rol", "fecha_emision"])
+
+
+def downgrade() -> None:
+    op.drop_table("cfdi_conceptos")
@@ -0,0 +1,53 @@
+"""
+payment_applications y receivable_balances: cuentas por cobrar PPD
+
+Las aplicaciones salen del XML de los complementos de pago ya guardados con
+`python -m app.services.receivables rematch --reparse`; después las
+mantiene la ingesta.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "payment_applications",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("pago_uuid", sa.String(36), nullable=False),
+        sa.Column("factura_uuid", sa.String(36), nullable=False),
+        sa.Column("fecha_pago", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("importe", sa.Numeric(18, 2), nullable=False),
+        sa.Column("company_id", sa.Integer(), sa.ForeignKey("companies.id"), nullable=False),
+    )
+    op.create_index("ix_payment_applications_company_pago", "payment_applications", ["company_id", "pago_uuid"])
+    op.create_index("ix_payment_applications_company_factura", "payment_applications", ["company_id", "factura_uuid"])
+
+    op.create_table(
+        "receivable_balances",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("cfdi_uuid", sa.String(36), nullable=False),
+        sa.Column("fecha_emision", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("receptor_rfc", sa.String(13), nullable=False),
+        sa.Column("total", sa.Numeric(18, 2), nullable=False),
+        sa.Column("pagado", sa.Numeric(18, 2), nullable=False),
+        sa.Column("saldo", sa.Numeric(18, 2), nullable=False),
+        sa.Column("ultimo_pago", sa.DateTime(timezone=True)),
+        sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column("company_id", sa.Integer(), sa.ForeignKey("companies.id"), nullable=False),
+        sa.UniqueConstraint("company_id", "cfdi_uuid", name="uq_receivable_balances_company_cfdi"),
+    )
+    op.create_index("ix_receivable_balances_company_fecha", "receivable_balances", ["company_id", "fecha_emision"])
+
+
+def downgrade() -> None:
+    op.drop_table("receivable_balances")
+    op.drop_table("payment_applications")
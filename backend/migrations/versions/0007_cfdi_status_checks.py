@@ -0,0 +1,31 @@
+"""
+cfdi_status_checks: última verificación de estado de cada CFDI ante el SAT
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "cfdi_status_checks",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("cfdi_uuid", sa.String(36), nullable=False),
+        sa.Column("estado_sat", sa.String(20), nullable=False),
+        sa.Column("estatus_cancelacion", sa.String(50)),
+        sa.Column("verificado_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("company_id", sa.Integer(), sa.ForeignKey("companies.id"), nullable=False),
+        sa.UniqueConstraint("company_id", "cfdi_uuid", name="uq_cfdi_status_checks_company_cfdi"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("cfdi_status_checks")
@@ -0,0 +1,24 @@
+"""
+companies.data_version: versión de los datos de la empresa para el feed de cambios
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0008"
+down_revision = "0007"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("companies") as batch:
+        batch.add_column(sa.Column("data_version", sa.Integer(), nullable=False, server_default="0"))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("companies") as batch:
+        batch.drop_column("data_version")
@@ -0,0 +1,73 @@
+"""
+Índices de la búsqueda de CFDIs (GET /api/companies/{id}/cfdis/search)
+
+btree por empresa para RFC de contraparte, monto y folio. Para texto
+(nombres de contraparte y fragmentos de UUID): pg_trgm con GIN en
+PostgreSQL (requiere permiso para CREATE EXTENSION) y una tabla FTS5 con
+tokenizer trigram en SQLite, sincronizada con triggers y llenada aquí con
+'rebuild'. En tablas grandes de PostgreSQL conviene crear los índices GIN
+antes con CREATE INDEX CONCURRENTLY (mismos nombres) para no bloquear
+escrituras; los IF NOT EXISTS de abajo los respetan.
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-19
+"""
+from alembic import op
+
+revision = "0009"
+down_revision = "0008"
+branch_labels = None
+depends_on = None
+
+BTREE_INDEXES = (
+    ("ix_cfdis_company_emisor_fecha", ["company_id", "emisor_rfc", "fecha_emision"]),
+    ("ix_cfdis_company_receptor_fecha", ["company_id", "receptor_rfc", "fecha_emision"]),
+    ("ix_cfdis_company_total", ["company_id", "total"]),
+    ("ix_cfdis_company_folio", ["company_id", "folio"]),
+)
+
+SQLITE_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS cfdis_fts USING fts5("
+    "emisor_nombre, receptor_nombre, uuid, content='cfdis', content_rowid='id', tokenize='trigram')",
+    "CREATE TRIGGER IF NOT EXISTS cfdis_fts_ai AFTER INSERT ON cfdis BEGIN "
+    "INSERT INTO cfdis_fts(rowid, emisor_nombre, receptor_nombre, uuid) "
+    "VALUES (new.id, new.emisor_nombre, new.receptor_nombre, new.uuid); END",
+    "CREATE TRIGGER IF NOT EXISTS cfdis_fts_ad AFTER DELETE ON cfdis BEGIN "
+    "INSERT INTO cfdis_fts(cfdis_fts, rowid, emisor_nombre, receptor_nombre, uuid) "
+    "VALUES ('delete', old.id, old.emisor_nombre, old.receptor_nombre, old.uuid); END",
+    "CREATE TRIGGER IF NOT EXISTS cfdis_fts_au AFTER UPDATE OF emisor_nombre, receptor_nombre, uuid ON cfdis BEGIN "
+    "INSERT INTO cfdis_fts(cfdis_fts, rowid, emisor_nombre, receptor_nombre, uuid) "
+    "VALUES ('delete', old.id, old.emisor_nombre, old.receptor_nombre, old.uuid); "
+    "INSERT INTO cfdis_fts(rowid, emisor_nombre, receptor_nombre, uuid) "
+    "VALUES (new.id, new.emisor_nombre, new.receptor_nombre, new.uuid); END",
+    "INSERT INTO cfdis_fts(cfdis_fts) VALUES ('rebuild')",
+)
+
+POSTGRES_DDL = (
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS ix_cfdis_emisor_nombre_trgm ON cfdis USING gin (emisor_nombre gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_cfdis_receptor_nombre_trgm ON cfdis USING gin (receptor_nombre gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_cfdis_uuid_trgm ON cfdis USING gin (uuid gin_trgm_ops)",
+)
+
+
+def upgrade() -> None:
+    for name, columns in BTREE_INDEXES:
+        op.create_index(name, "cfdis", columns)
+    dialect = op.get_bind().dialect.name
+    for statement in SQLITE_DDL if dialect == "sqlite" else POSTGRES_DDL if dialect == "postgresql" else ():
+        op.execute(statement)
+
+
+def downgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    if dialect == "sqlite":
+        for trigger in ("cfdis_fts_ai", "cfdis_fts_ad", "cfdis_fts_au"):
+            op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        op.execute("DROP TABLE IF EXISTS cfdis_fts")
+    elif dialect == "postgresql":
+        for index in ("ix_cfdis_emisor_nombre_trgm", "ix_cfdis_receptor_nombre_trgm", "ix_cfdis_uuid_trgm"):
+            op.execute(f"DROP INDEX IF EXISTS {index}")
+    for name, _ in BTREE_INDEXES:
+        op.drop_index(name, "cfdis")
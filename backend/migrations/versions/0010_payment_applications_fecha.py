@@ -0,0 +1,21 @@
+"""
+payment_applications por empresa y fecha de pago (flujo de efectivo diario)
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-19
+"""
+from alembic import op
+
+revision = "0010"
+down_revision = "0009"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index("ix_payment_applications_company_fecha", "payment_applications", ["company_id", "fecha_pago"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_payment_applications_company_fecha", "payment_applications")
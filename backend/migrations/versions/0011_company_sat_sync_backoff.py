@@ -0,0 +1,26 @@
+"""
+companies.sat_sync_failures / sat_sync_retry_at: backoff de la sincronización SAT por empresa
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0011"
+down_revision = "0010"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("companies") as batch:
+        batch.add_column(sa.Column("sat_sync_failures", sa.Integer(), nullable=False, server_default="0"))
+        batch.add_column(sa.Column("sat_sync_retry_at", sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("companies") as batch:
+        batch.drop_column("sat_sync_retry_at")
+        batch.drop_column("sat_sync_failures")
@@ -0,0 +1,68 @@
+"""
+Tabla `jobs` (cola de trabajos) e índices de llaves foráneas y de (company_id, fecha_emision)
+
+Versiones anteriores de 0001 ya los creaban, así que cada objeto se crea
+solo si falta: sirve igual para bases marcadas con `alembic stamp 0001`
+desde `create_all` que para las creadas con aquella 0001.
+
+Revision ID: 0012
+Revises: 0011
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0012"
+down_revision = "0011"
+branch_labels = None
+depends_on = None
+
+job_status = sa.Enum("QUEUED", "RUNNING", "SUCCEEDED", "FAILED", name="jobstatus")
+
+INDEXES = (
+    ("ix_companies_owner_id", "companies", ["owner_id"]),
+    ("ix_cfdis_company_fecha", "cfdis", ["company_id", "fecha_emision"]),
+    ("ix_fiscal_alerts_company_id", "fiscal_alerts", ["company_id"]),
+    ("ix_health_scores_company_id", "health_scores", ["company_id"]),
+)
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    for name, table, columns in INDEXES:
+        if name not in {ix["name"] for ix in inspector.get_indexes(table)}:
+            op.create_index(name, table, columns)
+
+    if inspector.has_table("jobs"):
+        return
+    op.create_table(
+        "jobs",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("kind", sa.String(50), nullable=False),
+        sa.Column("payload_json", sa.Text()),
+        sa.Column("status", job_status, nullable=False),
+        sa.Column("progress", sa.Integer()),
+        sa.Column("progress_message", sa.String(255)),
+        sa.Column("result_json", sa.Text()),
+        sa.Column("error", sa.Text()),
+        sa.Column("attempts", sa.Integer()),
+        sa.Column("max_attempts", sa.Integer()),
+        sa.Column("run_after", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("locked_by", sa.String(100)),
+        sa.Column("locked_at", sa.DateTime(timezone=True)),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column("updated_at", sa.DateTime(timezone=True)),
+        sa.Column("started_at", sa.DateTime(timezone=True)),
+        sa.Column("finished_at", sa.DateTime(timezone=True)),
+        sa.Column("company_id", sa.Integer(), sa.ForeignKey("companies.id")),
+    )
+    op.create_index("ix_jobs_id", "jobs", ["id"])
+    op.create_index("ix_jobs_company_id", "jobs", ["company_id"])
+    op.create_index("ix_jobs_status_run_after", "jobs", ["status", "run_after"])
+
+
+def downgrade() -> None:
+    op.drop_table("jobs")
+    job_status.drop(op.get_bind(), checkfirst=True)
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
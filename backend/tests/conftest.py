@@ -0,0 +1,46 @@
+"""
+Fixtures de las pruebas del backend
+
+La configuración se lee al importar `app.config`, así que el entorno se fija
+aquí antes de importar la aplicación: una base SQLite temporal con el
+esquema de las migraciones y los presupuestos de consultas en modo `raise`.
+"""
+import os
+import tempfile
+
+_TMP = tempfile.mkdtemp(prefix="poa-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_TMP}/test.db"
+os.environ["DB_SCHEMA_MODE"] = "migrate"
+os.environ["QUERY_BUDGET_MODE"] = "raise"
+os.environ["JOBS_EMBEDDED_WORKER"] = "false"
+os.environ["ARCHIVE_DIR"] = f"{_TMP}/archive"
+os.environ["PROFILE_DIR"] = f"{_TMP}/profiles"
+
+import pytest
+from fastapi.testclient import TestClient
+
+
+@pytest.fixture(scope="session")
+def client():
+    from app.main import app
+
+    with TestClient(app) as client:
+        assert client.post("/api/seed?scenario=A").status_code == 200
+        yield client
+
+
+@pytest.fixture(scope="session")
+def company_id(client) -> int:
+    return client.get("/api/companies").json()[0]["id"]
+
+
+@pytest.fixture(scope="session")
+def auth_headers(client, company_id) -> dict:
+    """Token del dueño de la empresa sembrada (las cuentas demo no pasan por /api/auth/login)."""
+    from app.auth import create_access_token
+    from app.database import SessionLocal
+    from app.models import Company
+
+    with SessionLocal() as db:
+        owner_id = db.get(Company, company_id).owner_id
+    return {"Authorization": f"Bearer {create_access_token({'sub': str(owner_id)})}"}
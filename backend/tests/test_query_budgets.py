@@ -0,0 +1,57 @@
+"""
+Presupuestos de consultas (`@query_budget`) con QUERY_BUDGET_MODE=raise
+
+Cada ruta con presupuesto se llama dos veces, con cache frío y caliente;
+si se pasa, el middleware lanza QueryBudgetExceeded y la prueba falla.
+"""
+import pytest
+
+from app.observability.querybudget import TRACKER
+
+
+def _cfdi_uuid(client, company_id: int) -> str:
+    return client.get(f"/api/companies/{company_id}/cfdis?per_page=1").json()["cfdis"][0]["uuid"]
+
+
+# (método, ruta, query): cada plantilla de ruta con presupuesto aparece al menos una vez
+REQUESTS = [
+    ("GET", "/api/dashboard/{company_id}", ""),
+    ("GET", "/api/companies/{company_id}/counterparties", ""),
+    ("GET", "/api/companies/{company_id}/receivables/aging", ""),
+    ("GET", "/api/companies/{company_id}/cfdis", "per_page=100"),
+    ("GET", "/api/companies/{company_id}/cfdis/search", "q=MÓVIL"),
+    ("GET", "/api/companies/{company_id}/cfdis/search", "rfc=AMO&monto_min=100"),
+    ("GET", "/api/companies/{company_id}/cfdis/search", "estado=vigente&tipo=ingreso"),
+    ("GET", "/api/companies/{company_id}/cfdis/{uuid}", ""),
+    ("GET", "/api/companies/{company_id}/health-score", ""),
+    ("GET", "/api/companies", ""),
+    ("GET", "/api/companies/{company_id}", ""),
+    ("GET", "/api/portfolio/dashboard", ""),
+    ("POST", "/api/cfo/chat", "message=flujo de efectivo&company_id={company_id}"),
+    ("POST", "/api/cfo/chat", "message=hola&company_id={company_id}"),
+    ("GET", "/api/predictions/{company_id}", ""),
+    ("GET", "/api/credit/{company_id}", ""),
+    ("GET", "/api/companies/{company_id}/bundle", ""),
+]
+
+
+def test_every_budgeted_route_is_covered(client):
+    budgeted = {
+        route.path
+        for route in client.app.routes
+        if getattr(getattr(route, "endpoint", None), "__query_budget__", None) is not None
+    }
+    assert budgeted == {path for _, path, _ in REQUESTS}
+
+
+@pytest.mark.parametrize("method,path,query", REQUESTS)
+def test_route_within_budget(client, company_id, auth_headers, method, path, query):
+    values = {"company_id": company_id}
+    if "{uuid}" in path:
+        values["uuid"] = _cfdi_uuid(client, company_id)
+    url = path.format(**values) + ("?" + query.format(**values) if query else "")
+    for _ in range(2):
+        response = client.request(method, url, headers=auth_headers)
+        assert response.status_code == 200, response.text
+    stats = {r["route"]: r for r in TRACKER.report(limit=100)}[path]
+    assert stats["max_queries"] <= stats["budget"]
@@ -0,0 +1,38 @@
+"""
+Búsqueda de CFDIs: el filtro de texto da lo mismo sin importar qué filtro
+guíe la consulta (ver app/services/search.py)
+"""
+from decimal import Decimal
+
+import pytest
+
+
+def _search(client, company_id: int, query: str) -> list[dict]:
+    response = client.get(f"/api/companies/{company_id}/cfdis/search?{query}&per_page=100")
+    assert response.status_code == 200, response.text
+    return response.json()["cfdis"]
+
+
+def test_text_ignores_case_outside_ascii(client, company_id):
+    upper = _search(client, company_id, "q=MÓVIL")
+    assert upper
+    assert upper == _search(client, company_id, "q=móvil")
+
+
+@pytest.mark.parametrize("extra", ["folio", "monto_min", "rfc"])
+def test_text_combined_with_another_filter(client, company_id, extra):
+    matches = _search(client, company_id, "q=MÓVIL")
+    target = matches[len(matches) // 2]
+    if extra == "folio":
+        query, expected = f"folio={target['folio']}", [c for c in matches if c["folio"] == target["folio"]]
+    elif extra == "monto_min":
+        minimum = Decimal(str(target["total"]))
+        query, expected = f"monto_min={minimum}", [c for c in matches if Decimal(str(c["total"])) >= minimum]
+    else:
+        prefix = target["receptor_rfc"][:4]
+        query = f"rfc={prefix}"
+        expected = [c for c in matches if c["emisor_rfc"].startswith(prefix) or c["receptor_rfc"].startswith(prefix)]
+
+    combined = _search(client, company_id, f"q=MÓVIL&{query}")
+    assert target in combined
+    assert combined == expected
@@ -0,0 +1,20 @@
+"""
+Import de app.main en un proceso nuevo (ver benchmarks/startup.py): sin
+módulos que deben cargarse perezosamente y dentro del presupuesto de tiempo
+"""
+import os
+import statistics
+
+from benchmarks.startup import IMPORT_BUDGET_MS, LAZY_MODULES, import_profile
+
+# Holgura para runners compartidos y ruidosos; el presupuesto fino lo mide `python -m benchmarks.startup`
+BUDGET_MS = 2 * IMPORT_BUDGET_MS
+
+
+def test_import_is_lazy_and_within_budget():
+    profiles = [import_profile(os.environ["DATABASE_URL"]) for _ in range(3)]
+
+    eager = profiles[-1]["eager"]
+    assert not eager, f"import app.main carga {', '.join(eager)} (deben ser perezosos: {', '.join(LAZY_MODULES)})"
+    import_ms = statistics.median(p["total_ms"] for p in profiles)
+    assert import_ms <= BUDGET_MS, f"import app.main tomó {import_ms:.0f} ms (presupuesto {BUDGET_MS})"
@@ -39,8 +39,9 @@ import {
   checkHealth,
   seedDatabase,
   getCompanies,
-  getDashboardStats,
-  getHealthScore,
+  getCompanyBundle,
+  subscribeCompanyChanges,
+  applyCompanyDelta,
   sendCFOMessage,
   formatMXN,
   authGetMe,
@@ -53,6 +54,10 @@ import {
 type Scenario = 'A' | 'B' | 'C'
 type View = 'dashboard' | 'cfdis' | 'semaforo' | 'cfo' | 'predicciones' | 'credito' | 'config'
 
+// Jobs whose effects a `data` delta cannot describe (seed rebuilds every company);
+// sat_sync and sat_verify already arrive as deltas, so they never trigger a refetch
+const JOBS_WITHOUT_DELTA = new Set(['seed'])
+
 export default function Home() {
   // Auth State
   const [isAuthenticated, setIsAuthenticated] = useState<boolean | null>(null)
@@ -171,17 +176,27 @@ export default function Home() {
   // Load dashboard data
   const loadDashboard = async (companyId: number) => {
     try {
-      const [stats, health] = await Promise.all([
-        getDashboardStats(companyId),
-        getHealthScore(companyId),
-      ])
-      setDashboardStats(stats)
-      setScoreComponents(health.componentes)
+      const bundle = await getCompanyBundle(companyId, ['dashboard', 'health'])
+      setDashboardStats(bundle.dashboard!)
+      setScoreComponents(bundle.health?.componentes ?? [])
     } catch (e) {
       console.error('Failed to load dashboard:', e)
     }
   }
 
+  // Push updates for the current company (uploads, SAT sync) instead of refetching
+  useEffect(() => {
+    if (!currentCompany) return
+    const companyId = currentCompany.id
+    return subscribeCompanyChanges(companyId, {
+      onDelta: (delta) => setDashboardStats((prev) => (prev ? applyCompanyDelta(prev, delta) : prev)),
+      onJob: (job) => {
+        if (job.status === 'succeeded' && JOBS_WITHOUT_DELTA.has(job.kind)) loadDashboard(companyId)
+      },
+      onResync: () => loadDashboard(companyId),
+    })
+  }, [currentCompany?.id])
+
   // Handle scenario change
   const handleScenarioChange = useCallback(async (scenario: Scenario) => {
     setCurrentScenario(scenario)
@@ -5,6 +5,7 @@
 const API_URL = process.env.NEXT_PUBLIC_API_URL || 'http://localhost:8000'
 
 export interface RevenueData {
+  periodo: string // YYYY-MM
   mes: string
   ingresos: number
   egresos: number
@@ -135,6 +136,77 @@ export async function getHealthScore(companyId: number): Promise<HealthScoreResp
   return res.json()
 }
 
+// Get several company sections in one request (shared queries on the server)
+export type BundleSection = 'dashboard' | 'health' | 'predictions' | 'credit'
+
+export async function getCompanyBundle(
+  companyId: number,
+  include: BundleSection[] = ['dashboard', 'health', 'predictions', 'credit'],
+): Promise<{
+  dashboard?: DashboardStats
+  health?: HealthScoreResponse | null
+  predictions?: PredictionsData
+  credit?: CreditData
+}> {
+  const res = await fetch(`${API_URL}/api/companies/${companyId}/bundle?include=${include.join(',')}`)
+  if (!res.ok) throw new Error('Failed to fetch company bundle')
+  return res.json()
+}
+
+// Company change feed (Server-Sent Events)
+export interface CompanyDelta {
+  version: number
+  total_cfdis: number
+  last_sync: string | null
+  meses: { periodo: string; mes: string; ingresos: number; egresos: number }[]
+  semaforo: (SemaforoItem | { nombre: string; estado: null })[]
+}
+
+export interface JobEvent {
+  job_id: number
+  kind: string
+  status: 'queued' | 'running' | 'succeeded' | 'failed'
+  progress: number
+  message: string | null
+}
+
+export function subscribeCompanyChanges(
+  companyId: number,
+  handlers: {
+    onDelta: (delta: CompanyDelta) => void
+    onJob?: (job: JobEvent) => void
+    onResync: () => void
+  },
+): () => void {
+  // EventSource reconnects on its own and sends Last-Event-ID (the data version)
+  const source = new EventSource(`${API_URL}/api/companies/${companyId}/changes`)
+  source.addEventListener('data', (e) => handlers.onDelta(JSON.parse((e as MessageEvent).data)))
+  source.addEventListener('job', (e) => handlers.onJob?.(JSON.parse((e as MessageEvent).data)))
+  source.addEventListener('resync', () => handlers.onResync())
+  return () => source.close()
+}
+
+// Apply a change-feed delta to the dashboard already on screen
+export function applyCompanyDelta(stats: DashboardStats, delta: CompanyDelta): DashboardStats {
+  // Por periodo (YYYY-MM): el mismo mes de otro año no es el de la gráfica; los meses fuera de ella se ignoran
+  const meses = new Map(delta.meses.map((m) => [m.periodo, m]))
+  let semaforo = stats.semaforo
+  for (const item of delta.semaforo) {
+    semaforo = semaforo.filter((s) => s.nombre !== item.nombre)
+    if (item.estado !== null) semaforo = [...semaforo, item as SemaforoItem]
+  }
+  return {
+    ...stats,
+    total_cfdis: delta.total_cfdis,
+    last_sync: delta.last_sync,
+    revenue_data: stats.revenue_data.map((r) => {
+      const m = meses.get(r.periodo)
+      return m ? { ...r, ingresos: m.ingresos, egresos: m.egresos } : r
+    }),
+    semaforo,
+  }
+}
+
 // CFO Chat
 export async function sendCFOMessage(message: string, companyId: number): Promise<{
   response: string